@@ -0,0 +1,72 @@
+#===========================================================================
+#
+# Retry backoff policy.
+#
+#===========================================================================
+import random
+
+
+class Backoff:
+    """Exponential backoff with jitter for message retries.
+
+    When a message times out, retrying it right away usually lands in the
+    same busy period on the Insteon network that caused the failure (and
+    another device retrying at the same time will collide again).  Instead
+    the retry is delayed by:
+
+       delay = min(max_delay, base * factor^(attempt - 1))
+
+    and then jittered by a random amount in the range [-jitter, +jitter] of
+    the delay so that retries spread out.
+
+    Configuration (each entry in the insteon 'retry_backoff' key):
+      - base:       (float) Delay in seconds before the first retry.
+      - factor:     (float) Delay multiplier for each retry.
+      - max_delay:  (float) Maximum delay in seconds.
+      - jitter:     (float) Random fraction of the delay in the range [0,1]
+                    to add or remove.
+    """
+    #-----------------------------------------------------------------------
+    def __init__(self, base=0.5, factor=2.0, max_delay=8.0, jitter=0.5):
+        """Constructor
+
+        Args:
+          base:       (float) Delay in seconds before the first retry.
+          factor:     (float) Delay multiplier for each retry.
+          max_delay:  (float) Maximum delay in seconds.
+          jitter:     (float) Random fraction of the delay to add or remove.
+        """
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    #-----------------------------------------------------------------------
+    def load_config(self, data):
+        """Load a configuration dictionary.
+
+        Args:
+          data:   (dict) The backoff configuration data.
+        """
+        self.base = float(data.get("base", self.base))
+        self.factor = float(data.get("factor", self.factor))
+        self.max_delay = float(data.get("max_delay", self.max_delay))
+        self.jitter = min(1.0, max(0.0, float(data.get("jitter",
+                                                       self.jitter))))
+
+    #-----------------------------------------------------------------------
+    def delay(self, attempt, rand=random.random):
+        """Return the delay to use before a retry.
+
+        Args:
+          attempt:  (int) The number of times the message has been sent.
+          rand:     Function returning a random number in [0,1).
+
+        Returns:
+          (float) Returns the delay in seconds.
+        """
+        delay = self.base * self.factor ** max(0, attempt - 1)
+        delay = min(self.max_delay, delay)
+        return max(0.0, delay * (1.0 + self.jitter * (2.0 * rand() - 1.0)))
+
+    #-----------------------------------------------------------------------
@@ -0,0 +1,341 @@
+#===========================================================================
+#
+# Insteon channel occupancy model.
+#
+#===========================================================================
+import collections
+from . import clock
+from . import log
+from . import message as Msg
+
+LOG = log.get_logger()
+
+
+class Channel:
+    """Insteon network channel occupancy model.
+
+    Writing to the modem while messages are still being repeated on the
+    Insteon network causes collisions and retries.  This class estimates
+    when the channel will be free so the Protocol can pace writes.  The
+    model includes:
+
+      - The remaining hops of inbound messages.  Standard messages take
+        STD_HOP_TIME per hop and extended messages take EXT_HOP_TIME.
+      - The cleanup messages a device sends to each of its responders after
+        an all link broadcast.  These use the number of hops the broadcast
+        took to reach the modem and are capped at MAX_CLEANUP_TIME.  The
+        estimate is dropped as soon as the next message (a cleanup or
+        anything else) is read since the channel is clearly usable.
+      - The cleanup messages the modem sends to each of its responders
+        after a modem scene (OutModemScene).  These are tracked until the
+        modem reports the scene is finished (InpAllLinkStatus).
+
+    The number of responders comes from the responders function which the
+    Modem sets so the device and modem databases can be used.
+
+    The counts of messages sent, modem NAK's (the modem is busy - usually
+    because of other traffic) and time outs are also tracked so the effect
+    of the pacing can be measured.
+
+    Each message read or written is also costed in estimated airtime (all
+    of it's hops plus any cleanup messages it causes) and the costs are
+    summed over a sliding window.  The utilization (airtime / window) is
+    used by the Protocol to only send background messages (refreshes,
+    database downloads, probes) while the channel isn't busy.
+
+    Configuration (the insteon 'channel' key):
+      - window:                  (float) Airtime window in seconds.
+                                 Default 60.
+      - background_utilization:  (float) Background messages are only
+                                 sent while the utilization is below this
+                                 fraction.  Default 0.5.
+    """
+    # Seconds per hop for standard and extended messages.  These are the
+    # same empirical values used in message.InpStandard.
+    STD_HOP_TIME = 0.087
+    EXT_HOP_TIME = 0.183
+
+    # Maximum seconds the device cleanups after an all link broadcast are
+    # assumed to take.  The cleanup count is a worst case (every responder
+    # needs a cleanup) so large scenes would otherwise block writes for
+    # many seconds.
+    MAX_CLEANUP_TIME = 2.0
+
+    #-----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor
+        """
+        # Function to return the number of responders for a controller
+        # address (None for the modem) and group.  Signature:
+        #    responders(Address addr, int group) -> int
+        self.responders = None
+
+        # Time that inbound traffic should be done.
+        self._busy_until = 0
+
+        # Estimated time the device cleanups after the last all link
+        # broadcast will be done.  Cleared by the next inbound message.
+        self._cleanup_until = 0
+
+        # Estimated time the modem scene cleanups will be done.  Cleared
+        # when the modem reports the scene is finished.
+        self._scene_until = 0
+
+        self.num_sent = 0
+        self.num_received = 0
+        self.num_nak = 0
+        self.num_timeout = 0
+
+        # Sliding window of (time, airtime) costs and the current sum of
+        # the window.
+        self.window = 60.0
+        self.max_background = 0.5
+        self._airtime = collections.deque()
+        self._window_total = 0.0
+
+        # Total airtime in seconds of all messages.
+        self.airtime_sent = 0.0
+        self.airtime_received = 0.0
+
+    #-----------------------------------------------------------------------
+    def load_config(self, data):
+        """Load a configuration dictionary.
+
+        Args:
+          data:   (dict) The channel configuration data.
+        """
+        self.window = max(1.0, float(data.get("window", self.window)))
+        self.max_background = float(data.get("background_utilization",
+                                             self.max_background))
+
+    #-----------------------------------------------------------------------
+    def next_write_time(self):
+        """Return the time after which the next message can be written.
+
+        Returns:
+          (float) Returns the time in seconds since the epoch.
+        """
+        return max(self._busy_until, self._cleanup_until, self._scene_until)
+
+    #-----------------------------------------------------------------------
+    def received(self, msg, t=None):
+        """Update the model with a message read from the modem.
+
+        Args:
+          msg:    (Msg.Base) The message that was read.
+          t:      (float) The current time.  None to use clock.now().
+        """
+        t = clock.now() if t is None else t
+
+        if isinstance(msg, Msg.InpAllLinkStatus):
+            self._scene_until = 0
+            return
+
+        elif isinstance(msg, (Msg.OutStandard, Msg.OutModemScene)):
+            if msg.is_ack is False:
+                self.num_nak += 1
+            return
+
+        elif not isinstance(msg, (Msg.InpStandard, Msg.InpExtended)):
+            return
+
+        self.num_received += 1
+        flags = msg.flags
+        hop_time = self.hop_time(flags.is_ext)
+
+        # The device will send a cleanup to each of it's responders next.
+        # They should need about as many hops as the broadcast did to
+        # reach us.  Any other message replaces the previous estimate -
+        # either the cleanups have started or the channel is free.
+        cleanup = 0
+        if flags.type == Msg.Flags.Type.ALL_LINK_BROADCAST:
+            num = self._responders(msg.from_addr, msg.group)
+            hops = flags.max_hops - flags.hops_left
+            cleanup = min(self.MAX_CLEANUP_TIME, self.cleanup_time(num, hops))
+
+        end = t + flags.hops_left * hop_time
+        self._occupy(end)
+        self._cleanup_until = end + cleanup if cleanup else 0
+
+        airtime = (flags.max_hops + 1) * hop_time + cleanup
+        self.airtime_received += airtime
+        self._use(t, airtime)
+
+    #-----------------------------------------------------------------------
+    def sent(self, msg, t=None):
+        """Update the model with a message written to the modem.
+
+        Args:
+          msg:    (Msg.Base) The message that was written.
+          t:      (float) The current time.  None to use clock.now().
+        """
+        t = clock.now() if t is None else t
+        self.num_sent += 1
+
+        if isinstance(msg, Msg.OutModemScene):
+            # Broadcast w/ 3 hops, then a cleanup to each responder.
+            num = self._responders(None, msg.group)
+            busy = 4 * self.STD_HOP_TIME + self.cleanup_time(num, 3)
+            self._scene_until = max(self._scene_until, t + busy)
+
+        elif isinstance(msg, Msg.OutStandard):  # Also matches OutExtended
+            flags = msg.flags
+            busy = (flags.max_hops + 1) * self.hop_time(flags.is_ext)
+
+        # Other messages are only sent to the modem.
+        else:
+            return
+
+        self.airtime_sent += busy
+        self._use(t, busy)
+
+    #-----------------------------------------------------------------------
+    def timeout(self):
+        """Record that a written message timed out.
+        """
+        self.num_timeout += 1
+
+    #-----------------------------------------------------------------------
+    def hop_time(self, is_ext):
+        """Return the time a message takes per hop.
+
+        Args:
+          is_ext:   (bool) True for extended messages.
+
+        Returns:
+          (float) Returns the time in seconds.
+        """
+        return self.EXT_HOP_TIME if is_ext else self.STD_HOP_TIME
+
+    #-----------------------------------------------------------------------
+    def cleanup_time(self, num, max_hops):
+        """Return the time needed for a series of cleanup messages.
+
+        Each cleanup is a standard direct message to a responder and an
+        ACK back.
+
+        Args:
+          num:       (int) The number of responders.
+          max_hops:  (int) The max hops used by the cleanup messages.
+
+        Returns:
+          (float) Returns the time in seconds.
+        """
+        return num * 2 * (max_hops + 1) * self.STD_HOP_TIME
+
+    #-----------------------------------------------------------------------
+    def utilization(self, t=None):
+        """Return the fraction of the window the channel has been in use.
+
+        Args:
+          t:      (float) The current time.  None to use clock.now().
+
+        Returns:
+          (float) Returns the airtime used in the window divided by the
+          window size.
+        """
+        t = clock.now() if t is None else t
+        self._expire(t)
+        return self._window_total / self.window
+
+    #-----------------------------------------------------------------------
+    def background_ok(self, t=None):
+        """Return True if background messages can be sent.
+
+        Args:
+          t:      (float) The current time.  None to use clock.now().
+
+        Returns:
+          (bool) Returns True if the utilization is below the background
+          limit.
+        """
+        return self.utilization(t) < self.max_background
+
+    #-----------------------------------------------------------------------
+    def stats(self, t=None):
+        """Return the channel statistics.
+
+        Args:
+          t:      (float) The current time.  None to use clock.now().
+
+        Returns:
+          (dict) Returns the message counts, the airtime totals in seconds,
+          the current utilization, and the NAK (collision) and time out
+          (retry) rates as a fraction of the messages sent.
+        """
+        sent = max(1, self.num_sent)
+        return {
+            "sent" : self.num_sent,
+            "received" : self.num_received,
+            "nak" : self.num_nak,
+            "timeout" : self.num_timeout,
+            "airtime_sent" : round(self.airtime_sent, 3),
+            "airtime_received" : round(self.airtime_received, 3),
+            "utilization" : round(self.utilization(t), 4),
+            "collision_rate" : round(float(self.num_nak) / sent, 4),
+            "retry_rate" : round(float(self.num_timeout) / sent, 4),
+            }
+
+    #-----------------------------------------------------------------------
+    def _occupy(self, end_time):
+        """Mark the channel as busy.
+
+        Args:
+          end_time:  (float) The time the channel will be free.
+        """
+        if end_time > self._busy_until:
+            self._busy_until = end_time
+            LOG.debug("Channel busy until: %f", end_time)
+
+    #-----------------------------------------------------------------------
+    def _use(self, t, airtime):
+        """Add a message cost to the airtime window.
+
+        Args:
+          t:        (float) The time the message was seen.
+          airtime:  (float) The estimated airtime in seconds.
+        """
+        self._airtime.append((t, airtime))
+        self._window_total += airtime
+
+        # Drop the old costs here as well so the window stays bounded even
+        # if nothing asks for the utilization.
+        self._expire(t)
+
+    #-----------------------------------------------------------------------
+    def _expire(self, t):
+        """Remove message costs that are older than the window.
+
+        Args:
+          t:      (float) The current time.
+        """
+        start = t - self.window
+        while self._airtime and self._airtime[0][0] < start:
+            self._window_total -= self._airtime.popleft()[1]
+
+        if not self._airtime:
+            self._window_total = 0.0
+
+    #-----------------------------------------------------------------------
+    def _responders(self, addr, group):
+        """Return the number of responders for a controller and group.
+
+        Args:
+          addr:    (Address) The controller address.  None for the modem.
+          group:   (int) The group.
+
+        Returns:
+          (int) Returns the number of responders.  If the responders
+          function isn't set, 0 is returned.
+        """
+        if self.responders is None:
+            return 0
+
+        try:
+            return self.responders(addr, group)
+        except:
+            LOG.exception("Error finding responders for %s group %s", addr,
+                          group)
+            return 0
+
+    #-----------------------------------------------------------------------
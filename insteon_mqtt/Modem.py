@@ -5,6 +5,7 @@
 #===========================================================================
 import json
 import os
+import time
 from .Address import Address
 from .CommandSeq import CommandSeq
 from . import config
@@ -13,7 +14,9 @@ from . import handler
 from . import log
 from . import message as Msg
 from . import util
+from .SceneTracker import SceneTracker
 from .Signal import Signal
+from .StateCache import StateCache
 
 LOG = log.get_logger()
 
@@ -49,6 +52,13 @@ class Modem:
         self.device_names = {}
         self.db = db.Modem()
 
+        # Tracks sets of devices that are commanded together so virtual
+        # modem scenes can be created for them.
+        self.scene_tracker = SceneTracker(self)
+
+        # Last known device states so they can be published at start up.
+        self.state_cache = StateCache(self)
+
         # Signal to emit when a new device is added.
         self.signal_new_device = Signal()  # emit(modem, device)
 
@@ -65,6 +75,10 @@ class Modem:
             'refresh_all' : self.refresh_all,
             'linking' : self.linking,
             'scene' : self.scene,
+            'create_scenes' : self.scene_tracker.create_scenes,
+            'scene_report' : self.scene_tracker.print_report,
+            'channel_stats' : self.print_channel_stats,
+            'trace_dump' : self.trace_dump,
             }
 
         # Add a generic read handler for any broadcast messages
@@ -82,6 +96,10 @@ class Modem:
         # to each device.
         self.protocol.signal_received.connect(self.handle_received)
 
+        # Let the channel model find the number of responders that will get
+        # cleanup messages after a broadcast.
+        self.protocol.channel.responders = self.num_responders
+
     #-----------------------------------------------------------------------
     def type(self):
         """Return a nice class name for the device.
@@ -102,6 +120,12 @@ class Modem:
         - storage   Path to store database records in.
         - startup_refresh    True if device databases should be checked for
                              new entries on start up.
+        - auto_scenes   Virtual modem scene creation settings.  See
+                        SceneTracker for details.
+        - state_cache   Device state cache settings.  See StateCache for
+                        details.
+        - circuit_breaker   Unreachable device settings.  See
+                            device.CircuitBreaker for details.
         - devices   List of devices.  Each device is a type and insteon
                     address of the device.
 
@@ -129,18 +153,29 @@ class Modem:
 
             LOG.info("Modem %s database loaded %s entries", self.addr,
                      len(self.db))
-            LOG.debug(str(self.db))
+            LOG.debug("%s", self.db)
+
+        self.scene_tracker.load_config(data.get('auto_scenes', {}),
+                                       self.save_path)
+        self.state_cache.load_config(data.get('state_cache', {}),
+                                     self.save_path)
 
         # Read the device definitions and scenes.
         self._load_devices(data.get('devices', []))
+
+        breaker = data.get('circuit_breaker', {})
+        for device in self.devices.values():
+            if device.breaker is not None:
+                device.breaker.load_config(breaker)
         #FUTURE: self.scenes = self._load_scenes(data.get('scenes', []))
 
         # Send refresh messages to each device to check if the
         # database is up to date.
         if data.get('startup_refresh', False) is True:
             LOG.info("Starting device refresh")
-            for device in self.devices.values():
-                device.refresh()
+            with self.protocol.background():
+                for device in self.devices.values():
+                    device.refresh()
 
     #-----------------------------------------------------------------------
     def refresh(self, force=False, on_done=None):
@@ -203,6 +238,18 @@ class Modem:
         LOG.info("%s database loaded %s entries", self.addr, len(self.db))
         LOG.debug("%s", self.db)
 
+    #-----------------------------------------------------------------------
+    def save_history(self):
+        """Save the message history for every device and the state cache.
+
+        The histories are saved periodically as they change.  This is
+        used at shutdown to save any recent changes.
+        """
+        for device in self.devices.values():
+            device.history.save()
+
+        self.state_cache.save()
+
     #-----------------------------------------------------------------------
     def print_db(self, on_done):
         """Print the device database to the log UI.
@@ -211,6 +258,80 @@ class Modem:
         LOG.ui("%s", self.db)
         on_done(True, "Complete", None)
 
+    #-----------------------------------------------------------------------
+    def print_channel_stats(self, on_done):
+        """Print the Insteon channel statistics to the log UI.
+
+        See Channel.stats() for details.
+        """
+        for key, value in self.protocol.channel.stats().items():
+            LOG.ui("%s: %s", key, value)
+
+        on_done(True, "Complete", None)
+
+    #-----------------------------------------------------------------------
+    def trace_dump(self, path=None, on_done=None):
+        """Write the modem message trace to a file.
+
+        See Trace for details.  Use 'insteon-mqtt trace-decode' to convert
+        the file to text.
+
+        The path comes from the MQTT command so only a file name is
+        accepted and the file is always written to the storage directory.
+
+        Args:
+          path:     (str) The name of the file to write in the storage
+                    directory.  If this is None, a time stamped name is
+                    used.
+          on_done:  Finished callback.  This is called when the command has
+                    completed.  Signature is: on_done(success, msg, data)
+        """
+        on_done = util.make_callback(on_done)
+        name = path
+        if name is None:
+            name = time.strftime("trace_%Y%m%d_%H%M%S.bin")
+
+        seps = [i for i in (os.sep, os.altsep, "/", "\\") if i]
+        if (not isinstance(name, str) or name in ("", ".", "..") or
+                any(i in name for i in seps)):
+            on_done(False, "Invalid trace file name '%s' - only a file name "
+                    "in the storage directory is allowed" % name, None)
+            return
+
+        path = os.path.join(self.save_path, name)
+
+        try:
+            self.protocol.trace.dump(path)
+        except OSError as e:
+            on_done(False, "Error writing trace %s: %s" % (path, e), None)
+            return
+
+        on_done(True, "Trace written to %s" % path, path)
+
+    #-----------------------------------------------------------------------
+    def num_responders(self, addr, group):
+        """Return the number of responders for a controller and group.
+
+        This is used by the Protocol channel model to estimate the number of
+        cleanup messages that follow a broadcast.
+
+        Args:
+          addr:   (Address) The controller address.  None for the modem.
+          group:  (int) The group number.
+
+        Returns:
+          (int) Returns the number of responders in the controller's
+          database.  0 if the controller isn't known.
+        """
+        if addr is None or addr == self.addr:
+            return len(self.db.find_group(group))
+
+        device = self.find(addr)
+        if device is None:
+            return 0
+
+        return len(device.db.find_group(group))
+
     #-----------------------------------------------------------------------
     def add(self, device):
         """Add a device object to the modem.
@@ -226,6 +347,8 @@ class Modem:
         if device.name:
             self.device_names[device.name] = device
 
+        self.state_cache.watch(device)
+
     #-----------------------------------------------------------------------
     def remove(self, device):
         """Remove a device object from the modem.
@@ -294,19 +417,22 @@ class Modem:
         This forces a refresh of the modem and device databases.  This
         can take a long time - up to 5 seconds per device some times
         depending on the database sizes.  So it usually should only be
-        called if no other activity is expected on the network.
+        called if no other activity is expected on the network.  The
+        messages are sent in the background (see Protocol.background) so
+        other commands can still be sent.
         """
-        # Reload the modem database.
-        self.refresh()
+        with self.protocol.background():
+            # Reload the modem database.
+            self.refresh()
 
-        # Reload all the device databases.
-        for i, device in enumerate(self.devices.values()):
-            # Only set the callback if this is the last element.
-            callback = None
-            if i == len(self.devices) - 1:
-                callback = on_done
+            # Reload all the device databases.
+            for i, device in enumerate(self.devices.values()):
+                # Only set the callback if this is the last element.
+                callback = None
+                if i == len(self.devices) - 1:
+                    callback = on_done
 
-            device.refresh(force, on_done=callback)
+                device.refresh(force, on_done=callback)
 
     #-----------------------------------------------------------------------
     def db_add_ctrl_of(self, local_group, remote_addr, remote_group,
@@ -454,7 +580,19 @@ class Modem:
 
     #-----------------------------------------------------------------------
     def scene(self, is_on, group, num_retry=3, on_done=None):
-        """TODO: doc
+        """Trigger a virtual modem scene.
+
+        This broadcasts the scene command for a modem controller group.
+        The on_done data is a dict with the responder addresses that ACK'ed
+        and failed the cleanup messages (see handler.ModemScene).
+
+        Args:
+          is_on:     (bool) True to turn the scene on, False for off.
+          group:     (int) The modem group to trigger.
+          num_retry: (int) The number of times to retry the message.
+          on_done:   Finished callback.  This is called when the command has
+                     completed.  Signature is:
+                         on_done(success, msg, data)
         """
         assert 0x01 <= group <= 0xff
         LOG.info("Modem scene %s on=%s", group, "on" if is_on else "off")
@@ -464,6 +602,37 @@ class Modem:
         msg_handler = handler.ModemScene(self, msg, on_done)
         self.protocol.send(msg, msg_handler)
 
+    #-----------------------------------------------------------------------
+    def find_scene(self, is_on, targets):
+        """Find a modem scene that matches a set of device commands.
+
+        A modem controller group matches if it's responders are exactly the
+        input devices.  For on commands, the responder on level stored in
+        each device's database for the group must also match the requested
+        level.
+
+        Args:
+          is_on:    (bool) True for an on command, False for off.
+          targets:  ({Address : int}) Map of device address to the requested
+                    on level.  The level is ignored for off commands.
+
+        Returns:
+          (int) Returns the modem group to use or None if no group matches.
+        """
+        addrs = set(targets)
+        for group in sorted(self.db.groups):
+            entries = self.db.find_group(group)
+            if set(e.addr for e in entries) != addrs:
+                continue
+
+            if is_on and any(self._responder_level(e.addr, group) !=
+                             targets[e.addr] for e in entries):
+                continue
+
+            return group
+
+        return None
+
     #-----------------------------------------------------------------------
     def handle_received(self, msg):
         """Receives incomming message notifications from protocol
@@ -485,32 +654,49 @@ class Modem:
             device.handle_received(msg)
 
     #-----------------------------------------------------------------------
-    def handle_scene(self, group, cmd):
+    def handle_scene(self, group, cmd, addrs=None):
         """Callback for scene simulation commanded messages.
 
         This callback is run when we get a reply back from triggering a scene
-        on the device.  If the command was ACK'ed, we know it worked.  The
-        device will then send out standard broadcast messages which will
-        trigger other updates for the scene devices.
+        on the device.  If the command was ACK'ed, we know it worked.  Each
+        responder in the group is then updated with the scene command.
 
-        TODO: doc
+        Args:
+          group:   (int) The modem group that was triggered.
+          cmd:     (int) The scene command byte.
+          addrs:   ([Address]) Only update these responders.  This is used
+                   to skip responders that didn't ACK the scene.  None to
+                   update every responder.
+
+        Returns:
+          ([Address]) Returns the addresses of the devices that were updated.
         """
         responders = self.db.find_group(group)
         LOG.debug("Found %s responders in group %s", len(responders), group)
-        LOG.debug("Group %s -> %s", group, [i.addr.hex for i in responders])
+        LOG.debug("Group %s -> %s", group,
+                  log.Lazy(lambda: [i.addr.hex for i in responders]))
 
         # For each device that we're the controller of call it's
         # handler for the broadcast message.
+        applied = []
         for elem in responders:
+            if addrs is not None and elem.addr not in addrs:
+                LOG.info("%s skipping group %s update for %s - no ACK",
+                         self.label, group, elem.addr)
+                continue
+
             device = self.find(elem.addr)
             if device:
                 LOG.info("%s broadcast to %s for group %s", self.label,
                          device.addr, group)
                 device.handle_group_cmd(self.addr, group, cmd)
+                applied.append(device.addr)
             else:
                 LOG.warning("%s broadcast - device %s not found", self.label,
                             elem.addr)
 
+        return applied
+
     #-----------------------------------------------------------------------
     def run_command(self, **kwargs):
         """Run arbitrary commands.
@@ -570,6 +756,25 @@ class Modem:
         # The modem has nothing to do for these messages.
         pass
 
+    #-----------------------------------------------------------------------
+    def _responder_level(self, addr, group):
+        """Return the on level a device uses as a responder of a modem group.
+
+        Args:
+          addr:    (Address) The responder device address.
+          group:   (int) The modem group.
+
+        Returns:
+          (int) Returns the on level or None if the device or its responder
+          entry can't be found.
+        """
+        device = self.devices.get(addr.id, None)
+        if not device:
+            return None
+
+        entry = device.db.find(self.addr, group, is_controller=False)
+        return entry.data[0] if entry else None
+
     #-----------------------------------------------------------------------
     def _load_devices(self, data):
         """Load device definitions from a configuration data object.
@@ -670,10 +875,10 @@ class Modem:
             on_done = None
             if is_controller:
                 seq.add(remote.db_add_resp_of, remote_group, self.addr,
-                        local_group, two_way, refresh, remote_data=remote_data)
+                        local_group, two_way, refresh, local_data=remote_data)
             else:
                 seq.add(remote.db_add_ctrl_of, remote_group, self.addr,
-                        local_group, two_way, refresh, remote_data=remote_data)
+                        local_group, two_way, refresh, local_data=remote_data)
 
         # Start the command sequence.
         seq.run()
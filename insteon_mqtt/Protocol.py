@@ -3,11 +3,18 @@
 # Insteon Protocol class.  Parses PLM data and writes messages.
 #
 #===========================================================================
-import time
+import contextlib
+import heapq
+import itertools
+from . import clock
+from . import latency
 from . import log
 from . import message as Msg
+from . import util
+from .Backoff import Backoff
+from .Channel import Channel
 from .Signal import Signal
-#from . import util
+from .Trace import Trace
 
 LOG = log.get_logger()
 
@@ -51,6 +58,18 @@ class Protocol:
        involves sending one command, getting an ACK, then reading a
        series of messages (1 per db entry) until we get a final
        message which ends the sequence.
+
+    Background messages: messages sent inside a background() block (and
+    any messages sent by the handlers of those messages) are held in a
+    separate queue.  They're only written when the write queue is empty
+    and the channel utilization is below the configured limit (see
+    Channel) so refreshes and database downloads don't crowd out user
+    commands.
+
+    Retries: when a handler times out, the retry is delayed using the
+    Backoff policy for the message class (see send_later()).  The message
+    isn't in the write queue while it waits so other messages can use the
+    modem in the mean time.
     """
     def __init__(self, link):
         """Constructor
@@ -70,7 +89,13 @@ class Protocol:
         link.signal_wrote.connect(self._msg_written)
 
         # Message received signal.  Every read message is passed to this.
-        self.signal_received = Signal()  # (Message)
+        # These are emitted for every message and poll so the slots are
+        # held in strong references to keep emit() fast.
+        self.signal_received = Signal(strong=True)  # (Message)
+
+        # Periodic poll signal.  Emitted each time the network link is
+        # polled so other objects can run delayed work.
+        self.signal_poll = Signal(strong=True)  # (float t)
 
         # Inbound message buffer.
         self._buf = bytearray()
@@ -90,6 +115,20 @@ class Protocol:
         # handler.Base message handler of the last written message.
         self._write_handler = None
 
+        # True if the first message in the write queue has been passed to
+        # the link but the link hasn't finished writing it yet.
+        self._write_pending = False
+
+        # List of (msg, handler) tuples sent inside a batch() block.  None if
+        # a batch isn't active.
+        self._batch = None
+
+        # List of (msg, handler) background messages waiting for the write
+        # queue to be empty and the channel to be quiet.  _background is
+        # True inside a background() block.
+        self._background_queue = []
+        self._background = False
+
         # Set of possible message handlers to use.  These are handlers that
         # handle any message that isn't handled by an explicit write handler.
         # # write handler.
@@ -102,8 +141,27 @@ class Protocol:
         # this time.
         self._read_history = []
 
-        # TODO: doc
-        self._next_write_time = 0
+        # Insteon channel occupancy model.  Used to pick the time that the
+        # next message can be written without colliding with other traffic.
+        self.channel = Channel()
+
+        # In memory trace of the modem traffic.
+        self.trace = Trace()
+
+        # Command latency histograms and sampled traces.
+        self.latency = latency.Recorder()
+
+        # Heap of (time, id, func, args) timers to run from the poll
+        # function.  The id keeps the order stable for equal times.
+        self._timers = []
+        self._timer_id = itertools.count()
+
+        # Map of message class name -> Backoff retry policy.  'default'
+        # is used for any class that isn't in the map.
+        self._backoff = {
+            "default" : Backoff(),
+            "OutExtended" : Backoff(base=1.0),
+            }
 
     #-----------------------------------------------------------------------
     def add_handler(self, handler):
@@ -138,9 +196,23 @@ class Protocol:
         object) to load any configuration for the modem connection.
 
         Args:
-          config:   (dict) Configuration data to load.
+          config:   (dict) Configuration data to load.  The optional
+                    retry_backoff key is a dictionary of message class
+                    names (or 'default') to Backoff configurations.  The
+                    optional channel, trace, and latency keys are the
+                    Channel, Trace, and latency.Recorder configurations.
         """
         self.link.load_config(config)
+        self.channel.load_config(config.get("channel", {}))
+        self.trace.load_config(config.get("trace", {}))
+        self.latency.load_config(config.get("latency", {}))
+
+        for name, data in config.get("retry_backoff", {}).items():
+            policy = self._backoff.get(name, None)
+            if policy is None:
+                policy = self._backoff[name] = Backoff()
+
+            policy.load_config(data)
 
     #-----------------------------------------------------------------------
     def send(self, msg, msg_handler, high_priority=False):
@@ -167,16 +239,161 @@ class Protocol:
                           the handler returns the message.FINISHED flags.
           high_priority:  (bool)False to add the message at the end of the
                           queue.  True to insert this message at the start of
-                          the queue.
+                          the queue.  This is ignored inside a batch() block.
         """
-        if not high_priority:
-            self._write_queue.append((msg, msg_handler))
+        trace = getattr(msg_handler, "latency", None)
+        if trace:
+            trace.mark("queued")
+
+        # Background messages wait in their own queue.  The handler is
+        # marked so retries are also sent in the background.
+        if self._background or getattr(msg_handler, "background", False):
+            msg_handler.background = True
+            self._background_queue.append((msg, msg_handler))
+            self._send_background()
+            return
+
+        # Inside a batch, the message is queued when the batch ends.
+        if self._batch is not None:
+            self._batch.append((msg, msg_handler))
+            return
+
+        self._enqueue([(msg, msg_handler)], high_priority)
+
+    #-----------------------------------------------------------------------
+    def send_later(self, delay, msg, msg_handler):
+        """Write a message to the PLM modem after a delay.
+
+        This is used for retries.  When the delay has passed, the message
+        is added to the front of the write queue.
+
+        Args:
+          delay:        (float) The delay in seconds.  If this is <= 0, the
+                        message is added to the end of the queue right away.
+          msg:          Output message to write.
+          msg_handler:  Message handler instance to use when replies to the
+                        message are received.
+        """
+        if delay <= 0:
+            self.send(msg, msg_handler)
         else:
-            self._write_queue.insert(0, (msg, msg_handler))
+            self.call_later(delay, self.send, msg, msg_handler, True)
 
-        # If there is an existing msg that we're processing replies
-        # for then delay sending this until we're done.
-        if not self._write_handler:
+    #-----------------------------------------------------------------------
+    def call_later(self, delay, func, *args):
+        """Call a function after a delay.
+
+        The function is called from the poll function so the actual time
+        depends on how often the network loop polls the link.
+
+        Args:
+          delay:   (float) The delay in seconds.
+          func:    The function to call.
+          args:    Arguments to pass to the function.
+        """
+        t = clock.now() + delay
+        heapq.heappush(self._timers, (t, next(self._timer_id), func, args))
+        clock.deadline(t)
+
+    #-----------------------------------------------------------------------
+    def retry_delay(self, msg, attempt):
+        """Return the delay to use before retrying a message.
+
+        The Backoff policy is found using the message class name or the
+        name of any of it's base classes.
+
+        Args:
+          msg:      The message to retry.
+          attempt:  (int) The number of times the message has been sent.
+
+        Returns:
+          (float) Returns the delay in seconds.
+        """
+        for cls in type(msg).__mro__:
+            policy = self._backoff.get(cls.__name__, None)
+            if policy is not None:
+                break
+        else:
+            policy = self._backoff["default"]
+
+        return policy.delay(attempt)
+
+    #-----------------------------------------------------------------------
+    @contextlib.contextmanager
+    def batch(self, high_priority=False):
+        """Context manager to queue a group of messages in one pass.
+
+        Messages sent inside the block are held until the block exits and
+        are then added to the write queue together, in the order they were
+        sent, with a shared priority.  Nested batches are merged into the
+        outermost one.
+
+        with protocol.batch(high_priority=True):
+           device1.on()
+           device2.off()
+
+        Args:
+          high_priority:  (bool) False to add the messages at the end of the
+                          queue.  True to insert them at the start of the
+                          queue.
+        """
+        if self._batch is not None:
+            yield
+            return
+
+        self._batch = []
+        try:
+            yield
+        finally:
+            items, self._batch = self._batch, None
+            if items:
+                self._enqueue(items, high_priority)
+
+    #-----------------------------------------------------------------------
+    @contextlib.contextmanager
+    def background(self, enable=True):
+        """Context manager to send messages in the background.
+
+        Messages sent inside the block are only written when the write
+        queue is empty and the channel utilization is below the background
+        limit.
+
+        with protocol.background():
+           device.refresh()
+
+        Args:
+          enable:  (bool) True to send messages in the background.  False
+                   to send them normally.
+        """
+        old, self._background = self._background, enable
+        try:
+            yield
+        finally:
+            self._background = old
+
+    #-----------------------------------------------------------------------
+    def _enqueue(self, items, high_priority):
+        """Add messages to the write queue.
+
+        Args:
+          items:          [(msg, handler)] List of messages and handlers to
+                          add.
+          high_priority:  (bool) False to add the messages at the end of the
+                          queue.  True to insert them at the start of the
+                          queue.
+        """
+        if not high_priority:
+            self._write_queue.extend(items)
+        else:
+            # If the first message has already been passed to the link, it
+            # has to stay at the front of the queue.
+            idx = 1 if self._write_pending else 0
+            self._write_queue[idx:idx] = items
+
+        # If there is an existing msg that we're processing replies for or
+        # one that is being written, then delay sending this until we're
+        # done.
+        if not self._write_handler and not self._write_pending:
             self._send_next_msg()
 
     #-----------------------------------------------------------------------
@@ -190,12 +407,29 @@ class Protocol:
         Args:
            t:   (float) Current Unix clock time tag.
         """
+        self.signal_poll.emit(t)
+
+        # Run any timers that are due.
+        while self._timers and self._timers[0][0] <= t:
+            _, _, func, args = heapq.heappop(self._timers)
+            func(*args)
+
         if not self._write_handler:
+            self._send_background(t)
             return
 
         # Ask the write handler if it's past the time out in which
         # case we'll mark this message as finished and move on.
-        if self._write_handler.is_expired(self, t):
+        trace = getattr(self._write_handler, "latency", None)
+        with LOG.ui_context(self._write_handler.ui_callback), \
+             latency.context(trace), \
+             self.background(self._write_handler.background):
+            expired = self._write_handler.is_expired(self, t)
+
+        if expired:
+            self.channel.timeout()
+            self.trace.record(Trace.HANDLER, "%s expired" %
+                              type(self._write_handler).__name__)
             self._write_finished()
 
     #-----------------------------------------------------------------------
@@ -217,8 +451,8 @@ class Protocol:
         # There must be at least 2 bytes so we can read the message
         # type code.
         while len(self._buf) > 1:
-            #LOG.debug("Searching message (len %d): %s... ",
-            #               len(self._buf), util.to_hex(self._buf,20))
+            LOG.debug("Searching message (len %d): %s... ", len(self._buf),
+                      log.Lazy(util.to_hex, self._buf, 20))
 
             # Find a message start token.  Note that this token could
             # also appear in the middle of a message so we can't be
@@ -266,12 +500,20 @@ class Protocol:
                 self._buf = self._buf[1:]
                 continue
 
+            self.trace.record(Trace.READ, self._buf[:msg_size])
             self._buf = self._buf[msg_size:]
-            LOG.info("Read %#04x: %s", msg_type, msg)
+            # Every message read is logged so this is at debug.  The
+            # message is only formatted if the level is enabled.
+            LOG.debug("Read %#04x: %s", msg_type, msg)
 
             if self._is_duplicate(msg):
-                LOG.info("Ignored duplicate %s", msg)
+                LOG.debug("Ignored duplicate %s", msg)
             else:
+                # Update the channel model with the traffic.  Duplicates
+                # aren't included since the first copy is already charged
+                # for all of it's hops.
+                self.channel.received(msg)
+
                 # And try to process the message using the handlers.
                 self._process_msg(msg)
 
@@ -294,16 +536,11 @@ class Protocol:
         if not isinstance(msg, Msg.InpStandard):  # Also matches InpExtended
             return False
 
-        current = time.time()
+        current = clock.now()
 
         # Remove any expired messages first.
         self._remove_expired_read(current)
 
-        # Update the next allowed write time based on the number of hops that
-        # are remaining on the inbound message.
-        self._next_write_time = msg.expire_time
-        LOG.debug("Setting next write time: %f", self._next_write_time)
-
         # See if we have a duplicate message.
         if msg in self._read_history:
             return True
@@ -355,12 +592,28 @@ class Protocol:
         # the handler ignored that message.
         if self._write_handler:
             LOG.debug("Passing msg to write handler")
-            status = self._write_handler.msg_received(self, msg)
+
+            # The reply stage is marked first so it's before anything the
+            # handler does with the message.
+            trace = getattr(self._write_handler, "latency", None)
+            if trace:
+                stage = latency.msg_stage(msg)
+                trace.mark(stage)
+
+            with LOG.ui_context(self._write_handler.ui_callback), \
+                 latency.context(trace), \
+                 self.background(self._write_handler.background):
+                status = self._write_handler.msg_received(self, msg)
+
+            if trace and status == Msg.UNKNOWN:
+                trace.discard(stage)
 
             # Handler is finished.  Send the next outgoing message
             # if one is waiting.
             if status == Msg.FINISHED:
                 LOG.debug("Write handler finished")
+                self.trace.record(Trace.HANDLER, "%s finished" %
+                                  type(self._write_handler).__name__)
                 self._write_finished()
                 return
 
@@ -404,6 +657,8 @@ class Protocol:
         self._write_handler = None
         if self._write_queue:
             self._send_next_msg()
+        else:
+            self._send_background()
 
     #-----------------------------------------------------------------------
     def _msg_written(self, link, data):
@@ -416,15 +671,43 @@ class Protocol:
 
         # Remove the message from the queue since it has been written.
         msg, handler = self._write_queue.pop(0)
+        self._write_pending = False
 
         # Save the handler to have priority processing for any inbound
         # messages.
         self._write_handler = handler
+        self.channel.sent(msg)
+        trace = getattr(handler, "latency", None)
+        if trace:
+            trace.mark("sent")
+        self.trace.record(Trace.HANDLER, "%s started" %
+                          type(handler).__name__)
 
         # Tell the handler that we've sent the message to update the current
         # time out time.
         handler.sending_message(msg)
 
+    #-----------------------------------------------------------------------
+    def _send_background(self, t=None):
+        """Send the next background message if the modem is idle.
+
+        The message is only sent if nothing else is being written or
+        waiting to be written and the channel isn't too busy.
+
+        Args:
+           t:   (float) Current Unix clock time tag.  None to use
+                clock.now().
+        """
+        if (not self._background_queue or self._write_handler or
+                self._write_pending or self._write_queue):
+            return
+
+        if not self.channel.background_ok(t):
+            return
+
+        self._write_queue.append(self._background_queue.pop(0))
+        self._send_next_msg()
+
     #-----------------------------------------------------------------------
     def _send_next_msg(self):
         """Send the next message in the write queue.
@@ -437,8 +720,17 @@ class Protocol:
         msg, handler = self._write_queue[0]
 
         # Write the message to the PLM modem.  The message will only be sent
-        # when the current time is after the next write time.
+        # when the channel model says the Insteon network should be free.
         LOG.info("Write to modem: %s", msg)
-        self.link.write(msg.to_bytes(), self._next_write_time)
+        data = msg.to_bytes()
+        self.trace.record(Trace.WRITE, data)
+        after_time = self.channel.next_write_time()
+        clock.deadline(after_time)
+        trace = getattr(handler, "latency", None)
+        if trace:
+            trace.mark("write")
+
+        self.link.write(data, after_time)
+        self._write_pending = True
 
     #-----------------------------------------------------------------------
@@ -0,0 +1,390 @@
+#===========================================================================
+#
+# Virtual modem scene tracking and provisioning.
+#
+#===========================================================================
+import json
+import os
+from . import clock
+from . import log
+from .Address import Address
+from .CommandSeq import CommandSeq
+
+LOG = log.get_logger()
+
+
+class SceneTracker:
+    """Tracks device sets that are commanded together.
+
+    Each time a bulk command turns a set of devices on (to the same level)
+    or off, the set is recorded.  Sets that are used often are suggested as
+    virtual modem scenes.  If auto creation is enabled, a free modem group
+    (see db.Modem.next_group) is linked to the devices once a set has been
+    used min_count times.  After that, bulk commands for the set match the
+    new modem scene and are sent as a single broadcast instead of one
+    message per device.
+
+    Configuration (the insteon 'auto_scenes' key):
+      - enable:       (bool) True to create scenes automatically.  If False,
+                      the scenes are only suggested and can be created with
+                      the modem 'create_scenes' command.  Default False.
+      - min_count:    (int) Number of times a set must be used before it's
+                      suggested or created.  Default 5.
+      - min_devices:  (int) Minimum number of devices in a set.  Default 3.
+      - max_groups:   (int) Maximum number of modem groups to create.
+                      Default 8.
+
+    The sets and the created groups are saved to scene_tracker.json in the
+    storage directory so the usage counts and the max_groups limit carry
+    over when the bridge is restarted.
+    """
+    # Estimated PLM messages needed to create the links for each device in
+    # a scene: the modem controller record and the device responder record.
+    setup_msgs = 2
+
+    #-----------------------------------------------------------------------
+    def __init__(self, modem):
+        """Constructor
+
+        Args:
+          modem:   (Modem) The Insteon modem.
+        """
+        self.modem = modem
+
+        self.enable = False
+        self.min_count = 5
+        self.min_devices = 3
+        self.max_groups = 8
+
+        # Map of set key -> usage dict.  See record() for the key and
+        # _new_set() for the dict fields.
+        self.sets = {}
+
+        # Modem groups that have been created by this class.
+        self.groups = []
+
+        # File to save the sets and groups to.  None to not save them.
+        self.save_path = None
+
+    #-----------------------------------------------------------------------
+    def load_config(self, data, save_path=None):
+        """Load a configuration dictionary.
+
+        Args:
+          data:       (dict) The auto_scenes configuration data.
+          save_path:  (str) The storage directory or None if there isn't
+                      one.
+        """
+        self.enable = bool(data.get("enable", self.enable))
+        self.min_count = int(data.get("min_count", self.min_count))
+        self.min_devices = int(data.get("min_devices", self.min_devices))
+        self.max_groups = int(data.get("max_groups", self.max_groups))
+
+        if save_path:
+            self.save_path = os.path.join(save_path, "scene_tracker.json")
+            self.load()
+
+    #-----------------------------------------------------------------------
+    def load(self):
+        """Load the saved sets and groups.
+
+        The inverse of this is save().
+        """
+        if not os.path.exists(self.save_path):
+            return
+
+        try:
+            with open(self.save_path) as f:
+                data = json.load(f)
+
+            groups = [int(i) for i in data.get("groups", [])]
+            sets = {}
+            for entry in data.get("sets", []):
+                is_on = bool(entry["is_on"])
+                targets = {Address(a) : v for a, v in entry["targets"]}
+                info = self._new_set(is_on, targets)
+                for key in ["count", "scene_count", "group", "suggested",
+                            "last_time"]:
+                    info[key] = entry.get(key, info[key])
+
+                sets[self._key(is_on, targets)] = info
+        except:
+            LOG.exception("Error reading scene tracker file %s",
+                          self.save_path)
+            return
+
+        self.groups = groups
+        self.sets = sets
+        LOG.info("Scene tracker loaded %d sets and %d groups", len(sets),
+                 len(groups))
+
+    #-----------------------------------------------------------------------
+    def save(self):
+        """Save the sets and groups.
+
+        Nothing is done if there is no storage directory.
+        """
+        if not self.save_path:
+            return
+
+        sets = []
+        for (is_on, targets), data in sorted(self.sets.items(), key=str):
+            sets.append({
+                "is_on" : is_on,
+                "targets" : sorted([Address(i).hex, v] for i, v in targets),
+                "count" : data["count"],
+                "scene_count" : data["scene_count"],
+                "group" : data["group"],
+                "suggested" : data["suggested"],
+                "last_time" : data["last_time"],
+                })
+
+        try:
+            with open(self.save_path, "w") as f:
+                json.dump({"groups" : self.groups, "sets" : sets}, f,
+                          indent=2)
+        except:
+            LOG.exception("Error writing scene tracker file %s",
+                          self.save_path)
+
+    #-----------------------------------------------------------------------
+    def record(self, is_on, targets, group=None):
+        """Record a set of devices that were commanded together.
+
+        Args:
+          is_on:    (bool) True for an on command, False for off.
+          targets:  ({Address : int}) Map of device address to the on level.
+                    The level is ignored for off commands.
+          group:    (int) The modem group that was used to send the command
+                    or None if it was sent as direct commands.
+        """
+        if len(targets) < self.min_devices:
+            return
+
+        key = self._key(is_on, targets)
+        data = self.sets.get(key, None)
+        if data is None:
+            data = self.sets[key] = self._new_set(is_on, targets)
+
+        data["count"] += 1
+        data["last_time"] = clock.now()
+        if group is not None:
+            data["group"] = group
+            data["scene_count"] += 1
+            self.save()
+            return
+
+        self.save()
+
+        if data["count"] < self.min_count or data["pending"]:
+            return
+
+        if self.enable:
+            if len(self.groups) < self.max_groups:
+                self.create(key)
+            elif not data["suggested"]:
+                LOG.warning("Auto scene limit of %d groups reached - not "
+                            "creating scene for %s", self.max_groups,
+                            self._label(data))
+                data["suggested"] = True
+
+        elif not data["suggested"]:
+            LOG.info("Suggested modem scene for %s (used %d times).  Use the "
+                     "modem 'create_scenes' command to create it.",
+                     self._label(data), data["count"])
+            data["suggested"] = True
+
+    #-----------------------------------------------------------------------
+    def suggestions(self):
+        """Return the sets that should have a modem scene.
+
+        Returns:
+          [key] Returns the keys of the sets that have been used at least
+          min_count times and don't have a modem scene yet.
+        """
+        return [k for k, v in sorted(self.sets.items(), key=str)
+                if v["group"] is None and not v["pending"] and
+                v["count"] >= self.min_count]
+
+    #-----------------------------------------------------------------------
+    def create_scenes(self, on_done=None):
+        """Create modem scenes for all the suggested sets.
+
+        This is the modem 'create_scenes' command.  The max_groups limit is
+        still applied.
+
+        Args:
+          on_done:  Finished callback.  Signature is:
+                        on_done(success, msg, data)
+        """
+        keys = self.suggestions()
+        keys = keys[:max(0, self.max_groups - len(self.groups))]
+        if not keys:
+            if on_done:
+                on_done(True, "No scenes to create", None)
+            return
+
+        seq = CommandSeq(self.modem.protocol, "Created %d modem scenes" %
+                         len(keys), on_done)
+        for key in keys:
+            seq.add(self.create, key)
+
+        seq.run()
+
+    #-----------------------------------------------------------------------
+    def create(self, key, on_done=None):
+        """Create a modem scene for a device set.
+
+        A free modem group is found and the modem is linked as the
+        controller of each device with the device responder on level set
+        to the level in the set.
+
+        Args:
+          key:      The set key (see record()).
+          on_done:  Finished callback.  Signature is:
+                        on_done(success, msg, data)
+        """
+        data = self.sets[key]
+        group = self.modem.db.next_group()
+        while group is not None and group in self.groups:
+            group = group + 1 if group < 0xff else None
+
+        if group is None:
+            LOG.error("No free modem groups for scene %s", self._label(data))
+            if on_done:
+                on_done(False, "No free modem groups", None)
+            return
+
+        LOG.ui("Creating modem scene %d for %s", group, self._label(data))
+        data["pending"] = True
+        self.groups.append(group)
+        self.save()
+
+        def done(success, msg, entry):
+            data["pending"] = False
+            if success:
+                data["group"] = group
+            else:
+                self.groups.remove(group)
+                LOG.error("Failed to create modem scene %d: %s", group, msg)
+
+            self.save()
+
+            if on_done:
+                on_done(success, msg, entry)
+
+        seq = CommandSeq(self.modem.protocol, "Modem scene %d created" %
+                         group, done)
+        level = data["level"] if data["is_on"] else 0xff
+        for addr in data["addrs"]:
+            seq.add(self.modem.db_add_ctrl_of, group, addr, 0x01,
+                    remote_data=[level, 0x00, 0x01])
+
+        seq.run()
+
+    #-----------------------------------------------------------------------
+    def report(self):
+        """Return a report of the tracked sets and the PLM traffic savings.
+
+        Each command sent directly to a device is one PLM round trip.  A
+        scene replaces N direct commands with a single broadcast so each use
+        saves N-1 round trips, less the one time cost of creating the links.
+
+        Returns:
+          [str] Returns the report lines.
+        """
+        lines = ["Group  Uses  Scene  Devices  Saved  Est/use  Setup  "
+                 "Command"]
+        total_saved = 0
+        total_possible = 0
+        for key, data in sorted(self.sets.items(), key=str):
+            num = len(data["addrs"])
+            saved = data["scene_count"] * (num - 1)
+            total_saved += saved
+
+            setup = "-"
+            if data["group"] is None:
+                setup = str(num * self.setup_msgs)
+                total_possible += data["count"] * (num - 1)
+
+            group = "-" if data["group"] is None else str(data["group"])
+            lines.append("%5s  %4d  %5d  %7d  %5d  %7d  %5s  %s" % (
+                group, data["count"], data["scene_count"], num, saved,
+                num - 1, setup, self._label(data)))
+
+        lines.append("PLM messages saved by scenes: %d" % total_saved)
+        lines.append("PLM messages that suggested scenes would have saved: "
+                     "%d" % total_possible)
+        return lines
+
+    #-----------------------------------------------------------------------
+    def print_report(self, on_done=None):
+        """Print the savings report to the log UI.
+
+        This is the modem 'scene_report' command.
+
+        Args:
+          on_done:  Finished callback.  Signature is:
+                        on_done(success, msg, data)
+        """
+        for line in self.report():
+            LOG.ui("%s", line)
+
+        if on_done:
+            on_done(True, "Complete", None)
+
+    #-----------------------------------------------------------------------
+    def _key(self, is_on, targets):
+        """Return the set key for a set of commands.
+
+        Args:
+          is_on:    (bool) True for an on command, False for off.
+          targets:  ({Address : int}) Map of device address to the on level.
+
+        Returns:
+          Returns a hashable key for the set.
+        """
+        if not is_on:
+            targets = {k : None for k in targets}
+
+        return (is_on, frozenset((Address(k).id, v)
+                                 for k, v in targets.items()))
+
+    #-----------------------------------------------------------------------
+    def _new_set(self, is_on, targets):
+        """Create a new set usage dictionary.
+
+        Args:
+          is_on:    (bool) True for an on command, False for off.
+          targets:  ({Address : int}) Map of device address to the on level.
+
+        Returns:
+          (dict) Returns the usage data.
+        """
+        levels = set(targets.values())
+        return {
+            "is_on" : is_on,
+            "addrs" : sorted(targets, key=lambda i: i.id),
+            "level" : levels.pop() if is_on and len(levels) == 1 else 0xff,
+            "count" : 0,
+            "scene_count" : 0,
+            "group" : None,
+            "pending" : False,
+            "suggested" : False,
+            "last_time" : None,
+            }
+
+    #-----------------------------------------------------------------------
+    def _label(self, data):
+        """Return a string describing a set.
+
+        Args:
+          data:   (dict) The set usage data.
+
+        Returns:
+          (str) Returns the command and device addresses.
+        """
+        cmd = "on %d" % data["level"] if data["is_on"] else "off"
+        return "%s %s" % (cmd, ",".join(i.hex for i in data["addrs"]))
+
+    #-----------------------------------------------------------------------
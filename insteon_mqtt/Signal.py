@@ -3,6 +3,7 @@
 # Signal/slot pattern signal object for weak coupling.
 #
 #===========================================================================
+import functools
 import inspect
 import weakref
 
@@ -17,17 +18,48 @@ class Signal:
     insure that the signal emitter is passing the same arguments
     expected by the slot.
 
-    Slots are held in weak references so if the object goes out of
-    scope, it the slot will be removed.  Slots can also disconnect
-    themselves in the middle of the signal being emitted.
+    By default slots are held in weak references so if the object goes out
+    of scope, it the slot will be removed.  If strong is True, the signal
+    keeps the slots alive instead which is useful for lambdas and closures
+    and makes emit() cheaper since there are no weak references to check.
 
+    Slots are called in the order they were connected.  emit() uses a
+    snapshot of the slots which is only rebuilt when the slots change so
+    slots can connect or disconnect themselves (or other slots) in the
+    middle of the signal being emitted.  Those changes take effect the
+    next time the signal is emitted.
     """
     #-----------------------------------------------------------------------
-    def __init__(self):
+    def __init__(self, strong=False):
         """Constructor
+
+        Args:
+          strong:   (bool) True to hold strong references to the slots.
+                    False to use weak references.
         """
-        # Weak references to functions or methods
-        self.slots = []
+        self.strong = strong
+
+        # Map of slot key (see _key) -> slot (strong) or weak reference to
+        # the slot.
+        self._slots = {}
+
+        # Tuple of the _slots values used by emit().  None if the slots
+        # have changed and it needs to be rebuilt.
+        self._snapshot = ()
+
+    #-----------------------------------------------------------------------
+    @property
+    def slots(self):
+        """Return the list of connected slots.
+
+        Returns:
+          (list) Returns the slot functions and methods.
+        """
+        if self.strong:
+            return list(self._slots.values())
+
+        slots = [i() for i in self._slots.values()]
+        return [i for i in slots if i is not None]
 
     #-----------------------------------------------------------------------
     def emit(self, *args, **kwargs):
@@ -40,16 +72,21 @@ class Signal:
            args:    List of positional arguments to pass.
            kwargs:  Dictionary of the keyword arguments to pass.
         """
-        # Loop in reverse order over the slots.  That way we can
-        # delete any weak references that no longer exist and support
-        # a slot that calls disconnect on itself in the middle of the
-        # loop.
-        for i in reversed(range(len(self.slots))):
-            slot = self.slots[i]()
+        slots = self._snapshot
+        if slots is None:
+            slots = self._snapshot = tuple(self._slots.values())
+
+        if self.strong:
+            for slot in slots:
+                slot(*args, **kwargs)
+            return
+
+        # Weak references that no longer exist are removed by the weak
+        # reference callback.
+        for ref in slots:
+            slot = ref()
             if slot is not None:
                 slot(*args, **kwargs)
-            else:
-                del self.slots[i]
 
     #-----------------------------------------------------------------------
     def connect(self, slot):
@@ -60,18 +97,22 @@ class Signal:
         Args:
            slot:  Instance method or function to connect.
         """
-        # Create a weak reference to the method or function.
-        if inspect.ismethod(slot):
-            wr_slot = weakref.WeakMethod(slot)
+        key = self._key(slot)
+        if key in self._slots:
+            return
+
+        if self.strong:
+            self._slots[key] = slot
         else:
-            wr_slot = weakref.ref(slot)
+            # Remove the slot when the function or object is deleted.  This
+            # also makes sure the id() in the key isn't reused.
+            remove = functools.partial(self._remove, key)
+            if inspect.ismethod(slot):
+                self._slots[key] = weakref.WeakMethod(slot, remove)
+            else:
+                self._slots[key] = weakref.ref(slot, remove)
 
-        # Only insert the slot if it doesn't already exist.  If the
-        # index method throws, the slot doesn't exist yet. Insert it
-        # at the beginning so that when we call the slots in reverse
-        # order, they will be called in the order inserted.
-        if wr_slot not in self.slots:
-            self.slots.insert(0, wr_slot)
+        self._snapshot = None
 
     #-----------------------------------------------------------------------
     def disconnect(self, slot):
@@ -82,23 +123,50 @@ class Signal:
         Args:
            slot:  Instance method or function to disconnect.
         """
-        # Create a weak reference to the method or function so that we
-        # can use the comparison operator on the weakref to find the slot.
-        if inspect.ismethod(slot):
-            wr_slot = weakref.WeakMethod(slot)
-        else:
-            wr_slot = weakref.ref(slot)
-
-        try:
-            self.slots.remove(wr_slot)
-        except ValueError:
-            pass
+        self._remove(self._key(slot))
 
     #-----------------------------------------------------------------------
     def clear(self):
         """Clear all the attached slots from the signal.
         """
-        self.slots = []
+        self._slots = {}
+        self._snapshot = ()
+
+    #-----------------------------------------------------------------------
+    def _key(self, slot):
+        """Return the slot map key for a slot.
+
+        Bound methods are created each time they are accessed so they're
+        identified by the object and function.  The ids are used so the key
+        doesn't hold a reference to the slot.
+
+        Args:
+           slot:  Instance method or function.
+
+        Returns:
+          Returns the key to use in the slot map.
+        """
+        if inspect.ismethod(slot):
+            return (id(slot.__self__), id(slot.__func__))
+
+        return id(slot)
+
+    #-----------------------------------------------------------------------
+    def _remove(self, key, ref=None):
+        """Remove a slot from the signal.
+
+        Args:
+           key:   The slot map key.
+           ref:   The weak reference that was deleted if this is called as
+                  a weak reference callback.
+        """
+        # A deleted weak reference callback should only remove it's own
+        # reference.
+        if ref is not None and self._slots.get(key, None) is not ref:
+            return
+
+        if self._slots.pop(key, None) is not None:
+            self._snapshot = None
 
     #-----------------------------------------------------------------------
 
@@ -0,0 +1,412 @@
+#===========================================================================
+#
+# Persistent device state cache.
+#
+#===========================================================================
+import enum
+import json
+import os
+from . import clock
+from . import log
+from .Signal import Signal
+
+LOG = log.get_logger()
+
+
+class StateCache:
+    """Persistent cache of the last known device states.
+
+    The state change signals of each device (level, on/off, keypad button
+    LED's, fan speed, IOLinc relay, etc) are recorded along with the time
+    they were received and saved to the storage directory.  The file is
+    written behind the changes - at most every save_interval seconds - so
+    a burst of state changes only causes a single write.
+
+    At start up the cached states are loaded and, once MQTT connects, the
+    state signals are emitted again so the MQTT state topics are
+    published right away instead of waiting for every device to be
+    refreshed.  signal_restored is emitted for each device with the age of
+    the cached state so the consumers know how old it is.  After that,
+    only devices whose cached state is older than the TTL are refreshed.
+
+    Battery devices (the ones with a device.Mailbox) are never refreshed
+    since they're asleep most of the time and won't reply.
+
+    Configuration (the insteon 'state_cache' key):
+      - enable:         (bool) True to use the cache.  Default False.
+      - ttl:            (int) Cached states older than this many seconds
+                        are refreshed from the device.  0 to never refresh.
+                        Default 3600.
+      - save_interval:  (int) Minimum seconds between cache writes.
+                        Default 30.
+    """
+    # Device state signals to record.  Signals with more than one value
+    # (KeypadLinc and Outlet buttons) are recorded by the first value.
+    signals = ["signal_active", "signal_level_changed", "signal_fan_changed",
+               "signal_state_change"]
+
+    #-----------------------------------------------------------------------
+    def __init__(self, modem):
+        """Constructor
+
+        Args:
+          modem:   (Modem) The Insteon modem.
+        """
+        self.modem = modem
+
+        self.enable = False
+        self.ttl = 3600
+        self.save_interval = 30
+        self.save_path = None
+
+        # Map of Address.hex -> { "time" : float, "state" : { KEY : [ARGS] } }
+        # where KEY is the signal name or name/value for signals with more
+        # than one value.
+        self.entries = {}
+
+        # Time of the last save and True if there are unsaved changes.
+        self._save_time = 0
+        self._changed = False
+
+        # Time of the next TTL check or None if it hasn't started yet.
+        self._verify_time = None
+
+        # True while the cached states are being emitted.
+        self._replaying = False
+        self._replayed = False
+
+        # Devices waiting to be refreshed (see verify), True while a
+        # refresh is running, and True while _refresh_next() is looping.
+        self._stale = []
+        self._refreshing = False
+        self._in_refresh = False
+
+        # Emitted for each device when the cached state is emitted.
+        self.signal_restored = Signal()  # emit(device, float age)
+
+    #-----------------------------------------------------------------------
+    def load_config(self, data, save_path):
+        """Load a configuration dictionary.
+
+        Args:
+          data:       (dict) The state_cache configuration data.
+          save_path:  (str) The storage directory or None if there isn't
+                      one.
+        """
+        self.enable = bool(data.get("enable", self.enable))
+        self.ttl = int(data.get("ttl", self.ttl))
+        self.save_interval = int(data.get("save_interval",
+                                          self.save_interval))
+        if not self.enable or not save_path:
+            return
+
+        self.save_path = os.path.join(save_path, "state_cache.json")
+        self.load()
+
+        # Use the protocol poll to handle the delayed writes and TTL checks.
+        self.modem.protocol.signal_poll.connect(self.poll)
+
+    #-----------------------------------------------------------------------
+    def load(self):
+        """Load the cache file.
+        """
+        if not os.path.exists(self.save_path):
+            return
+
+        try:
+            with open(self.save_path) as f:
+                self.entries = json.load(f)
+        except:
+            LOG.exception("Error reading state cache file %s", self.save_path)
+            return
+
+        LOG.info("State cache loaded %d devices", len(self.entries))
+
+    #-----------------------------------------------------------------------
+    def save(self, t=None):
+        """Save the cache if there are unsaved changes.
+
+        Args:
+           t:      (float) The current time.  None to use clock.now().
+        """
+        if not self.save_path or not self._changed:
+            return
+
+        self._save_time = clock.now() if t is None else t
+        self._changed = False
+        try:
+            with open(self.save_path, "w") as f:
+                json.dump(self.entries, f, indent=2)
+        except:
+            LOG.exception("Error writing state cache file %s",
+                          self.save_path)
+
+    #-----------------------------------------------------------------------
+    def watch(self, device):
+        """Record the state changes of a device.
+
+        Args:
+          device:  (device.Base) The device to watch.
+        """
+        for name in self.signals:
+            signal = getattr(device, name, None)
+            if signal is not None:
+                signal.connect(getattr(self, "handle" + name[6:]))
+
+    #-----------------------------------------------------------------------
+    def age(self, device, t=None):
+        """Return the age of the cached state of a device.
+
+        Args:
+          device:  (device.Base) The device to check.
+          t:       (float) The current time.  None to use clock.now().
+
+        Returns:
+          (float) Returns the age in seconds or None if there is no cached
+          state for the device.
+        """
+        entry = self.entries.get(device.addr.hex, None)
+        if entry is None:
+            return None
+
+        t = clock.now() if t is None else t
+        return max(0.0, t - entry["time"])
+
+    #-----------------------------------------------------------------------
+    def replay(self, t=None):
+        """Emit the cached state signals of every device.
+
+        This is only done once, the first time it's called.  The stale
+        devices are then refreshed (see verify()).
+
+        Args:
+           t:      (float) The current time.  None to use clock.now().
+        """
+        if not self.enable or self._replayed:
+            return
+
+        self._replayed = True
+        t = clock.now() if t is None else t
+        LOG.info("Publishing cached state for %d devices", len(self.entries))
+
+        self._replaying = True
+        try:
+            for device in list(self.modem.devices.values()):
+                entry = self.entries.get(device.addr.hex, None)
+                if entry is None:
+                    continue
+
+                for key, args in sorted(entry["state"].items()):
+                    self._emit(device, key.split("/")[0], args)
+
+                self.signal_restored.emit(device, self.age(device, t))
+        finally:
+            self._replaying = False
+
+        self.verify(t)
+
+    #-----------------------------------------------------------------------
+    def verify(self, t=None):
+        """Refresh the devices with a stale or missing cached state.
+
+        The refreshes are sent one at a time so they don't flood the write
+        queue.  Unlike a CommandSeq, a device that doesn't reply doesn't
+        stop the rest of the refreshes.
+
+        Args:
+           t:      (float) The current time.  None to use clock.now().
+        """
+        t = clock.now() if t is None else t
+        if self.ttl > 0:
+            self._verify_time = t + self.ttl
+
+        stale = []
+        for device in self.modem.devices.values():
+            if getattr(device, "mailbox", None) is not None or \
+               not hasattr(device, "refresh"):
+                continue
+
+            age = self.age(device, t)
+            if age is None or (self.ttl > 0 and age >= self.ttl):
+                stale.append(device)
+
+        if not stale:
+            return
+
+        LOG.info("Refreshing %d devices with stale cached state", len(stale))
+        self._stale.extend(i for i in stale if i not in self._stale)
+        self._refresh_next()
+
+    #-----------------------------------------------------------------------
+    def poll(self, t):
+        """Periodic polling function.
+
+        This saves the cache when the save interval has passed and checks
+        for stale devices once the TTL has passed.
+
+        Args:
+           t:   (float) Current Unix clock time tag.
+        """
+        if self._changed and t - self._save_time >= self.save_interval:
+            self.save(t)
+
+        if self._verify_time is not None and t >= self._verify_time:
+            self.verify(t)
+
+    #-----------------------------------------------------------------------
+    def handle_active(self, device, *args):
+        """Device signal_active callback.
+
+        Args:
+          device:  (device.Base) The device that changed.
+          args:    The signal values.
+        """
+        self._record(device, "signal_active", args)
+
+    #-----------------------------------------------------------------------
+    def handle_level_changed(self, device, *args):
+        """Device signal_level_changed callback.
+
+        Args:
+          device:  (device.Base) The device that changed.
+          args:    The signal values.
+        """
+        self._record(device, "signal_level_changed", args)
+
+    #-----------------------------------------------------------------------
+    def handle_fan_changed(self, device, *args):
+        """Device signal_fan_changed callback.
+
+        Args:
+          device:  (device.Base) The device that changed.
+          args:    The signal values.
+        """
+        self._record(device, "signal_fan_changed", args)
+
+    #-----------------------------------------------------------------------
+    def handle_state_change(self, device, *args):
+        """Device signal_state_change callback.
+
+        Args:
+          device:  (device.Base) The device that changed.
+          args:    The signal values.
+        """
+        self._record(device, "signal_state_change", args)
+
+    #-----------------------------------------------------------------------
+    def _record(self, device, name, args):
+        """Record a device state change.
+
+        Args:
+          device:  (device.Base) The device that changed.
+          name:    (str) The signal name.
+          args:    The signal values.
+        """
+        if not self.enable or self._replaying:
+            return
+
+        key = name if len(args) < 2 else "%s/%s" % (name, args[0])
+        entry = self.entries.setdefault(device.addr.hex,
+                                        {"time" : 0, "state" : {}})
+        entry["time"] = clock.now()
+        entry["state"][key] = [self._to_json(i) for i in args]
+        self._changed = True
+
+    #-----------------------------------------------------------------------
+    def _refresh_next(self):
+        """Refresh the queued stale devices one at a time.
+
+        The next refresh is started when the previous one finishes.  A
+        refresh can finish right away (i.e. the device circuit breaker is
+        open) so this loops instead of starting the next refresh from
+        inside the previous callback.  Otherwise a large install would
+        recurse once per device.
+        """
+        if self._in_refresh:
+            return
+
+        self._in_refresh = True
+        try:
+            while self._stale and not self._refreshing:
+                device = self._stale.pop(0)
+                self._refreshing = True
+
+                # Sent in the background so user commands aren't delayed.
+                try:
+                    with self.modem.protocol.background():
+                        device.refresh(on_done=self._refresh_done)
+                except:
+                    LOG.exception("Error refreshing %s", device.label)
+                    self._refreshing = False
+        finally:
+            self._in_refresh = False
+
+    #-----------------------------------------------------------------------
+    def _refresh_done(self, success, msg, data):
+        """Device refresh finished callback.
+
+        Args:
+          success:  (bool) True if the refresh worked.
+          msg:      (str) The result message.
+          data:     Result data (unused).
+        """
+        self._refreshing = False
+        self._refresh_next()
+
+    #-----------------------------------------------------------------------
+    def _emit(self, device, name, args):
+        """Emit a cached signal.
+
+        Args:
+          device:  (device.Base) The device to emit the signal for.
+          name:    (str) The signal name.
+          args:    (list) The cached signal values.
+        """
+        signal = getattr(device, name, None)
+        if signal is None:
+            return
+
+        try:
+            signal.emit(device, *[self._from_json(device, i) for i in args])
+        except:
+            LOG.exception("Error publishing cached state for %s",
+                          device.label)
+
+    #-----------------------------------------------------------------------
+    def _to_json(self, value):
+        """Convert a signal value to JSON.
+
+        Enums are saved by their class name so they can be restored.
+
+        Args:
+          value:  The signal value.
+
+        Returns:
+          Returns the JSON value.
+        """
+        if isinstance(value, enum.Enum):
+            return {"enum" : value.__class__.__name__, "value" : value.value}
+
+        return value
+
+    #-----------------------------------------------------------------------
+    def _from_json(self, device, value):
+        """Convert a JSON value to a signal value.
+
+        Enums are nested in the device class (e.g. FanLinc.Speed) so the
+        class is found using the device.
+
+        Args:
+          device:  (device.Base) The device the value is for.
+          value:   The JSON value.
+
+        Returns:
+          Returns the signal value.
+        """
+        if isinstance(value, dict):
+            enum_cls = getattr(device.__class__, value["enum"])
+            return enum_cls(value["value"])
+
+        return value
+
+    #-----------------------------------------------------------------------
@@ -0,0 +1,244 @@
+#===========================================================================
+#
+# In memory PLM message trace.
+#
+#===========================================================================
+import datetime
+import struct
+from . import clock
+from . import log
+from . import message as Msg
+from . import util
+
+LOG = log.get_logger()
+
+
+class Trace:
+    """Fixed size in memory trace of the PLM traffic.
+
+    Debug logging is too expensive to leave on all the time but when
+    something goes wrong, the history of what happened is needed.  This
+    class records every message frame read from and written to the modem
+    as raw bytes along with write handler state changes in a ring buffer.
+    Recording is just storing a tuple in a list so it can always be on.
+
+    The buffer can be written to a binary file with dump() (see the modem
+    trace_dump command) and turned back into readable text later with
+    decode().
+
+    Binary file format (little endian):
+       MAGIC
+       double:  Offset to add to the record times to get the Unix time.
+                The record times are already Unix times so this is 0.
+       Records:
+          double:  Time of the record (see clock.now).
+          uint8:   Record type (READ, WRITE, HANDLER).
+          uint16:  Number of data bytes.
+          bytes:   The data.  HANDLER data is UTF-8 text.
+
+    Configuration (the insteon 'trace' key):
+      - enable:  (bool) True to record the traffic.  Default True.
+      - size:    (int) Number of records to keep.  Default 2000.
+    """
+    # Record types.
+    READ = 0
+    WRITE = 1
+    HANDLER = 2
+
+    MAGIC = b"IMTRACE1"
+    _header = struct.Struct("<d")
+    _record = struct.Struct("<dBH")
+
+    #-----------------------------------------------------------------------
+    def __init__(self, size=2000):
+        """Constructor
+
+        Args:
+          size:   (int) The number of records to keep.
+        """
+        self.enable = True
+        self.size = size
+
+        # Ring buffer of (time, type, data) records.  _next is the index of
+        # the next record to write.
+        self._records = [None] * size
+        self._next = 0
+
+    #-----------------------------------------------------------------------
+    def load_config(self, data):
+        """Load a configuration dictionary.
+
+        Args:
+          data:   (dict) The trace configuration data.
+        """
+        self.enable = bool(data.get("enable", self.enable))
+
+        size = max(1, int(data.get("size", self.size)))
+        if size != self.size:
+            records = self.records()[-size:]
+            self.size = size
+            self._records = records + [None] * (size - len(records))
+            self._next = len(records) % size
+
+    #-----------------------------------------------------------------------
+    def record(self, kind, data):
+        """Add a record to the trace.
+
+        Args:
+          kind:   (int) The record type: READ, WRITE, or HANDLER.
+          data:   (bytes) The message bytes or (str) handler state.
+        """
+        if not self.enable:
+            return
+
+        self._records[self._next] = (clock.now(), kind, data)
+        self._next = (self._next + 1) % self.size
+
+    #-----------------------------------------------------------------------
+    def records(self):
+        """Return the records in the trace.
+
+        Returns:
+          ([(float, int, data)]) Returns the (time, type, data) records from
+          oldest to newest.
+        """
+        records = self._records[self._next:] + self._records[:self._next]
+        return [i for i in records if i is not None]
+
+    #-----------------------------------------------------------------------
+    def dump(self, path):
+        """Write the trace to a binary file.
+
+        Args:
+          path:   (str) The file to write.
+        """
+        records = self.records()
+
+        with open(path, "wb") as f:
+            f.write(self.header(0.0))
+            for t, kind, data in records:
+                f.write(self.pack(t, kind, data))
+
+        LOG.info("Wrote %d trace records to %s", len(records), path)
+
+    #-----------------------------------------------------------------------
+    @classmethod
+    def header(cls, offset):
+        """Return the binary file header.
+
+        Args:
+          offset:  (float) Offset to add to the record times to get the
+                   Unix time.
+
+        Returns:
+          (bytes) Returns the header bytes.
+        """
+        return cls.MAGIC + cls._header.pack(offset)
+
+    #-----------------------------------------------------------------------
+    @classmethod
+    def pack(cls, t, kind, data):
+        """Return the binary file bytes for a record.
+
+        Args:
+          t:      (float) The record time.
+          kind:   (int) The record type: READ, WRITE, or HANDLER.
+          data:   (bytes) The message bytes or (str) handler state.
+
+        Returns:
+          (bytes) Returns the record bytes.
+        """
+        if isinstance(data, str):
+            data = data.encode()
+
+        return cls._record.pack(t, kind, len(data)) + bytes(data)
+
+    #-----------------------------------------------------------------------
+    @classmethod
+    def read(cls, path):
+        """Read a binary trace file.
+
+        Args:
+          path:   (str) The file to read.
+
+        Returns:
+          ([(float, int, bytes)]) Returns the (time, type, data) records
+          where the time is the Unix time.
+        """
+        with open(path, "rb") as f:
+            raw = f.read()
+
+        if not raw.startswith(cls.MAGIC):
+            raise ValueError("%s is not an Insteon trace file" % path)
+
+        idx = len(cls.MAGIC)
+        offset = cls._header.unpack_from(raw, idx)[0]
+        idx += cls._header.size
+
+        records = []
+        while idx < len(raw):
+            t, kind, size = cls._record.unpack_from(raw, idx)
+            idx += cls._record.size
+            records.append((t + offset, kind, raw[idx:idx + size]))
+            idx += size
+
+        return records
+
+    #-----------------------------------------------------------------------
+    @classmethod
+    def decode(cls, path):
+        """Convert a binary trace file to readable text.
+
+        Args:
+          path:   (str) The file to read.
+
+        Returns:
+          ([str]) Returns one line per record.
+        """
+        lines = []
+        for t, kind, data in cls.read(path):
+            stamp = datetime.datetime.fromtimestamp(t).strftime(
+                "%Y-%m-%d %H:%M:%S.%f")
+
+            if kind == cls.HANDLER:
+                text = "HANDLER %s" % data.decode(errors="replace")
+            elif kind == cls.WRITE:
+                text = "WRITE   %s" % cls._decode_msg(data, True)
+            else:
+                text = "READ    %s" % cls._decode_msg(data, False)
+
+            lines.append("%s %s" % (stamp, text))
+
+        return lines
+
+    #-----------------------------------------------------------------------
+    @classmethod
+    def _decode_msg(cls, data, is_write):
+        """Convert message bytes to a message string.
+
+        Args:
+          data:      (bytes) The message bytes.
+          is_write:  (bool) True if the bytes were written to the modem.
+
+        Returns:
+          (str) Returns the message string or the hex bytes if the message
+          can't be decoded.
+        """
+        raw = bytes(data)
+        try:
+            msg_class = Msg.types[raw[1]]
+
+            # Written messages don't have the ACK byte that the modem adds
+            # when it echoes the message back.
+            if is_write:
+                raw += b"\x00"
+
+            msg = msg_class.from_bytes(raw)
+            if is_write and hasattr(msg, "is_ack"):
+                msg.is_ack = None
+
+            return str(msg)
+        except:
+            return util.to_hex(data)
+
+    #-----------------------------------------------------------------------
@@ -14,17 +14,25 @@ __version__ = "0.6.3"
 
 #===========================================================================
 
+from . import clock
 from . import cmd_line
 from . import db
 from . import device
+from . import latency
 from . import log
 from . import message
 from . import mqtt
 from . import network
+from . import sim
 from . import util
 
 from .Address import Address
+from .Backoff import Backoff
+from .Channel import Channel
 from .CommandSeq import CommandSeq
 from .Modem import Modem
 from .Protocol import Protocol
+from .SceneTracker import SceneTracker
 from .Signal import Signal
+from .StateCache import StateCache
+from .Trace import Trace
@@ -0,0 +1,40 @@
+#===========================================================================
+#
+# Micro-benchmarks
+#
+#===========================================================================
+# flake8: noqa
+
+__doc__ = """Micro-benchmarks for the bridge hot paths.
+
+Each module has a run() function which times a set of operations and
+returns a list of result dictionaries (see util.measure).  These are not
+imported by the main package.
+
+The suite module runs all of them (or a subset) and is used by the
+'insteon-mqtt config.yaml bench' command.  The results are JSON so runs
+can be compared across versions.
+
+The scale module runs the whole bridge against a simulated modem and MQTT
+broker with 50 to 2000 devices and reports the end to end latencies,
+event loop lag, memory, and start up time.  It's used by the
+'insteon-mqtt config.yaml bench-scale' command.
+
+python -m insteon_mqtt.bench.suite
+python -m insteon_mqtt.bench.scale
+python -m insteon_mqtt.bench.signals
+python -m insteon_mqtt.bench.logs
+"""
+
+#===========================================================================
+
+from . import address
+from . import db
+from . import logs
+from . import protocol
+from . import scale
+from . import scenes
+from . import signals
+from . import suite
+from . import templates
+from . import util
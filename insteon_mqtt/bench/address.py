@@ -0,0 +1,37 @@
+#===========================================================================
+#
+# Address benchmarks
+#
+#===========================================================================
+from ..Address import Address
+from . import util
+
+
+def run(number=50000):
+    """Run the Address benchmarks.
+
+    Times constructing an Address from each of the supported inputs.
+
+    Args:
+      number:   (int) Number of calls to time for each benchmark.
+
+    Returns:
+      ([dict]) Returns the list of results (see util.measure).
+    """
+    addr = Address(0xaabbcc)
+    raw = bytes([0x01, 0x02, 0xaa, 0xbb, 0xcc])
+
+    return [
+        util.measure("address.str", lambda: Address("aa.bb.cc"), number),
+        util.measure("address.int", lambda: Address(0xaabbcc), number),
+        util.measure("address.bytes3",
+                     lambda: Address(0xaa, 0xbb, 0xcc), number),
+        util.measure("address.from_bytes",
+                     lambda: Address.from_bytes(raw, 2), number),
+        util.measure("address.copy", lambda: Address(addr), number),
+        ]
+
+
+#===========================================================================
+if __name__ == "__main__":
+    print(util.to_json(run()))
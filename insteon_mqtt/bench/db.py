@@ -0,0 +1,70 @@
+#===========================================================================
+#
+# Device database benchmarks
+#
+#===========================================================================
+import os
+import tempfile
+from .. import db
+from .. import message as Msg
+from ..Address import Address
+from . import util
+
+
+def make_db(path, size):
+    """Create a device database.
+
+    Args:
+      path:   (str) The file to save the database to.
+      size:   (int) Number of entries in the database.
+
+    Returns:
+      (db.Device) Returns the database.
+    """
+    obj = db.Device(Address(0x100000), path)
+    obj.delta = 1
+    obj.engine = 2
+    for i in range(size):
+        flags = Msg.DbFlags(True, i % 2 == 0, True)
+        entry = db.DeviceEntry(Address(0x200000 + i), 1 + i % 8,
+                               0x0fff - 8 * i, flags, [0xff, 0x1f, 0x01])
+        obj.add_entry(entry, save=False)
+
+    return obj
+
+
+#===========================================================================
+def run(number=200):
+    """Run the device database benchmarks.
+
+    Times loading a device database from JSON with from_json() and
+    writing it to a file with save() for databases with 50 and 400
+    entries.
+
+    Args:
+      number:   (int) Number of calls to time for each benchmark.
+
+    Returns:
+      ([dict]) Returns the list of results (see util.measure).
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as save_path:
+        for size in [50, 400]:
+            path = os.path.join(save_path, "%d.json" % size)
+            obj = make_db(path, size)
+            data = obj.to_json()
+
+            results.append(util.measure(
+                "db.from_json.%d" % size,
+                lambda: db.Device.from_json(data, path), number, size=size))
+
+            results.append(util.measure(
+                "db.save.%d" % size, obj.save, max(1, number // 4),
+                size=size))
+
+    return results
+
+
+#===========================================================================
+if __name__ == "__main__":
+    print(util.to_json(run()))
@@ -0,0 +1,112 @@
+#===========================================================================
+#
+# Logging benchmarks
+#
+#===========================================================================
+import contextlib
+import logging
+import tempfile
+from .. import handler
+from .. import log
+from .. import message as Msg
+from ..Address import Address
+from ..Protocol import Protocol
+from . import util
+
+
+class DiscardHandler(logging.Handler):
+    """Logging handler that formats the records and throws them away.
+    """
+    def emit(self, record):
+        self.format(record)
+
+
+#===========================================================================
+class ReadHandler(handler.Base):
+    """Read handler that accepts every message.
+    """
+    def msg_received(self, protocol, msg):
+        return Msg.CONTINUE
+
+
+#===========================================================================
+@contextlib.contextmanager
+def log_level(level):
+    """Context manager to set the library logging level.
+
+    A handler that formats every record is used in place of the normal
+    handlers so the formatting cost is included.  The UI callback handler
+    is left in place and handlers added while this is active (like the UI
+    callback handler) are kept.
+
+    Args:
+      level:   (int) The logging level to use.
+    """
+    obj = log.get_logger()
+    save = (obj.level, obj.propagate)
+    handlers = [i for i in obj.handlers
+                if not isinstance(i, log.CallbackHandler)]
+
+    discard = DiscardHandler()
+    discard.setFormatter(logging.Formatter(
+        '%(asctime)s %(levelname)s %(module)s: %(message)s'))
+    obj.setLevel(level)
+    for h in handlers:
+        obj.removeHandler(h)
+    obj.addHandler(discard)
+    obj.propagate = False
+    try:
+        yield
+    finally:
+        obj.removeHandler(discard)
+        for h in handlers:
+            obj.addHandler(h)
+        obj.setLevel(save[0])
+        obj.propagate = save[1]
+
+
+#===========================================================================
+def run(number=20000):
+    """Run the logging benchmarks.
+
+    Times the per-message CPU cost of reading a message in the Protocol and
+    of a broadcast to a 30 device scene with the logging level at INFO and
+    at WARNING.
+
+    Args:
+      number:   (int) Number of calls to time for each benchmark.
+
+    Returns:
+      ([dict]) Returns the list of results (see util.measure).
+    """
+    # Device ACK from a device to the modem.  Zero hops so it isn't
+    # flagged as a duplicate of the previous message.
+    flags = Msg.Flags(Msg.Flags.Type.DIRECT_ACK, False, 0, 3)
+    read_msg = util.inp_bytes(Address(0x100000), Address(0x445511), flags,
+                              0x11, 0xff)
+
+    link = util.NullLink()
+    protocol = Protocol(link)
+    protocol.add_handler(ReadHandler())
+
+    results = []
+    with tempfile.TemporaryDirectory() as save_path:
+        modem, ctrl, msg = util.make_scene(save_path, 30)
+
+        for name, level in [("info", logging.INFO),
+                            ("warning", logging.WARNING)]:
+            with log_level(level):
+                results.append(util.measure(
+                    "log.read.%s" % name,
+                    lambda: protocol._data_read(link, read_msg), number))
+
+                results.append(util.measure(
+                    "log.broadcast.30.%s" % name,
+                    lambda: ctrl.handle_broadcast(msg), number // 20))
+
+    return results
+
+
+#===========================================================================
+if __name__ == "__main__":
+    print(util.to_json(run()))
@@ -0,0 +1,68 @@
+#===========================================================================
+#
+# Protocol benchmarks
+#
+#===========================================================================
+import logging
+from .. import clock
+from .. import message as Msg
+from ..Address import Address
+from ..Protocol import Protocol
+from . import logs
+from . import util
+
+
+def run(number=2000):
+    """Run the Protocol benchmarks.
+
+    Times parsing a 100 message chunk of modem data with _data_read() and
+    the duplicate message check with 10, 100, and 1000 messages in the
+    read history.
+
+    Args:
+      number:   (int) Number of calls to time for each benchmark.
+
+    Returns:
+      ([dict]) Returns the list of results (see util.measure).
+    """
+    # Device ACK's from 100 devices to the modem.  Zero hops so they
+    # expire right away and aren't flagged as duplicates on the next call.
+    flags = Msg.Flags(Msg.Flags.Type.DIRECT_ACK, False, 0, 3)
+    modem_addr = Address(0x445511)
+    chunk = b"".join(util.inp_bytes(Address(0x100000 + i), modem_addr, flags,
+                                    0x11, 0xff) for i in range(100))
+
+    link = util.NullLink()
+    protocol = Protocol(link)
+    protocol.add_handler(logs.ReadHandler())
+
+    results = []
+    with logs.log_level(logging.WARNING):
+        results.append(util.measure(
+            "protocol.parse.100", lambda: protocol._data_read(link, chunk),
+            max(1, number // 10), size=100))
+
+        # Fill the history with messages that won't expire during the run.
+        # The test message matches the last one so the whole history is
+        # searched each time.
+        for size in [10, 100, 1000]:
+            protocol._read_history = []
+            expire_time = clock.now() + 3600
+            for i in range(size):
+                msg = Msg.InpStandard(Address(0x100000 + i), modem_addr,
+                                      flags, 0x11, 0xff)
+                msg.expire_time = expire_time
+                protocol._read_history.append(msg)
+
+            dupe = Msg.InpStandard(Address(0x100000 + size - 1), modem_addr,
+                                   flags, 0x11, 0xff)
+            results.append(util.measure(
+                "protocol.duplicate.%d" % size,
+                lambda: protocol._is_duplicate(dupe), number))
+
+    return results
+
+
+#===========================================================================
+if __name__ == "__main__":
+    print(util.to_json(run()))
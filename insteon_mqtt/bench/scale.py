@@ -0,0 +1,424 @@
+#===========================================================================
+#
+# End to end scale harness
+#
+#===========================================================================
+import json
+import logging
+import os
+import platform
+import random
+import tempfile
+import time
+from .. import __version__
+from .. import clock
+from .. import message as Msg
+from .. import sim
+from ..Address import Address
+from ..cmd_line import start
+from . import logs
+from . import util
+
+# Fraction of each device type in the synthetic configurations.
+DEVICE_MIX = [
+    ("dimmer", 0.5),
+    ("switch", 0.3),
+    ("keypad_linc", 0.1),
+    ("motion", 0.1),
+    ]
+
+# Interval in seconds between event loop lag probes.
+PROBE_DT = 0.01
+
+
+def make_config(num_devices, storage, seed=1, latency=None):
+    """Create a configuration for a simulated network.
+
+    The devices use the DEVICE_MIX types.  The simulated modem and MQTT
+    broker are used so nothing outside the process is needed.
+
+    Args:
+      num_devices:  (int) Number of devices.
+      storage:      (str) Directory to save the modem and device data to.
+      seed:         (int) Random number seed for the simulated modem.
+      latency:      (float) Device reply time in seconds.  None to use the
+                    simulator default.
+
+    Returns:
+      (dict) Returns the configuration dictionary.
+    """
+    devices = {}
+    index = 0
+    for i, (device_type, fraction) in enumerate(DEVICE_MIX):
+        # The last type gets whatever is left over.
+        if i == len(DEVICE_MIX) - 1:
+            num = num_devices - index
+        else:
+            num = int(round(num_devices * fraction))
+
+        num = max(0, min(num, num_devices - index))
+        devices[device_type] = [Address(0x200000 + index + j).hex
+                                for j in range(num)]
+        index += num
+
+    sim_config = {"seed" : seed}
+    if latency is not None:
+        sim_config["latency"] = latency
+
+    return {
+        "insteon" : {
+            "address" : "44.55.11",
+            "storage" : storage,
+            "startup_refresh" : False,
+            "sim" : sim_config,
+            "devices" : devices,
+            },
+        "mqtt" : {
+            "sim" : True,
+            "broker" : "127.0.0.1",
+            "port" : 1883,
+            "cmd_topic" : "insteon/command",
+            "metrics_interval" : 0,
+            },
+        }
+
+
+#===========================================================================
+def percentiles(values):
+    """Compute the latency statistics.
+
+    Args:
+      values:   ([float]) The latencies in seconds.
+
+    Returns:
+      (dict) Returns the number of values and the 50th and 99th percentile
+      and maximum value in milli-seconds.
+    """
+    if not values:
+        return {"num" : 0, "p50" : None, "p99" : None, "max" : None}
+
+    values = sorted(values)
+
+    def pct(p):
+        idx = min(len(values) - 1, max(0, int(round(p * len(values))) - 1))
+        return round(1e3 * values[idx], 3)
+
+    return {
+        "num" : len(values),
+        "p50" : pct(0.50),
+        "p99" : pct(0.99),
+        "max" : round(1e3 * values[-1], 3),
+        }
+
+
+#===========================================================================
+def rss_mb():
+    """Return the resident memory size of the process.
+
+    Returns:
+      (float) Returns the current resident size in MB.  If that isn't
+      available, the peak resident size is returned.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, IndexError):
+        import resource
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss /
+                     1024, 1)
+
+
+#===========================================================================
+class Recorder:
+    """Command and broadcast latency recorder.
+
+    Each command or broadcast is started with the device address.  The
+    time to the direct ACK from the device (commands only) and to the
+    device state being published to MQTT is recorded.  Only one command
+    or broadcast can be active per device.
+    """
+    def __init__(self, protocol, broker, timer=time.perf_counter):
+        """Constructor
+
+        Args:
+          protocol:  (Protocol) The Insteon protocol.
+          broker:    (sim.Broker) The simulated MQTT broker.
+          timer:     Function that returns the current time in seconds.
+        """
+        self.timer = timer
+
+        # Map of device address hex -> [kind, start time, ACK time].
+        self.pending = {}
+
+        # Latencies in seconds.
+        self.ack = []
+        self.publish = []
+        self.broadcast = []
+        self.num_timeouts = 0
+
+        protocol.signal_received.connect(self._received)
+        broker.signal_publish.connect(self._published)
+
+    #-----------------------------------------------------------------------
+    def start(self, kind, addr):
+        """Start timing a command or broadcast.
+
+        Args:
+          kind:   (str) 'cmd' or 'broadcast'.
+          addr:   (Address) The device address.
+        """
+        self.pending[addr.hex] = [kind, self.timer(), None]
+
+    #-----------------------------------------------------------------------
+    def expire(self, timeout):
+        """Remove commands and broadcasts that haven't finished.
+
+        Args:
+          timeout:   (float) Time in seconds after the start after which
+                     the command or broadcast has failed.
+        """
+        t = self.timer() - timeout
+        for key in [k for k, v in self.pending.items() if v[1] < t]:
+            del self.pending[key]
+            self.num_timeouts += 1
+
+    #-----------------------------------------------------------------------
+    def _received(self, msg):
+        """Message read from the modem callback.
+
+        Args:
+          msg:   Insteon message object that was read.
+        """
+        if (not isinstance(msg, Msg.InpStandard) or
+                msg.flags.type != Msg.Flags.Type.DIRECT_ACK):
+            return
+
+        data = self.pending.get(msg.from_addr.hex, None)
+        if data and data[0] == "cmd" and data[2] is None:
+            data[2] = self.timer()
+            self.ack.append(data[2] - data[1])
+
+    #-----------------------------------------------------------------------
+    def _published(self, broker, msg):
+        """MQTT publish callback.
+
+        Args:
+          broker:   (sim.Broker) The MQTT broker.
+          msg:      (paho.MQTTMessage) The published message.
+        """
+        # State topics are insteon/ADDR/state or insteon/ADDR/state/BUTTON.
+        elems = msg.topic.split("/")
+        if len(elems) < 3 or elems[2] != "state":
+            return
+
+        data = self.pending.pop(elems[1], None)
+        if data is None:
+            return
+
+        dt = self.timer() - data[1]
+        if data[0] == "cmd":
+            self.publish.append(dt)
+        else:
+            self.broadcast.append(dt)
+
+
+#===========================================================================
+def command(broker, device_type, addr, rand):
+    """Send a random command for a device to the bridge.
+
+    Dimmers use the level topic, switches use the set topic, and keypads
+    use the command topic.  Some dimmer commands also use the command
+    topic.
+
+    Args:
+      broker:       (sim.Broker) The MQTT broker.
+      device_type:  (str) The device config type.
+      addr:         (Address) The device address.
+      rand:         (random.Random) The random number generator.
+    """
+    is_on = rand.random() < 0.5
+    on_str = "ON" if is_on else "OFF"
+
+    if device_type == "keypad_linc" or (device_type == "dimmer" and
+                                        rand.random() < 0.2):
+        payload = {"cmd" : "on" if is_on else "off"}
+        broker.inject("insteon/command/%s" % addr.hex, json.dumps(payload))
+
+    elif device_type == "dimmer":
+        payload = {"state" : on_str,
+                   "brightness" : rand.randint(1, 255) if is_on else 0}
+        broker.inject("insteon/%s/level" % addr.hex, json.dumps(payload))
+
+    else:
+        broker.inject("insteon/%s/set" % addr.hex, on_str)
+
+
+#===========================================================================
+def trigger(device, is_on):
+    """Simulate a button press or sensor trip.
+
+    Args:
+      device:   (sim.Device) The simulated device.
+      is_on:    (bool) True for on, False for off.
+    """
+    if isinstance(device, sim.BatterySensor):
+        device.trip(is_on)
+    else:
+        device.press(is_on)
+
+
+#===========================================================================
+def run_size(num_devices, commands=60, rate=2.0, storms=3, storm_size=20,
+             seed=1, latency=None, timeout=10.0, virtual=False):
+    """Run the bridge with a simulated network.
+
+    The full bridge (see cmd_line.start.setup) is started with a
+    simulated modem and MQTT broker.  Commands are sent to random devices
+    through MQTT at a fixed rate and broadcast storms (a set of devices
+    that are all pressed at the same time) are spread out over the
+    commands.
+
+    With virtual, the bridge runs with a clock.SimClock so the schedule
+    runs as fast as possible and the latencies are in simulated time.  The
+    event loop lag isn't measured in that case.
+
+    Args:
+      num_devices:  (int) Number of devices.
+      commands:     (int) Number of commands to send.
+      rate:         (float) Commands per second.
+      storms:       (int) Number of broadcast storms.
+      storm_size:   (int) Number of devices in each storm.
+      seed:         (int) Random number seed.
+      latency:      (float) Device reply time in seconds.  None to use the
+                    simulator default.
+      timeout:      (float) Time in seconds after which a command or
+                    broadcast that hasn't finished has failed.
+      virtual:      (bool) True to use a simulated clock.
+
+    Returns:
+      (dict) Returns the results.  Latencies are in milli-seconds (see
+      percentiles()).
+    """
+    rand = random.Random(seed)
+    timer = clock.now if virtual else time.perf_counter
+    run_clock = clock.SimClock() if virtual else clock.get_clock()
+    select_time_out = 1.0 if virtual else 0.001
+
+    with tempfile.TemporaryDirectory() as storage, \
+         logs.log_level(logging.WARNING), clock.use_clock(run_clock):
+        cfg = make_config(num_devices, storage, seed, latency)
+
+        # Start up ends when the network manager has connected the links.
+        # That's when the bridge has subscribed to the MQTT topics and is
+        # ready to go.
+        t0 = time.perf_counter()
+        loop, mqtt_handler, modem = start.setup(cfg)
+        while loop.unconnected:
+            loop.select(0.001)
+        startup = time.perf_counter() - t0
+
+        broker = mqtt_handler.link
+        plm = modem.protocol.link
+        recorder = Recorder(modem.protocol, broker, timer)
+
+        # Devices that can be commanded as (type, Address).
+        targets = [(k, Address(a)) for k, v in
+                   cfg["insteon"]["devices"].items() if k != "motion"
+                   for a in v]
+
+        # Schedule of (time, action) where action is None for a command or
+        # the list of devices for a storm.
+        wall_time = time.perf_counter()
+        start_time = timer()
+        schedule = [(start_time + i / rate, None) for i in range(commands)]
+        duration = commands / rate
+        devices = list(plm.devices.values())
+        for i in range(storms):
+            size = min(storm_size, len(devices))
+            schedule.append((start_time + duration * (i + 0.5) / storms,
+                             rand.sample(devices, size)))
+        schedule.sort(key=lambda i: i[0])
+        for t, action in schedule:
+            clock.deadline(t)
+
+        lags = []
+        num_commands = num_broadcasts = 0
+        next_probe = start_time + PROBE_DT
+        while schedule or recorder.pending:
+            loop.select(select_time_out)
+
+            t = timer()
+            if not virtual and t >= next_probe:
+                lags.append(t - next_probe)
+                next_probe = max(next_probe + PROBE_DT, t)
+
+            while schedule and schedule[0][0] <= t:
+                action = schedule.pop(0)[1]
+                if action is None:
+                    idle = [i for i in targets
+                            if i[1].hex not in recorder.pending]
+                    if idle:
+                        device_type, addr = rand.choice(idle)
+                        recorder.start("cmd", addr)
+                        command(broker, device_type, addr, rand)
+                        num_commands += 1
+                    continue
+
+                for device in action:
+                    if device.addr.hex not in recorder.pending:
+                        recorder.start("broadcast", device.addr)
+                        trigger(device, rand.random() < 0.5)
+                        num_broadcasts += 1
+
+            recorder.expire(timeout)
+
+        result = {
+            "devices" : num_devices,
+            "startup_sec" : round(startup, 3),
+            "run_sec" : round(time.perf_counter() - wall_time, 3),
+            "virtual" : virtual,
+            "rss_mb" : rss_mb(),
+            "commands" : num_commands,
+            "broadcasts" : num_broadcasts,
+            "timeouts" : recorder.num_timeouts,
+            "ack" : percentiles(recorder.ack),
+            "publish" : percentiles(recorder.publish),
+            "broadcast" : percentiles(recorder.broadcast),
+            "loop_lag" : percentiles(lags),
+            "stages" : modem.protocol.latency.stats()["stages"],
+            "plm_written" : plm.num_written,
+            "plm_dropped" : plm.num_dropped,
+            "mqtt_published" : broker.num_published,
+            }
+
+        loop.close_all()
+
+    return result
+
+
+#===========================================================================
+def run(sizes=(50, 500, 2000), **kwargs):
+    """Run the scale harness.
+
+    Args:
+      sizes:    ([int]) Number of devices for each run.
+      kwargs:   Inputs to pass to run_size().
+
+    Returns:
+      (dict) Returns the version, python version, time, inputs, and the
+      list of run_size() results.
+    """
+    results = [run_size(num, **kwargs) for num in sizes]
+    return {
+        "version" : __version__,
+        "python" : platform.python_version(),
+        "time" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "inputs" : kwargs,
+        "results" : results,
+        }
+
+
+#===========================================================================
+if __name__ == "__main__":
+    print(util.to_json(run()))
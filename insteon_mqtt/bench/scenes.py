@@ -0,0 +1,57 @@
+#===========================================================================
+#
+# Scene broadcast benchmarks
+#
+#===========================================================================
+import logging
+import tempfile
+from .. import handler
+from .. import message as Msg
+from . import logs
+from . import util
+
+
+def run(number=1000):
+    """Run the scene broadcast benchmarks.
+
+    Times the Broadcast handler processing an all link broadcast from a
+    device that controls a 30 dimmer scene (which updates each of the
+    responders) and processing the broadcast followed by the cleanup
+    message.
+
+    Args:
+      number:   (int) Number of calls to time for each benchmark.
+
+    Returns:
+      ([dict]) Returns the list of results (see util.measure).
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as save_path:
+        modem, ctrl, msg = util.make_scene(save_path, 30)
+        protocol = modem.protocol
+        broadcast = handler.Broadcast(modem)
+
+        flags = Msg.Flags(Msg.Flags.Type.ALL_LINK_CLEANUP, False, 3, 3)
+        cleanup = Msg.InpStandard(ctrl.addr, modem.addr, flags, msg.cmd1,
+                                  msg.group)
+
+        def broadcast_cleanup():
+            broadcast.msg_received(protocol, msg)
+            broadcast.msg_received(protocol, cleanup)
+
+        with logs.log_level(logging.WARNING):
+            results.append(util.measure(
+                "scene.broadcast.30",
+                lambda: broadcast.msg_received(protocol, msg), number,
+                size=30))
+
+            results.append(util.measure(
+                "scene.broadcast_cleanup.30", broadcast_cleanup, number,
+                size=30))
+
+    return results
+
+
+#===========================================================================
+if __name__ == "__main__":
+    print(util.to_json(run()))
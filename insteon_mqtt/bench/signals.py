@@ -0,0 +1,112 @@
+#===========================================================================
+#
+# Signal benchmarks
+#
+#===========================================================================
+import inspect
+import weakref
+from ..Signal import Signal
+from . import util
+
+
+class LegacySignal:
+    """The original list based Signal implementation.
+
+    This is only used as a baseline to compare the Signal class against.
+    """
+    def __init__(self):
+        self.slots = []
+
+    def emit(self, *args, **kwargs):
+        for i in reversed(range(len(self.slots))):
+            slot = self.slots[i]()
+            if slot is not None:
+                slot(*args, **kwargs)
+            else:
+                del self.slots[i]
+
+    def connect(self, slot):
+        if inspect.ismethod(slot):
+            wr_slot = weakref.WeakMethod(slot)
+        else:
+            wr_slot = weakref.ref(slot)
+
+        if wr_slot not in self.slots:
+            self.slots.insert(0, wr_slot)
+
+    def disconnect(self, slot):
+        if inspect.ismethod(slot):
+            wr_slot = weakref.WeakMethod(slot)
+        else:
+            wr_slot = weakref.ref(slot)
+
+        try:
+            self.slots.remove(wr_slot)
+        except ValueError:
+            pass
+
+
+#===========================================================================
+class Receiver:
+    """Object with a slot method to connect to the signals.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def slot(self, msg):
+        self.count += 1
+
+
+#===========================================================================
+def run(number=100000):
+    """Run the Signal benchmarks.
+
+    Times emit() with 1 and 5 connected slots and connect/disconnect with
+    100 connected slots for the LegacySignal, Signal, and strong reference
+    Signal classes.
+
+    Args:
+      number:   (int) Number of calls to time for each benchmark.
+
+    Returns:
+      ([dict]) Returns the list of results (see util.measure).
+    """
+    classes = [
+        ("legacy", LegacySignal),
+        ("weak", Signal),
+        ("strong", lambda: Signal(strong=True)),
+        ]
+
+    results = []
+    for num_slots in [1, 5]:
+        for name, cls in classes:
+            receivers = [Receiver() for i in range(num_slots)]
+            signal = cls()
+            for obj in receivers:
+                signal.connect(obj.slot)
+
+            results.append(util.measure(
+                "signal.emit.%d.%s" % (num_slots, name),
+                lambda: signal.emit("msg"), number))
+
+    for name, cls in classes:
+        receivers = [Receiver() for i in range(100)]
+        signal = cls()
+        for obj in receivers:
+            signal.connect(obj.slot)
+
+        extra = Receiver()
+
+        def connect():
+            signal.connect(extra.slot)
+            signal.disconnect(extra.slot)
+
+        results.append(util.measure("signal.connect.100.%s" % name,
+                                    connect, number // 10))
+
+    return results
+
+
+#===========================================================================
+if __name__ == "__main__":
+    print(util.to_json(run()))
@@ -0,0 +1,67 @@
+#===========================================================================
+#
+# Benchmark suite
+#
+#===========================================================================
+import inspect
+import platform
+import time
+from .. import __version__
+from . import address
+from . import db
+from . import logs
+from . import protocol
+from . import scenes
+from . import signals
+from . import templates
+from . import util
+
+# Map of benchmark name -> module.  Each module has a run(number) function.
+MODULES = {
+    "protocol" : protocol,
+    "scenes" : scenes,
+    "templates" : templates,
+    "db" : db,
+    "signals" : signals,
+    "address" : address,
+    "logs" : logs,
+    }
+
+
+def run(names=None, scale=1.0):
+    """Run the benchmarks.
+
+    Args:
+      names:   ([str]) The MODULES names of the benchmarks to run.  None to
+               run all of them.
+      scale:   (float) Scale factor for the number of calls of each
+               benchmark.  Use a small value for a quick check.
+
+    Returns:
+      (dict) Returns the version, python version, time, and the list of
+      results (see util.measure).
+    """
+    names = names or list(MODULES.keys())
+    for name in names:
+        if name not in MODULES:
+            raise ValueError("Unknown benchmark '%s'.  Valid names: %s" %
+                             (name, ", ".join(MODULES.keys())))
+
+    results = []
+    for name in names:
+        func = MODULES[name].run
+        number = inspect.signature(func).parameters["number"].default
+        results.extend(func(max(1, int(number * scale))))
+
+    return {
+        "version" : __version__,
+        "python" : platform.python_version(),
+        "time" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scale" : scale,
+        "results" : results,
+        }
+
+
+#===========================================================================
+if __name__ == "__main__":
+    print(util.to_json(run()))
@@ -0,0 +1,57 @@
+#===========================================================================
+#
+# MQTT template benchmarks
+#
+#===========================================================================
+from ..mqtt import MsgTemplate
+from . import util
+
+
+def run(number=5000):
+    """Run the MQTT template benchmarks.
+
+    Times rendering the default dimmer state topic and payload and
+    converting a dimmer level command payload to JSON with to_json().
+
+    Args:
+      number:   (int) Number of calls to time for each benchmark.
+
+    Returns:
+      ([dict]) Returns the list of results (see util.measure).
+    """
+    # These match the mqtt.Dimmer default templates.
+    state = MsgTemplate(
+        topic='insteon/{{address}}/state',
+        payload='{ "state" : "{{on_str.upper()}}", '
+                '"brightness" : {{level_255}} }',
+        )
+    level = MsgTemplate(
+        topic='insteon/{{address}}/level',
+        payload='{ "cmd" : "{{json.state.lower()}}", '
+                '"level" : {{json.brightness}} }',
+        )
+
+    data = {
+        "address" : "aa.bb.cc",
+        "name" : "aa.bb.cc",
+        "on" : 1,
+        "on_str" : "on",
+        "level_255" : 128,
+        "level_100" : 50,
+        }
+    payload = b'{ "state" : "ON", "brightness" : 128 }'
+
+    def render():
+        state.render_topic(data)
+        state.render_payload(data)
+
+    return [
+        util.measure("template.render", render, number),
+        util.measure("template.to_json", lambda: level.to_json(payload),
+                     number),
+        ]
+
+
+#===========================================================================
+if __name__ == "__main__":
+    print(util.to_json(run()))
@@ -0,0 +1,141 @@
+#===========================================================================
+#
+# Benchmark utilities
+#
+#===========================================================================
+import json
+import time
+from ..Address import Address
+from ..Modem import Modem
+from ..Protocol import Protocol
+from ..Signal import Signal
+from .. import db
+from .. import device as IM_device
+from .. import message as Msg
+
+
+def measure(name, func, number, repeat=3, size=1):
+    """Time a function.
+
+    The function is called number times in a loop and the best of repeat
+    loops is used to limit the effect of other activity on the machine.
+
+    Args:
+      name:     (str) The name of the benchmark.
+      func:     Function to time.  This is called with no arguments.
+      number:   (int) Number of calls per loop.
+      repeat:   (int) Number of loops to run.
+      size:     (int) Number of items (messages, records, etc) processed
+                by each call.  Used to compute the throughput.
+
+    Returns:
+      (dict) Returns the name, number of calls, the best time per call
+      in micro-seconds, and the number of items per second.
+    """
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for j in range(number):
+            func()
+
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return {
+        "name" : name,
+        "number" : number,
+        "usec" : round(1e6 * best / number, 4),
+        "per_sec" : round(size * number / best, 1) if best else None,
+        }
+
+
+#===========================================================================
+def to_json(results):
+    """Convert a list of benchmark results to JSON.
+
+    Args:
+      results:   ([dict]) The results from measure().
+
+    Returns:
+      (str) Returns the JSON string.
+    """
+    return json.dumps(results, indent=2)
+
+
+#===========================================================================
+class NullLink:
+    """Network link stand in that discards everything that is written.
+
+    Use signal_read.emit(link, data) to pass data to the Protocol.
+    """
+    def __init__(self):
+        self.signal_read = Signal()
+        self.signal_wrote = Signal()
+        self.poll = None
+
+    def load_config(self, config):
+        pass
+
+    def write(self, data, after_time=None):
+        pass
+
+    def close(self):
+        pass
+
+
+#===========================================================================
+def inp_bytes(from_addr, to_addr, flags, cmd1, cmd2):
+    """Return the modem bytes for a standard message read from the modem.
+
+    Args:
+      from_addr:  (Address) The sending device.
+      to_addr:    (Address) The destination or group address.
+      flags:      (Msg.Flags) The message flags.
+      cmd1:       (int) The command 1 byte.
+      cmd2:       (int) The command 2 byte.
+
+    Returns:
+      (bytes) Returns the message bytes.
+    """
+    return Msg.InpStandard(from_addr, to_addr, flags, cmd1, cmd2).to_bytes()
+
+
+#===========================================================================
+def make_scene(save_path, num_responders=30, group=1):
+    """Create a modem with a device that controls a scene of dimmers.
+
+    Args:
+      save_path:       (str) Directory to save device data to.
+      num_responders:  (int) Number of dimmers in the scene.
+      group:           (int) The scene group on the controller.
+
+    Returns:
+      Returns a tuple of (Modem, controller Dimmer, broadcast InpStandard).
+    """
+    protocol = Protocol(NullLink())
+    modem = Modem(protocol)
+    modem.addr = Address(0x445511)
+    modem.save_path = save_path
+
+    ctrl_flags = Msg.DbFlags(True, True, True)
+    resp_flags = Msg.DbFlags(True, False, True)
+    ctrl = IM_device.Dimmer(protocol, modem, Address(0x100000), "ctrl")
+    modem.add(ctrl)
+
+    for i in range(num_responders):
+        addr = Address(0x200000 + i)
+        dimmer = IM_device.Dimmer(protocol, modem, addr)
+        dimmer.db.add_entry(db.DeviceEntry(ctrl.addr, group, 0xfff, resp_flags,
+                                           [255, 0, 0]))
+        modem.add(dimmer)
+
+        ctrl.db.add_entry(db.DeviceEntry(addr, group, 0xfff - 8 * i,
+                                         ctrl_flags, [3, 0, group]))
+
+    flags = Msg.Flags(Msg.Flags.Type.ALL_LINK_BROADCAST, False, 3, 3)
+    msg = Msg.InpStandard(ctrl.addr, Address(0, 0, group), flags, 0x11, 0x00)
+    return modem, ctrl, msg
+
+
+#===========================================================================
@@ -0,0 +1,251 @@
+#===========================================================================
+#
+# Injectable clock
+#
+#===========================================================================
+import contextlib
+import heapq
+import time
+
+__doc__ = """Injectable clock.
+
+All of the time outs, pacing, and expiration times in the bridge use
+now() from this module instead of time.time().  By default that's the
+system clock but any Clock can be made active with set_clock() or
+use_clock().
+
+SimClock is a virtual clock that only moves when advance() is called.
+Objects that schedule something for a future time call deadline() with
+that time and the network manager advances the clock to the next deadline
+each time through the loop instead of waiting for it.  This allows hours
+of simulated traffic (see sim.Plm) to run in seconds in tests and
+benchmarks and makes the time outs and pacing reproducible.
+
+    with clock.use_clock(clock.SimClock()):
+        while loop.active():
+            loop.select()
+"""
+
+
+class Clock:
+    """System clock.
+
+    This is the default clock and it uses the system time.  Derived
+    classes can override the methods to change the time used by the
+    bridge.
+    """
+    #-----------------------------------------------------------------------
+    def time(self):
+        """Return the current time.
+
+        Returns:
+          (float) Returns the current Unix time in seconds.
+        """
+        return time.time()
+
+    #-----------------------------------------------------------------------
+    def deadline(self, t):
+        """Note a time that something is scheduled to happen.
+
+        The system clock ignores this.
+
+        Args:
+          t:   (float) The Unix time of the scheduled event.
+        """
+        pass
+
+    #-----------------------------------------------------------------------
+    def poll_time_out(self, time_out):
+        """Return the time to block waiting for network events.
+
+        Args:
+          time_out:   (float) The network manager time out in seconds.
+
+        Returns:
+          (float) Returns the time out in seconds to pass to the network
+          poll call.
+        """
+        return time_out
+
+    #-----------------------------------------------------------------------
+    def advance(self, time_out):
+        """Move the clock after the network manager has processed events.
+
+        The system clock moves by itself so this does nothing.
+
+        Args:
+          time_out:   (float) The network manager time out in seconds.
+        """
+        pass
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+class SimClock(Clock):
+    """Virtual clock.
+
+    The time only changes when advance() or move_to() is called.  The
+    network manager never blocks waiting for events and calls advance()
+    each time through the loop which jumps the clock to the next deadline
+    (or the manager time out if there isn't one).
+    """
+    #-----------------------------------------------------------------------
+    def __init__(self, start=None):
+        """Constructor
+
+        Args:
+          start:   (float) The initial Unix time.  None to use the system
+                   time.
+        """
+        self.now = time.time() if start is None else start
+
+        # Heap of scheduled event times.
+        self._deadlines = []
+
+    #-----------------------------------------------------------------------
+    def time(self):
+        """Return the current time.
+
+        Returns:
+          (float) Returns the current virtual time in seconds.
+        """
+        return self.now
+
+    #-----------------------------------------------------------------------
+    def deadline(self, t):
+        """Note a time that something is scheduled to happen.
+
+        Args:
+          t:   (float) The Unix time of the scheduled event.
+        """
+        heapq.heappush(self._deadlines, t)
+
+    #-----------------------------------------------------------------------
+    def poll_time_out(self, time_out):
+        """Return the time to block waiting for network events.
+
+        Args:
+          time_out:   (float) The network manager time out in seconds.
+
+        Returns:
+          (float) Returns 0 so the network poll never blocks.
+        """
+        return 0
+
+    #-----------------------------------------------------------------------
+    def advance(self, time_out):
+        """Jump to the next deadline.
+
+        If any deadlines are due now, the clock doesn't move so they can be
+        processed on the next pass through the loop.  Otherwise the clock
+        moves to the next deadline or by the time out if that's sooner.
+
+        Args:
+          time_out:   (float) The maximum time in seconds to move the clock.
+
+        Returns:
+          (float) Returns the new time.
+        """
+        if self._deadlines and self._deadlines[0] <= self.now:
+            while self._deadlines and self._deadlines[0] <= self.now:
+                heapq.heappop(self._deadlines)
+            return self.now
+
+        t = self.now + time_out
+        if self._deadlines:
+            t = min(t, self._deadlines[0])
+
+        self.now = t
+        return t
+
+    #-----------------------------------------------------------------------
+    def move_to(self, t):
+        """Set the time.
+
+        Deadlines before the time are dropped.  The clock never moves
+        backwards.
+
+        Args:
+          t:   (float) The Unix time to move to.
+        """
+        self.now = max(self.now, t)
+        while self._deadlines and self._deadlines[0] < self.now:
+            heapq.heappop(self._deadlines)
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+# The active clock.
+_clock = Clock()
+
+
+def get_clock():
+    """Return the active clock.
+
+    Returns:
+      (Clock) Returns the active clock.
+    """
+    return _clock
+
+
+#===========================================================================
+def set_clock(obj):
+    """Make a clock active.
+
+    Args:
+      obj:   (Clock) The clock to use.  None to use the system clock.
+
+    Returns:
+      (Clock) Returns the previously active clock.
+    """
+    # pylint: disable=global-statement
+    global _clock
+
+    prev = _clock
+    _clock = obj if obj is not None else Clock()
+    return prev
+
+
+#===========================================================================
+@contextlib.contextmanager
+def use_clock(obj):
+    """Context manager to make a clock active.
+
+    The previously active clock is restored on exit.
+
+        with clock.use_clock(clock.SimClock()):
+            ...
+
+    Args:
+      obj:   (Clock) The clock to use.
+    """
+    prev = set_clock(obj)
+    try:
+        yield obj
+    finally:
+        set_clock(prev)
+
+
+#===========================================================================
+def now():
+    """Return the current time from the active clock.
+
+    Returns:
+      (float) Returns the current Unix time in seconds.
+    """
+    return _clock.time()
+
+
+#===========================================================================
+def deadline(t):
+    """Note a time that something is scheduled to happen.
+
+    Args:
+      t:   (float) The Unix time of the scheduled event.
+    """
+    _clock.deadline(t)
+
+
+#===========================================================================
@@ -12,6 +12,7 @@ or send a variety of commands to a running server process.
 """
 
 #===========================================================================
+from . import batch
 from . import device
 from . import modem
 from . import util
@@ -0,0 +1,194 @@
+#===========================================================================
+#
+# Batch and interactive shell commands
+#
+#===========================================================================
+import shlex
+import sys
+from . import util
+
+# Commands that can't be run from a batch file or the shell.
+NOT_ALLOWED = ["start", "batch", "shell"]
+
+
+#===========================================================================
+def batch(args, config):
+    """Run a file of commands using a single broker connection.
+
+    Each line in the file is a normal command line (without the config
+    file), for example 'on lamp1 --level 128'.  Blank lines and lines
+    starting with '#' are ignored.  Up to args.max_in_flight commands are
+    sent before waiting for replies and a summary table is printed at the
+    end.
+
+    Args:
+      args:    The command line arguments.
+      config:  The configuration dictionary.
+
+    Returns:
+      Returns 0 if all the commands worked or -1 if any failed.
+    """
+    if args.file == "-":
+        lines = sys.stdin.readlines()
+    else:
+        with open(args.file, "r") as f:
+            lines = f.readlines()
+
+    client = util.Client(config, args.max_in_flight)
+    util.Client.active = client
+    try:
+        results = []
+        for num, line in enumerate(lines, 1):
+            result = run_line(args, config, client, num, line)
+            if result:
+                results.append(result)
+
+        client.wait()
+    finally:
+        util.Client.active = None
+        client.close()
+
+    return print_summary(results)
+
+
+#===========================================================================
+def shell(args, config):
+    """Interactive command shell.
+
+    This reads commands from the terminal and runs them using a single
+    broker connection.  Each command is finished before the next prompt is
+    shown.  Use 'exit', 'quit', or EOF (ctrl-d) to finish.
+
+    Args:
+      args:    The command line arguments.
+      config:  The configuration dictionary.
+
+    Returns:
+      Returns 0 if all the commands worked or -1 if any failed.
+    """
+    try:
+        # Optional - adds history and line editing to input().
+        import readline  # noqa: F401 pylint: disable=unused-import
+    except ImportError:
+        pass
+
+    client = util.Client(config, max_in_flight=1)
+    util.Client.active = client
+    try:
+        results = []
+        num = 0
+        while True:
+            try:
+                line = input("insteon-mqtt> ")
+            except (EOFError, KeyboardInterrupt):
+                print()
+                break
+
+            if line.strip().lower() in ["exit", "quit"]:
+                break
+
+            num += 1
+            result = run_line(args, config, client, num, line)
+            if result:
+                results.append(result)
+                client.wait()
+    finally:
+        util.Client.active = None
+        client.close()
+
+    return print_summary(results)
+
+
+#===========================================================================
+def run_line(args, config, client, num, line):
+    """Parse and send a single command line.
+
+    Args:
+      args:    The batch command line arguments.
+      config:  The configuration dictionary.
+      client:  (util.Client) The client being used to send commands.
+      num:     (int) The line number.
+      line:    (str) The command line to run.
+
+    Returns:
+      Returns a result dict with the line number, line, and session.  The
+      session is None if the line couldn't be parsed.  Returns None if the
+      line was blank or a comment.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+
+    result = {
+        "num" : num,
+        "line" : line,
+        "session" : None,
+        }
+
+    try:
+        words = shlex.split(line)
+        if words[0] in NOT_ALLOWED:
+            raise ValueError("Command '%s' can't be used here" % words[0])
+
+        # argparse exits on errors - catch that so one bad line doesn't
+        # stop everything.
+        cmd_args = args.parse_args([args.config] + words)
+    except (ValueError, SystemExit) as e:
+        if isinstance(e, ValueError):
+            print("ERROR: line %d: %s" % (num, e))
+        return result
+
+    cmd_args.topic = getattr(args, "topic", None)
+    if args.quiet and hasattr(cmd_args, "quiet"):
+        cmd_args.quiet = True
+
+    num_sent = len(client.sent)
+    cmd_args.func(cmd_args, config)
+    if len(client.sent) > num_sent:
+        result["session"] = client.sent[-1]
+
+    return result
+
+
+#===========================================================================
+def print_summary(results):
+    """Print a summary table of the commands that were run.
+
+    Args:
+      results:  (list) List of result dicts from run_line().
+
+    Returns:
+      Returns 0 if all the commands worked or -1 if any failed.
+    """
+    status = 0
+    counts = {}
+
+    print("%5s  %-7s  %7s  %s" % ("Line", "Status", "Time", "Command"))
+    for r in results:
+        session = r["session"]
+        if session is None:
+            state = "INVALID"
+            dt = "-"
+        else:
+            if session["timed_out"]:
+                state = "TIMEOUT"
+            elif session["status"] == 0:
+                state = "OK"
+            else:
+                state = "ERROR"
+
+            end = session.get("finish_time", session["start_time"])
+            dt = "%.2fs" % (end - session["start_time"])
+
+        if state != "OK":
+            status = -1
+
+        counts[state] = counts.get(state, 0) + 1
+        print("%5d  %-7s  %7s  %s" % (r["num"], state, dt, r["line"]))
+
+    print("Total: %d  %s" % (len(results), "  ".join(
+        "%s: %d" % (k, v) for k, v in sorted(counts.items()))))
+    return status
+
+
+#===========================================================================
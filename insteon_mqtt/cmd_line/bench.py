@@ -0,0 +1,50 @@
+#===========================================================================
+#
+# Benchmark command
+#
+#===========================================================================
+from .. import bench
+
+# Valid benchmark names.
+NAMES = list(bench.suite.MODULES.keys())
+
+
+#===========================================================================
+def run(args, config):
+    try:
+        results = bench.suite.run(args.names, args.scale)
+    except ValueError as e:
+        print(e)
+        return 1
+
+    return write(results, args.output)
+
+
+#===========================================================================
+def scale(args, config):
+    results = bench.scale.run(args.devices, commands=args.commands,
+                              rate=args.rate, storms=args.storms,
+                              storm_size=args.storm_size, seed=args.seed,
+                              latency=args.latency, virtual=args.virtual)
+    return write(results, args.output)
+
+
+#===========================================================================
+def write(results, output):
+    text = bench.util.to_json(results)
+
+    if not output:
+        print(text)
+        return 0
+
+    try:
+        with open(output, "w") as f:
+            f.write(text)
+    except OSError as e:
+        print("Error writing benchmark file: %s" % e)
+        return 1
+
+    return 0
+
+
+#===========================================================================
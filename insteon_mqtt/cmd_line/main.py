@@ -6,9 +6,12 @@
 import argparse
 import sys
 from .. import config
+from . import batch
+from . import bench
 from . import device
 from . import modem
 from . import start
+from . import trace
 
 
 def parse_args(args):
@@ -43,6 +46,85 @@ def parse_args(args):
                     help="Don't print any command results to the screen.")
     sp.set_defaults(func=modem.refresh_all)
 
+    #---------------------------------------
+    # modem.create_scenes command
+    sp = sub.add_parser("create-scenes", help="Create the suggested virtual "
+                        "modem scenes for frequently used device sets.")
+    sp.add_argument("-q", "--quiet", action="store_true",
+                    help="Don't print any command results to the screen.")
+    sp.set_defaults(func=modem.create_scenes)
+
+    #---------------------------------------
+    # modem.scene_report command
+    sp = sub.add_parser("scene-report", help="Print the virtual modem scene "
+                        "usage and PLM traffic savings report.")
+    sp.set_defaults(func=modem.scene_report)
+
+    #---------------------------------------
+    # modem.channel_stats command
+    sp = sub.add_parser("channel-stats", help="Print the Insteon channel "
+                        "message, collision, and retry statistics.")
+    sp.set_defaults(func=modem.channel_stats)
+
+    #---------------------------------------
+    # modem.trace_dump command
+    sp = sub.add_parser("trace-dump", help="Write the in memory modem "
+                        "message trace to a file on the server.")
+    sp.add_argument("-p", "--path", help="File name to write in the "
+                    "storage directory.  Default is a time stamped name.")
+    sp.add_argument("-q", "--quiet", action="store_true",
+                    help="Don't print any command results to the screen.")
+    sp.set_defaults(func=modem.trace_dump)
+
+    #---------------------------------------
+    # trace.decode command
+    sp = sub.add_parser("trace-decode", help="Print a modem message trace "
+                        "file written by trace-dump.")
+    sp.add_argument("file", help="Trace file to decode.")
+    sp.set_defaults(func=trace.decode)
+
+    #---------------------------------------
+    # bench.run command
+    sp = sub.add_parser("bench", help="Run the performance benchmarks and "
+                        "print the results as JSON.")
+    sp.add_argument("-s", "--scale", type=float, default=1.0,
+                    help="Scale factor for the number of calls in each "
+                    "benchmark.  Use < 1 for a quick run.")
+    sp.add_argument("-o", "--output", help="File to write the results to.  "
+                    "Default is to print them.")
+    sp.add_argument("names", nargs="*", metavar="name",
+                    help="Benchmarks to run.  Default is all of them: %s" %
+                    ", ".join(bench.NAMES))
+    sp.set_defaults(func=bench.run)
+
+    #---------------------------------------
+    # bench.scale command
+    sp = sub.add_parser("bench-scale", help="Run the bridge against a "
+                        "simulated modem and MQTT broker with synthetic "
+                        "networks and print the latency, event loop lag, "
+                        "memory, and start up time as JSON.")
+    sp.add_argument("-d", "--devices", type=int, nargs="+",
+                    default=[50, 500, 2000], help="Number of devices for "
+                    "each run.")
+    sp.add_argument("-c", "--commands", type=int, default=60,
+                    help="Number of MQTT commands to send in each run.")
+    sp.add_argument("-r", "--rate", type=float, default=2.0,
+                    help="MQTT commands per second.")
+    sp.add_argument("--storms", type=int, default=3,
+                    help="Number of broadcast storms in each run.")
+    sp.add_argument("--storm-size", type=int, default=20,
+                    help="Number of devices triggered in each storm.")
+    sp.add_argument("--seed", type=int, default=1,
+                    help="Random number seed.")
+    sp.add_argument("--latency", type=float, help="Device reply time in "
+                    "seconds.  Default is the simulator default.")
+    sp.add_argument("--virtual", action="store_true", help="Use a simulated "
+                    "clock so the run isn't limited by real time.  "
+                    "Latencies are in simulated time.")
+    sp.add_argument("-o", "--output", help="File to write the results to.  "
+                    "Default is to print them.")
+    sp.set_defaults(func=bench.scale)
+
     #---------------------------------------
     # device.linking command
     sp = sub.add_parser("linking", help="Turn on device or modem linking.  "
@@ -166,17 +248,6 @@ def parse_args(args):
     sp.add_argument("address", help="Device address or name.")
     sp.set_defaults(func=device.pair)
 
-    #---------------------------------------
-    # device.pair command
-    sp = sub.add_parser("refresh", help="Refresh device/modem state and "
-                        "all link database.")
-    sp.add_argument("-f", "--force", action="store_true",
-                    help="Force the device database to be downloaded.")
-    sp.add_argument("-q", "--quiet", action="store_true",
-                    help="Don't print any command results to the screen.")
-    sp.add_argument("address", help="Device address or name.")
-    sp.set_defaults(func=device.refresh)
-
     #---------------------------------------
     # device.db_add add ctrl/rspdr command
     sp = sub.add_parser("db-add", help="Add the device/modem as the "
@@ -255,6 +326,28 @@ def parse_args(args):
     sp.add_argument("address", help="Device address or name.")
     sp.set_defaults(func=device.print_db)
 
+    #---------------------------------------
+    # batch command
+    sp = sub.add_parser("batch", help="Run a file of commands using a "
+                        "single broker connection.  Each line is a command "
+                        "line without the config file (e.g. 'on lamp1').")
+    sp.add_argument("-n", "--max-in-flight", type=int, default=4,
+                    help="Maximum number of commands to wait for replies "
+                    "for at the same time.")
+    sp.add_argument("-q", "--quiet", action="store_true",
+                    help="Don't print any command results to the screen.")
+    sp.add_argument("file", nargs="?", default="-", help="File of commands "
+                    "to run.  Use '-' or leave blank to read from stdin.")
+    sp.set_defaults(func=batch.batch, parse_args=parse_args)
+
+    #---------------------------------------
+    # shell command
+    sp = sub.add_parser("shell", help="Interactive command shell using a "
+                        "single broker connection.")
+    sp.add_argument("-q", "--quiet", action="store_true",
+                    help="Don't print any command results to the screen.")
+    sp.set_defaults(func=batch.shell, parse_args=parse_args)
+
     return p.parse_args(args)
 
 
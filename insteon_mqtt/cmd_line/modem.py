@@ -18,4 +18,50 @@ def refresh_all(args, config):
     return reply["status"]
 
 
+#===========================================================================
+def create_scenes(args, config):
+    topic = "%s/modem" % (args.topic)
+    payload = {
+        "cmd" : "create_scenes",
+        }
+
+    reply = util.send(config, topic, payload, args.quiet)
+    return reply["status"]
+
+
+#===========================================================================
+def scene_report(args, config):
+    topic = "%s/modem" % (args.topic)
+    payload = {
+        "cmd" : "scene_report",
+        }
+
+    reply = util.send(config, topic, payload)
+    return reply["status"]
+
+
+#===========================================================================
+def channel_stats(args, config):
+    topic = "%s/modem" % (args.topic)
+    payload = {
+        "cmd" : "channel_stats",
+        }
+
+    reply = util.send(config, topic, payload)
+    return reply["status"]
+
+
+#===========================================================================
+def trace_dump(args, config):
+    topic = "%s/modem" % (args.topic)
+    payload = {
+        "cmd" : "trace_dump",
+        }
+    if args.path:
+        payload["path"] = args.path
+
+    reply = util.send(config, topic, payload, args.quiet)
+    return reply["status"]
+
+
 #===========================================================================
@@ -7,6 +7,7 @@ from .. import config
 from .. import log
 from .. import mqtt
 from .. import network
+from .. import sim
 from ..Modem import Modem
 from ..Protocol import Protocol
 
@@ -29,10 +30,47 @@ def start(args, cfg):
     # config file logging data is used.
     log.initialize(args.level, args.log_screen, args.log, config=cfg)
 
+    # Create the network event loop, links, modem, and MQTT handler.
+    loop, mqtt_handler, modem = setup(cfg)
+
+    # Start the network event loop.  Save the device link statistics and
+    # cached states on the way out so they are available at the next start.
+    try:
+        while loop.active():
+            loop.select()
+    finally:
+        modem.save_history()
+
+
+#===========================================================================
+def setup(cfg):
+    """Create the network event loop, links, modem, and MQTT handler.
+
+    If a replay file or the PLM simulator is configured, it's used instead
+    of the modem.  If the MQTT simulator is configured, an in process
+    broker stand in is used instead of the MQTT broker.
+
+    Args:
+      cfg:   The configuration dictionary.
+
+    Returns:
+      Returns a tuple of (network.Manager, mqtt.Mqtt, Modem).  The links
+      are added to the manager but won't be connected until the manager
+      runs.
+    """
     # Create the network event loop and MQTT and serial modem clients.
     loop = network.Manager()
-    mqtt_link = network.Mqtt()
-    plm_link = network.Serial()
+    if cfg['mqtt'].get('sim', None):
+        mqtt_link = sim.Broker()
+    else:
+        mqtt_link = network.Mqtt()
+
+    if cfg['insteon'].get('replay', None):
+        plm_link = network.Replay()
+    elif cfg['insteon'].get('sim', None):
+        plm_link = sim.Plm()
+    else:
+        plm_link = network.Serial()
 
     # Add the clients to the event loop.
     loop.add(mqtt_link, connected=False)
@@ -47,6 +85,4 @@ def start(args, cfg):
     # Load the configuration data into the objects.
     config.apply(cfg, mqtt_handler, modem)
 
-    # Start the network event loop.
-    while loop.active():
-        loop.select()
+    return loop, mqtt_handler, modem
@@ -0,0 +1,23 @@
+#===========================================================================
+#
+# Offline trace file commands
+#
+#===========================================================================
+from ..Trace import Trace
+
+
+#===========================================================================
+def decode(args, config):
+    try:
+        lines = Trace.decode(args.file)
+    except (OSError, ValueError) as e:
+        print("Error reading trace file: %s" % e)
+        return 1
+
+    for line in lines:
+        print(line)
+
+    return 0
+
+
+#===========================================================================
@@ -19,6 +19,11 @@ TIME_OUT = 10
 def send(config, topic, payload, quiet=False):
     """Send a message and get the replies from the server.
 
+    If a persistent Client is active (see Client.active), the message is
+    sent using that client and this returns right away without waiting for
+    the command to finish.  Otherwise a new connection to the broker is made
+    and this waits until the command finishes.
+
     Args:
       config:   (dict) Configuration dictionary.  The MQTT broker and
                 connection information is read from this.
@@ -30,51 +35,171 @@ def send(config, topic, payload, quiet=False):
       Returns the session reply object.  This is a dict with the results of the
       command.
     """
-    session = {
-        "result" : None,
-        "done" : False,
-        "status" : 0,
-        "quiet" : quiet,
-        }
-
-    client = mqtt.Client(userdata=session)
-
-    # Add user/password if the config file has them set.
-    if config["mqtt"].get("username", None):
-        user = config["mqtt"]["username"]
-        password = config["mqtt"].get("password", None)
-        client.username_pw_set(user, password)
-
-    # Connect to the broker.
-    client.connect(config["mqtt"]["broker"], config["mqtt"]["port"])
-
-    # Generate a random session ID to use so the server can reply directly to
-    # us via MQTT.
-    id = str(random.getrandbits(32))
-    payload["session"] = id
-
-    # Session topic - this must match the servers definition of the session
-    # topic (i.e. don't just change it here).
-    rtn_topic = "%s/session/%s" % (topic, id)
-    client.message_callback_add(rtn_topic, callback)
-    client.subscribe(rtn_topic)
-
-    # Send the message).
-    client.publish(topic, json.dumps(payload), qos=2)
-
-    # Loop on the client until the callback sets the done field in the
-    # session data or we time out.
-    session["end_time"] = time.time() + TIME_OUT  # seconds
-    while not session["done"] and time.time() < session["end_time"]:
-        client.loop(timeout=0.5)
-
-    if not session["done"]:
+    if Client.active:
+        return Client.active.send(topic, payload, quiet)
+
+    client = Client(config, max_in_flight=1)
+    try:
+        session = client.send(topic, payload, quiet)
+        client.wait()
+    finally:
+        client.close()
+
+    if session["timed_out"]:
         print("Reply timed out")
 
-    client.disconnect()
     return session
 
 
+#===========================================================================
+class Client:
+    """Persistent command line MQTT client.
+
+    This keeps a single connection to the broker open so that many commands
+    can be sent without connecting for each one.  Each command gets it's own
+    session topic so up to max_in_flight commands can be waiting for
+    replies at the same time.
+
+    If a client is set as Client.active, then send() will use it instead of
+    making a new connection.
+    """
+    # Client being used by send().  None to connect for each command.
+    active = None
+
+    #-----------------------------------------------------------------------
+    def __init__(self, config, max_in_flight=4):
+        """Constructor
+
+        This connects to the broker.
+
+        Args:
+          config:         (dict) Configuration dictionary.  The MQTT broker
+                          and connection information is read from this.
+          max_in_flight:  (int) Maximum number of commands to have waiting
+                          for replies.  send() will wait for commands to
+                          finish if this is exceeded.
+        """
+        self.max_in_flight = max(1, max_in_flight)
+
+        # List of session dicts that are waiting for replies and a list of
+        # every session that has been sent.
+        self.sessions = []
+        self.sent = []
+
+        self.client = mqtt.Client()
+
+        # Add user/password if the config file has them set.
+        if config["mqtt"].get("username", None):
+            user = config["mqtt"]["username"]
+            password = config["mqtt"].get("password", None)
+            self.client.username_pw_set(user, password)
+
+        # Connect to the broker.
+        self.client.connect(config["mqtt"]["broker"], config["mqtt"]["port"])
+
+    #-----------------------------------------------------------------------
+    def send(self, topic, payload, quiet=False):
+        """Send a command.
+
+        This returns once the command has been published.  The session
+        dictionary that is returned will be updated as replies arrive.  Use
+        wait() to wait for the command to finish.
+
+        Args:
+          topic:    (str) The MQTT topic string.
+          payload:  (dict) Message payload dictionary.  Will be converted to
+                    json.
+          quiet:    (bool) True to not print any of the reply messages.
+
+        Returns:
+          Returns the session reply object.  This is a dict with the results
+          of the command.
+        """
+        # Wait for a slot to open up.
+        while len(self.sessions) >= self.max_in_flight:
+            self.loop()
+
+        session = {
+            "result" : None,
+            "done" : False,
+            "status" : 0,
+            "quiet" : quiet,
+            "timed_out" : False,
+            "start_time" : time.time(),
+            }
+
+        # Generate a random session ID to use so the server can reply
+        # directly to us via MQTT.
+        id = str(random.getrandbits(32))
+        payload["session"] = id
+
+        # Session topic - this must match the servers definition of the
+        # session topic (i.e. don't just change it here).
+        rtn_topic = "%s/session/%s" % (topic, id)
+        session["topic"] = rtn_topic
+
+        self.client.message_callback_add(
+            rtn_topic, lambda client, data, msg: callback(client, session,
+                                                          msg))
+        self.client.subscribe(rtn_topic)
+
+        # Send the message.
+        session["end_time"] = time.time() + TIME_OUT  # seconds
+        self.client.publish(topic, json.dumps(payload), qos=2)
+
+        self.sessions.append(session)
+        self.sent.append(session)
+        return session
+
+    #-----------------------------------------------------------------------
+    def loop(self, timeout=0.5):
+        """Process network traffic and remove finished sessions.
+
+        Sessions that haven't received a reply in TIME_OUT seconds are
+        marked as timed out with a status of -1.
+
+        Args:
+          timeout:   (float) Maximum time in seconds to wait for traffic.
+        """
+        self.client.loop(timeout=timeout)
+
+        t = time.time()
+        for session in list(self.sessions):
+            if not session["done"] and t >= session["end_time"]:
+                session["done"] = True
+                session["timed_out"] = True
+                session["status"] = -1
+
+            if session["done"]:
+                session["finish_time"] = t
+                self.client.message_callback_remove(session["topic"])
+                self.client.unsubscribe(session["topic"])
+                self.sessions.remove(session)
+
+    #-----------------------------------------------------------------------
+    def wait(self, session=None):
+        """Wait for commands to finish.
+
+        Args:
+          session:   (dict) The session to wait for.  If this is None, wait
+                     for all of the sessions to finish.
+        """
+        if session is None:
+            while self.sessions:
+                self.loop()
+        else:
+            while not session["done"] or session in self.sessions:
+                self.loop()
+
+    #-----------------------------------------------------------------------
+    def close(self):
+        """Disconnect from the broker.
+        """
+        self.client.disconnect()
+
+    #-----------------------------------------------------------------------
+
+
 #===========================================================================
 def callback(client, session, message):
     """MQTT message callback
@@ -5,6 +5,8 @@
 #===========================================================================
 import json
 import os.path
+from .CircuitBreaker import CircuitBreaker
+from .Mailbox import Mailbox
 from .MsgHistory import MsgHistory
 from ..Address import Address
 from ..CommandSeq import CommandSeq
@@ -77,10 +79,19 @@ class Base:
         self.addr = Address(address)
         self.name = name
 
-        # Moving window history of messages that are received from the
-        # device.  Used for optimal hop computations.
+        # History of messages sent to and received from the device.  Used
+        # for optimal hop and retry computations.
         self.history = MsgHistory()
 
+        # Battery powered devices set this to a Mailbox to hold messages
+        # until the device is awake (see enable_mailbox).
+        self.mailbox = None
+
+        # Fails commands immediately when the device isn't responding.
+        # Battery powered devices don't use this since they are expected
+        # to not respond most of the time.
+        self.breaker = CircuitBreaker(self)
+
         # Make some nice labels to make logging easier.
         self.label = str(self.addr)
         if self.name:
@@ -89,6 +100,7 @@ class Base:
         self.save_path = modem.save_path
         self.db = db.Device(self.addr)
         self.load_db()
+        self.load_history()
 
         # Remove (mqtt) commands mapped to methods calls.  These are
         # handled in run_command().  Derived classes can add more
@@ -113,6 +125,19 @@ class Base:
         # downloading the database.
         self._next_db_delta = None
 
+    #-----------------------------------------------------------------------
+    def enable_mailbox(self):
+        """Hold commands in a Mailbox until the device is awake.
+
+        Battery powered devices call this in the constructor.  The device
+        is asleep most of the time so commands are held until it wakes up
+        instead of failing them with the circuit breaker.  This also adds
+        the clear_mailbox command.
+        """
+        self.mailbox = Mailbox(self)
+        self.breaker = None
+        self.cmd_map['clear_mailbox'] = self.mailbox.clear
+
     #-----------------------------------------------------------------------
     def type(self):
         """Return a nice class name for the device.
@@ -123,8 +148,12 @@ class Base:
     def send(self, msg, msg_handler, high_priority=False):
         """Send a message to the device.
 
-        This will use the history of messages received from the device to set
-        the number of hops to use in the message.
+        This will use the history of messages sent to and received from the
+        device to set the number of hops and retries to use for the message
+        (see MsgHistory).  If the device has a mailbox, the message is held
+        there until the device is awake (see Mailbox).  If the circuit
+        breaker is open, the message isn't sent and the handler is told it
+        failed (see CircuitBreaker).
 
         Args:
           msg:            Output message to write.  This should be an
@@ -138,10 +167,25 @@ class Base:
                           queue.  True to insert this message at the start of
                           the queue.
         """
+        if self.breaker is not None:
+            if self.breaker.is_open:
+                LOG.error("Device %s is unreachable - command not sent",
+                          self.label)
+                msg_handler.on_done(False, "Device %s is unreachable" %
+                                    self.label, None)
+                return
+
+            msg_handler.use_breaker(self.breaker)
+
         if isinstance(msg, Msg.OutStandard):  # handles OutExtended as well
-            msg.flags.set_hops(self.history.avg_hops())
+            num_hops = self.history.max_hops()
+            msg.flags.set_hops(num_hops)
+            msg_handler.use_history(self.history, num_hops)
 
-        self.protocol.send(msg, msg_handler, high_priority)
+        if self.mailbox is not None:
+            self.mailbox.send(msg, msg_handler)
+        else:
+            self.protocol.send(msg, msg_handler, high_priority)
 
     #-----------------------------------------------------------------------
     def db_path(self):
@@ -184,6 +228,40 @@ class Base:
                  len(self.db))
         LOG.debug("%s", self.db)
 
+    #-----------------------------------------------------------------------
+    def history_path(self):
+        """Return the message history path.
+
+        This is saved next to the all link database using the device hex
+        address with a .history.json suffix.
+        """
+        return os.path.join(self.save_path, self.addr.hex) + ".history.json"
+
+    #-----------------------------------------------------------------------
+    def load_history(self):
+        """Load the message history from a file.
+
+        This restores the link statistics learned before the last restart
+        so the first messages sent to the device use the right hops and
+        retries.  If the file doesn't exist, nothing is done.
+        """
+        path = self.history_path()
+        self.history.set_path(path)
+        if not os.path.exists(path):
+            return
+
+        try:
+            with open(path) as f:
+                data = json.load(f)
+
+            self.history = MsgHistory.from_json(data, path)
+        except:
+            LOG.exception("Error reading file %s", path)
+            return
+
+        LOG.debug("Device %s history loaded, using %d hops", self.label,
+                  self.history.max_hops())
+
     #-----------------------------------------------------------------------
     def print_db(self, on_done):
         """Print the device database to the log UI.
@@ -463,6 +541,11 @@ class Base:
           msg:    (Msg.InpStandard, Msg.InpExtended) The message that arrived.
         """
         self.history.add(msg)
+        if self.mailbox is not None:
+            self.mailbox.handle_received(msg)
+
+        if self.breaker is not None:
+            self.breaker.success()
 
     #-----------------------------------------------------------------------
     def handle_refresh(self, msg):
@@ -524,7 +607,8 @@ class Base:
 
         responders = self.db.find_group(group)
         LOG.debug("Found %s responders in group %s", len(responders), group)
-        LOG.debug("Group %s -> %s", group, [i.addr.hex for i in responders])
+        LOG.debug("Group %s -> %s", group,
+                  log.Lazy(lambda: [i.addr.hex for i in responders]))
 
         # For each device that we're the controller of call it's
         # handler for the broadcast message.
@@ -22,6 +22,19 @@ class BatterySensor(Base):
     broadcast group 01 = on (0x11) / off (0x13)
     broadcast group 03 = low battery (0x11) / good battery (0x13)
     broadcast group 04 = heartbeat (0x11)
+
+    The run_command() method is used for arbitrary remote commanding
+    (via MQTT for example).  The input is a dict (or keyword args)
+    containing a 'cmd' key with the value as the command name and any
+    additional arguments needed for the command as other key/value
+    pairs. Valid commands for all devices are:
+
+       getdb:    No arguments.  Download the PLM modem all link database
+                 and save it to file.
+       refresh:  No arguments.  Ping the device and see if the database is
+                 current.  Reloads the modem database if needed.
+       clear_mailbox:  No arguments.  Drop the commands that are waiting
+                 for the sensor to wake up (see Mailbox).
     """
     def __init__(self, protocol, modem, address, name=None):
         """Constructor
@@ -40,6 +53,8 @@ class BatterySensor(Base):
         self.signal_low_battery = Signal()  # (Device, bool)
         self.signal_heartbeat = Signal()  # (Device, bool)
 
+        self.enable_mailbox()
+
         # Derived classes can override these or add to them.  Maps
         # Insteon groups to message type for this sensor.
         self.group_map = {
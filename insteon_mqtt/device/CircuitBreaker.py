@@ -0,0 +1,174 @@
+#===========================================================================
+#
+# Circuit breaker for unresponsive devices.
+#
+#===========================================================================
+from .. import clock
+from .. import handler
+from .. import log
+from .. import message as Msg
+from ..Signal import Signal
+
+LOG = log.get_logger()
+
+
+class CircuitBreaker:
+    """Fast fails commands to a device that has stopped responding.
+
+    Each command sent to an unplugged or broken device ties up the modem
+    for every retry and time out.  After threshold commands in a row have
+    timed out, the breaker opens and new commands to the device fail
+    immediately with a "device unreachable" error.
+
+    While the breaker is open, a probe message (engine version request) is
+    sent in the background every probe_time seconds.  The time
+    doubles after each failed probe up to max_probe_time.  Any message
+    from the device (a probe reply or the user pushing a button) closes
+    the breaker.
+
+    signal_state is emitted when the breaker opens or closes so the
+    device availability can be published.
+
+    Configuration (the insteon 'circuit_breaker' key):
+      - enable:          (bool) True to use the breakers.  Default True.
+      - threshold:       (int) Number of commands in a row that time out
+                         before the breaker opens.  Default 3.
+      - probe_time:      (int) Initial seconds between probes.  Default 30.
+      - max_probe_time:  (int) Maximum seconds between probes.
+                         Default 3600.
+    """
+    #-----------------------------------------------------------------------
+    def __init__(self, device):
+        """Constructor
+
+        Args:
+          device:   (device.Base) The device to track.
+        """
+        self.device = device
+
+        self.enable = True
+        self.threshold = 3
+        self.probe_time = 30
+        self.max_probe_time = 3600
+
+        # Number of commands in a row that have timed out.
+        self.num_failed = 0
+
+        self.is_open = False
+
+        # Time of the next probe, the current time between probes, and True
+        # if a probe is waiting for a reply.
+        self._probe_at = None
+        self._backoff = self.probe_time
+        self._probing = False
+
+        # Emitted when the breaker opens or closes.
+        self.signal_state = Signal()  # emit(device, bool available)
+
+    #-----------------------------------------------------------------------
+    def load_config(self, data):
+        """Load a configuration dictionary.
+
+        Args:
+          data:   (dict) The circuit_breaker configuration data.
+        """
+        self.enable = bool(data.get("enable", self.enable))
+        self.threshold = max(1, int(data.get("threshold", self.threshold)))
+        self.probe_time = int(data.get("probe_time", self.probe_time))
+        self.max_probe_time = int(data.get("max_probe_time",
+                                           self.max_probe_time))
+        self._backoff = self.probe_time
+
+    #-----------------------------------------------------------------------
+    def timeout(self, t=None):
+        """Record that a command timed out with no more retries.
+
+        Args:
+          t:      (float) The current time.  None to use clock.now().
+        """
+        self.num_failed += 1
+        if not self.enable or self.is_open or \
+           self.num_failed < self.threshold:
+            return
+
+        t = clock.now() if t is None else t
+        LOG.error("%s is unreachable after %d commands timed out - failing "
+                  "new commands until it replies", self.device.label,
+                  self.num_failed)
+        self.is_open = True
+        self._backoff = self.probe_time
+        self._probe_at = t + self._backoff
+        self.device.protocol.signal_poll.connect(self.poll)
+        self.signal_state.emit(self.device, False)
+
+    #-----------------------------------------------------------------------
+    def success(self):
+        """Record that a message was received from the device.
+        """
+        self.num_failed = 0
+        if not self.is_open:
+            return
+
+        LOG.info("%s is reachable again", self.device.label)
+        self.is_open = False
+        self._probe_at = None
+        self.device.protocol.signal_poll.disconnect(self.poll)
+        self.signal_state.emit(self.device, True)
+
+    #-----------------------------------------------------------------------
+    def poll(self, t):
+        """Periodic polling function.
+
+        Sends a probe to the device when the probe time has passed.
+
+        Args:
+           t:   (float) Current Unix clock time tag.
+        """
+        if not self.is_open or self._probing or t < self._probe_at:
+            return
+
+        LOG.info("Probing unreachable device %s", self.device.label)
+        self._probing = True
+
+        # Sent w/o the device send() so it isn't blocked by the open breaker
+        # and a failed probe isn't counted again.  No retries - the backoff
+        # takes care of that.  Probes are background messages so they only
+        # use a quiet channel.
+        msg = Msg.OutStandard.direct(self.device.addr, 0x0D, 0x00)
+        msg_handler = handler.StandardCmd(msg, self._probe_reply,
+                                          self._probe_done, num_retry=0)
+        msg_handler.background = True
+        self.device.protocol.send(msg, msg_handler)
+
+    #-----------------------------------------------------------------------
+    def _probe_reply(self, msg, on_done):
+        """Probe reply callback.
+
+        The reply was already passed to success() when it arrived so there
+        is nothing else to do.
+
+        Args:
+          msg:      (InpStandard) The reply message.
+          on_done:  Finished callback.
+        """
+        on_done(True, "Device replied", None)
+
+    #-----------------------------------------------------------------------
+    def _probe_done(self, success, msg, data):
+        """Probe finished callback.
+
+        Args:
+          success:  (bool) True if the device replied.
+          msg:      (str) Message result.
+          data:     Callback data.
+        """
+        self._probing = False
+        if success or not self.is_open:
+            return
+
+        self._backoff = min(self.max_probe_time, self._backoff * 2)
+        self._probe_at = clock.now() + self._backoff
+        LOG.info("%s probe failed - next probe in %d sec", self.device.label,
+                 self._backoff)
+
+    #-----------------------------------------------------------------------
@@ -32,6 +32,19 @@ class Leak(Base):
     device senses water and signal_active(False) when no water is detected.
 
     TODO: download the database automatically when leak/heartbeat is seen.
+
+    The run_command() method is used for arbitrary remote commanding
+    (via MQTT for example).  The input is a dict (or keyword args)
+    containing a 'cmd' key with the value as the command name and any
+    additional arguments needed for the command as other key/value
+    pairs. Valid commands for all devices are:
+
+       getdb:    No arguments.  Download the PLM modem all link database
+                 and save it to file.
+       refresh:  No arguments.  Ping the device and see if the database is
+                 current.  Reloads the modem database if needed.
+       clear_mailbox:  No arguments.  Drop the commands that are waiting
+                 for the sensor to wake up (see Mailbox).
     """
     def __init__(self, protocol, modem, address, name=None):
         """Constructor
@@ -49,6 +62,8 @@ class Leak(Base):
         self.signal_active = Signal()  # (Device, bool)
         self.signal_heartbeat = Signal()  # (Device, bool)
 
+        self.enable_mailbox()
+
         # Maps Insteon groups to message type for this sensor.
         self.group_map = {
             # Dry event on group 1.
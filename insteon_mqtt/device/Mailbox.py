@@ -0,0 +1,171 @@
+#===========================================================================
+#
+# Command mailbox for battery powered devices.
+#
+#===========================================================================
+from .. import clock
+from .. import log
+from .. import message as Msg
+
+LOG = log.get_logger()
+
+
+class Mailbox:
+    """Holds messages for a battery powered device until it's awake.
+
+    Battery powered devices are asleep most of the time and only listen
+    for a few seconds after they send a message.  Sending a command to a
+    sleeping device ties up the modem through every retry and time out and
+    then fails anyway.  Instead, messages sent to the device are held here
+    and the shared write queue stays free.
+
+    Any broadcast message from the device (state changes, heartbeats, and
+    the set button) means it's awake.  The held messages are then added to
+    the front of the write queue in a single batch and any messages sent
+    while the device is still awake go straight to the queue at high
+    priority so the device doesn't fall asleep again before they're sent.
+    Retries of the messages come back through send() (see
+    handler.Base.use_mailbox) so a message that misses the awake time is
+    held again.
+    """
+    # Seconds the device stays awake after a broadcast.
+    AWAKE_TIME = 4
+
+    # Seconds the device stays awake after the set button is pressed.
+    SET_BUTTON_TIME = 60
+
+    # Maximum number of held messages.  The oldest are dropped (and their
+    # handler is told they failed) when this is reached.
+    MAX_SIZE = 20
+
+    # Broadcast cmd1 values sent when the set button is pressed.
+    SET_BUTTON_CMDS = [0x01, 0x02]
+
+    #-----------------------------------------------------------------------
+    def __init__(self, device):
+        """Constructor
+
+        Args:
+          device:   (device.Base) The battery powered device.
+        """
+        self.device = device
+
+        # List of (msg, handler) tuples waiting for the device to wake up.
+        self.messages = []
+
+        # Time until the device is assumed to be awake.
+        self.awake_until = 0
+
+    #-----------------------------------------------------------------------
+    def __len__(self):
+        return len(self.messages)
+
+    #-----------------------------------------------------------------------
+    def is_awake(self, t=None):
+        """Return True if the device is currently awake.
+
+        Args:
+          t:      (float) The current time.  None to use clock.now().
+        """
+        t = clock.now() if t is None else t
+        return t < self.awake_until
+
+    #-----------------------------------------------------------------------
+    def send(self, msg, msg_handler, t=None):
+        """Send a message to the device or hold it until the device wakes.
+
+        Args:
+          msg:          Output message to write.
+          msg_handler:  Message handler instance to use when replies to the
+                        message are received.
+          t:            (float) The current time.  None to use
+                        clock.now().
+        """
+        msg_handler.use_mailbox(self)
+        if self.is_awake(t):
+            self.device.protocol.send(msg, msg_handler, high_priority=True)
+            return
+
+        if len(self.messages) >= self.MAX_SIZE:
+            _, old_handler = self.messages.pop(0)
+            LOG.warning("%s mailbox is full - dropping oldest message",
+                        self.device.label)
+            old_handler.on_done(False, "Mailbox full - device is asleep",
+                                None)
+
+        self.messages.append((msg, msg_handler))
+        LOG.ui("%s is asleep - command will be sent when it wakes up "
+               "(%d waiting)", self.device.label, len(self.messages))
+
+    #-----------------------------------------------------------------------
+    def handle_received(self, msg, t=None):
+        """Receives every message from the device.
+
+        Broadcasts from the device mean it's awake so any held messages are
+        sent.  Other messages from the device (i.e. replies to the held
+        messages) keep the device awake a little longer.
+
+        Args:
+          msg:    (Msg.InpStandard, Msg.InpExtended) The message that
+                  arrived.
+          t:      (float) The current time.  None to use clock.now().
+        """
+        t = clock.now() if t is None else t
+        msg_type = msg.flags.type
+        if msg_type == Msg.Flags.Type.BROADCAST and \
+           msg.cmd1 in self.SET_BUTTON_CMDS:
+            self.awake_until = max(self.awake_until, t + self.SET_BUTTON_TIME)
+
+        elif msg_type in (Msg.Flags.Type.BROADCAST,
+                          Msg.Flags.Type.ALL_LINK_BROADCAST,
+                          Msg.Flags.Type.ALL_LINK_CLEANUP):
+            self.awake_until = max(self.awake_until, t + self.AWAKE_TIME)
+
+        elif self.is_awake(t):
+            self.awake_until = max(self.awake_until, t + self.AWAKE_TIME)
+            return
+
+        else:
+            return
+
+        self.flush()
+
+    #-----------------------------------------------------------------------
+    def flush(self):
+        """Send all the held messages.
+
+        The messages are added to the front of the write queue in the order
+        they were sent.
+        """
+        if not self.messages:
+            return
+
+        LOG.info("%s is awake - sending %d held messages", self.device.label,
+                 len(self.messages))
+        messages, self.messages = self.messages, []
+
+        protocol = self.device.protocol
+        with protocol.batch(high_priority=True):
+            for msg, msg_handler in messages:
+                protocol.send(msg, msg_handler)
+
+    #-----------------------------------------------------------------------
+    def clear(self, on_done=None):
+        """Drop all the held messages.
+
+        The handler of each message is told the message failed.
+
+        Args:
+          on_done:  Finished callback.  Signature is:
+                        on_done(success, msg, data)
+        """
+        messages, self.messages = self.messages, []
+        for msg, msg_handler in messages:
+            msg_handler.on_done(False, "Mailbox cleared", None)
+
+        LOG.ui("%s mailbox cleared %d messages", self.device.label,
+               len(messages))
+        if on_done:
+            on_done(True, "Mailbox cleared", None)
+
+    #-----------------------------------------------------------------------
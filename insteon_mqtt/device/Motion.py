@@ -52,6 +52,8 @@ class Motion(BatterySensor):
                  and save it to file.
        refresh:  No arguments.  Ping the device and see if the database is
                  current.  Reloads the modem database if needed.
+       clear_mailbox:  No arguments.  Drop the commands that are waiting
+                 for the sensor to wake up (see Mailbox).
     """
     def __init__(self, protocol, modem, address, name=None):
         """Constructor
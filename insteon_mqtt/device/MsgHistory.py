@@ -3,55 +3,229 @@
 # Message history class
 #
 #===========================================================================
+import collections
+import json
 import math
+import time
+from .. import clock
 from .. import log
+from .. import message as Msg
 
 LOG = log.get_logger()
 
 
 class MsgHistory:
-    """Message history tracking.
+    """Message history and link quality tracking.
 
-    This class is used to track the history of messages received by a device.
-    It's primarily used to compute the most efficient hop value to use for
-    outbound messages by tracking the hop values of the messages that are
-    received from the device.
+    This class is used to track the history of messages sent to and
+    received from a device.  It's used to pick the starting hop count and
+    retry count for outbound messages so that devices with a good link use
+    less network time and devices with a poor link get enough hops on the
+    first try.
+
+    The model tracks:
+      - The hops needed by messages received from the device (max_hops -
+        hops_left) over the last WINDOW_LEN messages.
+      - The number of messages sent and ACK'ed (or NAK'ed) at each
+        max_hops value.
+      - The number of messages sent and ACK'ed in each hour of the day.
+      - The total NAK and time out counts.
+
+    Outcome counts are halved when they reach OUTCOME_LEN so recent
+    behavior is weighted more than old behavior.
+
+    If a save path is set, the history is saved as JSON at most every
+    SAVE_INTERVAL seconds when it changes so the learned values are
+    available as soon as the bridge restarts.
     """
-    # Number of messages to use in the averaging.
+    # Number of messages to use in the hop averaging.
     WINDOW_LEN = 10
 
+    # Maximum number of sends in a bucket before the counts are decayed.
+    OUTCOME_LEN = 50
+
+    # Minimum number of sends in a bucket before the success rate is used.
+    MIN_SAMPLES = 5
+
+    # Success rates below this will use more hops or retries.
+    GOOD_RATE = 0.9
+
+    # Success rate above which fewer retries are used.
+    EXCELLENT_RATE = 0.97
+
+    # Maximum number of retries to use.
+    MAX_RETRY = 5
+
+    # Minimum time in seconds between saves.
+    SAVE_INTERVAL = 300
+
     #-----------------------------------------------------------------------
-    def __init__(self):
+    @staticmethod
+    def from_json(data, path=None):
+        """Read a MsgHistory from a JSON input.
+
+        The inverse of this is to_json().
+
+        Args:
+          data:   (dict) The data to read from.
+          path:   (str) The file to save the history to when it changes.
+
+        Returns:
+          MsgHistory: Returns the created MsgHistory object.
+        """
+        obj = MsgHistory(path)
+        obj._hops.extend(data.get("hops", []))
+
+        hop_stats = data.get("hop_stats", [])
+        if len(hop_stats) == len(obj._hop_stats):
+            obj._hop_stats = [list(i) for i in hop_stats]
+
+        hour_stats = data.get("hour_stats", [])
+        if len(hour_stats) == len(obj._hour_stats):
+            obj._hour_stats = [list(i) for i in hour_stats]
+
+        obj.num_sent = data.get("num_sent", 0)
+        obj.num_ack = data.get("num_ack", 0)
+        obj.num_nak = data.get("num_nak", 0)
+        obj.num_timeout = data.get("num_timeout", 0)
+        return obj
+
+    #-----------------------------------------------------------------------
+    def __init__(self, path=None):
         """Constructor
+
+        Args:
+          path:   (str) The file to save the history to when it changes.
+        """
+        self.save_path = path
+
+        # Time of the last save and True if there are unsaved changes.
+        self._save_time = clock.now()
+        self._changed = False
+
+        # Number of hops taken for up to WINDOW_LEN of the last received
+        # messages.
+        self._hops = collections.deque(maxlen=self.WINDOW_LEN)
+
+        # [sent, ack] counts for each max_hops value [0,3] and for each hour
+        # of the day.
+        self._hop_stats = [[0, 0] for i in range(4)]
+        self._hour_stats = [[0, 0] for i in range(24)]
+
+        self.num_sent = 0
+        self.num_ack = 0
+        self.num_nak = 0
+        self.num_timeout = 0
+
+        # (max_hops, hour) of the last sent message that is waiting for an
+        # ACK or None if there isn't one.
+        self._pending = None
+
+    #-----------------------------------------------------------------------
+    def set_path(self, path):
+        """Set the save path to use for the history.
+
+        Args:
+          path:   (str) The file to save the history to when it changes.
+        """
+        self.save_path = path
+
+    #-----------------------------------------------------------------------
+    def save(self, t=None):
+        """Save the history if there are unsaved changes.
+
+        If a save path wasn't set, nothing is done.
+
+        Args:
+           t:      (float) The current time.  None to use clock.now().
         """
-        # List of the number of messages hops that were taken for up to
-        # NUM_AVG of the last messages.
-        self._hops = []
+        if not self.save_path or not self._changed:
+            return
 
-        # Sum of the number of hops in self._hops.
-        self._hopSum = 0
+        self._save_time = clock.now() if t is None else t
+        self._changed = False
+        try:
+            with open(self.save_path, "w") as f:
+                json.dump(self.to_json(), f, indent=2)
+        except:
+            LOG.exception("Error writing history file %s", self.save_path)
+
+    #-----------------------------------------------------------------------
+    def to_json(self):
+        """Convert the history to JSON format.
+
+        Returns:
+          (dict) Returns the history as a JSON dictionary.
+        """
+        return {
+            "hops" : list(self._hops),
+            "hop_stats" : self._hop_stats,
+            "hour_stats" : self._hour_stats,
+            "num_sent" : self.num_sent,
+            "num_ack" : self.num_ack,
+            "num_nak" : self.num_nak,
+            "num_timeout" : self.num_timeout,
+            }
 
     #-----------------------------------------------------------------------
     def add(self, msg):
         """Add a received message to the history.
 
+        Direct ACK and NAK messages are also counted as the reply to the
+        last sent message.
+
         Args:
            msg:    (Msg.Base) The received message.
         """
         num_hops = msg.flags.max_hops - msg.flags.hops_left
         self._hops.append(num_hops)
-        self._hopSum += num_hops
-        LOG.debug("Received %s hops, total %d for %d entries", num_hops,
-                  self._hopSum, len(self._hops))
+        LOG.debug("Received %s hops, total %s for %d entries", num_hops,
+                  log.Lazy(sum, self._hops), len(self._hops))
+
+        if msg.flags.type == Msg.Flags.Type.DIRECT_ACK:
+            self._finished(True)
 
-        # If we've gone over the window size, remove the oldest value.
-        if len(self._hops) > self.WINDOW_LEN:
-            old_num = self._hops.pop(0)
-            self._hopSum -= old_num
+        elif msg.flags.type == Msg.Flags.Type.DIRECT_NAK:
+            # A NAK still means the message got to the device.
+            self.num_nak += 1
+            self._finished(True)
+
+        self._update()
+
+    #-----------------------------------------------------------------------
+    def sent(self, msg, t=None):
+        """Record that a message was sent to the device.
+
+        Args:
+           msg:    (Msg.OutStandard) The message being sent.
+           t:      (float) The current time.  None to use clock.now().
+        """
+        t = clock.now() if t is None else t
+        hour = time.localtime(t).tm_hour
+        hops = msg.flags.max_hops
+
+        self.num_sent += 1
+        self._add_outcome(self._hop_stats[hops], 0)
+        self._add_outcome(self._hour_stats[hour], 0)
+        self._pending = (hops, hour)
+        self._update(t)
+
+    #-----------------------------------------------------------------------
+    def timeout(self):
+        """Record that a sent message timed out w/o an ACK.
+        """
+        if self._pending is None:
+            return
+
+        self.num_timeout += 1
+        self._pending = None
+        self._update()
 
     #-----------------------------------------------------------------------
     def avg_hops(self):
-        """Compute the number of optimal number hops for an outbound message.
+        """Compute the average number of hops needed by the device.
+
+        This is the number of hops taken by messages from the device.
 
         Returns:
           (int) Returns the number of hops to use in the range [0,3].
@@ -60,7 +234,7 @@ class MsgHistory:
             return 3
 
         # Compute the average # of hops in the buffer.
-        avg_hops = float(self._hopSum) / len(self._hops)
+        avg_hops = float(sum(self._hops)) / len(self._hops)
 
         # Round up and use at least 1 hop
         num_hops = max(0, int(math.ceil(avg_hops)))
@@ -69,3 +243,129 @@ class MsgHistory:
         return num_hops
 
     #-----------------------------------------------------------------------
+    def max_hops(self, t=None):
+        """Choose the max_hops value to use for an outbound message.
+
+        This starts with the average number of hops needed by the device.
+        If messages sent with that many hops have a poor ACK rate or this
+        hour of the day has a poor ACK rate, another hop is added.
+
+        Args:
+           t:      (float) The current time.  None to use clock.now().
+
+        Returns:
+          (int) Returns the number of hops to use in the range [0,3].
+        """
+        num_hops = self.avg_hops()
+
+        # Add hops until the ACK rate at that hop count is good.
+        while num_hops < 3:
+            rate = self._rate(self._hop_stats[num_hops])
+            if rate is None or rate >= self.GOOD_RATE:
+                break
+
+            num_hops += 1
+
+        # Poor time of day - add another hop.
+        t = clock.now() if t is None else t
+        rate = self._rate(self._hour_stats[time.localtime(t).tm_hour])
+        if rate is not None and rate < self.GOOD_RATE:
+            num_hops = min(3, num_hops + 1)
+
+        return num_hops
+
+    #-----------------------------------------------------------------------
+    def num_retry(self, default, max_hops=None):
+        """Choose the retry count to use for an outbound message.
+
+        Devices with an excellent ACK rate use one less retry than the
+        default and devices with a poor rate use more.
+
+        Args:
+          default:   (int) The handler's default retry count.
+          max_hops:  (int) The max_hops the message is being sent with.  If
+                     this is set, the ACK rate for that hop count is used.
+                     Otherwise the overall ACK rate is used.
+
+        Returns:
+          (int) Returns the retry count to use.
+        """
+        if max_hops is not None:
+            rate = self._rate(self._hop_stats[max_hops])
+        else:
+            rate = self._rate([sum(i[0] for i in self._hop_stats),
+                               sum(i[1] for i in self._hop_stats)])
+        if rate is None or default < 1:
+            return default
+
+        if rate >= self.EXCELLENT_RATE:
+            return max(1, default - 1)
+        elif rate < self.GOOD_RATE / 2:
+            return min(self.MAX_RETRY, default + 2)
+        elif rate < self.GOOD_RATE:
+            return min(self.MAX_RETRY, default + 1)
+
+        return default
+
+    #-----------------------------------------------------------------------
+    def _update(self, t=None):
+        """Record a change and save the history if it's time to.
+
+        Args:
+           t:      (float) The current time.  None to use clock.now().
+        """
+        self._changed = True
+
+        t = clock.now() if t is None else t
+        if t - self._save_time >= self.SAVE_INTERVAL:
+            self.save(t)
+
+    #-----------------------------------------------------------------------
+    def _finished(self, success):
+        """Record the result of the pending sent message.
+
+        Args:
+          success:  (bool) True if the message was ACK'ed.
+        """
+        if self._pending is None:
+            return
+
+        hops, hour = self._pending
+        self._pending = None
+        if success:
+            self.num_ack += 1
+            self._hop_stats[hops][1] += 1
+            self._hour_stats[hour][1] += 1
+
+    #-----------------------------------------------------------------------
+    def _add_outcome(self, stats, idx):
+        """Increment a [sent, ack] count.
+
+        If the sent count is too large, both counts are halved.
+
+        Args:
+          stats:  ([int, int]) The counts to update.
+          idx:    (int) The index to increment.
+        """
+        stats[idx] += 1
+        if stats[0] > self.OUTCOME_LEN:
+            stats[0] //= 2
+            stats[1] //= 2
+
+    #-----------------------------------------------------------------------
+    def _rate(self, stats):
+        """Return the ACK rate for a [sent, ack] count.
+
+        Args:
+          stats:  ([int, int]) The counts to use.
+
+        Returns:
+          (float) Returns the ACK rate or None if there aren't enough sent
+          messages to compute it.
+        """
+        if stats[0] < self.MIN_SAMPLES:
+            return None
+
+        return min(1.0, float(stats[1]) / stats[0])
+
+    #-----------------------------------------------------------------------
@@ -50,6 +50,8 @@ class Remote(Base):
        refresh:  No arguments.  Ping the device to get the current state and
                  see if the database is current.  Reloads the modem database
                  if needed.  This will emit the current state as a signal.
+       clear_mailbox:  No arguments.  Drop the commands that are waiting
+                 for the remote to wake up (see Mailbox).
     """
 
     on_codes = [0x11, 0x12, 0x21, 0x23]  # on, fast on, instant on, manual on
@@ -72,6 +74,8 @@ class Remote(Base):
 
         self.signal_pressed = Signal()  # (Device, int group, bool on)
 
+        self.enable_mailbox()
+
     #-----------------------------------------------------------------------
     def pair(self, on_done=None):
         """Pair the device with the modem.
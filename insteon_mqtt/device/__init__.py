@@ -28,11 +28,13 @@ first (hold the modem set button, then the device.
 
 from .Base import Base
 from .BatterySensor import BatterySensor
+from .CircuitBreaker import CircuitBreaker
 from .Dimmer import Dimmer
 from .FanLinc import FanLinc
 from .IOLinc import IOLinc
 from .KeypadLinc import KeypadLinc
 from .Leak import Leak
+from .Mailbox import Mailbox
 from .MsgHistory import MsgHistory
 from .Motion import Motion
 from .Outlet import Outlet
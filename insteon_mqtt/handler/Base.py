@@ -3,7 +3,8 @@
 # Message handler API definition
 #
 #===========================================================================
-import time
+from .. import clock
+from .. import latency
 from .. import log
 from .. import message as Msg
 from .. import util
@@ -30,6 +31,32 @@ class Base:
     callback is stored in the base class.  The API for the callback is
     always:
        on_done( bool success, str message, data )
+
+    UI context: the UI logging callback that is active when the handler is
+    created (see log.Logger.ui_context) is saved in the handler.  The
+    Protocol makes it active again whenever it passes messages to the
+    handler so that UI messages from the handler and it's callbacks are
+    sent back to the session that started the command, even if other
+    commands are running at the same time.
+
+    Latency tracing: the active latency.Context (if any) is saved in the
+    handler the same way and the on_done callback is wrapped so the trace
+    finishes when the handler is done.
+
+    Circuit breaker: devices call use_breaker() with their
+    device.CircuitBreaker so that messages that time out with no more
+    retries can stop later commands from being sent to an unreachable
+    device.
+
+    Mailbox: battery devices call use_mailbox() with their device.Mailbox
+    so that the message expires as soon as the device goes back to sleep
+    and the retries go back through the mailbox to be held until it wakes
+    up again.
+
+    Link history: devices call use_history() with their
+    device.MsgHistory when they send a message.  The history picks the
+    retry count and is updated with each send and time out so that it can
+    choose the hop count and retries for later messages.
     """
     #-----------------------------------------------------------------------
     def __init__(self, on_done=None, num_retry=0, time_out=5):
@@ -46,6 +73,14 @@ class Base:
         """
         self.on_done = util.make_callback(on_done)
 
+        # UI logging callback for the session that created the handler.
+        self.ui_callback = LOG.ui_callback()
+
+        # Latency trace of the command that created the handler.
+        self.latency = latency.current()
+        if self.latency:
+            self.on_done = self.latency.wrap(self.on_done)
+
         # expire_time is the time after which we should time out.
         self._time_out = time_out
         self._expire_time = None
@@ -56,6 +91,56 @@ class Base:
         self._num_retry = num_retry
         self._msg = None
 
+        # device.MsgHistory of the device the message is sent to.
+        self.history = None
+
+        # device.CircuitBreaker of the device the message is sent to.
+        self.breaker = None
+
+        # device.Mailbox of the battery device the message is sent to.
+        self.mailbox = None
+
+        # True if the message is sent in the background (see
+        # Protocol.background).  Set by the Protocol.
+        self.background = False
+
+    #-----------------------------------------------------------------------
+    def use_history(self, history, max_hops=None):
+        """Use a device link history for the message.
+
+        The retry count is set from the history (see
+        MsgHistory.num_retry) and the history will be updated as the
+        message is sent and retried.
+
+        Args:
+          history:  (device.MsgHistory) The device message history.
+          max_hops: (int) The max_hops the message is being sent with.
+        """
+        self.history = history
+        self._num_retry = history.num_retry(self._num_retry, max_hops)
+
+    #-----------------------------------------------------------------------
+    def use_breaker(self, breaker):
+        """Use a device circuit breaker for the message.
+
+        The breaker is told if the message times out with no more retries.
+
+        Args:
+          breaker:  (device.CircuitBreaker) The device circuit breaker.
+        """
+        self.breaker = breaker
+
+    #-----------------------------------------------------------------------
+    def use_mailbox(self, mailbox):
+        """Use a device mailbox for the message.
+
+        Retries are sent to the mailbox instead of the write queue.
+
+        Args:
+          mailbox:  (device.Mailbox) The battery device mailbox.
+        """
+        self.mailbox = mailbox
+
     #-----------------------------------------------------------------------
     def sending_message(self, msg):
         """Messaging being sent callback.
@@ -69,6 +154,9 @@ class Base:
         self._num_sent += 1
         self._msg = msg
 
+        if self.history and isinstance(msg, Msg.OutStandard):
+            self.history.sent(msg)
+
         # Update the expiration time.
         self.update_expire_time()
 
@@ -84,7 +172,8 @@ class Base:
 
         This resets the time out time to record that we saw a valid message.
         """
-        self._expire_time = time.time() + self._time_out
+        self._expire_time = clock.now() + self._time_out
+        clock.deadline(self._expire_time)
 
     #-----------------------------------------------------------------------
     def is_expired(self, protocol, t):
@@ -101,33 +190,61 @@ class Base:
         Returns:
           Returns True if the message has timed out or False otherwise.
         """
-        # Not enough time has elapsed to time out.
-        if t < self._expire_time:
+        # Not enough time has elapsed to time out.  Battery devices stop
+        # listening when they go back to sleep so the message is handed
+        # back to the mailbox right away instead of waiting for the time
+        # out.
+        asleep = self.mailbox is not None and not self.mailbox.is_awake(t)
+        if t < self._expire_time and not asleep:
             return False
 
+        # A sleeping device says nothing about the link quality.
+        if self.history and not asleep:
+            self.history.timeout()
+
         # If we've exhausted the number of sends, end the handler.
-        elif not self._msg or self._num_sent > self._num_retry:
+        if not self._msg or self._num_sent > self._num_retry:
             LOG.warning("Handler timed out - no more retries (%s sent)",
                         self._num_sent - 1)
+            if self.breaker:
+                self.breaker.timeout(t)
+
             self.handle_timeout(protocol)
             return True
 
         LOG.warning("Handler timed out %s of %s sent: %s",
                     self._num_sent, self._num_retry, self._msg)
 
-        # Increase the hop count if we can.
+        # Increase the hop count if we can.  If the device has a link
+        # history, the starting hop count was chosen using it so only add a
+        # single hop.  Otherwise go straight to the maximum.
         if isinstance(self._msg, Msg.OutStandard):  # also handles OutExtended
-            num_hops = max(3, self._msg.flags.max_hops)
+            num_hops = 3
+            if self.history:
+                num_hops = min(3, self._msg.flags.max_hops + 1)
+
             LOG.debug("Increasing max_hops to %d", num_hops)
             self._msg.flags.set_hops(num_hops)
 
         # Otherwise we should try and resend the message with ourselves as
-        # the handler again so we don't lose the count.
-        protocol.send(self._msg, self)
+        # the handler again so we don't lose the count.  The retry is
+        # delayed using the backoff policy for the message so it doesn't
+        # land in the same busy period that caused the time out.
+        delay = protocol.retry_delay(self._msg, self._num_sent)
+        LOG.debug("Retrying in %.2f sec", delay)
+
+        # Battery devices only listen for a few seconds.  If the device
+        # has gone back to sleep, the mailbox holds the retry until it
+        # wakes up instead of tying up the write queue.
+        if self.mailbox is not None:
+            protocol.call_later(delay, self.mailbox.send, self._msg, self)
+        else:
+            protocol.send_later(delay, self._msg, self)
 
         # Tell the protocol that we're expired.  This will end this handler
-        # and send the next message in the queue.  At some point that will be
-        # our retry command with ourselves as the handler again.
+        # and send the next message in the queue.  Other messages can be
+        # sent while we wait and then our retry will be put at the front of
+        # the queue with ourselves as the handler again.
         return True
 
     #-----------------------------------------------------------------------
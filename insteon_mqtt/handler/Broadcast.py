@@ -3,6 +3,7 @@
 # Broadcast message handler.
 #
 #===========================================================================
+from .. import clock
 from .. import log
 from .. import message as Msg
 from .Base import Base
@@ -24,12 +25,22 @@ class Broadcast(Base):
     message gets ignored).  So if we get the broadcast, the cleanup is
     ignored.
 
+    Broadcasts are remembered by (device, group, command) for
+    CLEANUP_WINDOW seconds so the cleanup is matched to the right
+    broadcast even when several devices broadcast at the same time and
+    the cleanups arrive interleaved with other broadcasts.
+
     This handler will call device.handle_broadcast(msg) for the device that
     sends the message.
 
     NOTE: This handler is designed to always be active - it never returns
     FINISHED.
     """
+    # Time in seconds after a broadcast that the matching cleanup is
+    # ignored.  Devices send cleanups to each responder in turn so this
+    # needs to cover a device with a large number of responders.
+    CLEANUP_WINDOW = 10.0
+
     def __init__(self, modem):
         """Constructor
 
@@ -42,10 +53,11 @@ class Broadcast(Base):
         self.modem = modem
 
         # We get a broadcast, then a cleanup.  So when we receive the
-        # broadcast, store it here.  That way when we see the cleanup, we
-        # don't call the device again.  But if we miss the broadcast, the
-        # cleanup will trigger the device call.
-        self._last_broadcast = None
+        # broadcast, store it's time here.  That way when we see the cleanup,
+        # we don't call the device again.  But if we miss the broadcast, the
+        # cleanup will trigger the device call.  Maps (address id, group,
+        # cmd1) to the time the broadcast was received.
+        self._broadcasts = {}
 
     #-----------------------------------------------------------------------
     def msg_received(self, protocol, msg):
@@ -68,9 +80,13 @@ class Broadcast(Base):
         if not isinstance(msg, Msg.InpStandard):
             return Msg.UNKNOWN
 
+        t = clock.now()
+        self._remove_expired(t)
+        key = (msg.from_addr.id, msg.group, msg.cmd1)
+
         # Process the all link broadcast.
         if msg.flags.type == Msg.Flags.Type.ALL_LINK_BROADCAST:
-            self._last_broadcast = msg
+            self._broadcasts[key] = t
             return self._process(msg)
 
         # Clean up message is basically the same data but addressed to the
@@ -78,10 +94,9 @@ class Broadcast(Base):
         # if we missed the broadcast, this gives us a second chance to
         # trigger the scene.
         elif msg.flags.type == Msg.Flags.Type.ALL_LINK_CLEANUP:
-            if self._should_process(msg):
+            if self._broadcasts.pop(key, None) is None:
                 return self._process(msg)
 
-            self._last_broadcast = None
             return Msg.CONTINUE
 
         # Different message flags than we exepcted.
@@ -114,21 +129,15 @@ class Broadcast(Base):
         return Msg.CONTINUE
 
     #-----------------------------------------------------------------------
-    def _should_process(self, msg):
-        """Should we process a cleanup message?
+    def _remove_expired(self, t):
+        """Remove broadcasts that are older than the cleanup window.
 
         Args:
-          msg:   (Msg.InpStandard) Cleanup message to handle.
-
-        Returns:
-          (bool) True if the message should be procssed, False otherwise.
+          t:   (float) The current time.
         """
-        if not self._last_broadcast:
-            return True
-
-        # If we just got a broadcast from the same device, don't process the
-        # cleanup.
-        if self._last_broadcast.from_addr == msg.from_addr:
-            return False
+        start = t - self.CLEANUP_WINDOW
+        expired = [k for k, v in self._broadcasts.items() if v < start]
+        for key in expired:
+            del self._broadcasts[key]
 
-        return True
+    #-----------------------------------------------------------------------
@@ -5,7 +5,6 @@
 #===========================================================================
 from .. import log
 from .. import message as Msg
-from .. import util
 from .Base import Base
 
 LOG = log.get_logger()
@@ -30,10 +29,9 @@ class ModemDbGet(Base):
           on_done:   The finished callback.  Calling signature:
                          on_done( bool success, str message, data )
         """
-        super().__init__()
+        super().__init__(on_done)
 
         self.db = modem_db
-        self.on_done = util.make_callback(on_done)
 
     #-----------------------------------------------------------------------
     def msg_received(self, protocol, msg):
@@ -60,7 +58,7 @@ class ModemDbGet(Base):
         if isinstance(msg, (Msg.OutAllLinkGetFirst, Msg.OutAllLinkGetNext)):
             # If we get a NAK, then there are no more db records.
             if not msg.is_ack:
-                LOG.ui("Modem database download complete:\n%s", str(self.db))
+                LOG.ui("Modem database download complete:\n%s", self.db)
 
                 # Save the database to a local file.
                 self.db.save()
@@ -15,6 +15,16 @@ class ModemScene(Base):
 
     This handles the callbacks when simulated modem scene is sent using the
     OutModemScene message.  Calls modem.handle_scene when complete.
+
+    After the scene is broadcast, the modem sends a cleanup message to each
+    responder in the group.  The cleanup ACK's from the devices and any
+    InpAllLinkFailure reports for devices that didn't respond are recorded
+    so only the devices that ACK'ed are updated.  If the modem doesn't
+    report any cleanups, every responder is assumed to have the scene and
+    all of them are updated.  The on_done data is a dict with the keys
+    'acked', 'failed', and 'applied' which are lists of the device Address
+    objects.  'applied' is the devices that were updated - callers should
+    use it to find the devices that still need a direct command.
     """
     def __init__(self, modem, msg, on_done=None, num_retry=3):
         """Constructor
@@ -34,6 +44,11 @@ class ModemScene(Base):
         self.modem = modem
         self.msg = msg
 
+        # Addresses of the responders that ACK'ed the cleanup message and
+        # those the modem reported as failed.
+        self.acked = []
+        self.failed = []
+
     #-----------------------------------------------------------------------
     def msg_received(self, protocol, msg):
         """See if we can handle the message.
@@ -56,21 +71,46 @@ class ModemScene(Base):
             self.on_done(False, "Scene command failed", None)
             return Msg.FINISHED
 
+        # Each responder should ACK the cleanup message sent to it.
+        elif isinstance(msg, Msg.InpStandard):
+            if (msg.flags.type == Msg.Flags.Type.CLEANUP_ACK and
+                    msg.to_addr == self.modem.addr and
+                    msg.cmd1 == self.msg.cmd1):
+                LOG.debug("Modem scene %s cleanup ACK from %s",
+                          self.msg.group, msg.from_addr)
+                self.acked.append(msg.from_addr)
+                return Msg.CONTINUE
+
+        # The modem reports devices that never ACK'ed the cleanup.
+        elif isinstance(msg, Msg.InpAllLinkFailure):
+            if msg.group == self.msg.group:
+                LOG.warning("Modem scene %s cleanup failed for %s",
+                            self.msg.group, msg.addr)
+                self.failed.append(msg.addr)
+                return Msg.CONTINUE
+
         # The next message should be an InpAllLinkStatus which tells us the
         # command went out.
         elif isinstance(msg, Msg.InpAllLinkStatus):
+            data = {"acked" : self.acked, "failed" : self.failed,
+                    "applied" : []}
             if msg.is_ack:
                 LOG.debug("Modem scene %s command ACK", self.msg.group)
-                self.modem.handle_scene(self.msg.group, self.msg.cmd1)
-                self.on_done(True, "Scene command complete", None)
+
+                # If no cleanup reports were seen, assume every responder
+                # got the broadcast.
+                addrs = None
+                if self.acked or self.failed:
+                    addrs = self.acked
+
+                data["applied"] = self.modem.handle_scene(
+                    self.msg.group, self.msg.cmd1, addrs)
+                self.on_done(True, "Scene command complete", data)
             else:
-                self.on_done(False, "Scene command failed", None)
+                self.on_done(False, "Scene command failed", data)
 
             return Msg.FINISHED
 
-        # NOTE: The devices in the scene will also send an all link clean up
-        # report when they respond.  But we don't need to handle those. The
-        # regular device scene broadcast will take care of that.
         return Msg.UNKNOWN
 
     #-----------------------------------------------------------------------
@@ -0,0 +1,377 @@
+#===========================================================================
+#
+# Command latency tracing
+#
+#===========================================================================
+import bisect
+import collections
+import contextlib
+import itertools
+import json
+from . import clock
+from . import log
+from . import message as Msg
+
+__doc__ = """Command latency tracing.
+
+A Context is created for each MQTT message that arrives (see
+mqtt.Mqtt.handle_message) and is made active while the message is
+processed.  Like the UI logging callback (see log.Logger.ui_context), the
+message handlers save the active context when they are created and the
+Protocol makes it active again whenever it passes messages to the
+handler.  Each step along the way marks a stage with the time it
+happened:
+
+  - received:    The MQTT message arrived.
+  - queued:      The message was added to the modem write queue.
+  - write:       The message was passed to the modem link.
+  - sent:        The link wrote the message to the modem (after pacing).
+  - plm_ack:     The modem echoed the message back with an ACK or NAK.
+  - device_ack:  The device sent a direct ACK or NAK.
+  - reply:       Any other reply the handler used.
+  - publish:     A state change was published to MQTT.
+  - done:        The handler on_done callback was called.
+
+The time between each stage and the stage before it is added to a
+histogram for that stage in the Recorder when the command finishes (the
+last handler created for it calls on_done).  A sampled set of the full
+traces are kept in memory and can also be written to a file.
+"""
+
+LOG = log.get_logger()
+
+# Histogram bucket upper bounds in milli-seconds.  The last bucket counts
+# everything larger.
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+# Stack of active contexts.  A None entry means no context is active.
+_active = []
+
+
+#===========================================================================
+def current():
+    """Return the active trace context.
+
+    Returns:
+      (Context) Returns the active context or None if there isn't one.
+    """
+    return _active[-1] if _active else None
+
+
+#===========================================================================
+@contextlib.contextmanager
+def context(ctx):
+    """Context manager to make a trace context active.
+
+    The previously active context is restored on exit.
+
+        with latency.context(ctx):
+            ...
+
+    Args:
+      ctx:   (Context) The context to use or None for no context.
+    """
+    _active.append(ctx)
+    try:
+        yield ctx
+    finally:
+        _active.pop()
+
+
+#===========================================================================
+def mark(stage):
+    """Mark a stage in the active trace context.
+
+    Args:
+      stage:   (str) The stage name.
+    """
+    if _active and _active[-1] is not None:
+        _active[-1].mark(stage)
+
+
+#===========================================================================
+def msg_stage(msg):
+    """Return the stage name for a reply message.
+
+    Args:
+      msg:   Insteon message object that was read.
+
+    Returns:
+      (str) Returns the stage name.
+    """
+    if isinstance(msg, (Msg.InpStandard, Msg.InpExtended)):
+        if msg.flags.type in (Msg.Flags.Type.DIRECT_ACK,
+                              Msg.Flags.Type.DIRECT_NAK):
+            return "device_ack"
+
+    elif getattr(msg, "is_ack", None) is not None:
+        return "plm_ack"
+
+    return "reply"
+
+
+#===========================================================================
+class Context:
+    """Trace of a single command.
+
+    The stages are recorded as (stage, time) tuples.  Each handler that
+    uses the context wraps it's on_done callback with wrap().  When the
+    last of those callbacks runs, the trace is finished and passed to the
+    Recorder.
+    """
+    _ids = itertools.count(1)
+
+    #-----------------------------------------------------------------------
+    def __init__(self, recorder, name, t=None):
+        """Constructor
+
+        Args:
+          recorder:  (Recorder) The recorder to pass the finished trace to.
+          name:      (str) The trace name (usually the MQTT topic).
+          t:         (float) The start time.  None to use clock.now().
+        """
+        self.recorder = recorder
+        self.name = name
+        self.id = next(self._ids)
+        self.stages = [("received", clock.now() if t is None else t)]
+
+        # Number of handlers whose on_done callback hasn't run yet.
+        self.pending = 0
+        self.finished = False
+
+    #-----------------------------------------------------------------------
+    def mark(self, stage, t=None):
+        """Record that a stage happened.
+
+        Args:
+          stage:  (str) The stage name.
+          t:      (float) The current time.  None to use clock.now().
+        """
+        if not self.finished:
+            self.stages.append((stage, clock.now() if t is None else t))
+
+    #-----------------------------------------------------------------------
+    def discard(self, stage):
+        """Remove the last stage if it matches.
+
+        This is used when a stage is marked before knowing if it applies
+        (a handler ignoring a message).
+
+        Args:
+          stage:  (str) The stage name.
+        """
+        if len(self.stages) > 1 and self.stages[-1][0] == stage:
+            self.stages.pop()
+
+    #-----------------------------------------------------------------------
+    def wrap(self, on_done):
+        """Wrap a handler on_done callback.
+
+        The returned callback marks the done stage, runs the input callback
+        with the context active, and finishes the trace if there are no
+        other handlers left.
+
+        Args:
+          on_done:  The handler finished callback.
+
+        Returns:
+          Returns the callback to use.
+        """
+        self.pending += 1
+        called = [False]
+
+        def done(success, msg, data):
+            self.mark("done")
+            with context(self):
+                on_done(success, msg, data)
+
+            if not called[0]:
+                called[0] = True
+                self.pending -= 1
+                if self.pending <= 0:
+                    self.finish()
+
+        return done
+
+    #-----------------------------------------------------------------------
+    def end(self):
+        """End the processing of the message that started the trace.
+
+        If no handlers are using the trace (nothing was sent to the modem),
+        it's dropped without being recorded.
+        """
+        if self.pending <= 0:
+            self.finished = True
+
+    #-----------------------------------------------------------------------
+    def finish(self):
+        """Finish the trace and pass it to the recorder.
+        """
+        if self.finished:
+            return
+
+        self.finished = True
+        if self.recorder:
+            self.recorder.record(self)
+
+    #-----------------------------------------------------------------------
+    def to_json(self):
+        """Convert the trace to a JSON dictionary.
+
+        Returns:
+          (dict) Returns the id, name, start time, total time, and the list
+          of [stage, milli-seconds from the start].
+        """
+        t0 = self.stages[0][1]
+        return {
+            "id" : self.id,
+            "name" : self.name,
+            "time" : round(t0, 3),
+            "total_ms" : round(1e3 * (self.stages[-1][1] - t0), 3),
+            "stages" : [[s, round(1e3 * (t - t0), 3)]
+                        for s, t in self.stages],
+            }
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+class Recorder:
+    """Per stage latency histograms and sampled traces.
+
+    Configuration (the insteon 'latency' key):
+      - enable:       (bool) True to trace commands.  Default True.
+      - sample_rate:  (float) Fraction of the traces to keep.  Default 0.
+      - samples:      (int) Number of sampled traces to keep in memory.
+                      Default 100.
+      - file:         (str) File to append the sampled traces to as one
+                      JSON dictionary per line.  Default is to not write
+                      them.
+    """
+    def __init__(self):
+        """Constructor
+        """
+        self.enable = True
+        self.sample_rate = 0.0
+        self.path = None
+
+        # Map of stage name -> [count, total sec, max sec, bucket counts].
+        # The total stage is the time from the start to the end.
+        self.stages = {}
+        self.num_traces = 0
+
+        # Sampled traces (see Context.to_json).  The sample count is
+        # accumulated so exactly sample_rate of the traces are kept.
+        self.samples = collections.deque(maxlen=100)
+        self._sample_sum = 0.0
+
+    #-----------------------------------------------------------------------
+    def load_config(self, data):
+        """Load a configuration dictionary.
+
+        Args:
+          data:   (dict) The latency configuration data.
+        """
+        self.enable = bool(data.get("enable", self.enable))
+        self.sample_rate = min(1.0, max(0.0, float(
+            data.get("sample_rate", self.sample_rate))))
+        self.path = data.get("file", self.path)
+
+        size = max(1, int(data.get("samples", self.samples.maxlen)))
+        if size != self.samples.maxlen:
+            self.samples = collections.deque(self.samples, maxlen=size)
+
+    #-----------------------------------------------------------------------
+    def start(self, name, t=None):
+        """Start tracing a command.
+
+        Args:
+          name:   (str) The trace name (usually the MQTT topic).
+          t:      (float) The start time.  None to use clock.now().
+
+        Returns:
+          (Context) Returns the trace context or None if tracing is off.
+        """
+        if not self.enable:
+            return None
+
+        return Context(self, name, t)
+
+    #-----------------------------------------------------------------------
+    def record(self, ctx):
+        """Add a finished trace to the histograms.
+
+        Args:
+          ctx:   (Context) The finished trace.
+        """
+        self.num_traces += 1
+
+        stages = ctx.stages
+        for i in range(1, len(stages)):
+            self._add(stages[i][0], stages[i][1] - stages[i - 1][1])
+        self._add("total", stages[-1][1] - stages[0][1])
+
+        self._sample_sum += self.sample_rate
+        if self._sample_sum < 1.0:
+            return
+
+        self._sample_sum -= 1.0
+        data = ctx.to_json()
+        self.samples.append(data)
+
+        if self.path:
+            try:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(data) + "\n")
+            except OSError as e:
+                LOG.error("Error writing latency trace to %s: %s",
+                          self.path, e)
+                self.path = None
+
+    #-----------------------------------------------------------------------
+    def stats(self):
+        """Return the latency histograms.
+
+        Returns:
+          (dict) Returns the number of traces, the bucket upper bounds in
+          milli-seconds, and a dictionary of stage name to the count, mean,
+          max, and the bucket counts.  The last bucket count is the number
+          of times larger than the last bound.
+        """
+        stages = {}
+        for stage, (num, total, max_dt, counts) in self.stages.items():
+            stages[stage] = {
+                "num" : num,
+                "mean_ms" : round(1e3 * total / num, 3),
+                "max_ms" : round(1e3 * max_dt, 3),
+                "counts" : list(counts),
+                }
+
+        return {
+            "traces" : self.num_traces,
+            "buckets_ms" : BUCKETS_MS,
+            "stages" : stages,
+            }
+
+    #-----------------------------------------------------------------------
+    def _add(self, stage, dt):
+        """Add a stage time to the histogram.
+
+        Args:
+          stage:  (str) The stage name.
+          dt:     (float) The time in seconds.
+        """
+        data = self.stages.get(stage, None)
+        if data is None:
+            data = self.stages[stage] = [0, 0.0, 0.0,
+                                         [0] * (len(BUCKETS_MS) + 1)]
+
+        data[0] += 1
+        data[1] += dt
+        data[2] = max(data[2], dt)
+
+        data[3][bisect.bisect_left(BUCKETS_MS, 1e3 * dt)] += 1
+
+    #-----------------------------------------------------------------------
+
+#===========================================================================
@@ -3,8 +3,11 @@
 # Logging utilities
 #
 #===========================================================================
+import atexit
+import contextlib
 import logging
 import logging.handlers
+import queue
 
 # Add a custom logging level.  This lets us do some filtering for
 # sending user interface messages to the command line tool about
@@ -13,6 +16,16 @@ import logging.handlers
 UI_LEVEL = 21
 logging.addLevelName(UI_LEVEL, "UI")
 
+# Stack of active UI callbacks.  UI level (and higher) messages are passed to
+# the callback at the top of the stack.  This is shared by all the logger
+# objects so that child loggers send their messages to the same callback.  A
+# None entry means no callback is active for that context.
+_ui_stack = []
+
+# Listener thread that writes the queued log records to the screen and file
+# handlers.  None if records are written directly.
+_listener = None
+
 
 #===========================================================================
 def get_logger(name="insteon_mqtt"):
@@ -41,8 +54,16 @@ def initialize(level=None, screen=None, file=None, config=None):
       file:    (str) File to log to or None to skip.
       config:  Config object to read logging information from.  This read from
                the yaml file and the 'logging' key is extracted to configure
-               the inputs.
+               the inputs.  The 'async' key (default True) writes records
+               from a background thread and 'queue_size' (default 1000) is
+               the number of records that can be waiting to be written.
     """
+    # pylint: disable=global-statement
+    global _listener
+
+    async_write = True
+    queue_size = 1000
+
     # Config variables are used if the config is input and if a direct
     # input variable is not set.
     if config:
@@ -56,6 +77,9 @@ def initialize(level=None, screen=None, file=None, config=None):
         if file is None:
             file = data.get("file", None)
 
+        async_write = bool(data.get("async", async_write))
+        queue_size = int(data.get("queue_size", queue_size))
+
     # Apply defaults if none were set.
     level = level if level is not None else logging.INFO
     screen = bool(screen) if screen is not None else True
@@ -69,18 +93,88 @@ def initialize(level=None, screen=None, file=None, config=None):
     fmt = '%(asctime)s %(levelname)s %(module)s: %(message)s'
     datefmt = '%Y-%m-%d %H:%M:%S'
     formatter = logging.Formatter(fmt, datefmt)
+    handlers = []
 
     if screen:
         handler = logging.StreamHandler()
         handler.setFormatter(formatter)
-        log_obj.addHandler(handler)
+        handlers.append(handler)
 
     if file:
         # Use a watched file handler - that way LINUX system log
         # rotation works properly.
         handler = logging.handlers.WatchedFileHandler(file)
         handler.setFormatter(formatter)
-        log_obj.addHandler(handler)
+        handlers.append(handler)
+
+    if not async_write or not handlers:
+        for handler in handlers:
+            log_obj.addHandler(handler)
+        return
+
+    # Writing to the screen or file can block (slow disks, full terminal
+    # buffers) so the records are queued and written from a background
+    # thread instead of the network loop.  UI records are still passed to
+    # the UI callback handler right away since it's attached directly to
+    # the logger.
+    shutdown()
+    records = queue.Queue(max(1, queue_size))
+    _listener = Listener(records, *handlers)
+    _listener.start()
+    atexit.register(shutdown)
+
+    log_obj.addHandler(DropQueueHandler(records))
+
+
+#===========================================================================
+def shutdown():
+    """Stop the background log writer.
+
+    Any queued records are written before this returns.  This is called
+    automatically when the program exits.
+    """
+    # pylint: disable=global-statement
+    global _listener
+
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+
+#===========================================================================
+class Lazy:
+    """Lazy logging argument.
+
+    Logging only formats the message arguments if the message is going to
+    be output.  But the arguments themselves are built before the logging
+    call is made.  Arguments that are expensive to build (lists, sums,
+    database strings) can be wrapped in this class so the function is only
+    called if the message is formatted.
+
+        LOG.debug("Group %s -> %s", group,
+                  log.Lazy(lambda: [i.addr.hex for i in responders]))
+
+    The result is formatted with str() so only use it with %s.
+    """
+    __slots__ = ["func", "args"]
+
+    def __init__(self, func, *args):
+        """Constructor
+
+        Args:
+          func:   The function to call to get the argument.
+          args:   Arguments to pass to the function.
+        """
+        self.func = func
+        self.args = args
+
+    #-----------------------------------------------------------------------
+    def __str__(self):
+        return str(self.func(*self.args))
+
+    #-----------------------------------------------------------------------
+    def __repr__(self):
+        return repr(self.func(*self.args))
 
 
 #===========================================================================
@@ -117,29 +211,143 @@ class Logger(logging.getLoggerClass()):
 
     #-----------------------------------------------------------------------
     def set_ui_callback(self, callback):
-        """Add a callback for UI messages.
+        """Make a callback the active UI message callback.
 
-        The callback will be passed the logging module Record object
-        to process when a UI message is logged.  Only one UI callback can
-        be added at a time.
+        The callback will be passed the logging module Record object to
+        process when a UI message is logged.  Callbacks are stored in a
+        stack - the last callback set is the active one until it's removed
+        with del_ui_callback().  Use ui_context() to do this automatically.
 
         Args:
-          callback:   The callback function to use.
+          callback:   The callback function to use.  None can be used to
+                      turn off UI callbacks until it's removed.
         """
-        self._ui_handler = CallbackHandler(callback)
-        self.addHandler(self._ui_handler)
+        # The handler is only added once - it forwards records to the top of
+        # the callback stack.
+        if not self._ui_handler:
+            self._ui_handler = CallbackHandler(_ui_dispatch)
+            self.addHandler(self._ui_handler)
+
+        _ui_stack.append(callback)
 
     #-----------------------------------------------------------------------
     def del_ui_callback(self):
-        """Remove the UI callback handler.
+        """Remove the active UI callback.
+
+        The previously active callback (if any) becomes active again.
+        """
+        if _ui_stack:
+            _ui_stack.pop()
+
+    #-----------------------------------------------------------------------
+    def ui_callback(self):
+        """Return the active UI callback.
+
+        This is used by objects like message handlers which run later from
+        the event loop to save the callback active when they are created.
+
+        Returns:
+          Returns the active UI callback or None if there isn't one.
+        """
+        return _ui_stack[-1] if _ui_stack else None
+
+    #-----------------------------------------------------------------------
+    @contextlib.contextmanager
+    def ui_context(self, callback):
+        """Context manager to make a UI callback active.
+
+        UI messages logged in the body of the with statement are sent to the
+        callback.  The previously active callback is restored on exit.
+
+            with LOG.ui_context(callback):
+                ...
+
+        Args:
+          callback:   The callback function to use or None for no callback.
         """
-        self.removeHandler(self._ui_handler)
+        self.set_ui_callback(callback)
+        try:
+            yield callback
+        finally:
+            self.del_ui_callback()
 
     #-----------------------------------------------------------------------
 
+
+#===========================================================================
+def _ui_dispatch(record):
+    """Pass a logging record to the active UI callback.
+
+    Args:
+      record:  The logging record.
+    """
+    if _ui_stack and _ui_stack[-1] is not None:
+        _ui_stack[-1](record)
+
+
 #===========================================================================
+class DropQueueHandler(logging.handlers.QueueHandler):
+    """Logging handler that queues records for a Listener.
+
+    If the queue is full (the writer thread can't keep up), the oldest
+    queued record is dropped to make room for the new one so logging never
+    blocks the caller.  The number of dropped records is tracked in
+    num_dropped.
+    """
+    def __init__(self, records):
+        """Constructor
 
+        Args:
+          records:   (queue.Queue) The queue to write records to.
+        """
+        super().__init__(records)
+        self.num_dropped = 0
+
+    #-----------------------------------------------------------------------
+    def enqueue(self, record):
+        """Add a record to the queue.
 
+        Args:
+           record:  The logging record.
+        """
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                pass
+
+            try:
+                self.queue.get_nowait()
+                self.num_dropped += 1
+            except queue.Empty:
+                pass
+
+
+#===========================================================================
+class Listener(logging.handlers.QueueListener):
+    """Background thread that writes queued logging records.
+    """
+    def __init__(self, records, *handlers):
+        """Constructor
+
+        Args:
+          records:   (queue.Queue) The queue to read records from.
+          handlers:  The logging handlers to write the records to.
+        """
+        super().__init__(records, *handlers, respect_handler_level=True)
+
+    #-----------------------------------------------------------------------
+    def enqueue_sentinel(self):
+        """Tell the thread to stop.
+
+        The base class fails if the queue is full so this waits for the
+        thread to make room instead.
+        """
+        self.queue.put(self._sentinel)
+
+
+#===========================================================================
 class CallbackHandler(logging.Handler):
     """Logging handler object.
 
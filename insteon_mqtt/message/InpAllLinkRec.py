@@ -64,6 +64,19 @@ class InpAllLinkRec(Base):
         self.addr = addr
         self.data = data
 
+    #-----------------------------------------------------------------------
+    def to_bytes(self):
+        """Convert the message to a byte array.
+
+        Modems never receive this message but the bytes are used to
+        simulate and replay modem traffic.
+
+        Returns:
+           (bytes) Returns the message as bytes.
+        """
+        return (bytes([0x02, self.msg_code]) + self.db_flags.to_bytes() +
+                bytes([self.group]) + self.addr.to_bytes() + bytes(self.data))
+
     #-----------------------------------------------------------------------
     def __str__(self):
         return "InpAllLinkRec: %s grp: %s %s data: %#04x %#04x %#04x" % \
@@ -49,6 +49,18 @@ class InpAllLinkStatus(Base):
 
         self.is_ack = is_ack
 
+    #-----------------------------------------------------------------------
+    def to_bytes(self):
+        """Convert the message to a byte array.
+
+        Modems never receive this message but the bytes are used to
+        simulate and replay modem traffic.
+
+        Returns:
+           (bytes) Returns the message as bytes.
+        """
+        return bytes([0x02, self.msg_code, 0x06 if self.is_ack else 0x15])
+
     #-----------------------------------------------------------------------
     def __str__(self):
         return "All link status ack: %d" % self.is_ack
@@ -4,7 +4,7 @@
 #
 #===========================================================================
 import io
-import time
+from .. import clock
 from ..Address import Address
 from .Base import Base
 from .Flags import Flags
@@ -80,7 +80,21 @@ class InpStandard(Base):
         # detect duplicates.  87 msec is empirical and was found to be an OK
         # value to use with standard length messages in other Insteon
         # software (misterhouse?)
-        self.expire_time = time.time() + self.flags.hops_left * 0.087
+        self.expire_time = clock.now() + self.flags.hops_left * 0.087
+
+    #-----------------------------------------------------------------------
+    def to_bytes(self):
+        """Convert the message to a byte array.
+
+        Modems never receive this message but the bytes are used to
+        simulate and replay modem traffic.
+
+        Returns:
+           (bytes) Returns the message as bytes.
+        """
+        return (bytes([0x02, self.msg_code]) + self.from_addr.to_bytes() +
+                self.to_addr.to_bytes() + self.flags.to_bytes() +
+                bytes([self.cmd1, self.cmd2]))
 
     #-----------------------------------------------------------------------
     def __str__(self):
@@ -189,7 +203,21 @@ class InpExtended(Base):
         # detect duplicates.  183 msec is empirical and was found to be an OK
         # value to use with extended length messages in other Insteon
         # software (misterhouse?)
-        self.expire_time = time.time() + self.flags.hops_left * 0.183
+        self.expire_time = clock.now() + self.flags.hops_left * 0.183
+
+    #-----------------------------------------------------------------------
+    def to_bytes(self):
+        """Convert the message to a byte array.
+
+        Modems never receive this message but the bytes are used to
+        simulate and replay modem traffic.
+
+        Returns:
+           (bytes) Returns the message as bytes.
+        """
+        return (bytes([0x02, self.msg_code]) + self.from_addr.to_bytes() +
+                self.to_addr.to_bytes() + self.flags.to_bytes() +
+                bytes([self.cmd1, self.cmd2]) + bytes(self.data))
 
     #-----------------------------------------------------------------------
     def __str__(self):
@@ -3,7 +3,7 @@
 # MQTT leak sensor device
 #
 #===========================================================================
-import time
+from .. import clock
 from .. import log
 from .MsgTemplate import MsgTemplate
 
@@ -125,7 +125,7 @@ class Leak:
             "name" : self.device.name if self.device.name
                      else self.device.addr.hex,
             "is_heartbeat" : 1 if is_heartbeat else 0,
-            "heartbeat_str" : time.time() if is_heartbeat else "",
+            "heartbeat_str" : clock.now() if is_heartbeat else "",
             }
 
         self.msg_heartbeat.publish(self.mqtt, data)
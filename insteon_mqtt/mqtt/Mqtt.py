@@ -3,13 +3,15 @@
 # MQTT main interface
 #
 #===========================================================================
-import functools
+import inspect
 import json
-import logging
+from .. import clock
+from .. import latency
 from .. import log
 from . import config
 from .MsgTemplate import MsgTemplate
-from .Reply import Reply
+from .Session import Session
+from .TopicRouter import TopicRouter
 
 LOG = log.get_logger()
 
@@ -82,6 +84,35 @@ class Mqtt:
         CMD is the command name.  Valid commands are:
         - 'reload_all' : Delete all local device databases and re-download
           them from the devices.  This could take a long time.
+
+    Bulk Commands:
+
+      Bulk commands send commands to many devices with one message.
+
+      Topic: {CMD_TOPIC}/bulk
+
+      Payload: { 'session' : ID, 'priority' : 'normal' | 'high',
+                 'commands' : [ { 'device' : NAME, 'cmd' : CMD,
+                                  'args' : { 'ARG' : 'VALUE' ... } } ... ] }
+
+        The payload can also be just the list of commands.  All the
+        commands are checked before any are run.  If any of them
+        are invalid, nothing is sent.  Otherwise the messages are all
+        added to the modem write queue at once with the same priority and
+        a single reply with the results of every command is sent on the
+        session topic once they are all finished.
+
+        If a set of on or off commands exactly matches the responders (and
+        on levels) of a modem scene, the scene is triggered instead.  Any
+        device that the scene didn't update (no cleanup ACK) is sent the
+        command directly.
+
+    Latency:
+
+      Each inbound message starts a latency.Context that follows the
+      command through the modem to the state publish.  The per stage
+      histograms (see latency.Recorder.stats) are published with the
+      channel metrics.
     """
     def __init__(self, mqtt_link, modem):
         self.modem = modem
@@ -89,15 +120,56 @@ class Mqtt:
 
         self.link = mqtt_link
         self.link.signal_connected.connect(self.handle_connected)
+        self.link.signal_message.connect(self.handle_message)
 
         # Map of Address ID to MQTT device.
         self.devices = {}
 
+        # Devices register their input topics with the router.  The broker
+        # subscriptions are a small set of wildcard filters that cover those
+        # topics and inbound messages are routed locally.  _filters is the
+        # set of filters currently subscribed to on the broker.
+        self.router = TopicRouter()
+        self._filters = set()
+
         self._cmd_topic = None
         self._qos = 1
         self._retain = True
         self._config = None
 
+        # Cached device states are published when we first connect.  This
+        # template is used to publish the age of each cached state.
+        self.msg_state_age = MsgTemplate(
+            topic='insteon/{{address}}/state_age',
+            payload='{ "age" : {{age}}, "time" : {{time}} }',
+            )
+        self.modem.state_cache.signal_restored.connect(self.handle_restored)
+
+        # Device availability template.  This is published when a device
+        # circuit breaker opens or closes.
+        self.msg_available = MsgTemplate(
+            topic='insteon/{{address}}/available',
+            payload='{{available_str}}',
+            )
+
+        # Insteon channel metrics template (see Channel.stats).  This is
+        # published every metrics_interval seconds while connected.
+        self.msg_metrics = MsgTemplate(
+            topic='insteon/metrics',
+            payload='{{json}}',
+            )
+        self._metrics_interval = 60
+        self._metrics_time = 0
+
+        # Command latency histogram template (see latency.Recorder.stats).
+        # This is published with the metrics once commands have been
+        # traced.
+        self.msg_latency = MsgTemplate(
+            topic='insteon/latency',
+            payload='{{json}}',
+            )
+        self.modem.protocol.signal_poll.connect(self.poll)
+
     #-----------------------------------------------------------------------
     def load_config(self, data):
         """Load a configuration dictionary.
@@ -119,6 +191,21 @@ class Mqtt:
                        Insteont device changes.
         - cmd_topic:   (str) The MQTT topic prefix to subscribe to for
                        system commands.
+        - state_age_topic:   (str) The topic template to publish the age of
+                             cached device states with at start up.
+        - state_age_payload: (str) The payload template for the state age.
+        - available_topic:   (str) The topic template to publish device
+                             availability with.
+        - available_payload: (str) The payload template for the device
+                             availability.
+        - metrics_topic:     (str) The topic template to publish the channel
+                             metrics with.
+        - metrics_payload:   (str) The payload template for the metrics.
+        - metrics_interval:  (int) Seconds between metrics messages.  0 to
+                             disable them.
+        - latency_topic:     (str) The topic template to publish the command
+                             latency histograms with.
+        - latency_payload:   (str) The payload template for the latency.
 
         Args:
           data:   (dict) Configuration data to load.
@@ -129,6 +216,16 @@ class Mqtt:
         self._cmd_topic = MsgTemplate.clean_topic(data['cmd_topic'])
         self._qos = data.get('qos', 1)
         self._retain = data.get('retain', True)
+        self.msg_state_age.load_config(data, 'state_age_topic',
+                                       'state_age_payload', self._qos)
+        self.msg_available.load_config(data, 'available_topic',
+                                       'available_payload', self._qos)
+        self.msg_metrics.load_config(data, 'metrics_topic',
+                                     'metrics_payload', self._qos)
+        self._metrics_interval = data.get('metrics_interval',
+                                          self._metrics_interval)
+        self.msg_latency.load_config(data, 'latency_topic',
+                                     'latency_payload', self._qos)
 
         # Save the config for later passing to devices when they are
         # created.
@@ -152,6 +249,7 @@ class Mqtt:
         """
         qos = self._qos if qos is None else qos
         retain = self._retain if retain is None else retain
+        latency.mark("publish")
         self.link.publish(topic, payload, qos, retain)
 
     #-----------------------------------------------------------------------
@@ -172,8 +270,82 @@ class Mqtt:
           connected: (bool) True if connected, False if disconnected.
         """
         if connected:
+            # After a reconnect, the broker may not have our old
+            # subscriptions so make sure they are all sent again.
+            self._filters = set()
             self._subscribe()
 
+            # Publish the cached device states.  This only happens on the
+            # first connection.
+            self.modem.state_cache.replay()
+
+    #-----------------------------------------------------------------------
+    def poll(self, t):
+        """Periodic polling function.
+
+        Publishes the channel metrics and command latency histograms when
+        the metrics interval has passed.
+
+        Args:
+           t:   (float) Current Unix clock time tag.
+        """
+        if (self._metrics_interval <= 0 or not self.link.connected or
+                t < self._metrics_time):
+            return
+
+        self._metrics_time = t + self._metrics_interval
+
+        stats = self.modem.protocol.channel.stats(t)
+        data = dict(stats)
+        data["time"] = int(t)
+        data["json"] = json.dumps(stats)
+        self.msg_metrics.publish(self, data)
+
+        recorder = self.modem.protocol.latency
+        if recorder.num_traces:
+            stats = recorder.stats()
+            data = {"time" : int(t), "traces" : stats["traces"],
+                    "json" : json.dumps(stats)}
+            self.msg_latency.publish(self, data)
+
+    #-----------------------------------------------------------------------
+    def handle_restored(self, device, age):
+        """Cached device state callback.
+
+        This is called after the cached state of a device has been
+        published at start up and publishes the age of that state.
+
+        Args:
+          device:  (device.Base) The Insteon device.
+          age:     (float) The age of the cached state in seconds.
+        """
+        data = {
+            "address" : device.addr.hex,
+            "name" : device.name if device.name else device.addr.hex,
+            "age" : int(age),
+            "time" : int(clock.now() - age),
+            }
+        self.msg_state_age.publish(self, data)
+
+    #-----------------------------------------------------------------------
+    def handle_available(self, device, available):
+        """Device availability callback.
+
+        This is called when a device circuit breaker opens or closes and
+        publishes the device availability.
+
+        Args:
+          device:     (device.Base) The Insteon device.
+          available:  (bool) True if the device is responding.
+        """
+        data = {
+            "address" : device.addr.hex,
+            "name" : device.name if device.name else device.addr.hex,
+            "available" : 1 if available else 0,
+            "available_str" : "online" if available else "offline",
+            }
+        self.msg_available.publish(self, data)
+
     #-----------------------------------------------------------------------
     def handle_new_device(self, modem, device):
         """New Insteon device callback.
@@ -204,18 +376,62 @@ class Mqtt:
         # Save the MQTT device so we can find it again.
         self.devices[device.addr.id] = obj
 
+        # Publish the device availability when it changes.
+        breaker = getattr(device, "breaker", None)
+        if breaker is not None:
+            breaker.signal_state.connect(self.handle_available)
+
+        # If we're already connected, add the device topics to the router
+        # and update the broker subscriptions if they need to change.
+        if self.link.connected:
+            obj.subscribe(self.router, self._qos)
+            self._sync_filters()
+
+    #-----------------------------------------------------------------------
+    def handle_message(self, link, message):
+        """MQTT inbound message callback.
+
+        This is called for every message that arrives on one of the
+        subscribed topic filters.  The router finds the device callback
+        registered for the topic and passes the message to it.
+
+        The callback is run with a new latency trace active so the
+        handlers of any commands it sends carry the trace through to the
+        state publish.
+
+        Args:
+          link:     (network.Mqtt) The MQTT network link.
+          message:  Paho.mqtt message object.  Has attributes topic and
+                    payload.
+        """
+        trace = self.modem.protocol.latency.start(message.topic)
+        with latency.context(trace):
+            self.router.route(link, message)
+
+        if trace:
+            trace.end()
+
     #-----------------------------------------------------------------------
     def handle_cmd(self, client, data, message):
         """MQTT command message callback.
 
-        TODO: doc
+        This is called when an MQTT message is received on the command
+        topic.  The device name/address is the last element of the topic
+        and the payload is a JSON dictionary with the command name and any
+        arguments:  { 'cmd' : 'CMD', 'ARG' : 'VALUE' ... }
 
-        This is called when an MQTT message is received.  Check it's
-        topic and pass it off to the correct handler.
+        If the payload has a 'session' key, the UI log messages for the
+        command are published on the topic 'TOPIC/session/SESSION' and an
+        END reply is sent when the command finishes.  Each command gets it's
+        own Session object which is carried through the message handlers
+        (see log.Logger.ui_context) so multiple commands can be run at the
+        same time without mixing up their replies.
 
         Args:
-          link:  (network.Link) The MQTT link the message was read from.
-          msg:   Paho.mqtt message object.  has attributes topic and pyaload.
+          client:   (network.Link) The MQTT link the message was read from.
+          data:     User data (unused).
+          message:  Paho.mqtt message object.  Has attributes topic and
+                    payload.
         """
         LOG.info("MQTT message %s %s", message.topic, message.payload)
 
@@ -227,20 +443,281 @@ class Mqtt:
                           message.payload)
             return
 
-        # TODO: docs
-        end_reply = lambda *x: None
+        session = None
         if "session" in data:
             reply_topic = "%s/session/%s" % (message.topic,
                                              data.pop("session"))
-            reply_cb = functools.partial(self.handle_reply, topic=reply_topic)
-            LOG.set_ui_callback(reply_cb)
+            session = Session(self.link, reply_topic)
+
+        with LOG.ui_context(session):
+            self._run_cmd(message.topic, data, session)
+
+    #-----------------------------------------------------------------------
+    def handle_bulk(self, client, data, message):
+        """MQTT bulk command message callback.
 
-            end_reply = functools.partial(self.handle_reply, None,
-                                          topic=reply_topic)
+        This is called when an MQTT message is received on the bulk command
+        topic.  See the class docs for the payload format.
+
+        Args:
+          client:   (network.Link) The MQTT link the message was read from.
+          data:     User data (unused).
+          message:  Paho.mqtt message object.  Has attributes topic and
+                    payload.
+        """
+        LOG.info("MQTT message %s %s", message.topic, message.payload)
+
+        # Decode the JSON payload.
+        try:
+            data = json.loads(message.payload.decode("utf-8"))
+        except:
+            LOG.exception("Error decoding bulk command payload: %s",
+                          message.payload)
+            return
+
+        # A bare list is the list of commands with the default options.
+        if isinstance(data, list):
+            data = {"commands" : data}
+
+        elif not isinstance(data, dict):
+            LOG.error("Bulk command rejected: Input must be a JSON "
+                      "dictionary or list: %s", message.payload)
+            return
+
+        session = None
+        if "session" in data:
+            reply_topic = "%s/session/%s" % (message.topic,
+                                             data.pop("session"))
+            session = Session(self.link, reply_topic)
+
+        with LOG.ui_context(session):
+            self._run_bulk(data, session)
+
+    #-----------------------------------------------------------------------
+    def _run_bulk(self, data, session):
+        """Run a set of bulk commands.
+
+        This should be called with the session's UI context active.
+
+        Args:
+          data:     (dict) The bulk command payload with the session removed.
+          session:  (Session) The reply session or None if there isn't one.
+        """
+        # pylint: disable=too-many-locals,too-many-statements
+        def end_reply():
+            if session:
+                session.end()
+
+        priority = data.get("priority", "normal")
+        commands = data.get("commands", None)
+
+        # Check every command before sending any of them.
+        errors = []
+        if priority not in ("normal", "high"):
+            errors.append("Invalid priority '%s'" % priority)
+
+        if not isinstance(commands, list) or not commands:
+            errors.append("Input has no 'commands' list")
+            commands = []
+
+        jobs = []
+        for i, entry in enumerate(commands):
+            try:
+                jobs.append(self._bulk_job(entry))
+            except ValueError as e:
+                errors.append("Command %d: %s" % (i, e))
+
+        if errors:
+            for msg in errors:
+                LOG.error("Bulk command rejected: %s", msg)
+            end_reply()
+            return
+
+        LOG.info("Running %d bulk commands with %s priority", len(jobs),
+                 priority)
+
+        results = [None] * len(jobs)
+        remaining = [len(jobs)]
+
+        def done(idx, success, msg):
+            # Each command is only counted once even if it's callback runs
+            # more than once (or runs and then raises).
+            if results[idx]["success"] is not None:
+                return
+
+            results[idx]["success"] = success
+            results[idx]["message"] = msg
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+
+            # All the commands are finished - send a single reply with the
+            # results.
+            num_ok = sum(1 for r in results if r["success"])
+            with LOG.ui_context(session):
+                log_func = LOG.ui if num_ok == len(results) else LOG.error
+                log_func(json.dumps({"total" : len(results),
+                                     "success" : num_ok,
+                                     "results" : results}))
+            end_reply()
+
+        protocol = self.modem.protocol
+
+        def run_job(idx):
+            device, cmd, cmd_func, args = jobs[idx]
+
+            def on_done(success, msg, data):
+                done(idx, success, msg)
+
+            try:
+                cmd_func(on_done=on_done, **args)
+            except Exception as e:
+                LOG.exception("Error running command %s on device %s", cmd,
+                              device.label)
+                done(idx, False, str(e))
+
+        def run_scene(group, is_on, idxs):
+            def on_done(success, msg, data):
+                # Any device the scene didn't update (see
+                # handler.ModemScene) gets the original command sent
+                # directly to it.
+                applied = data["applied"] if success and data else []
+                with LOG.ui_context(None), protocol.batch(priority == "high"):
+                    for idx in idxs:
+                        if jobs[idx][0].addr in applied:
+                            done(idx, True, "Set by modem scene %d" % group)
+                        else:
+                            LOG.info("No scene %d ACK from %s - sending "
+                                     "direct command", group,
+                                     jobs[idx][0].label)
+                            run_job(idx)
+
+            self.modem.scene(is_on, group, on_done=on_done)
+
+        for idx, (device, cmd, cmd_func, args) in enumerate(jobs):
+            results[idx] = {"device" : device.label, "cmd" : cmd,
+                            "success" : None, "message" : None}
+
+        # Commands that exactly match a modem scene are sent as a single
+        # scene broadcast instead of one message per device.
+        scenes = self._bulk_scenes(jobs)
+        in_scene = set(idx for group, is_on, idxs in scenes for idx in idxs)
+
+        # Each command runs w/o a UI context so only the summary is sent to
+        # the session.  The messages are all queued at once when the batch
+        # ends.
+        with LOG.ui_context(None), protocol.batch(priority == "high"):
+            for group, is_on, idxs in scenes:
+                LOG.info("Sending %d bulk commands as modem scene %d",
+                         len(idxs), group)
+                run_scene(group, is_on, idxs)
+
+            for idx in range(len(jobs)):
+                if idx not in in_scene:
+                    run_job(idx)
+
+    #-----------------------------------------------------------------------
+    def _bulk_scenes(self, jobs):
+        """Find bulk commands that can be sent as a modem scene.
+
+        Simple on and off commands are grouped by level.  If the devices in
+        a group exactly match the responders of a modem scene (see
+        Modem.find_scene), the scene can be used instead.  Each group is
+        also recorded in the modem SceneTracker.
+
+        Args:
+          jobs:   [(device, cmd, cmd_func, args)] The bulk commands.
+
+        Returns:
+          [(group, is_on, [idx])] Returns a list of the modem group, the
+          scene command, and the job indices that the scene replaces.
+        """
+        sets = {}
+        for idx, (device, cmd, cmd_func, args) in enumerate(jobs):
+            if cmd == "on" and set(args) <= set(["level"]):
+                key = (True, args.get("level", 0xff))
+            elif cmd == "off" and not args:
+                key = (False, None)
+            else:
+                continue
+
+            sets.setdefault(key, []).append(idx)
+
+        scenes = []
+        for (is_on, level), idxs in sorted(sets.items(), key=str):
+            targets = {jobs[i][0].addr : level for i in idxs}
+            if len(idxs) < 2 or len(targets) != len(idxs):
+                continue
+
+            group = self.modem.find_scene(is_on, targets)
+            if group is not None:
+                scenes.append((group, is_on, idxs))
+
+            # Track the sets so frequently used ones can be turned into
+            # modem scenes.
+            self.modem.scene_tracker.record(is_on, targets, group)
+
+        return scenes
+
+    #-----------------------------------------------------------------------
+    def _bulk_job(self, entry):
+        """Check a single bulk command entry.
+
+        Args:
+          entry:   (dict) The bulk command with keys device, cmd, and
+                   optionally args.
+
+        Returns:
+          Returns the tuple (device, cmd, cmd_func, args).
+
+        Raises:
+          ValueError if the command is not valid.
+        """
+        if not isinstance(entry, dict):
+            raise ValueError("Input must be a dictionary")
+
+        device = self.modem.find(entry.get("device", None))
+        if not device:
+            raise ValueError("Unknown Insteon device '%s'" %
+                             entry.get("device", None))
+
+        cmd = entry.get("cmd", None)
+        cmd_func = device.cmd_map.get(cmd, None)
+        if not cmd_func:
+            raise ValueError("Unknown command '%s' for device type %s" %
+                             (cmd, device.type()))
+
+        args = entry.get("args", {})
+        if not isinstance(args, dict):
+            raise ValueError("Command args must be a dictionary")
+
+        # Make sure the arguments match what the command accepts.
+        try:
+            inspect.signature(cmd_func).bind(on_done=None, **args)
+        except TypeError as e:
+            raise ValueError("Invalid args for command '%s': %s" % (cmd, e))
+
+        return (device, cmd, cmd_func, args)
+
+    #-----------------------------------------------------------------------
+    def _run_cmd(self, topic, data, session):
+        """Run a command on a device.
+
+        This should be called with the session's UI context active.
+
+        Args:
+          topic:    (str) The command topic.  The device name/address is the
+                    last element of the topic.
+          data:     (dict) The command payload with the session removed.
+          session:  (Session) The reply session or None if there isn't one.
+        """
+        def end_reply():
+            if session:
+                session.end()
 
         # Extract the device name/address from the topic and use
         # it to find the device object to handle the command.
-        device_id = message.topic.split("/")[-1]
+        device_id = topic.split("/")[-1]
         device = self.modem.find(device_id)
         if not device:
             LOG.error("Unknown Insteon device '%s'", device_id)
@@ -267,10 +744,13 @@ class Mqtt:
             return
 
         def on_done(success, msg, data):
-            if success:
-                LOG.ui(msg)
-            else:
-                LOG.error(msg)
+            # The callback may be run from a different context (a handler
+            # for some other command) so make sure the session is active.
+            with LOG.ui_context(session):
+                if success:
+                    LOG.ui(msg)
+                else:
+                    LOG.error(msg)
             end_reply()
 
         try:
@@ -282,43 +762,72 @@ class Mqtt:
                           device.label)
             end_reply()
 
-    #-----------------------------------------------------------------------
-    def handle_reply(self, record, topic):
-        """: TODO: doc
-        """
-        if record is None:
-            LOG.del_ui_callback()
-            reply = Reply(Reply.Type.END)
-        else:
-            type = Reply.Type.MESSAGE
-            if record.levelno >= logging.ERROR:
-                type = Reply.Type.ERROR
-
-            reply = Reply(type, record.msg % record.args)
-
-        payload = reply.to_json()
-        self.link.publish(topic, payload)
-
     #-----------------------------------------------------------------------
     def _subscribe(self):
         """Subscribe to the command and set topics.
+
+        The command and device topics are registered with the router and
+        then the broker is subscribed to the wildcard filters that cover
+        them.
         """
+        self.router.clear()
         if self._cmd_topic:
-            self.link.subscribe(self._cmd_topic + "/+", self._qos,
-                                self.handle_cmd)
+            self.router.subscribe(self._cmd_topic + "/+", self._qos,
+                                  self.handle_cmd)
+            self.router.subscribe(self._cmd_topic + "/bulk", self._qos,
+                                  self.handle_bulk)
 
         for device in self.devices.values():
-            device.subscribe(self.link, self._qos)
+            device.subscribe(self.router, self._qos)
+
+        self._sync_filters()
 
     #-----------------------------------------------------------------------
     def _unsubscribe(self):
         """Unsubscribe to the command and set topics.
         """
-        if self._cmd_topic:
-            self.link.unsubscribe(self._cmd_topic + "/+")
+        self.router.clear()
+        self._sync_filters()
 
-        for device in self.devices.values():
-            device.unsubscribe(self.link)
+    #-----------------------------------------------------------------------
+    def _sync_filters(self):
+        """Update the broker subscriptions to match the router.
+
+        Only filters that have changed are subscribed or unsubscribed so
+        adding a device usually doesn't send anything to the broker.
+        """
+        filters = set(self.router.filters(self._outputs()))
+
+        for topic in sorted(filters - self._filters):
+            self.link.subscribe(topic, self._qos)
+
+        for topic in sorted(self._filters - filters):
+            self.link.unsubscribe(topic)
+
+        LOG.info("MQTT routing %d topics with %d subscriptions",
+                 len(self.router), len(filters))
+        self._filters = filters
+
+    #-----------------------------------------------------------------------
+    def _outputs(self):
+        """Return topic filters for the topics we publish to.
+
+        These are the filters of all the message templates (see
+        MsgTemplate.topic_filter) that don't cover any of the topics
+        registered with the router.  The rest are input templates.
+
+        Returns:
+          [str] Returns the list of output topic filters.
+        """
+        outputs = set()
+        for obj in [self] + list(self.devices.values()):
+            for template in vars(obj).values():
+                if isinstance(template, MsgTemplate):
+                    outputs.add(template.topic_filter())
+
+        return sorted(i for i in outputs if i and
+                      not any(self.router.covers(i, topic)
+                              for topic in self.router))
 
     #-----------------------------------------------------------------------
 
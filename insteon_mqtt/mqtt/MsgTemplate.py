@@ -95,6 +95,21 @@ class MsgTemplate:
         """
         return self._render(self.topic_str, self.topic, data, silent)
 
+    #-----------------------------------------------------------------------
+    def topic_filter(self):
+        """Return an MQTT topic filter that matches every rendered topic.
+
+        Each topic level that uses a template variable is replaced with a
+        '+' wildcard.  So 'insteon/{{address}}/state' becomes
+        'insteon/+/state'.
+
+        Returns:
+          (str) Returns the topic filter.  This is empty if the topic
+          template is empty.
+        """
+        levels = self.clean_topic(self.topic_str).split("/")
+        return "/".join("+" if "{" in i else i for i in levels)
+
     #-----------------------------------------------------------------------
     def render_payload(self, data, silent=False):
         """Render the payload template.
@@ -0,0 +1,77 @@
+#===========================================================================
+#
+# MQTT command session class
+#
+#===========================================================================
+import logging
+from .. import log
+from .Reply import Reply
+
+LOG = log.get_logger()
+
+
+class Session:
+    """MQTT command session.
+
+    A session is created for each command that arrives with a 'session' id
+    in the payload.  It's used as the UI logging callback (see
+    log.Logger.ui_context) for that command so the UI messages generated by
+    the command are published as Reply objects on the session topic.  The
+    message handlers save the active callback so replies continue to go to
+    the correct session as the command runs.  That allows any number of
+    commands to be running at the same time, each with it's own reply
+    stream.
+    """
+    def __init__(self, link, topic):
+        """Constructor
+
+        Args:
+          link:    (network.Mqtt) The MQTT link to publish replies to.
+          topic:   (str) The session reply topic.
+        """
+        self.link = link
+        self.topic = topic
+
+        # Set to False once the END reply has been sent.  Any messages
+        # logged after that are ignored.
+        self.active = True
+
+    #-----------------------------------------------------------------------
+    def __call__(self, record):
+        """UI logging callback.
+
+        Args:
+          record:  The logging record to publish.
+        """
+        if not self.active:
+            return
+
+        type = Reply.Type.MESSAGE
+        if record.levelno >= logging.ERROR:
+            type = Reply.Type.ERROR
+
+        self.publish(Reply(type, record.getMessage()))
+
+    #-----------------------------------------------------------------------
+    def end(self):
+        """End the session.
+
+        This sends the END reply to tell the remote client that the command
+        is finished.  Calling this more than once does nothing.
+        """
+        if not self.active:
+            return
+
+        self.publish(Reply(Reply.Type.END))
+        self.active = False
+
+    #-----------------------------------------------------------------------
+    def publish(self, reply):
+        """Publish a reply on the session topic.
+
+        Args:
+          reply:   (Reply) The reply to send.
+        """
+        self.link.publish(self.topic, reply.to_json())
+
+    #-----------------------------------------------------------------------
@@ -0,0 +1,350 @@
+#===========================================================================
+#
+# MQTT local topic router
+#
+#===========================================================================
+import functools
+from .. import log
+
+LOG = log.get_logger()
+
+
+class TopicRouter:
+    """Local MQTT topic router.
+
+    Devices register the topics they want to receive with the router using
+    the same subscribe() and unsubscribe() API as the network.Mqtt link.
+    Instead of sending a SUBSCRIBE packet to the broker for every device
+    topic, the main Mqtt class asks the router for a small set of wildcard
+    filters (see filters()) that cover all the registered topics and only
+    subscribes to those.  Inbound messages are then routed locally by
+    walking a trie of the topic levels so the cost of routing a message is
+    proportional to the topic depth, not the number of devices.
+
+    If more than one registered topic matches an inbound message, the most
+    specific one is used: a literal level is preferred over a '+' level
+    which is preferred over a '#' level.
+    """
+    # Minimum number of topics that must share a wildcard filter before it
+    # will be used instead of subscribing to the topic directly.
+    min_group = 2
+
+    #-----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor
+        """
+        # Root node of the topic level trie.
+        self._root = Node()
+
+        # Map of registered topic filter -> callback.
+        self._callbacks = {}
+
+    #-----------------------------------------------------------------------
+    def __len__(self):
+        """Return the number of registered topics.
+        """
+        return len(self._callbacks)
+
+    #-----------------------------------------------------------------------
+    def __iter__(self):
+        """Return an iterator over the registered topics.
+        """
+        return iter(self._callbacks)
+
+    #-----------------------------------------------------------------------
+    def subscribe(self, topic, qos=0, callback=None):
+        """Register a topic with the router.
+
+        The API matches network.Mqtt.subscribe() so that MQTT device classes
+        can be passed the router in place of the link.  The callback
+        signature is:
+           func(client, user_data, message)
+
+        Args:
+          topic:    (str) The topic to register.  This may contain MQTT
+                    wildcards ('+' and '#').
+          qos:      (int) The quality of service level.  This is ignored -
+                    the main Mqtt class sets the QOS of the broker
+                    subscriptions.
+          callback: The message callback to use.
+        """
+        node = self._root
+        for level in topic.split("/"):
+            node = node.children.setdefault(level, Node())
+
+        node.callback = callback
+        self._callbacks[topic] = callback
+
+    #-----------------------------------------------------------------------
+    def unsubscribe(self, topic):
+        """Remove a topic from the router.
+
+        Args:
+          topic:   (str) The topic to remove.  If it isn't registered,
+                   nothing is done.
+        """
+        if self._callbacks.pop(topic, None) is None:
+            return
+
+        # Walk down the trie, then remove any nodes that are no longer
+        # needed on the way back up.
+        path = [self._root]
+        levels = topic.split("/")
+        for level in levels:
+            path.append(path[-1].children[level])
+
+        path[-1].callback = None
+        for i in range(len(levels), 0, -1):
+            node = path[i]
+            if node.callback is not None or node.children:
+                break
+
+            del path[i - 1].children[levels[i - 1]]
+
+    #-----------------------------------------------------------------------
+    def clear(self):
+        """Remove all the registered topics.
+        """
+        self._root = Node()
+        self._callbacks = {}
+
+    #-----------------------------------------------------------------------
+    def find(self, topic):
+        """Find the callback to use for a topic.
+
+        Args:
+          topic:   (str) The topic of the inbound message.
+
+        Returns:
+          Returns the registered callback or None if no topic matches.
+        """
+        levels = topic.split("/")
+        return self._find(self._root, levels, 0)
+
+    #-----------------------------------------------------------------------
+    def route(self, client, message):
+        """Route an inbound message to the registered callback.
+
+        Args:
+          client:   The MQTT client (or link) the message was read from.
+          message:  Paho.mqtt message object.  Has attributes topic and
+                    payload.
+
+        Returns:
+          (bool) Returns True if a callback was found for the message.
+        """
+        callback = self.find(message.topic)
+        if callback is None:
+            LOG.debug("No MQTT route for topic %s", message.topic)
+            return False
+
+        callback(client, None, message)
+        return True
+
+    #-----------------------------------------------------------------------
+    def filters(self, outputs=None):
+        """Return the wildcard filters that cover all the registered topics.
+
+        Topics are grouped by replacing a single level with a '+' wildcard.
+        The wildcard that covers the most topics is selected first and this
+        is repeated until the remaining topics can't be grouped.  So the
+        default device topics (insteon/ADDRESS/set, insteon/ADDRESS/level,
+        etc) turn into one filter per command type (insteon/+/set).
+
+        Only levels that change from device to device are replaced.  The
+        device that registered a topic is the object that owns the callback
+        so a group with two topics from the same device is never used.
+        Otherwise the command level of a single keypad (insteon/ADDRESS/set/1
+        and insteon/ADDRESS/scene/1) would turn into insteon/ADDRESS/+/1
+        which also matches the insteon/ADDRESS/state/1 topic we publish.  As
+        a second check, any group filter that overlaps one of the outputs is
+        not used.
+
+        Args:
+          outputs:  [str] Topic filters for the topics that are published
+                    (see MsgTemplate.topic_filter).  None for no outputs.
+
+        Returns:
+          [str] Returns the sorted list of topic filters to subscribe to.
+        """
+        outputs = [i for i in (outputs or []) if i]
+        remaining = set(self._callbacks)
+        results = set()
+
+        while remaining:
+            # Map of group filter -> {owner : topic}.  Groups are set to
+            # None if they can't be used.
+            groups = {}
+            for topic in remaining:
+                owner = self._owner(self._callbacks[topic])
+                levels = topic.split("/")
+                for i, level in enumerate(levels):
+                    if level in ("+", "#"):
+                        continue
+
+                    key = "/".join(levels[:i] + ["+"] + levels[i + 1:])
+                    if key not in groups:
+                        groups[key] = {}
+                        if any(self.overlaps(key, out) for out in outputs):
+                            groups[key] = None
+
+                    topics = groups[key]
+                    if topics is None:
+                        continue
+                    elif owner in topics:
+                        groups[key] = None
+                    else:
+                        topics[owner] = topic
+
+            # Pick the largest group.  Use the key for ties so the results
+            # don't change from run to run.
+            best = None
+            for key, topics in groups.items():
+                if topics is None:
+                    continue
+                elif (best is None or
+                      (len(topics), key) > (len(best[1]), best[0])):
+                    best = (key, topics)
+
+            if best is None or len(best[1]) < self.min_group:
+                results.update(remaining)
+                break
+
+            key, topics = best
+            results.add(key)
+            remaining -= set(topics.values())
+            remaining.discard(key)
+
+        # Drop any filters that are covered by another filter.  Overlapping
+        # subscriptions can make the broker deliver a message more than once.
+        wildcards = [i for i in results if "+" in i or "#" in i]
+        return sorted(i for i in results
+                      if not any(w != i and self.covers(w, i)
+                                 for w in wildcards))
+
+    #-----------------------------------------------------------------------
+    @staticmethod
+    def covers(filter, topic):
+        """Return True if a filter matches every topic another filter does.
+
+        Args:
+          filter:  (str) The topic filter to check with.
+          topic:   (str) The topic or topic filter to check.
+
+        Returns:
+          (bool) Returns True if everything matched by topic is also matched
+          by filter.
+        """
+        levels = topic.split("/")
+        for i, level in enumerate(filter.split("/")):
+            if level == "#":
+                return True
+            elif i >= len(levels) or levels[i] == "#":
+                return False
+            elif level != "+" and level != levels[i]:
+                return False
+
+        return len(filter.split("/")) == len(levels)
+
+    #-----------------------------------------------------------------------
+    @staticmethod
+    def overlaps(filter1, filter2):
+        """Return True if there is a topic that both filters match.
+
+        Args:
+          filter1:  (str) The first topic or topic filter.
+          filter2:  (str) The second topic or topic filter.
+
+        Returns:
+          (bool) Returns True if at least one topic matches both filters.
+        """
+        levels1 = filter1.split("/")
+        levels2 = filter2.split("/")
+        for level1, level2 in zip(levels1, levels2):
+            if level1 == "#" or level2 == "#":
+                return True
+            elif level1 != "+" and level2 != "+" and level1 != level2:
+                return False
+
+        # 'a/#' also matches the parent level 'a'.
+        longer = levels1 if len(levels1) > len(levels2) else levels2
+        return (len(levels1) == len(levels2) or
+                longer[min(len(levels1), len(levels2)):] == ["#"])
+
+    #-----------------------------------------------------------------------
+    @staticmethod
+    def _owner(callback):
+        """Return the object that registered a callback.
+
+        Args:
+          callback:  The registered callback.
+
+        Returns:
+          Returns the object the method is bound to (unwrapping any
+          functools.partial) or the callback itself.
+        """
+        while isinstance(callback, functools.partial):
+            callback = callback.func
+
+        return getattr(callback, "__self__", callback)
+
+    #-----------------------------------------------------------------------
+    def _find(self, node, levels, idx):
+        """Recursively search the trie for a matching callback.
+
+        Args:
+          node:    (Node) The current trie node.
+          levels:  [str] The inbound topic levels.
+          idx:     (int) The index of the level to match in node.
+
+        Returns:
+          Returns the matching callback or None if there is no match.
+        """
+        if idx == len(levels):
+            if node.callback is not None:
+                return node.callback
+
+            # 'a/#' also matches the parent level 'a'.
+            child = node.children.get("#", None)
+            return child.callback if child is not None else None
+
+        level = levels[idx]
+        child = node.children.get(level, None)
+        if child is not None:
+            callback = self._find(child, levels, idx + 1)
+            if callback is not None:
+                return callback
+
+        # Wildcards don't match topics that start with '$'.
+        if idx == 0 and level.startswith("$"):
+            return None
+
+        child = node.children.get("+", None)
+        if child is not None:
+            callback = self._find(child, levels, idx + 1)
+            if callback is not None:
+                return callback
+
+        child = node.children.get("#", None)
+        if child is not None:
+            return child.callback
+
+        return None
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+class Node:
+    """Topic trie node.
+
+    Each node represents one topic level.  Child nodes are stored by level
+    string and the callback is set if a topic ends at this node.
+    """
+    def __init__(self):
+        """Constructor
+        """
+        self.children = {}
+        self.callback = None
+
+#===========================================================================
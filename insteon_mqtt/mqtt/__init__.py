@@ -31,5 +31,7 @@ from .MsgTemplate import MsgTemplate
 from .Outlet import Outlet
 from .Remote import Remote
 from .Reply import Reply
+from .Session import Session
 from .SmokeBridge import SmokeBridge
 from .Switch import Switch
+from .TopicRouter import TopicRouter
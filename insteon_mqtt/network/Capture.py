@@ -0,0 +1,129 @@
+#===========================================================================
+#
+# Serial link traffic capture.
+#
+#===========================================================================
+from .. import clock
+from .. import log
+from ..Trace import Trace
+
+LOG = log.get_logger(__name__)
+
+
+class Capture:
+    """Serial link capture file writer.
+
+    This taps the read and write signals of a link (usually a Serial link
+    to the PLM) and writes every chunk of bytes read or written to a
+    capture file along with the time it happened.  The file uses the Trace
+    binary format (with Unix times) so it can be converted to text with
+    the trace-decode command and played back with the Replay link.
+
+    The file is buffered and only flushed once a second (and when the link
+    closes) so the tap doesn't slow down the link.
+    """
+    # Maximum time in seconds between file flushes.
+    flush_dt = 1.0
+
+    #-----------------------------------------------------------------------
+    def __init__(self, path):
+        """Constructor
+
+        The file isn't opened until the first record is written.
+
+        Args:
+          path:   (str) The capture file to write.
+        """
+        self.path = path
+        self.num_records = 0
+        self._file = None
+        self._flush_time = 0
+
+    #-----------------------------------------------------------------------
+    def tap(self, link):
+        """Capture the traffic on a link.
+
+        Args:
+          link:   (Link) The link to capture.  This must have signal_read
+                  and signal_wrote signals.
+        """
+        link.signal_read.connect(self._read)
+        link.signal_wrote.connect(self._wrote)
+        link.signal_closing.connect(self._closing)
+
+    #-----------------------------------------------------------------------
+    def record(self, kind, data, t=None):
+        """Write a record to the capture file.
+
+        Args:
+          kind:   (int) The record type: Trace.READ or Trace.WRITE.
+          data:   (bytes) The bytes that were read or written.
+          t:      (float) The Unix time of the record.  None to use
+                  clock.now().
+        """
+        t = clock.now() if t is None else t
+
+        try:
+            if self._file is None:
+                self._file = open(self.path, "wb")
+                self._file.write(Trace.header(0.0))
+                self._flush_time = t + self.flush_dt
+                LOG.info("Capturing link traffic to %s", self.path)
+
+            self._file.write(Trace.pack(t, kind, data))
+            self.num_records += 1
+
+            if t >= self._flush_time:
+                self.flush()
+                self._flush_time = t + self.flush_dt
+
+        except OSError:
+            LOG.exception("Error writing capture file %s", self.path)
+
+    #-----------------------------------------------------------------------
+    def flush(self):
+        """Flush any buffered records to the capture file.
+        """
+        if self._file:
+            self._file.flush()
+
+    #-----------------------------------------------------------------------
+    def close(self):
+        """Close the capture file.
+        """
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    #-----------------------------------------------------------------------
+    def _read(self, link, data):
+        """Callback when data is read from the link.
+
+        Args:
+          link:   (Link) The link that was read from.
+          data:   (bytes) The bytes that were read.
+        """
+        self.record(Trace.READ, data)
+
+    #-----------------------------------------------------------------------
+    def _wrote(self, link, data):
+        """Callback when data is written to the link.
+
+        Args:
+          link:   (Link) The link that was written to.
+          data:   (bytes) The bytes that were written.
+        """
+        self.record(Trace.WRITE, data)
+
+    #-----------------------------------------------------------------------
+    def _closing(self, link):
+        """Callback when the link is closing.
+
+        The file is flushed but left open in case the link reconnects.
+
+        Args:
+          link:   (Link) The link that is closing.
+        """
+        self.flush()
+
+    #-----------------------------------------------------------------------
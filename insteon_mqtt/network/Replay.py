@@ -0,0 +1,304 @@
+#===========================================================================
+#
+# Network link that plays back a capture file.
+#
+#===========================================================================
+import socket
+import threading
+import time
+from .. import clock
+from .. import log
+from ..Signal import Signal
+from ..Trace import Trace
+from .Link import Link
+
+LOG = log.get_logger(__name__)
+
+
+class Replay(Link):
+    """Capture file playback link.
+
+    This class replaces the Serial link to the PLM and feeds the bytes that
+    were read from the modem in a capture file (see Capture) or a modem
+    trace dump into the Protocol.  This allows the message parsing and
+    handling, MQTT publishing, etc to be run against real traffic without
+    a modem attached.
+
+    The reads are played back at the speed they were captured, at a
+    multiple of that speed, or as fast as possible (speed = 0).  Data
+    written to the link is dropped (there is no modem) but signal_wrote is
+    emitted like the Serial link does so the Protocol keeps working.
+
+    A background thread writes the captured bytes into a socket pair at
+    the scheduled times so the network manager wakes up when the data is
+    available just like it does for the serial port.  When all the data
+    has been read, signal_finished is emitted and the link closes.
+
+    Configuration (the insteon 'replay' key):
+      - file:    (str) The capture file to play back.
+      - speed:   (float) Play back speed multiplier.  0 to play the data
+                 back as fast as possible.  Default 1.
+    """
+    read_buf_size = 4096
+
+    #-----------------------------------------------------------------------
+    def __init__(self, path=None, speed=1.0, reconnect_dt=10):
+        """Constructor.
+
+        The play back won't start until connect() is called.  Either
+        manually or by the network manager.
+
+        Args:
+          path:          (str) The capture file to play back.
+          speed:         (float) Play back speed multiplier.  0 to play
+                         the data back as fast as possible.
+          reconnect_dt:  (int) Time in seconds to try and reconnect if the
+                         capture file can't be read.
+        """
+        # Public signals to connect to for read/write notification.
+        self.signal_read = Signal()   # (Replay, bytes)
+        self.signal_wrote = Signal()  # (Replay, bytes)
+
+        # Emitted when all the captured data has been read.
+        self.signal_finished = Signal()  # (Replay)
+
+        super().__init__()
+
+        self.path = path
+        self.speed = speed
+        self._reconnect_dt = reconnect_dt
+
+        # Socket the network manager watches for reading and the
+        # background play back thread.
+        self._sock = None
+        self._thread = None
+        self._stop = None
+
+        # List of packets to write.  Each is a tuple of (bytes, time) where
+        # the time is the time after which to do the write.
+        self._write_buf = []
+
+        self.finished = False
+        self.num_read = 0
+        self._start_time = None
+
+        self.signal_connected.connect(self._connected)
+
+    #-----------------------------------------------------------------------
+    def load_config(self, config):
+        """Load a configuration dictionary.
+
+        Configuration inputs will override any set in the constructor.  The
+        input is the insteon configuration and the replay key is used.  See
+        the class docs for the valid inputs.
+
+        Args:
+          config:   (dict) Configuration data to load.
+        """
+        assert self._sock is None
+
+        data = config.get('replay', {})
+        self.path = data.get('file', self.path)
+        self.speed = max(0.0, float(data.get('speed', self.speed)))
+
+    #-----------------------------------------------------------------------
+    def fileno(self):
+        """Return the file descriptor to watch for this link.
+
+        Returns:
+          (int) Returns the descriptor (obj.fileno() usually) to monitor.
+        """
+        assert self._sock
+        return self._sock.fileno()
+
+    #-----------------------------------------------------------------------
+    def write(self, data, after_time=None):
+        """Schedule data for writing to the link.
+
+        Args:
+          data:       (bytes) The data to write.
+          after_time: (float) Time in seconds past epoch after which to write
+                      the packet.  If None, the message will be sent whenever
+                      it can.
+        """
+        after_time = after_time if after_time is not None else 0
+        self._write_buf.append((data, after_time))
+        self.signal_needs_write.emit(self, True)
+
+    #-----------------------------------------------------------------------
+    def retry_connect_dt(self):
+        """Return a positive integer (seconds) if the link should reconnect.
+
+        Once the capture file has been played back, the link won't
+        reconnect.
+        """
+        return None if self.finished else self._reconnect_dt
+
+    #-----------------------------------------------------------------------
+    def connect(self):
+        """Connect the link to the capture file.
+
+        This will read the capture file and start the play back thread.
+
+        Returns:
+          (bool) Returns True if the connection was successful or False it
+          it failed.
+        """
+        try:
+            reads = [(t, data) for t, kind, data in Trace.read(self.path)
+                     if kind == Trace.READ]
+        except Exception:
+            LOG.exception("Error reading capture file %s", self.path)
+            return False
+
+        self._sock, play_sock = socket.socketpair()
+        self._sock.setblocking(False)
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._play, args=(play_sock, reads, self.speed, self._stop),
+            name="Replay", daemon=True)
+        self._thread.start()
+
+        self._start_time = clock.now()
+        LOG.info("Replaying %d reads from %s at speed %s", len(reads),
+                 self.path, self.speed or "max")
+        return True
+
+    #-----------------------------------------------------------------------
+    def read_from_link(self):
+        """Read data from the link.
+
+        This will be called by the manager when there is data
+        available on the file descriptor for reading.
+
+        Returns:
+           (int) Return -1 if the link should be closed.  Or any other
+           integer to indicate success.
+        """
+        # Read until the socket is empty.  The play back thread closes it's
+        # end of the socket when it's done which the manager sees as a
+        # hang up so any remaining data has to be read now.
+        num = 0
+        while self._sock:
+            try:
+                data = self._sock.recv(self.read_buf_size)
+            except BlockingIOError:
+                return num
+
+            if not data:
+                dt = clock.now() - self._start_time
+                LOG.info("Replay of %s finished: %d bytes in %.3f sec",
+                         self.path, self.num_read, dt)
+                self.finished = True
+                self.signal_finished.emit(self)
+                self.close()
+                return -1
+
+            num += len(data)
+            self.num_read += len(data)
+            self.signal_read.emit(self, data)
+
+        return num
+
+    #-----------------------------------------------------------------------
+    def write_to_link(self, t):
+        """Write data from the link.
+
+        The data is dropped since there is no modem but signal_wrote is
+        emitted once the after time of the packet has passed.
+
+        Args:
+           t:    (float) The current time (clock.now).
+        """
+        if not self._write_buf:
+            self.signal_needs_write.emit(self, False)
+            return
+
+        data, after_time = self._write_buf[0]
+        if t < after_time:
+            return
+
+        self._write_buf.pop(0)
+        if not self._write_buf:
+            self.signal_needs_write.emit(self, False)
+
+        self.signal_wrote.emit(self, data)
+
+    #-----------------------------------------------------------------------
+    def close(self):
+        """Close the link.
+
+        The link will call self.signal_closing.emit() after closing.
+        """
+        if not self._sock:
+            return
+
+        LOG.info("Replay closing %s", self.path)
+
+        # Emit the signal before closing the socket so the manager can
+        # still look up the file descriptor to remove.
+        self._stop.set()
+        self._write_buf = []
+        self.signal_closing.emit(self)
+
+        self._sock.close()
+        self._sock = None
+        self._thread = None
+
+    #-----------------------------------------------------------------------
+    def _play(self, sock, reads, speed, stop):
+        """Play back thread.
+
+        Args:
+          sock:    (socket) The socket to write the data to.
+          reads:   ([(float, bytes)]) The captured (time, data) reads.
+          speed:   (float) Play back speed multiplier.  0 for no delays.
+          stop:    (threading.Event) Set to stop the play back.
+        """
+        # This thread really sleeps between the reads so it paces them with
+        # the system clock.  A virtual clock (clock.SimClock) only moves in
+        # the network loop and would never reach the read times here.
+        try:
+            start = time.monotonic()
+            t0 = reads[0][0] if reads else 0
+
+            for t, data in reads:
+                if speed:
+                    dt = (t - t0) / speed - (time.monotonic() - start)
+                    if dt > 0 and stop.wait(dt):
+                        return
+
+                elif stop.is_set():
+                    return
+
+                sock.sendall(data)
+
+        except OSError:
+            # The link was closed while we were writing.
+            pass
+
+        finally:
+            sock.close()
+
+    #-----------------------------------------------------------------------
+    def _connected(self, link, connected):
+        """Connected callback.
+
+        If we have data remaining to write, we'll notify the manager of
+        that.
+
+        Args:
+          link:        (Link) Ourselves.
+          connected:   (bool) True if the device is connected.
+        """
+        assert self == link
+
+        if connected and self._write_buf:
+            self.signal_needs_write.emit(self, True)
+
+    #-----------------------------------------------------------------------
+    def __str__(self):
+        return "Replay %s" % str(self.path)
+
+    #-----------------------------------------------------------------------
@@ -7,6 +7,7 @@ import os
 import serial
 from .. import log
 from ..Signal import Signal
+from .Capture import Capture
 from .Link import Link
 
 LOG = log.get_logger(__name__)
@@ -61,6 +62,9 @@ class Serial(Link):
         self._reconnect_dt = reconnect_dt
         self._fd = None
 
+        # Optional capture file tap (see load_config).
+        self.capture = None
+
         # List of packets to write.  Each is a tuple of (bytes, time) where
         # the time is the time after which to do the write.
         self._write_buf = []
@@ -83,6 +87,8 @@ class Serial(Link):
         - port       (str) The serial device to connect to.
         - baudrate   (int) Baudrate to use (optional)
         - parity     Parity to use (optional)
+        - capture    (str) File to capture the link traffic to (optional).
+                     See the Capture class for details.
 
         Args:
           config:   (dict) Configuration data to load.
@@ -93,6 +99,11 @@ class Serial(Link):
         self._baudrate = config.get('baudrate', self._baudrate)
         self._parity = config.get('parity', self._parity)
 
+        capture = config.get('capture', None)
+        if capture and self.capture is None:
+            self.capture = Capture(capture)
+            self.capture.tap(self)
+
         self.client = self._open_client()
 
     #-----------------------------------------------------------------------
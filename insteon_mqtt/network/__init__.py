@@ -18,9 +18,11 @@ links get closed for maximum robustness.
 
 #===========================================================================
 
+from .Capture import Capture
 from .Link import Link
 from .Serial import Serial
 from .Mqtt import Mqtt
+from .Replay import Replay
 
 # Use Poll on non-windows systems - For windows we have to use select.
 import platform  # pylint: disable=wrong-import-order
@@ -5,7 +5,7 @@
 #===========================================================================
 import errno
 import select
-import time
+from .. import clock
 from .. import log
 
 LOG = log.get_logger(__name__)
@@ -107,7 +107,7 @@ class Manager:
 
         # For unconnected links, store them for later checking.
         else:
-            data = (link, time.time())
+            data = (link, clock.now())
             self.unconnected.append(data)
 
     #-----------------------------------------------------------------------
@@ -167,13 +167,16 @@ class Manager:
         if self.unconnected:
             time_out = min(time_out, self.unconnected_time_out)
 
-        time_out *= 1000  # sec->msec
+        # A simulated clock doesn't wait for events.  It moves to the next
+        # deadline once the events are processed (see clock.SimClock).
+        poll_time_out = clock.get_clock().poll_time_out(time_out)
+        poll_time_out *= 1000  # sec->msec
 
         # Keep polling until we get a successfull call with events.
         while True:
             try:
                 # events = (fileno, bit flags) of the actions.
-                events = self.poll.poll(time_out)
+                events = self.poll.poll(poll_time_out)
             except OSError as err:
                 # This error can occur sometimes when using a timeout.
                 # It should be ignored and the poll retried.
@@ -184,7 +187,7 @@ class Manager:
                 break
 
         # Handle any links that need to be connected.
-        t = time.time()
+        t = clock.now()
         for i in range(len(self.unconnected) - 1, -1, -1):
             link, next_time = self.unconnected[i]
 
@@ -232,6 +235,8 @@ class Manager:
         for link in list(self.links.values()):
             link.poll(t)
 
+        clock.get_clock().advance(time_out)
+
     #-----------------------------------------------------------------------
     def link_closing(self, link):
         """Callback when a link is closing.
@@ -248,7 +253,7 @@ class Manager:
 
         dt = link.retry_connect_dt()
         if dt and dt > 0:
-            data = (link, time.time() + dt)
+            data = (link, clock.now() + dt)
             self.unconnected.append(data)
 
         # Emit the connected signal to let anyone else know that the
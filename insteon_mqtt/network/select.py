@@ -9,6 +9,7 @@
 import errno
 import select
 import time
+from .. import clock
 from .. import log
 
 LOG = log.get_logger(__name__)
@@ -105,7 +106,7 @@ class Manager:
 
         # For unconnected links, store them for later checking.
         else:
-            data = (link, time.time())
+            data = (link, clock.now())
             self.unconnected.append(data)
 
     #-----------------------------------------------------------------------
@@ -165,17 +166,22 @@ class Manager:
         if self.unconnected:
             time_out = min(time_out, self.unconnected_time_out)
 
+        # A simulated clock doesn't wait for events.  It moves to the next
+        # deadline once the events are processed (see clock.SimClock).
+        select_time_out = clock.get_clock().poll_time_out(time_out)
+
         # If nothing is reading for checking, skip the select call.
         run = self.read or self.write or self.error
         if not run:
-            time.sleep(time_out)
+            time.sleep(select_time_out)
             reads, writes, errors = [], [], []
 
         # Keep trying until we get a successfull call with events.
         while run:
             try:
                 reads, writes, errors = select.select(self.read, self.write,
-                                                      self.error, time_out)
+                                                      self.error,
+                                                      select_time_out)
             except OSError as err:
                 # This error can occur sometimes when using a timeout.
                 # It should be ignored and the poll retried.
@@ -185,7 +191,7 @@ class Manager:
                 break
 
         # Handle any links that need to be connected.
-        t = time.time()
+        t = clock.now()
         for i in range(len(self.unconnected) - 1, -1, -1):
             link, next_time = self.unconnected[i]
 
@@ -226,6 +232,8 @@ class Manager:
         for link in list(self.links.values()):
             link.poll(t)
 
+        clock.get_clock().advance(time_out)
+
     #-----------------------------------------------------------------------
     def link_closing(self, link):
         """Callback when a link is closing.
@@ -242,7 +250,7 @@ class Manager:
 
         dt = link.retry_connect_dt()
         if dt and dt > 0:
-            data = (link, time.time() + dt)
+            data = (link, clock.now() + dt)
             self.unconnected.append(data)
 
         # Emit the connected signal to let anyone else know that the
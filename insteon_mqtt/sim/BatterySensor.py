@@ -0,0 +1,80 @@
+#===========================================================================
+#
+# Simulated battery sensor device.
+#
+#===========================================================================
+from .Device import Device
+
+
+class BatterySensor(Device):
+    """Simulated battery powered sensor.
+
+    Battery devices sleep and ignore direct messages except for awake_time
+    seconds after they send a broadcast.  The sensor broadcasts are group
+    1 for the sensor state, group 3 for low battery, and group 4 for the
+    heartbeat.
+    """
+    #-----------------------------------------------------------------------
+    def __init__(self, address, awake_time=3.0, **kwargs):
+        """Constructor
+
+        Args:
+          address:     (Address) The device address.
+          awake_time:  (float) Time in seconds the device listens after a
+                       broadcast.
+          kwargs:      Simulation settings.  See Device for details.
+        """
+        super().__init__(address, **kwargs)
+        self.awake_time = awake_time
+        self.awake = False
+        self._sleep_time = 0
+
+    #-----------------------------------------------------------------------
+    def trip(self, is_on=True):
+        """Simulate the sensor changing state.
+
+        Args:
+          is_on:   (bool) True for the sensor on (open, motion, wet, etc).
+        """
+        self.level = 0xff if is_on else 0x00
+        self.broadcast(0x01, 0x11 if is_on else 0x13)
+
+    #-----------------------------------------------------------------------
+    def low_battery(self):
+        """Simulate a low battery report.
+        """
+        self.broadcast(0x03, 0x11)
+
+    #-----------------------------------------------------------------------
+    def heartbeat(self):
+        """Simulate a heartbeat report.
+        """
+        self.broadcast(0x04, 0x11)
+
+    #-----------------------------------------------------------------------
+    def broadcast(self, group, cmd1, cmd2=0x00):
+        """Send a broadcast and stay awake for a while.
+
+        Args:
+          group:  (int) The group being triggered.
+          cmd1:   (int) The command 1 byte.
+          cmd2:   (int) The command 2 byte.
+        """
+        super().broadcast(group, cmd1, cmd2)
+        self.awake = True
+        if self.plm:
+            self._sleep_time = self.plm.now + self.awake_time
+
+    #-----------------------------------------------------------------------
+    def receive(self, msg):
+        """Handle a direct message sent to the device.
+
+        Args:
+          msg:   (message.OutStandard) The message.
+        """
+        if self.awake and self.plm and self.plm.now >= self._sleep_time:
+            self.awake = False
+
+        super().receive(msg)
+
+    #-----------------------------------------------------------------------
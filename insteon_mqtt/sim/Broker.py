@@ -0,0 +1,307 @@
+#===========================================================================
+#
+# In process MQTT broker stand in.
+#
+#===========================================================================
+import socket
+import paho.mqtt.client as paho
+from .. import log
+from ..network import Link
+from ..Signal import Signal
+
+LOG = log.get_logger(__name__)
+
+
+class Broker(Link):
+    """In process MQTT broker link.
+
+    This replaces the network.Mqtt link so the bridge can be run without
+    an MQTT broker.  It has the same interface as network.Mqtt but
+    instead of talking to a broker, published messages are stored (the
+    last payload of each retained topic is kept) and signal_publish is
+    emitted for each one.  Messages from clients are passed in with
+    inject() and are delivered to the bridge on the next loop if they
+    match a subscription like a broker would.  Messages the bridge
+    publishes that match it's own subscriptions are also delivered.
+
+    There is no file descriptor to wait on so the link reports it needs
+    to write while messages are waiting to be delivered (see sim.Plm).
+
+    Configuration (the mqtt 'sim' key) is only used to select this link.
+    The broker settings are ignored.
+    """
+    #-----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor.
+        """
+        self.signal_message = Signal()    # (Broker, Message msg)
+
+        # Emitted when the bridge publishes a message.
+        self.signal_publish = Signal()    # (Broker, Message msg)
+
+        super().__init__()
+        self.connected = False
+
+        # Map of subscribed topic filter -> (qos, callback).
+        self.subscriptions = {}
+
+        # Map of topic -> payload for retained messages.
+        self.retained = {}
+
+        # Messages waiting to be delivered to the bridge.
+        self._inbound = []
+
+        self.num_published = 0
+        self.num_delivered = 0
+
+        # Socket pair for the network manager to watch.
+        self._sock = None
+        self._peer = None
+        self._needs_write = False
+
+        self.signal_connected.connect(self._connected)
+
+    #-----------------------------------------------------------------------
+    def load_config(self, config):
+        """Load a configuration dictionary.
+
+        The broker settings in the mqtt configuration are ignored.
+
+        Args:
+          config:   (dict) Configuration data to load.
+        """
+        assert not self.connected
+
+    #-----------------------------------------------------------------------
+    def publish(self, topic, payload, qos=0, retain=False):
+        """Publish an MQTT message.
+
+        Arg:
+          topic:    (str) The topic to publish with.
+          payload:  (str/bytes) The payload to send for the message.
+          qos:      (int) The MQTT QOS level to use (1, 2, or 3).
+          retain:   (bool) True to mark the message as retained.
+        """
+        msg = self._message(topic, payload, qos, retain)
+        if retain:
+            self.retained[topic] = msg.payload
+
+        self.num_published += 1
+        self.signal_publish.emit(self, msg)
+
+        if self._matches(topic):
+            self._inbound.append(msg)
+            self._update_needs_write()
+
+    #-----------------------------------------------------------------------
+    def subscribe(self, topic, qos=0, callback=None):
+        """Subscribe the client to a topic.
+
+        If a callback is supplied, then that callback will be used for
+        all messages that match the input topic and NO other callbacks
+        or signals will be sent for that message.  The callback
+        signature is:
+           func(client, user_data, message)
+
+        Args:
+          topic:    (str) The topic to subscribe to.
+          qos:      (int) The quality of service level to use (0,1,2).
+          callback: Optional message callback.
+        """
+        self.subscriptions[topic] = (qos, callback)
+        LOG.debug("Sim MQTT subscribe %s qos=%s", topic, qos)
+
+    #-----------------------------------------------------------------------
+    def unsubscribe(self, topic):
+        """Unsubscribe the client from a topic.
+
+        Args:
+          topic:   (str) The topic to unsubscribe from.
+        """
+        self.subscriptions.pop(topic, None)
+        LOG.debug("Sim MQTT unsubscribe %s", topic)
+
+    #-----------------------------------------------------------------------
+    def inject(self, topic, payload, qos=0, retain=False):
+        """Send a message to the bridge from a client.
+
+        The message is delivered the next time the network manager runs
+        the link if it matches a subscription.
+
+        Args:
+          topic:    (str) The topic to send.
+          payload:  (str/bytes) The message payload.
+          qos:      (int) The MQTT QOS level.
+          retain:   (bool) True to mark the message as retained.
+
+        Returns:
+          (bool) Returns True if the message matches a subscription.
+        """
+        if not self._matches(topic):
+            return False
+
+        self._inbound.append(self._message(topic, payload, qos, retain))
+        self._update_needs_write()
+        return True
+
+    #-----------------------------------------------------------------------
+    def fileno(self):
+        """Return the file descriptor to watch for this link.
+
+        Returns:
+          (int) Returns the descriptor (obj.fileno() usually) to monitor.
+        """
+        assert self._sock
+        return self._sock.fileno()
+
+    #-----------------------------------------------------------------------
+    def retry_connect_dt(self):
+        """Return a positive integer (seconds) if the link should reconnect.
+        """
+        return 1
+
+    #-----------------------------------------------------------------------
+    def connect(self):
+        """Connect the link.
+
+        This creates a socket for the network manager to watch.  Nothing is
+        ever read from it.
+
+        Returns:
+          (bool) Returns True.
+        """
+        self._sock, self._peer = socket.socketpair()
+        self.connected = True
+        LOG.info("Simulated MQTT broker started")
+        return True
+
+    #-----------------------------------------------------------------------
+    def read_from_link(self):
+        """Read data from the link.
+
+        Nothing is ever written to the socket so this shouldn't be called.
+
+        Returns:
+           (int) Returns 0.
+        """
+        return 0
+
+    #-----------------------------------------------------------------------
+    def write_to_link(self, t):
+        """Deliver the waiting messages to the bridge.
+
+        Args:
+           t:    (float) The current time (time.time).
+        """
+        inbound, self._inbound = self._inbound, []
+        for msg in inbound:
+            self._deliver(msg)
+
+        self._update_needs_write()
+
+    #-----------------------------------------------------------------------
+    def close(self):
+        """Close the link.
+
+        The link will call self.signal_closing.emit() after closing.
+        """
+        if not self._sock:
+            return
+
+        LOG.info("Simulated MQTT broker closing")
+
+        # Emit the signal before closing the socket so the manager can
+        # still look up the file descriptor to remove.
+        self.connected = False
+        self._inbound = []
+        self.signal_closing.emit(self)
+
+        self._sock.close()
+        self._peer.close()
+        self._sock = None
+
+    #-----------------------------------------------------------------------
+    def _deliver(self, msg):
+        """Deliver a message to the bridge.
+
+        Args:
+          msg:   (paho.MQTTMessage) The message to deliver.
+        """
+        callback = None
+        for topic, (qos, func) in self.subscriptions.items():
+            if func and paho.topic_matches_sub(topic, msg.topic):
+                callback = func
+                break
+
+        self.num_delivered += 1
+        if callback:
+            callback(self, None, msg)
+        else:
+            self.signal_message.emit(self, msg)
+
+    #-----------------------------------------------------------------------
+    def _matches(self, topic):
+        """See if a topic matches any of the subscriptions.
+
+        Args:
+          topic:   (str) The topic to check.
+
+        Returns:
+          (bool) Returns True if the topic matches a subscription.
+        """
+        for sub in self.subscriptions:
+            if paho.topic_matches_sub(sub, topic):
+                return True
+
+        return False
+
+    #-----------------------------------------------------------------------
+    def _message(self, topic, payload, qos, retain):
+        """Create a message object.
+
+        Args:
+          topic:    (str) The message topic.
+          payload:  (str/bytes) The message payload.
+          qos:      (int) The MQTT QOS level.
+          retain:   (bool) The message retain flag.
+
+        Returns:
+          (paho.MQTTMessage) Returns the message.
+        """
+        msg = paho.MQTTMessage(topic=topic.encode("utf-8"))
+        msg.payload = payload.encode("utf-8") if isinstance(payload, str) \
+            else bytes(payload or b"")
+        msg.qos = qos
+        msg.retain = retain
+        return msg
+
+    #-----------------------------------------------------------------------
+    def _update_needs_write(self):
+        """Tell the network manager if messages are waiting.
+        """
+        needs_write = bool(self._inbound)
+        if needs_write != self._needs_write:
+            self._needs_write = needs_write
+            self.signal_needs_write.emit(self, needs_write)
+
+    #-----------------------------------------------------------------------
+    def _connected(self, link, connected):
+        """Connected callback.
+
+        If messages are waiting, notify the manager now that it's watching
+        the link.
+
+        Args:
+          link:        (Link) Ourselves.
+          connected:   (bool) True if the device is connected.
+        """
+        assert self == link
+
+        if connected and self._needs_write:
+            self.signal_needs_write.emit(self, True)
+
+    #-----------------------------------------------------------------------
+    def __str__(self):
+        return "Sim MQTT broker"
+
+    #-----------------------------------------------------------------------
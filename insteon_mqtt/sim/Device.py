@@ -0,0 +1,291 @@
+#===========================================================================
+#
+# Simulated Insteon device base class.
+#
+#===========================================================================
+from ..Address import Address
+from .. import db
+from .. import log
+from .. import message as Msg
+
+LOG = log.get_logger(__name__)
+
+
+class Device:
+    """Simulated Insteon device.
+
+    Simulated devices are added to a sim.Plm link.  The Plm passes each
+    direct message sent to the device address to receive() and the device
+    replies by calling send() which the Plm delivers to the Protocol after
+    the device latency (unless the message is dropped).
+
+    The base class handles the commands common to all devices: refresh
+    (0x19), engine version (0x0d), and database reads and writes (0x2f).
+    Any other command is ACK'ed.  Derived classes add commands to cmd_map
+    and override handle_group() to respond to scenes.
+
+    Each device has it's own all link database of db.DeviceEntry objects
+    which can be read and modified by the device db commands.
+    """
+    #-----------------------------------------------------------------------
+    def __init__(self, address, latency=0.05, hops=1, drop_rate=0.0):
+        """Constructor
+
+        Args:
+          address:    (Address) The device address.  See Address for the
+                      valid inputs.
+          latency:    (float) Time in seconds the device takes to reply.
+          hops:       (int) Number of hops (0-3) between the device and the
+                      modem.  Each hop adds to the delivery time.
+          drop_rate:  (float) Fraction (0-1) of the messages from the device
+                      that never reach the modem.
+        """
+        self.addr = Address(address)
+        self.latency = latency
+        self.hops = hops
+        self.drop_rate = drop_rate
+
+        # Set by Plm.add().
+        self.plm = None
+
+        # All link database and it's delta (change counter).
+        self.db = []
+        self.db_delta = 0
+
+        # Current state reported by refresh.
+        self.level = 0x00
+
+        # Battery devices only listen while awake.
+        self.awake = True
+
+        self.num_received = 0
+
+        # Map of direct message cmd1 -> handler function.  Signature:
+        #    func(message.OutStandard msg)
+        self.cmd_map = {
+            0x0d : self._engine,
+            0x19 : self._refresh,
+            0x2f : self._db,
+            }
+
+    #-----------------------------------------------------------------------
+    def load_config(self, data):
+        """Load a configuration dictionary.
+
+        Args:
+          data:   (dict) Simulation settings.  Keys are latency, hops, and
+                  drop_rate.  See the constructor for details.
+        """
+        self.latency = float(data.get("latency", self.latency))
+        self.hops = int(data.get("hops", self.hops))
+        self.drop_rate = float(data.get("drop_rate", self.drop_rate))
+
+    #-----------------------------------------------------------------------
+    def add_link(self, addr, group, is_controller, data=None):
+        """Add a record to the device all link database.
+
+        Records are added from the top of memory down like the real
+        devices.
+
+        Args:
+          addr:           (Address) The address of the linked device.
+          group:          (int) The group of the link.
+          is_controller:  (bool) True if this device is the controller.
+          data:           (bytes) 3 data bytes.  [0] is the on level.
+        """
+        mem_loc = 0x0fff - 8 * len(self.db)
+        flags = Msg.DbFlags(True, is_controller, False)
+        self.db.append(db.DeviceEntry(Address(addr), group, mem_loc, flags,
+                                      data))
+        self.db_delta = (self.db_delta + 1) % 256
+
+    #-----------------------------------------------------------------------
+    def receive(self, msg):
+        """Handle a direct message sent to the device.
+
+        Args:
+          msg:   (message.OutStandard) The message.  This may also be an
+                 OutExtended message.
+        """
+        if not self.awake:
+            return
+
+        self.num_received += 1
+        func = self.cmd_map.get(msg.cmd1, self._ack)
+        func(msg)
+
+    #-----------------------------------------------------------------------
+    def handle_group(self, addr, group, cmd1, cmd2):
+        """Handle a scene command from a controller.
+
+        Derived classes should override this to change state when they
+        are responders in the scene.
+
+        Args:
+          addr:   (Address) The controller address.
+          group:  (int) The controller group.
+          cmd1:   (int) The command 1 byte.
+          cmd2:   (int) The command 2 byte.
+        """
+        pass
+
+    #-----------------------------------------------------------------------
+    def responder(self, addr, group):
+        """Return the responder database entry for a controller.
+
+        Args:
+          addr:   (Address) The controller address.
+          group:  (int) The controller group.
+
+        Returns:
+          (db.DeviceEntry) Returns the entry or None if the device isn't a
+          responder of the controller group.
+        """
+        for entry in self.db:
+            if (entry.db_flags.in_use and not entry.is_controller and
+                    entry.addr == addr and entry.group == group):
+                return entry
+
+        return None
+
+    #-----------------------------------------------------------------------
+    def send(self, msg, delay=0.0):
+        """Send a message to the modem.
+
+        Args:
+          msg:    (message.InpStandard) The message to send.  This may also
+                  be an InpExtended message.
+          delay:  (float) Extra delay in seconds beyond the device latency.
+        """
+        if self.plm:
+            self.plm.deliver(self, msg, delay)
+
+    #-----------------------------------------------------------------------
+    def send_ack(self, cmd1, cmd2, is_nak=False, delay=0.0):
+        """Send a direct ACK (or NAK) to the modem.
+
+        Args:
+          cmd1:    (int) The command 1 byte.
+          cmd2:    (int) The command 2 byte.
+          is_nak:  (bool) True to send a NAK instead of an ACK.
+          delay:   (float) Extra delay in seconds beyond the device latency.
+        """
+        type = Msg.Flags.Type.DIRECT_NAK if is_nak else \
+               Msg.Flags.Type.DIRECT_ACK
+        flags = self.msg_flags(type)
+        msg = Msg.InpStandard(self.addr, self.plm.addr, flags, cmd1, cmd2)
+        self.send(msg, delay)
+
+    #-----------------------------------------------------------------------
+    def broadcast(self, group, cmd1, cmd2=0x00):
+        """Simulate a button press or sensor trigger.
+
+        This sends the all link broadcast, updates the responders, and
+        sends the cleanup message to the modem if the modem is a responder
+        of the group.
+
+        Args:
+          group:  (int) The group being triggered.
+          cmd1:   (int) The command 1 byte.
+          cmd2:   (int) The command 2 byte.
+        """
+        LOG.info("Sim %s broadcast group %s cmd %#04x %#04x", self.addr,
+                 group, cmd1, cmd2)
+
+        flags = self.msg_flags(Msg.Flags.Type.ALL_LINK_BROADCAST)
+        msg = Msg.InpStandard(self.addr, Address(0, 0, group), flags, cmd1,
+                              cmd2)
+        self.send(msg)
+
+        if self.plm:
+            self.plm.handle_group(self.addr, group, cmd1, cmd2)
+
+            for entry in self.db:
+                if (entry.is_controller and entry.group == group and
+                        entry.addr == self.plm.addr):
+                    flags = self.msg_flags(Msg.Flags.Type.ALL_LINK_CLEANUP)
+                    msg = Msg.InpStandard(self.addr, self.plm.addr, flags,
+                                          cmd1, group)
+                    self.send(msg, self.plm.hop_time(flags) * 4)
+                    break
+
+    #-----------------------------------------------------------------------
+    def msg_flags(self, type, is_ext=False):
+        """Return the flags for a message from the device.
+
+        Args:
+          type:    (Msg.Flags.Type) The message type.
+          is_ext:  (bool) True for extended messages.
+
+        Returns:
+          (Msg.Flags) Returns the flags with the hops left set from the
+          device hop count.
+        """
+        return Msg.Flags(type, is_ext, max(0, 3 - self.hops), 3)
+
+    #-----------------------------------------------------------------------
+    def _ack(self, msg):
+        """ACK a command with the current level.
+
+        Args:
+          msg:   (message.OutStandard) The message to ACK.
+        """
+        self.send_ack(msg.cmd1, msg.cmd2)
+
+    #-----------------------------------------------------------------------
+    def _engine(self, msg):
+        """Engine version request.  Simulated devices are i2cs.
+
+        Args:
+          msg:   (message.OutStandard) The request.
+        """
+        self.send_ack(msg.cmd1, 0x02)
+
+    #-----------------------------------------------------------------------
+    def _refresh(self, msg):
+        """Refresh request.  Replies with the db delta and level.
+
+        Args:
+          msg:   (message.OutStandard) The request.
+        """
+        self.send_ack(self.db_delta, self.level)
+
+    #-----------------------------------------------------------------------
+    def _db(self, msg):
+        """All link database read or write request.
+
+        Args:
+          msg:   (message.OutExtended) The request.
+        """
+        if not isinstance(msg, Msg.OutExtended):
+            self.send_ack(msg.cmd1, msg.cmd2, is_nak=True)
+            return
+
+        # Write a record.
+        if msg.data[1] == 0x02:
+            entry = db.DeviceEntry.from_bytes(msg.data)
+            self.db = [i for i in self.db if i.mem_loc != entry.mem_loc]
+            self.db.append(entry)
+            self.db_delta = (self.db_delta + 1) % 256
+            self.send_ack(msg.cmd1, msg.cmd2)
+            return
+
+        # Read the database.  Each record is sent followed by an empty last
+        # record which ends the read.
+        self.send_ack(msg.cmd1, msg.cmd2)
+
+        entries = sorted(self.db, key=lambda i: i.mem_loc, reverse=True)
+        mem_loc = entries[-1].mem_loc - 8 if entries else 0x0fff
+        last = db.DeviceEntry(Address(0), 0, mem_loc,
+                              Msg.DbFlags(False, False, True), None)
+
+        flags = self.msg_flags(Msg.Flags.Type.DIRECT, is_ext=True)
+        delay = 4 * self.plm.hop_time(flags)
+        for i, entry in enumerate(entries + [last]):
+            data = bytearray(entry.to_bytes())
+            data[1] = 0x01  # Response flag.
+            reply = Msg.InpExtended(self.addr, self.plm.addr, flags, 0x2f,
+                                    0x00, bytes(data))
+            self.send(reply, (i + 1) * delay)
+
+    #-----------------------------------------------------------------------
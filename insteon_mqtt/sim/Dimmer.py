@@ -0,0 +1,108 @@
+#===========================================================================
+#
+# Simulated dimmer device.
+#
+#===========================================================================
+from .Device import Device
+
+
+class Dimmer(Device):
+    """Simulated dimmer (or on/off switch) device.
+
+    Supports the on (0x11, 0x12, 0x21), off (0x13, 0x14, 0x22), and
+    increment (0x15, 0x16) direct commands and responds to scenes using the
+    on level in the responder database entry.  press() simulates pushing
+    the paddle.
+    """
+    #-----------------------------------------------------------------------
+    def __init__(self, address, is_dimmer=True, **kwargs):
+        """Constructor
+
+        Args:
+          address:    (Address) The device address.
+          is_dimmer:  (bool) False for an on/off switch.
+          kwargs:     Simulation settings.  See Device for details.
+        """
+        super().__init__(address, **kwargs)
+        self.is_dimmer = is_dimmer
+
+        for cmd in [0x11, 0x12, 0x21]:
+            self.cmd_map[cmd] = self._on
+        for cmd in [0x13, 0x14, 0x22]:
+            self.cmd_map[cmd] = self._off
+        self.cmd_map[0x15] = self._increment
+        self.cmd_map[0x16] = self._increment
+
+    #-----------------------------------------------------------------------
+    def press(self, is_on=True):
+        """Simulate the paddle being pushed.
+
+        Args:
+          is_on:   (bool) True for on, False for off.
+        """
+        self.level = 0xff if is_on else 0x00
+        self.broadcast(0x01, 0x11 if is_on else 0x13)
+
+    #-----------------------------------------------------------------------
+    def handle_group(self, addr, group, cmd1, cmd2):
+        """Handle a scene command from a controller.
+
+        Args:
+          addr:   (Address) The controller address.
+          group:  (int) The controller group.
+          cmd1:   (int) The command 1 byte.
+          cmd2:   (int) The command 2 byte.
+        """
+        entry = self.responder(addr, group)
+        if entry is None:
+            return
+
+        if cmd1 in (0x11, 0x12):
+            self._set_level(entry.data[0])
+        elif cmd1 in (0x13, 0x14):
+            self._set_level(0x00)
+
+    #-----------------------------------------------------------------------
+    def _set_level(self, level):
+        """Set the device level.
+
+        Args:
+          level:   (int) The level 0-0xff.  Switches are always on or off.
+        """
+        if not self.is_dimmer and level:
+            level = 0xff
+
+        self.level = level
+
+    #-----------------------------------------------------------------------
+    def _on(self, msg):
+        """On command.
+
+        Args:
+          msg:   (message.OutStandard) The command.
+        """
+        self._set_level(msg.cmd2)
+        self.send_ack(msg.cmd1, self.level)
+
+    #-----------------------------------------------------------------------
+    def _off(self, msg):
+        """Off command.
+
+        Args:
+          msg:   (message.OutStandard) The command.
+        """
+        self._set_level(0x00)
+        self.send_ack(msg.cmd1, self.level)
+
+    #-----------------------------------------------------------------------
+    def _increment(self, msg):
+        """Increment up (0x15) or down (0x16) command.
+
+        Args:
+          msg:   (message.OutStandard) The command.
+        """
+        delta = 8 if msg.cmd1 == 0x15 else -8
+        self._set_level(max(0x00, min(0xff, self.level + delta)))
+        self.send_ack(msg.cmd1, self.level)
+
+    #-----------------------------------------------------------------------
@@ -0,0 +1,117 @@
+#===========================================================================
+#
+# Simulated keypad linc device.
+#
+#===========================================================================
+from .. import util
+from .Dimmer import Dimmer
+
+
+class KeypadLinc(Dimmer):
+    """Simulated keypad linc device.
+
+    Button 1 controls the load like a Dimmer.  The other buttons are only
+    LED's whose state is set with the 0x2e LED command and read with the
+    0x19 0x01 refresh.  press() simulates pushing a button.
+    """
+    #-----------------------------------------------------------------------
+    def __init__(self, address, is_dimmer=True, **kwargs):
+        """Constructor
+
+        Args:
+          address:    (Address) The device address.
+          is_dimmer:  (bool) False for an on/off load.
+          kwargs:     Simulation settings.  See Device for details.
+        """
+        super().__init__(address, is_dimmer, **kwargs)
+
+        # Bit flags of the button LED's.  Bit 0 is button 1.
+        self.led_bits = 0x00
+
+        self.cmd_map[0x2e] = self._set_flags
+
+    #-----------------------------------------------------------------------
+    def press(self, is_on=True, button=1):
+        """Simulate a button being pushed.
+
+        Args:
+          is_on:   (bool) True for on, False for off.
+          button:  (int) The button 1-8.
+        """
+        self._set_led(button, is_on)
+        if button == 1:
+            self.level = 0xff if is_on else 0x00
+
+        self.broadcast(button, 0x11 if is_on else 0x13)
+
+    #-----------------------------------------------------------------------
+    def handle_group(self, addr, group, cmd1, cmd2):
+        """Handle a scene command from a controller.
+
+        The responder entry data[2] is the button the scene controls.
+
+        Args:
+          addr:   (Address) The controller address.
+          group:  (int) The controller group.
+          cmd1:   (int) The command 1 byte.
+          cmd2:   (int) The command 2 byte.
+        """
+        entry = self.responder(addr, group)
+        if entry is None:
+            return
+
+        button = entry.data[2] or 1
+        if button == 1:
+            super().handle_group(addr, group, cmd1, cmd2)
+
+        if cmd1 in (0x11, 0x12, 0x13, 0x14):
+            self._set_led(button, cmd1 in (0x11, 0x12))
+
+    #-----------------------------------------------------------------------
+    def _set_led(self, button, is_on):
+        """Set a button LED.
+
+        Args:
+          button:  (int) The button 1-8.
+          is_on:   (bool) True if the LED is on.
+        """
+        self.led_bits = util.bit_set(self.led_bits, button - 1, is_on)
+
+    #-----------------------------------------------------------------------
+    def _set_level(self, level):
+        """Set the load level and the button 1 LED.
+
+        Args:
+          level:   (int) The level 0-0xff.
+        """
+        super()._set_level(level)
+        self._set_led(1, bool(self.level))
+
+    #-----------------------------------------------------------------------
+    def _refresh(self, msg):
+        """Refresh request.
+
+        A cmd2 of 0x01 replies with the LED bits.  Otherwise the db delta and
+        load level are sent.
+
+        Args:
+          msg:   (message.OutStandard) The request.
+        """
+        if msg.cmd2 == 0x01:
+            self.send_ack(self.db_delta, self.led_bits)
+        else:
+            super()._refresh(msg)
+
+    #-----------------------------------------------------------------------
+    def _set_flags(self, msg):
+        """Extended set command.  Only the LED (D2 = 0x09) is simulated.
+
+        Args:
+          msg:   (message.OutExtended) The command.
+        """
+        if getattr(msg, "data", None) and msg.data[1] == 0x09:
+            self.led_bits = msg.data[2]
+
+        self.send_ack(msg.cmd1, msg.cmd2)
+
+    #-----------------------------------------------------------------------
@@ -0,0 +1,530 @@
+#===========================================================================
+#
+# Simulated PLM modem network link.
+#
+#===========================================================================
+import heapq
+import itertools
+import random
+import socket
+from .. import clock
+from ..Address import Address
+from ..Channel import Channel
+from .. import db
+from .. import log
+from .. import message as Msg
+from ..network import Link
+from ..Signal import Signal
+from .BatterySensor import BatterySensor
+from .Device import Device
+from .Dimmer import Dimmer
+from .KeypadLinc import KeypadLinc
+
+LOG = log.get_logger(__name__)
+
+
+class Plm(Link):
+    """Simulated PLM modem link.
+
+    This replaces the Serial link to the PLM so the Protocol, handlers,
+    and device classes can be run without a modem.  Messages written to
+    the link are echoed back with an ACK like the modem does and:
+
+      - Direct standard and extended messages are passed to the simulated
+        device with that address (see sim.Device).
+      - Modem scenes update the responder devices, which send cleanup
+        ACK's, followed by the all link status message.
+      - The modem all link database can be read (get first/next) and
+        modified (all link update).
+
+    Each device reply is delivered after the device latency plus the time
+    for it's hops and may be dropped (see Device).  collision_rate is the
+    fraction of writes the modem NAK's like it does when the channel is
+    busy.
+
+    There is no file descriptor to wait on so the link always reports it
+    needs to write while anything is scheduled.  The network manager then
+    calls write_to_link() each time through the loop which runs any
+    scheduled events.  Without a network manager, call step() to run the
+    simulation up to a time.  The scheduled reads are registered with the
+    active clock so a clock.SimClock jumps straight to them.
+
+    Configuration (the insteon 'sim' key):
+      - latency:         (float) Default device reply time in seconds.
+      - hops:            (int) Default device hop count.
+      - drop_rate:       (float) Default device message drop fraction.
+      - collision_rate:  (float) Fraction of writes the modem NAK's.
+      - seed:            (int) Random number seed.
+      - devices:         (dict) Address -> settings to override the
+                         defaults for a device.
+
+    A simulated device is created for each device in the insteon 'devices'
+    configuration and linked to the modem (see add()).
+    """
+    # Map of insteon device config type -> (class, kwargs) for the
+    # simulated devices.  Other types use the Device class.
+    device_types = {
+        'dimmer' : (Dimmer, {}),
+        'switch' : (Dimmer, {'is_dimmer' : False}),
+        'outlet' : (Dimmer, {'is_dimmer' : False}),
+        'keypad_linc' : (KeypadLinc, {}),
+        'keypad_linc_sw' : (KeypadLinc, {'is_dimmer' : False}),
+        'battery_sensor' : (BatterySensor, {}),
+        'leak' : (BatterySensor, {}),
+        'motion' : (BatterySensor, {}),
+        }
+
+    #-----------------------------------------------------------------------
+    def __init__(self, address=0x445511, seed=None):
+        """Constructor.
+
+        Args:
+          address:   (Address) The modem address.
+          seed:      Random number seed.  None to seed from the system.
+        """
+        # Public signals to connect to for read/write notification.
+        self.signal_read = Signal()   # (Plm, bytes)
+        self.signal_wrote = Signal()  # (Plm, bytes)
+
+        super().__init__()
+
+        self.addr = Address(address)
+
+        # Map of device id -> sim.Device.
+        self.devices = {}
+
+        # Modem all link database.
+        self.db = []
+        self._db_next = 0
+
+        self.latency = 0.05
+        self.hops = 1
+        self.drop_rate = 0.0
+        self.collision_rate = 0.0
+        self._device_config = {}
+        self._rand = random.Random(seed)
+
+        # Current simulation time.  This is the last time passed to
+        # step() (or the system time before that).
+        self.now = clock.now()
+
+        # Written bytes waiting to be processed.  List of (bytes, time)
+        # tuples where the time is the time after which to do the write.
+        self._write_buf = []
+
+        # Scheduled reads.  Heap of (time, index, bytes).  The index keeps
+        # messages with the same time in order.
+        self._events = []
+        self._index = itertools.count()
+
+        self.num_written = 0
+        self.num_dropped = 0
+        self.num_collisions = 0
+
+        # Socket pair for the network manager to watch.
+        self._sock = None
+        self._peer = None
+        self._needs_write = False
+
+        self.signal_connected.connect(self._connected)
+
+    #-----------------------------------------------------------------------
+    def load_config(self, config):
+        """Load a configuration dictionary.
+
+        The input is the insteon configuration.  See the class docs for the
+        sim key inputs.
+
+        Args:
+          config:   (dict) Configuration data to load.
+        """
+        if 'address' in config:
+            self.addr = Address(config['address'])
+
+        data = config.get('sim', {}) or {}
+        self.latency = float(data.get('latency', self.latency))
+        self.hops = int(data.get('hops', self.hops))
+        self.drop_rate = float(data.get('drop_rate', self.drop_rate))
+        self.collision_rate = float(data.get('collision_rate',
+                                             self.collision_rate))
+        if 'seed' in data:
+            self._rand.seed(data['seed'])
+
+        self._device_config = {Address(k).id : v for k, v in
+                               (data.get('devices', {}) or {}).items()}
+
+        for device_type, values in (config.get('devices', {}) or {}).items():
+            cls, kwargs = self.device_types.get(device_type, (Device, {}))
+            for value in values or []:
+                addr = next(iter(value)) if isinstance(value, dict) else value
+                self.add(cls(addr, **kwargs))
+
+    #-----------------------------------------------------------------------
+    def add(self, device, link=True):
+        """Add a simulated device.
+
+        The device uses the link latency, hops, and drop rate settings
+        unless they are overridden in the sim devices configuration.
+
+        Args:
+          device:  (sim.Device) The device to add.
+          link:    (bool) True to link the device group 1 to the modem in
+                   both directions like the device pair() commands do.
+        """
+        device.plm = self
+        device.load_config({"latency" : self.latency, "hops" : self.hops,
+                            "drop_rate" : self.drop_rate})
+        device.load_config(self._device_config.get(device.addr.id, {}))
+        self.devices[device.addr.id] = device
+
+        if link:
+            self.db.append(db.ModemEntry(device.addr, 0x01, True))
+            self.db.append(db.ModemEntry(device.addr, 0x01, False))
+            device.add_link(self.addr, 0x01, False, [0xff, 0x00, 0x01])
+            device.add_link(self.addr, 0x01, True, [0x03, 0x00, 0x01])
+
+        return device
+
+    #-----------------------------------------------------------------------
+    def fileno(self):
+        """Return the file descriptor to watch for this link.
+
+        Returns:
+          (int) Returns the descriptor (obj.fileno() usually) to monitor.
+        """
+        assert self._sock
+        return self._sock.fileno()
+
+    #-----------------------------------------------------------------------
+    def connect(self):
+        """Connect the link.
+
+        This creates a socket for the network manager to watch.  Nothing is
+        ever read from it.
+
+        Returns:
+          (bool) Returns True.
+        """
+        self._sock, self._peer = socket.socketpair()
+        LOG.info("Simulated PLM %s started with %d devices", self.addr,
+                 len(self.devices))
+        return True
+
+    #-----------------------------------------------------------------------
+    def write(self, data, after_time=None):
+        """Schedule data for writing to the modem.
+
+        Args:
+          data:       (bytes) The data to write.
+          after_time: (float) Time in seconds past epoch after which to write
+                      the packet.  If None, the message will be sent whenever
+                      it can.
+        """
+        after_time = after_time if after_time is not None else 0
+        self._write_buf.append((data, after_time))
+        self._update_needs_write()
+
+    #-----------------------------------------------------------------------
+    def read_from_link(self):
+        """Read data from the link.
+
+        Nothing is ever written to the socket so this shouldn't be called.
+
+        Returns:
+           (int) Returns 0.
+        """
+        return 0
+
+    #-----------------------------------------------------------------------
+    def write_to_link(self, t):
+        """Run the simulation.
+
+        This will be called by the manager when the link has something
+        scheduled (see the class docs).
+
+        Args:
+           t:    (float) The current time (time.time).
+        """
+        self.run(t)
+
+    #-----------------------------------------------------------------------
+    def step(self, t=None):
+        """Run the simulation and poll the link.
+
+        Use this instead of a network manager to drive the simulation.
+
+        Args:
+           t:    (float) The time to run the simulation to.  None to use
+                 clock.now().
+        """
+        t = clock.now() if t is None else t
+        self.run(t)
+        self.poll(t)
+
+    #-----------------------------------------------------------------------
+    def run(self, t):
+        """Process the writes and reads that are due.
+
+        Args:
+           t:    (float) The time to run the simulation to.
+        """
+        self.now = max(self.now, t)
+
+        while self._write_buf and self._write_buf[0][1] <= t:
+            data = self._write_buf.pop(0)[0]
+            self.signal_wrote.emit(self, data)
+            self._handle_write(data)
+
+        while self._events and self._events[0][0] <= t:
+            data = heapq.heappop(self._events)[2]
+            self.signal_read.emit(self, data)
+
+        self._update_needs_write()
+
+    #-----------------------------------------------------------------------
+    def deliver(self, device, msg, delay=0.0):
+        """Deliver a message from a device to the modem.
+
+        The message arrives after the device latency, hop time, and delay
+        unless it's dropped.
+
+        Args:
+          device:  (sim.Device) The sending device.
+          msg:     (message.InpStandard) The message.  This may also be an
+                   InpExtended.
+          delay:   (float) Extra delay in seconds.
+        """
+        if device.drop_rate and self._rand.random() < device.drop_rate:
+            self.num_dropped += 1
+            LOG.debug("Sim %s dropped %s", device.addr, msg)
+            return
+
+        dt = device.latency + delay + device.hops * self.hop_time(msg.flags)
+        self._schedule(msg.to_bytes(), dt)
+
+    #-----------------------------------------------------------------------
+    def handle_group(self, addr, group, cmd1, cmd2):
+        """Pass a scene command to the responder devices.
+
+        Args:
+          addr:   (Address) The controller address.
+          group:  (int) The controller group.
+          cmd1:   (int) The command 1 byte.
+          cmd2:   (int) The command 2 byte.
+        """
+        for device in self.devices.values():
+            if device.addr != addr:
+                device.handle_group(addr, group, cmd1, cmd2)
+
+    #-----------------------------------------------------------------------
+    def hop_time(self, flags):
+        """Return the time a message takes per hop.
+
+        Args:
+          flags:   (message.Flags) The message flags.
+
+        Returns:
+          (float) Returns the time in seconds.
+        """
+        return Channel.EXT_HOP_TIME if flags.is_ext else Channel.STD_HOP_TIME
+
+    #-----------------------------------------------------------------------
+    def close(self):
+        """Close the link.
+
+        The link will call self.signal_closing.emit() after closing.
+        """
+        if not self._sock:
+            return
+
+        # Emit the signal before closing the socket so the manager can
+        # still look up the file descriptor to remove.
+        self._write_buf = []
+        self._events = []
+        self.signal_closing.emit(self)
+
+        self._sock.close()
+        self._peer.close()
+        self._sock = None
+
+    #-----------------------------------------------------------------------
+    def _handle_write(self, data):
+        """Handle a message written to the modem.
+
+        Args:
+          data:   (bytes) The message bytes.
+        """
+        self.num_written += 1
+        msg_class = Msg.types.get(data[1], None) if len(data) > 1 else None
+        try:
+            msg = msg_class.from_bytes(bytes(data) + b"\x06")
+        except Exception:
+            LOG.error("Sim PLM can't parse message %s", data)
+            self._echo(data, False)
+            return
+
+        if self.collision_rate and self._rand.random() < self.collision_rate:
+            self.num_collisions += 1
+            self._echo(data, False)
+            return
+
+        if isinstance(msg, Msg.OutStandard):  # Also matches OutExtended
+            self._echo(data, True)
+            device = self.devices.get(msg.to_addr.id, None)
+            if device:
+                device.receive(msg)
+
+        elif isinstance(msg, Msg.OutModemScene):
+            self._echo(data, True)
+            self._modem_scene(msg)
+
+        elif isinstance(msg, Msg.OutAllLinkGetFirst):
+            self._db_next = 0
+            self._db_get(data)
+
+        elif isinstance(msg, Msg.OutAllLinkGetNext):
+            self._db_get(data)
+
+        elif isinstance(msg, Msg.OutAllLinkUpdate):
+            self._echo(data, self._db_update(msg))
+
+        else:
+            self._echo(data, True)
+
+    #-----------------------------------------------------------------------
+    def _echo(self, data, is_ack):
+        """Echo a written message back with an ACK or NAK.
+
+        Args:
+          data:    (bytes) The message bytes.
+          is_ack:  (bool) True for ACK, False for NAK.
+        """
+        self._schedule(bytes(data) + (b"\x06" if is_ack else b"\x15"), 0)
+
+    #-----------------------------------------------------------------------
+    def _modem_scene(self, msg):
+        """Simulate a modem scene.
+
+        Each responder is updated and sends a cleanup ACK.  Then the all
+        link status message is sent.
+
+        Args:
+          msg:   (message.OutModemScene) The scene message.
+        """
+        self.handle_group(self.addr, msg.group, msg.cmd1, msg.cmd2)
+
+        dt = 4 * Channel.STD_HOP_TIME
+        for entry in self.db:
+            if not entry.is_controller or entry.group != msg.group:
+                continue
+
+            device = self.devices.get(entry.addr.id, None)
+            if device is None:
+                continue
+
+            flags = device.msg_flags(Msg.Flags.Type.CLEANUP_ACK)
+            reply = Msg.InpStandard(device.addr, self.addr, flags, msg.cmd1,
+                                    msg.group)
+            self.deliver(device, reply, dt)
+            dt += 2 * 4 * Channel.STD_HOP_TIME
+
+        self._schedule(Msg.InpAllLinkStatus(True).to_bytes(),
+                       dt + self.latency)
+
+    #-----------------------------------------------------------------------
+    def _db_get(self, data):
+        """Send the next modem database record.
+
+        Args:
+          data:   (bytes) The get first or get next message bytes.
+        """
+        if self._db_next >= len(self.db):
+            self._echo(data, False)
+            return
+
+        entry = self.db[self._db_next]
+        self._db_next += 1
+
+        self._echo(data, True)
+        flags = Msg.DbFlags(True, entry.is_controller, False)
+        reply = Msg.InpAllLinkRec(flags, entry.group, entry.addr, entry.data)
+        self._schedule(reply.to_bytes(), 0)
+
+    #-----------------------------------------------------------------------
+    def _db_update(self, msg):
+        """Modify the modem database.
+
+        Args:
+          msg:   (message.OutAllLinkUpdate) The update message.
+
+        Returns:
+          (bool) Returns True if the update worked.
+        """
+        Cmd = Msg.OutAllLinkUpdate.Cmd
+        is_ctrl = msg.cmd == Cmd.ADD_CONTROLLER or \
+            (msg.cmd == Cmd.UPDATE and msg.db_flags.is_controller)
+
+        matches = [i for i in self.db if i.addr == msg.addr and
+                   i.group == msg.group]
+        if msg.cmd != Cmd.DELETE:
+            matches = [i for i in matches if i.is_controller == is_ctrl]
+
+        if msg.cmd in (Cmd.EXISTS, Cmd.SEARCH):
+            return bool(matches)
+
+        elif msg.cmd == Cmd.DELETE:
+            if not matches:
+                return False
+
+            self.db.remove(matches[0])
+            return True
+
+        for entry in matches:
+            self.db.remove(entry)
+
+        self.db.append(db.ModemEntry(msg.addr, msg.group, is_ctrl, msg.data))
+        return True
+
+    #-----------------------------------------------------------------------
+    def _schedule(self, data, dt):
+        """Schedule bytes to be read from the modem.
+
+        Args:
+          data:   (bytes) The bytes to read.
+          dt:     (float) Time in seconds from now to read them.
+        """
+        item = (self.now + dt, next(self._index), data)
+        heapq.heappush(self._events, item)
+        clock.deadline(item[0])
+        self._update_needs_write()
+
+    #-----------------------------------------------------------------------
+    def _update_needs_write(self):
+        """Tell the network manager if anything is scheduled.
+        """
+        needs_write = bool(self._write_buf or self._events)
+        if needs_write != self._needs_write:
+            self._needs_write = needs_write
+            self.signal_needs_write.emit(self, needs_write)
+
+    #-----------------------------------------------------------------------
+    def _connected(self, link, connected):
+        """Connected callback.
+
+        If there is anything scheduled, notify the manager now that it's
+        watching the link.
+
+        Args:
+          link:        (Link) Ourselves.
+          connected:   (bool) True if the device is connected.
+        """
+        assert self == link
+
+        if connected and self._needs_write:
+            self.signal_needs_write.emit(self, True)
+
+    #-----------------------------------------------------------------------
+    def __str__(self):
+        return "Sim PLM %s" % self.addr
+
+    #-----------------------------------------------------------------------
@@ -0,0 +1,33 @@
+#===========================================================================
+#
+# Modem and device simulator
+#
+#===========================================================================
+# flake8: noqa
+
+__doc__ = """Simulated PLM modem and Insteon devices.
+
+The Plm class is a network link that can replace the Serial link to the
+modem.  It echoes and ACK's the messages written to it, stores a modem all
+link database, and passes direct messages to simulated devices which reply
+with configurable latency, hop counts, and drop rates.  This allows the
+Protocol, handlers, and device classes to be run end to end without any
+hardware for testing and load testing.
+
+The Broker class is a network link that can replace the MQTT link.  It
+keeps the published messages in memory and delivers injected client
+messages to the bridge.
+
+Add a 'sim' key to the insteon configuration to run the bridge with the
+simulated modem and to the mqtt configuration to use the simulated
+broker.  See config.yaml for details.
+"""
+
+#===========================================================================
+
+from .BatterySensor import BatterySensor
+from .Broker import Broker
+from .Device import Device
+from .Dimmer import Dimmer
+from .KeypadLinc import KeypadLinc
+from .Plm import Plm
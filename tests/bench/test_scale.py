@@ -0,0 +1,48 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/bench/scale.py
+#
+#===========================================================================
+import insteon_mqtt.bench as bench
+
+
+class Test_scale:
+    def test_run(self):
+        data = bench.scale.run((10,), commands=4, rate=20, storms=1,
+                               storm_size=3, latency=0.005)
+        assert data["inputs"]["commands"] == 4
+
+        r = data["results"][0]
+        assert r["devices"] == 10
+        assert r["commands"] == 4
+        assert r["broadcasts"] > 0
+        assert r["timeouts"] == 0
+        assert r["ack"]["num"] == 4
+        assert r["publish"]["num"] == 4
+        assert r["broadcast"]["num"] == r["broadcasts"]
+        assert r["publish"]["p50"] >= r["ack"]["p50"]
+        assert r["loop_lag"]["num"] > 0
+        assert r["startup_sec"] > 0 and r["rss_mb"] > 0
+
+    #-----------------------------------------------------------------------
+    def test_virtual(self):
+        # Ten minutes of simulated commands.
+        data = bench.scale.run((10,), commands=20, rate=1 / 30, storms=1,
+                               storm_size=3, virtual=True)
+
+        r = data["results"][0]
+        assert r["virtual"] is True
+        assert r["commands"] == 20
+        assert r["timeouts"] == 0
+        assert r["publish"]["num"] == 20
+        assert r["loop_lag"]["num"] == 0
+        assert r["run_sec"] < 60
+
+    #-----------------------------------------------------------------------
+    def test_percentiles(self):
+        assert bench.scale.percentiles([])["num"] == 0
+
+        data = bench.scale.percentiles([i / 1000 for i in range(1, 101)])
+        assert data == {"num" : 100, "p50" : 50, "p99" : 99, "max" : 100}
+
+#===========================================================================
@@ -0,0 +1,60 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/bench/suite.py
+#
+#===========================================================================
+import argparse
+import json
+import pytest
+import insteon_mqtt.bench as bench
+import insteon_mqtt.cmd_line.bench as cmd_bench
+
+
+class Test_suite:
+    def test_run(self):
+        # Tiny scale so this just checks that every benchmark runs.
+        data = bench.suite.run(scale=0.001)
+        assert data["scale"] == 0.001
+        assert data["version"]
+
+        names = [r["name"] for r in data["results"]]
+        assert len(names) == len(set(names))
+        for prefix in ["protocol.parse", "protocol.duplicate", "scene.",
+                       "template.", "db.from_json", "db.save", "signal.",
+                       "address.", "log."]:
+            assert any(i.startswith(prefix) for i in names), prefix
+
+        for r in data["results"]:
+            assert r["number"] >= 1
+            assert r["usec"] >= 0
+
+        # Output is valid JSON.
+        assert json.loads(bench.util.to_json(data)) == data
+
+    #-----------------------------------------------------------------------
+    def test_names(self):
+        data = bench.suite.run(["address"], scale=0.001)
+        assert data["results"]
+        assert all(r["name"].startswith("address.") for r in data["results"])
+
+        with pytest.raises(ValueError):
+            bench.suite.run(["foo"])
+
+    #-----------------------------------------------------------------------
+    def test_cmd_line(self, tmpdir, capsys):
+        path = str(tmpdir.join("bench.json"))
+        args = argparse.Namespace(names=["templates"], scale=0.001,
+                                  output=path)
+        assert cmd_bench.run(args, {}) == 0
+
+        with open(path) as f:
+            data = json.load(f)
+        assert [r["name"] for r in data["results"]] == \
+            ["template.render", "template.to_json"]
+
+        args.names = ["foo"]
+        assert cmd_bench.run(args, {}) == 1
+        out, err = capsys.readouterr()
+        assert "foo" in out
+
+#===========================================================================
@@ -0,0 +1,112 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/cmd_line/batch.py
+#
+#===========================================================================
+import insteon_mqtt as IM
+from insteon_mqtt.cmd_line.main import parse_args
+
+
+class Test_batch:
+    #-----------------------------------------------------------------------
+    def test_batch(self, mocker, tmpdir):
+        mocker.patch.object(IM.cmd_line.util, "Client", MockClient)
+
+        path = tmpdir.join("cmds.txt")
+        path.write("# Comment line\n"
+                   "\n"
+                   "on aa.bb.cc\n"
+                   "off lamp --bad-option\n"
+                   "set lamp 128 --instant\n"
+                   "start\n"
+                   "bad-command\n")
+
+        args = parse_args(["config.yaml", "batch", "-n", "2",
+                           "-q", str(path)])
+        args.topic = "cmd"
+
+        r = IM.cmd_line.batch.batch(args, {})
+        assert r == -1
+
+        client = MockClient.last
+        assert client.max_in_flight == 2
+        assert client.waited
+        assert client.closed
+        assert IM.cmd_line.util.Client.active is None
+
+        assert len(client.sent) == 2
+        topic, payload, quiet = client.sent[0]["args"]
+        assert topic == "cmd/aa.bb.cc"
+        assert payload["cmd"] == "on"
+        assert quiet is True
+
+        topic, payload, quiet = client.sent[1]["args"]
+        assert topic == "cmd/lamp"
+        assert payload["cmd"] == "set"
+        assert payload["level"] == 128
+        assert payload["instant"] is True
+
+    #-----------------------------------------------------------------------
+    def test_batch_ok(self, mocker, tmpdir, capsys):
+        mocker.patch.object(IM.cmd_line.util, "Client", MockClient)
+
+        path = tmpdir.join("cmds.txt")
+        path.write("on aa.bb.cc\noff aa.bb.cc\n")
+
+        args = parse_args(["config.yaml", "batch",
+                           str(path)])
+        args.topic = "cmd"
+
+        r = IM.cmd_line.batch.batch(args, {})
+        assert r == 0
+
+        out = capsys.readouterr().out
+        assert "Total: 2  OK: 2" in out
+
+    #-----------------------------------------------------------------------
+    def test_summary(self, capsys):
+        results = [
+            {"num" : 1, "line" : "a", "session" : None},
+            {"num" : 2, "line" : "b", "session" : MockClient.session(0)},
+            {"num" : 3, "line" : "c", "session" : MockClient.session(-1)},
+            {"num" : 4, "line" : "d",
+             "session" : MockClient.session(-1, timed_out=True)},
+            ]
+
+        r = IM.cmd_line.batch.print_summary(results)
+        assert r == -1
+
+        out = capsys.readouterr().out
+        assert "INVALID" in out
+        assert "TIMEOUT" in out
+        assert "Total: 4  ERROR: 1  INVALID: 1  OK: 1  TIMEOUT: 1" in out
+
+
+#===========================================================================
+class MockClient:
+    active = None
+    last = None
+
+    @staticmethod
+    def session(status, timed_out=False):
+        return {"status" : status, "timed_out" : timed_out, "done" : True,
+                "start_time" : 1.0, "finish_time" : 1.5}
+
+    def __init__(self, config, max_in_flight=4):
+        self.max_in_flight = max_in_flight
+        self.sent = []
+        self.waited = False
+        self.closed = False
+        MockClient.last = self
+
+    def send(self, topic, payload, quiet=False):
+        session = self.session(0)
+        session["args"] = (topic, payload, quiet)
+        self.sent.append(session)
+        return session
+
+    def wait(self, session=None):
+        self.waited = True
+
+    def close(self):
+        self.closed = True
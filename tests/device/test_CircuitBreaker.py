@@ -0,0 +1,107 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/device/CircuitBreaker.py
+#
+#===========================================================================
+import time
+import insteon_mqtt as IM
+import insteon_mqtt.message as Msg
+
+
+class Test_CircuitBreaker:
+    def test_open(self, tmpdir):
+        proto = MockProto()
+        dev = IM.device.Base(proto, MockModem(str(tmpdir)), '0a.12.34')
+        dev.breaker.load_config({"threshold" : 2, "probe_time" : 10,
+                                 "max_probe_time" : 30})
+        states = []
+        slot = lambda device, available: states.append(available)
+        dev.breaker.signal_state.connect(slot)
+
+        # Commands that time out with no more retries open the breaker.
+        t = time.time()
+        for i in range(2):
+            assert not dev.breaker.is_open
+            dev.get_engine()
+            msg_handler = proto.sent[-1][1]
+            assert msg_handler.breaker is dev.breaker
+            msg_handler._num_retry = 0
+            msg_handler.sending_message(proto.sent[-1][0])
+            assert msg_handler.is_expired(proto, t + 6)
+
+        assert dev.breaker.is_open
+        assert states == [False]
+        assert dev.breaker.poll in proto.signal_poll.slots
+
+        # New commands fail right away.
+        done = []
+        num_sent = len(proto.sent)
+        dev.get_engine(on_done=lambda *args: done.append(args))
+        assert len(proto.sent) == num_sent
+        assert done[0][0] is False
+        assert "unreachable" in done[0][1]
+
+        # A probe is sent after the probe time.
+        t = t + 20
+        dev.breaker._probe_at = t + 10
+        dev.breaker.poll(t + 5)
+        assert len(proto.sent) == num_sent
+        dev.breaker.poll(t + 10)
+        assert len(proto.sent) == num_sent + 1
+        probe, probe_handler = proto.sent[-1]
+        assert probe.cmd1 == 0x0d
+        assert probe_handler.breaker is None
+
+        # Only one probe at a time.
+        dev.breaker.poll(t + 11)
+        assert len(proto.sent) == num_sent + 1
+
+        # Failed probes back off up to the max time.
+        probe_handler.on_done(False, "timeout", None)
+        assert dev.breaker._backoff == 20
+        dev.breaker._probing = False
+        probe_handler.on_done(False, "timeout", None)
+        assert dev.breaker._backoff == 30
+        assert dev.breaker.is_open
+
+        # Any message from the device closes the breaker.
+        flags = Msg.Flags(Msg.Flags.Type.DIRECT_ACK, False, 3, 3)
+        dev.handle_received(Msg.InpStandard(dev.addr, dev.addr, flags, 0x0d,
+                                            0x02))
+        assert not dev.breaker.is_open
+        assert states == [False, True]
+        assert not proto.signal_poll.slots
+
+        dev.get_engine()
+        assert len(proto.sent) == num_sent + 2
+
+    #-----------------------------------------------------------------------
+    def test_disabled(self, tmpdir):
+        proto = MockProto()
+        dev = IM.device.Base(proto, MockModem(str(tmpdir)), '0a.12.34')
+        dev.breaker.load_config({"enable" : False, "threshold" : 1})
+
+        dev.breaker.timeout()
+        dev.breaker.timeout()
+        assert not dev.breaker.is_open
+
+        # Battery devices don't use a breaker.
+        dev = IM.device.Leak(proto, MockModem(str(tmpdir)), '0a.12.35')
+        assert dev.breaker is None
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+class MockProto:
+    def __init__(self):
+        self.signal_poll = IM.Signal()
+        self.sent = []
+
+    def send(self, msg, handler, high_priority=False):
+        self.sent.append((msg, handler))
+
+
+class MockModem:
+    def __init__(self, path):
+        self.save_path = path
@@ -0,0 +1,167 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/device/Mailbox.py
+#
+#===========================================================================
+import contextlib
+import insteon_mqtt as IM
+import insteon_mqtt.message as Msg
+
+
+class Test_Mailbox:
+    def test_hold(self, tmpdir):
+        proto = MockProto()
+        dev = IM.device.BatterySensor(proto, MockModem(str(tmpdir)),
+                                      '0a.12.34')
+        assert dev.mailbox is not None
+
+        # Asleep - messages are held.
+        handlers = [MockHandler() for i in range(3)]
+        dev.send(out(0x19), handlers[0])
+        dev.send(out(0x1f), handlers[1])
+        assert proto.sent == []
+        assert len(dev.mailbox) == 2
+
+        # A broadcast wakes the device and the messages are sent in order
+        # at the front of the queue.
+        t = 1000.0
+        dev.mailbox.handle_received(inp(Msg.Flags.Type.ALL_LINK_BROADCAST,
+                                        0x11), t)
+        assert [i[0].cmd1 for i in proto.sent] == [0x19, 0x1f]
+        assert proto.batches == [True]
+        assert len(dev.mailbox) == 0
+
+        # Still awake - messages go straight to the queue.
+        dev.mailbox.send(out(0x2e), handlers[2], t + 1)
+        assert proto.sent[-1] == (handlers[2].msg, True)
+
+        # Replies keep the device awake.
+        dev.mailbox.handle_received(inp(Msg.Flags.Type.DIRECT_ACK, 0x2e),
+                                    t + 3)
+        assert dev.mailbox.is_awake(t + 6)
+        assert not dev.mailbox.is_awake(t + 8)
+
+        # Replies while asleep don't wake the device.
+        dev.mailbox.handle_received(inp(Msg.Flags.Type.DIRECT_ACK, 0x2e),
+                                    t + 20)
+        assert not dev.mailbox.is_awake(t + 20)
+
+    #-----------------------------------------------------------------------
+    def test_set_button(self, tmpdir):
+        proto = MockProto()
+        dev = IM.device.Remote(proto, MockModem(str(tmpdir)), '0a.12.34',
+                               None, 4)
+
+        dev.send(out(0x19), MockHandler())
+        t = 1000.0
+        dev.mailbox.handle_received(inp(Msg.Flags.Type.BROADCAST, 0x01), t)
+        assert len(proto.sent) == 1
+        assert dev.mailbox.is_awake(t + 30)
+
+        # Other direct messages don't wake the device.
+        dev.send(out(0x19), MockHandler())
+        dev.mailbox.handle_received(inp(Msg.Flags.Type.DIRECT, 0x19),
+                                    t + 100)
+        assert len(proto.sent) == 1
+
+    #-----------------------------------------------------------------------
+    def test_retry(self, tmpdir):
+        proto = MockProto()
+        dev = IM.device.BatterySensor(proto, MockModem(str(tmpdir)),
+                                      '0a.12.34')
+
+        # Sent while awake but the device falls asleep before it replies.
+        t = 1000.0
+        dev.mailbox.handle_received(inp(Msg.Flags.Type.BROADCAST, 0x11), t)
+        handler = IM.handler.StandardCmd(out(0x19), None, num_retry=3)
+        dev.mailbox.send(out(0x19), handler, t + 1)
+        assert len(proto.sent) == 1
+
+        # The handler expires when the device falls asleep, before the
+        # normal time out.
+        handler.sending_message(proto.sent[0][0])
+        assert not handler.is_expired(proto, t + 2)
+        assert handler.is_expired(proto, dev.mailbox.awake_until)
+
+        # The retry goes back to the mailbox and is held there instead of
+        # being written to the sleeping device.
+        assert len(proto.timers) == 1
+        func, args = proto.timers.pop()
+        func(*args)
+        assert len(proto.sent) == 1
+        assert dev.mailbox.messages == [(proto.sent[0][0], handler)]
+
+    #-----------------------------------------------------------------------
+    def test_full(self, tmpdir):
+        proto = MockProto()
+        dev = IM.device.Leak(proto, MockModem(str(tmpdir)), '0a.12.34')
+
+        handlers = [MockHandler() for i in range(dev.mailbox.MAX_SIZE + 1)]
+        for h in handlers:
+            dev.mailbox.send(out(0x19), h, 0)
+
+        assert len(dev.mailbox) == dev.mailbox.MAX_SIZE
+        assert handlers[0].done == [False]
+        assert handlers[1].done == []
+
+        done = []
+        dev.run_command(cmd="clear_mailbox",
+                        on_done=lambda *args: done.append(args[0]))
+        assert done == [True]
+        assert len(dev.mailbox) == 0
+        assert handlers[1].done == [False]
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+def inp(type, cmd1):
+    addr = IM.Address('0a.12.34')
+    flags = Msg.Flags(type, False, 3, 3)
+    return Msg.InpStandard(addr, addr, flags, cmd1, 0x00)
+
+
+def out(cmd1):
+    return Msg.OutStandard.direct(IM.Address('0a.12.34'), cmd1, 0x00)
+
+
+class MockHandler:
+    def __init__(self):
+        self.done = []
+        self.msg = None
+
+    def use_history(self, history, max_hops=None):
+        pass
+
+    def use_mailbox(self, mailbox):
+        pass
+
+    def on_done(self, success, msg, data):
+        self.done.append(success)
+
+
+class MockProto:
+    def __init__(self):
+        self.sent = []
+        self.batches = []
+        self.timers = []
+
+    def send(self, msg, handler, high_priority=False):
+        handler.msg = msg
+        self.sent.append((msg, high_priority))
+
+    def retry_delay(self, msg, attempt):
+        return 1.0
+
+    def call_later(self, delay, func, *args):
+        self.timers.append((func, args))
+
+    @contextlib.contextmanager
+    def batch(self, high_priority=False):
+        self.batches.append(high_priority)
+        yield
+
+
+class MockModem:
+    def __init__(self, path):
+        self.save_path = path
@@ -0,0 +1,173 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/device/MsgHistory.py
+#
+#===========================================================================
+import json
+import time
+import insteon_mqtt as IM
+import insteon_mqtt.message as Msg
+
+
+class Test_MsgHistory:
+    def test_avg_hops(self):
+        obj = IM.device.MsgHistory()
+        assert obj.avg_hops() == 3
+        assert obj.max_hops() == 3
+
+        for i in range(20):
+            obj.add(inp(Msg.Flags.Type.BROADCAST, 3, 2))
+
+        assert obj.avg_hops() == 1
+        assert obj.max_hops() == 1
+
+        # Window only uses the last 10 messages.
+        for i in range(10):
+            obj.add(inp(Msg.Flags.Type.BROADCAST, 3, 1))
+        assert obj.avg_hops() == 2
+
+    #-----------------------------------------------------------------------
+    def test_acks(self):
+        obj = IM.device.MsgHistory()
+        t = time.time()
+
+        for i in range(10):
+            obj.add(inp(Msg.Flags.Type.BROADCAST, 3, 3))
+
+        assert obj.avg_hops() == 0
+
+        # 0 hop messages usually fail.
+        for i in range(10):
+            obj.sent(out(0), t)
+            if i % 2:
+                obj.add(inp(Msg.Flags.Type.DIRECT_ACK, 3, 3))
+            else:
+                obj.timeout()
+
+        assert obj.num_sent == 10
+        assert obj.num_ack == 5
+        assert obj.num_timeout == 5
+        assert obj.num_retry(3, 0) == 4
+
+        # Time of day is also poor so 2 hops are used.
+        assert obj.max_hops(t) == 2
+
+        # Good 1 hop messages.
+        for i in range(40):
+            obj.sent(out(1), t)
+            obj.add(inp(Msg.Flags.Type.DIRECT_NAK, 3, 3))
+
+        assert obj.num_nak == 40
+        assert obj.max_hops(t) == 1
+        assert obj.num_retry(3, 1) == 2
+        assert obj.num_retry(3) == 3
+
+        # ACK w/o a sent message isn't counted.
+        obj.add(inp(Msg.Flags.Type.DIRECT_ACK, 3, 3))
+        assert obj.num_ack == 45
+
+        # Decay keeps the counts bounded.
+        for i in range(100):
+            obj.sent(out(1), t)
+            obj.add(inp(Msg.Flags.Type.DIRECT_ACK, 3, 3))
+
+        assert obj._hop_stats[1][0] <= obj.OUTCOME_LEN
+
+    #-----------------------------------------------------------------------
+    def test_save(self, tmpdir):
+        path = str(tmpdir.join("hist.json"))
+        obj = IM.device.MsgHistory(path)
+        t = time.time()
+
+        for i in range(6):
+            obj.add(inp(Msg.Flags.Type.BROADCAST, 3, 2))
+            obj.sent(out(1), t)
+            obj.add(inp(Msg.Flags.Type.DIRECT_ACK, 3, 2))
+
+        # Not saved until the save interval passes.
+        assert not tmpdir.join("hist.json").exists()
+        obj.sent(out(1), t + obj.SAVE_INTERVAL)
+        assert tmpdir.join("hist.json").exists()
+
+        with open(path) as f:
+            data = json.load(f)
+
+        obj2 = IM.device.MsgHistory.from_json(data, path)
+        assert obj2.to_json() == obj.to_json()
+        assert obj2.save_path == path
+        assert obj2.avg_hops() == 1
+        assert obj2.num_sent == 7
+        assert obj2.num_retry(3, 1) == 4
+
+        # Forced save only writes changes.
+        obj2.save_path = str(tmpdir.join("hist2.json"))
+        obj2.save()
+        assert not tmpdir.join("hist2.json").exists()
+
+    #-----------------------------------------------------------------------
+    def test_device(self, tmpdir):
+        modem = MockModem(str(tmpdir))
+        addr = IM.Address('0a.12.34')
+        device = IM.device.Base(MockProto(), modem, addr)
+        assert device.history.save_path == device.history_path()
+
+        device.history.add(inp(Msg.Flags.Type.BROADCAST, 3, 3))
+        device.history.save()
+
+        device = IM.device.Base(MockProto(), modem, addr)
+        assert device.history.avg_hops() == 0
+
+    #-----------------------------------------------------------------------
+    def test_handler(self):
+        obj = IM.device.MsgHistory()
+        for i in range(10):
+            obj.sent(out(1))
+            obj.timeout()
+
+        handler = IM.handler.Base(num_retry=3)
+        handler.use_history(obj)
+        assert handler._num_retry == 5
+
+        # Retries add one hop at a time.
+        proto = MockProto()
+        msg = out(1)
+        handler.sending_message(msg)
+        assert obj.num_sent == 11
+
+        assert handler.is_expired(proto, time.time() + 10)
+        assert obj.num_timeout == 11
+        assert msg.flags.max_hops == 2
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+def inp(type, max_hops, hops_left):
+    addr = IM.Address('0a.12.34')
+    flags = Msg.Flags(type, False, hops_left, max_hops)
+    return Msg.InpStandard(addr, addr, flags, 0x11, 0x00)
+
+
+def out(max_hops):
+    msg = Msg.OutStandard.direct(IM.Address('0a.12.34'), 0x11, 0xff)
+    msg.flags.set_hops(max_hops)
+    return msg
+
+
+class MockProto:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, msg, handler, high_priority=False):
+        self.sent.append(msg)
+
+    def retry_delay(self, msg, attempt):
+        return 0
+
+    def send_later(self, delay, msg, handler):
+        self.send(msg, handler)
+
+
+class MockModem:
+    def __init__(self, path):
+        self.save_path = path
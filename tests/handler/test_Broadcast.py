@@ -20,8 +20,9 @@ class Test_Broadcast:
         r = handler.msg_received(proto, "dummy")
         assert r == Msg.UNKNOWN
 
+        # Broadcast to group 1 (the group is the last byte of the address).
         flags = Msg.Flags(Msg.Flags.Type.ALL_LINK_BROADCAST, False)
-        msg = Msg.InpStandard(addr, addr, flags, 0x11, 0x01)
+        msg = Msg.InpStandard(addr, IM.Address(0, 0, 1), flags, 0x11, 0x01)
 
         # no device
         r = handler.msg_received(proto, msg)
@@ -56,6 +57,52 @@ class Test_Broadcast:
         assert r == Msg.UNKNOWN
 
     #-----------------------------------------------------------------------
+    def test_interleaved(self, tmpdir):
+        proto = MockProto()
+        modem = IM.Modem(proto)
+        modem.save_path = str(tmpdir)
+        handler = IM.handler.Broadcast(modem)
+
+        calls = []
+        addrs = [IM.Address('0a.12.34'), IM.Address('0a.12.35')]
+        for addr in addrs:
+            device = IM.device.Base(proto, modem, addr)
+            device.handle_broadcast = calls.append
+            modem.add(device)
+
+        def msg(type, addr, group, cmd1):
+            flags = Msg.Flags(type, False)
+            if type == Msg.Flags.Type.ALL_LINK_BROADCAST:
+                return Msg.InpStandard(addr, IM.Address(0, 0, group), flags,
+                                       cmd1, 0x00)
+            return Msg.InpStandard(addr, modem.addr, flags, cmd1, group)
+
+        broadcast = Msg.Flags.Type.ALL_LINK_BROADCAST
+        cleanup = Msg.Flags.Type.ALL_LINK_CLEANUP
+
+        # A and B broadcast, then their cleanups arrive.
+        handler.msg_received(proto, msg(broadcast, addrs[0], 1, 0x11))
+        handler.msg_received(proto, msg(broadcast, addrs[1], 1, 0x11))
+        handler.msg_received(proto, msg(broadcast, addrs[0], 2, 0x13))
+        handler.msg_received(proto, msg(cleanup, addrs[0], 1, 0x11))
+        handler.msg_received(proto, msg(cleanup, addrs[1], 1, 0x11))
+        handler.msg_received(proto, msg(cleanup, addrs[0], 2, 0x13))
+        assert len(calls) == 3
+        assert handler._broadcasts == {}
+
+        # A different command or group is a new message.
+        handler.msg_received(proto, msg(broadcast, addrs[0], 1, 0x11))
+        handler.msg_received(proto, msg(cleanup, addrs[0], 1, 0x13))
+        handler.msg_received(proto, msg(cleanup, addrs[0], 3, 0x11))
+        assert len(calls) == 6
+
+        # Old broadcasts don't suppress cleanups.
+        key = (addrs[0].id, 1, 0x11)
+        handler._broadcasts[key] -= handler.CLEANUP_WINDOW + 1
+        handler.msg_received(proto, msg(cleanup, addrs[0], 1, 0x11))
+        assert len(calls) == 7
+
+    #-----------------------------------------------------------------------
 
 #===========================================================================
 
@@ -63,6 +110,7 @@ class Test_Broadcast:
 class MockProto:
     def __init__(self):
         self.signal_received = IM.Signal()
+        self.channel = IM.Channel()
 
     def add_handler(self, *args):
         pass
@@ -0,0 +1,84 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/handler/ModemScene.py
+#
+#===========================================================================
+import insteon_mqtt as IM
+import insteon_mqtt.message as Msg
+
+
+class Test_ModemScene:
+    def test_acks(self):
+        modem = MockModem()
+        calls = []
+
+        def callback(success, msg, data):
+            calls.append((success, data))
+
+        out = Msg.OutModemScene(20, 0x11, 0x00)
+        handler = IM.handler.ModemScene(modem, out, callback)
+
+        out.is_ack = True
+        r = handler.msg_received(None, out)
+        assert r == Msg.CONTINUE
+
+        # Cleanup ACK from the first device.
+        a1 = IM.Address('0a.12.34')
+        a2 = IM.Address('0a.12.35')
+        flags = Msg.Flags(Msg.Flags.Type.CLEANUP_ACK, False)
+        msg = Msg.InpStandard(a1, modem.addr, flags, 0x11, 20)
+        r = handler.msg_received(None, msg)
+        assert r == Msg.CONTINUE
+
+        # Wrong command is ignored.
+        msg = Msg.InpStandard(a2, modem.addr, flags, 0x13, 20)
+        r = handler.msg_received(None, msg)
+        assert r == Msg.UNKNOWN
+
+        # Second device failed.
+        msg = Msg.InpAllLinkFailure(20, a2)
+        r = handler.msg_received(None, msg)
+        assert r == Msg.CONTINUE
+
+        msg = Msg.InpAllLinkFailure(21, a2)
+        r = handler.msg_received(None, msg)
+        assert r == Msg.UNKNOWN
+
+        r = handler.msg_received(None, Msg.InpAllLinkStatus(True))
+        assert r == Msg.FINISHED
+
+        # Only the device that ACK'ed is updated.
+        assert modem.scenes == [(20, 0x11, [a1])]
+        assert calls == [(True, {"acked" : [a1], "failed" : [a2],
+                                 "applied" : [a1]})]
+
+    #-----------------------------------------------------------------------
+    def test_no_reports(self):
+        modem = MockModem()
+        calls = []
+
+        def callback(success, msg, data):
+            calls.append((success, data["applied"]))
+
+        out = Msg.OutModemScene(20, 0x13, 0x00)
+        handler = IM.handler.ModemScene(modem, out, callback)
+
+        # No cleanup reports - every responder is updated.
+        r = handler.msg_received(None, Msg.InpAllLinkStatus(True))
+        assert r == Msg.FINISHED
+        assert modem.scenes == [(20, 0x13, None)]
+        assert calls == [(True, modem.responders)]
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+class MockModem:
+    def __init__(self):
+        self.addr = IM.Address('44.85.11')
+        self.responders = [IM.Address('0a.12.34'), IM.Address('0a.12.35')]
+        self.scenes = []
+
+    def handle_scene(self, group, cmd, addrs=None):
+        self.scenes.append((group, cmd, addrs))
+        return self.responders if addrs is None else addrs
@@ -127,10 +127,11 @@ class Test_StandardCmd:
         assert calls[0] == msg
 
     #-----------------------------------------------------------------------
-    def test_engine_version(self):
+    def test_engine_version(self, tmpdir):
         # Tests response to get engine version
         proto = MockProto()
         modem = MockModem()
+        modem.save_path = str(tmpdir)
         calls = []
         addr = IM.Address('0a.12.34')
         device = IM.device.Base(proto, modem, addr)
@@ -15,6 +15,7 @@ class Test_InpAllLinkRec:
                    0x3a, 0x29, 0x84,  # addess
                    0x01, 0x0e, 0x43])  # data
         obj = Msg.InpAllLinkRec.from_bytes(b)
+        assert obj.to_bytes() == b
 
         assert obj.db_flags.in_use is True
         assert obj.db_flags.is_controller is True
@@ -11,6 +11,7 @@ class Test_InpAllLinkStatus:
     def test_ack(self):
         b = bytes([0x02, 0x58, 0x06])
         obj = Msg.InpAllLinkStatus.from_bytes(b)
+        assert obj.to_bytes() == b
 
         assert obj.is_ack is True
 
@@ -18,6 +18,7 @@ class Test_InpExtended:
                    0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x08, 0x09,
                    0x0a, 0x0b, 0x0c, 0x0d, 0x0e])
         obj = Msg.InpExtended.from_bytes(b)
+        assert obj.to_bytes() == b
 
         assert obj.from_addr.ids == [0x3e, 0xe2, 0xc4]
         assert obj.to_addr.ids == [0x23, 0x9b, 0x65]
@@ -15,6 +15,7 @@ class Test_InpStandard:
                    0xaf,  # flags
                    0x11, 0x01])  # cmd1, cmd2
         obj = Msg.InpStandard.from_bytes(b)
+        assert obj.to_bytes() == b
 
         assert obj.from_addr.ids == [0x3e, 0xe2, 0xc4]
         assert obj.to_addr.ids == [0x23, 0x9b, 0x65]
@@ -0,0 +1,393 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/mqtt/Mqtt.py
+#
+#===========================================================================
+import contextlib
+import json
+import insteon_mqtt as IM
+
+
+class Test_Mqtt:
+    def test_subscribe(self):
+        link = MockLink()
+        modem = IM.Modem(MockProto())
+        modem.addr = IM.Address("44.85.11")
+        modem.save_path = ""
+        mqtt = IM.mqtt.Mqtt(link, modem)
+        mqtt.load_config({"cmd_topic" : "insteon/command"})
+
+        for i in range(20):
+            addr = IM.Address(0x100000 + i)
+            device = IM.device.Dimmer(modem.protocol, modem, addr)
+            mqtt.handle_new_device(modem, device)
+
+        link.signal_connected.emit(link, True)
+
+        # Only the wildcard filters get sent to the broker.
+        assert sorted(link.subs) == ["insteon/+/level", "insteon/+/scene",
+                                     "insteon/+/set", "insteon/command/+"]
+
+        # Inbound messages are routed to the device callbacks.
+        calls = []
+        obj = mqtt.devices[IM.Address(0x100005).id]
+        obj.handle_set = lambda *args: calls.append(args)
+        mqtt._subscribe()
+        mqtt.handle_message(link, MockMessage("insteon/10.00.05/set"))
+        mqtt.handle_message(link, MockMessage("insteon/ff.ff.ff/set"))
+        assert len(calls) == 1
+
+    #-----------------------------------------------------------------------
+    def test_subscribe_keypad(self):
+        link = MockLink()
+        modem = IM.Modem(MockProto())
+        modem.addr = IM.Address("44.85.11")
+        modem.save_path = ""
+        mqtt = IM.mqtt.Mqtt(link, modem)
+        mqtt.load_config({"cmd_topic" : "insteon/command"})
+
+        addr = IM.Address("10.00.01")
+        device = IM.device.KeypadLinc(modem.protocol, modem, addr, "kp")
+        mqtt.handle_new_device(modem, device)
+        link.signal_connected.emit(link, True)
+
+        # None of the button command topics are merged into a filter that
+        # would match the button state topics we publish.
+        obj = mqtt.devices[addr.id]
+        assert len(link.subs) > 1
+        for button in range(1, 9):
+            data = obj.template_data(button=button)
+            state = obj.msg_btn_state.render_topic(data)
+            for topic in link.subs:
+                assert not IM.mqtt.TopicRouter.overlaps(topic, state)
+
+        # Every registered topic is still covered.
+        for topic in mqtt.router:
+            assert any(IM.mqtt.TopicRouter.covers(i, topic)
+                       for i in link.subs)
+
+    #-----------------------------------------------------------------------
+    def test_sessions(self):
+        LOG = IM.log.get_logger()
+        LOG.setLevel(IM.log.UI_LEVEL)
+
+        link = MockLink()
+        modem = IM.Modem(MockProto())
+        modem.addr = IM.Address("44.85.11")
+        mqtt = IM.mqtt.Mqtt(link, modem)
+
+        # Fake device that starts a handler for the command and returns.
+        handlers = []
+        device = MockDevice()
+        device.cmd_map["run"] = \
+            lambda on_done: handlers.append(IM.handler.Base(on_done))
+        modem.device_names["dev"] = device
+
+        for id in ["1", "2"]:
+            payload = json.dumps({"cmd" : "run", "session" : id})
+            msg = MockMessage("insteon/command/dev", payload.encode())
+            mqtt.handle_cmd(None, None, msg)
+
+        assert len(handlers) == 2
+        assert handlers[0].ui_callback is not handlers[1].ui_callback
+        link.pubs = []
+
+        # Messages from the handlers go to their own session.
+        with LOG.ui_context(handlers[1].ui_callback):
+            LOG.ui("msg 2")
+            handlers[1].on_done(True, "done 2", None)
+
+        with LOG.ui_context(handlers[0].ui_callback):
+            handlers[0].on_done(False, "failed 1", None)
+
+        # Nothing is sent once a session has ended.
+        with LOG.ui_context(handlers[1].ui_callback):
+            LOG.ui("ignored")
+
+        topic = "insteon/command/dev/session/%s"
+        replies = [(t, json.loads(p)) for t, p in link.pubs]
+        assert replies == [
+            (topic % 2, {"type" : "MESSAGE", "data" : "msg 2"}),
+            (topic % 2, {"type" : "MESSAGE", "data" : "done 2"}),
+            (topic % 2, {"type" : "END", "data" : None}),
+            (topic % 1, {"type" : "ERROR", "data" : "failed 1"}),
+            (topic % 1, {"type" : "END", "data" : None}),
+            ]
+        assert LOG.ui_callback() is None
+
+    #-----------------------------------------------------------------------
+    def test_bulk(self):
+        LOG = IM.log.get_logger()
+        LOG.setLevel(IM.log.UI_LEVEL)
+
+        link = MockLink()
+        proto = MockProto()
+        modem = IM.Modem(proto)
+        modem.addr = IM.Address("44.85.11")
+        mqtt = IM.mqtt.Mqtt(link, modem)
+
+        calls = []
+
+        def run(on_done, level=255):
+            calls.append((on_done, level, proto.batch_priority,
+                          LOG.ui_callback()))
+
+        for name in ["a", "b"]:
+            device = MockDevice(name)
+            device.cmd_map["run"] = run
+            modem.device_names[name] = device
+
+        # Invalid commands - nothing gets run.
+        payload = {"session" : "1", "commands" : [
+            {"device" : "a", "cmd" : "run"},
+            {"device" : "b", "cmd" : "run", "args" : {"bad" : 1}},
+            {"device" : "a", "cmd" : "unknown"},
+            ]}
+        msg = MockMessage("insteon/command/bulk", json.dumps(payload).encode())
+        mqtt.handle_bulk(None, None, msg)
+
+        assert calls == []
+        replies = [json.loads(p) for t, p in link.pubs]
+        assert [r["type"] for r in replies] == ["ERROR", "ERROR", "END"]
+        link.pubs = []
+
+        payload = {"session" : "2", "priority" : "high", "commands" : [
+            {"device" : "a", "cmd" : "run"},
+            {"device" : "b", "cmd" : "run", "args" : {"level" : 10}},
+            ]}
+        msg = MockMessage("insteon/command/bulk", json.dumps(payload).encode())
+        mqtt.handle_bulk(None, None, msg)
+
+        # Commands run in a high priority batch w/o the session context.
+        assert [c[1:] for c in calls] == [(255, True, None), (10, True, None)]
+        assert link.pubs == []
+
+        calls[1][0](False, "failed", None)
+        assert link.pubs == []
+
+        # A callback that runs twice is only counted once.
+        calls[1][0](False, "failed again", None)
+        assert link.pubs == []
+        calls[0][0](True, "ok", None)
+
+        topic = "insteon/command/bulk/session/2"
+        assert [t for t, p in link.pubs] == [topic, topic]
+        reply = json.loads(link.pubs[0][1])
+        assert reply["type"] == "ERROR"
+        assert json.loads(reply["data"]) == {
+            "total" : 2, "success" : 1, "results" : [
+                {"device" : "a", "cmd" : "run", "success" : True,
+                 "message" : "ok"},
+                {"device" : "b", "cmd" : "run", "success" : False,
+                 "message" : "failed"},
+                ]}
+        assert json.loads(link.pubs[1][1])["type"] == "END"
+
+        # A bare list is the list of commands.
+        calls.clear()
+        payload = [{"device" : "a", "cmd" : "run"},
+                   {"device" : "b", "cmd" : "run", "args" : {"level" : 5}}]
+        msg = MockMessage("insteon/command/bulk", json.dumps(payload).encode())
+        mqtt.handle_bulk(None, None, msg)
+        assert [c[1:] for c in calls] == [(255, False, None),
+                                          (5, False, None)]
+
+        # Any other payload is rejected.
+        calls.clear()
+        for payload in [b'"run"', b'5', b'null']:
+            mqtt.handle_bulk(None, None, MockMessage("insteon/command/bulk",
+                                                     payload))
+        assert calls == []
+
+    #-----------------------------------------------------------------------
+    def test_bulk_scene(self, tmpdir):
+        link = MockLink()
+        proto = MockProto()
+        modem = IM.Modem(proto)
+        modem.addr = IM.Address("44.85.11")
+        modem.save_path = str(tmpdir)
+        mqtt = IM.mqtt.Mqtt(link, modem)
+
+        # Modem group 20 controls 3 dimmers with an on level of 128.
+        addrs = [IM.Address(0x100000 + i) for i in range(4)]
+        for addr in addrs:
+            device = IM.device.Dimmer(proto, modem, addr)
+            modem.devices[addr.id] = device
+            if addr != addrs[3]:
+                modem.db.add_entry(IM.db.ModemEntry(addr, 20, True, None))
+                flags = IM.message.DbFlags(True, False, True)
+                device.db.add_entry(IM.db.DeviceEntry(modem.addr, 20, 0xfff,
+                                                      flags, [128, 0, 0]))
+
+        def bulk(cmd, addrs, args=None):
+            commands = [{"device" : i.hex, "cmd" : cmd, "args" : args or {}}
+                        for i in addrs]
+            payload = json.dumps({"commands" : commands}).encode()
+            mqtt.handle_bulk(None, None,
+                             MockMessage("insteon/command/bulk", payload))
+
+        # Wrong level or device set - sent directly.
+        bulk("on", addrs[:3], {"level" : 255})
+        bulk("off", addrs)
+        assert len(proto.sent) == 7
+        assert not any(isinstance(m, IM.message.OutModemScene)
+                       for m, h in proto.sent)
+        proto.sent = []
+
+        def scene(level, reports):
+            proto.sent = []
+            bulk("on", addrs[:3], {"level" : level})
+            assert len(proto.sent) == 1
+            msg, handler = proto.sent[0]
+            assert isinstance(msg, IM.message.OutModemScene)
+            assert msg.group == 20 and msg.cmd1 == 0x11
+
+            proto.sent = []
+            msg.is_ack = True
+            assert handler.msg_received(proto, msg) == IM.message.CONTINUE
+            for report in reports:
+                r = handler.msg_received(proto, report)
+                assert r == IM.message.CONTINUE
+            r = handler.msg_received(proto, IM.message.InpAllLinkStatus(True))
+            assert r == IM.message.FINISHED
+
+        # Matching set - sent as a scene.  One device ACK's the cleanup and
+        # one fails.  The others get the direct command.
+        flags = IM.message.Flags(IM.message.Flags.Type.CLEANUP_ACK, False)
+        scene(128, [
+            IM.message.InpStandard(addrs[1], modem.addr, flags, 0x11, 20),
+            IM.message.InpAllLinkFailure(20, addrs[2]),
+            ])
+        assert [m.to_addr for m, h in proto.sent] == [addrs[0], addrs[2]]
+        assert modem.devices[addrs[1].id]._level == 128
+        assert modem.devices[addrs[0].id]._level == 0
+
+        # No cleanup reports - every responder is updated by the scene and
+        # nothing is sent directly.
+        scene(128, [])
+        assert proto.sent == []
+        assert all(modem.devices[a.id]._level == 128 for a in addrs[:3])
+
+    #-----------------------------------------------------------------------
+    def test_available(self, tmpdir):
+        link = MockLink()
+        modem = IM.Modem(MockProto())
+        modem.addr = IM.Address("44.85.11")
+        modem.save_path = str(tmpdir)
+        mqtt = IM.mqtt.Mqtt(link, modem)
+        mqtt.load_config({"cmd_topic" : "insteon/command",
+                          "available_payload" : "{{available}}"})
+
+        device = IM.device.Switch(modem.protocol, modem, "0a.00.01", "sw")
+        mqtt.handle_new_device(modem, device)
+
+        device.breaker.signal_state.emit(device, False)
+        device.breaker.signal_state.emit(device, True)
+        assert link.pubs == [("insteon/0a.00.01/available", "0"),
+                             ("insteon/0a.00.01/available", "1")]
+
+    #-----------------------------------------------------------------------
+    def test_metrics(self, tmpdir):
+        link = MockLink()
+        proto = MockProto()
+        modem = IM.Modem(proto)
+        modem.addr = IM.Address("44.85.11")
+        modem.save_path = str(tmpdir)
+        mqtt = IM.mqtt.Mqtt(link, modem)
+        mqtt.load_config({"cmd_topic" : "insteon/command",
+                          "metrics_interval" : 10})
+
+        t = 1000.0
+        msg = IM.message.OutStandard.direct(IM.Address("0a.00.01"), 0x11,
+                                            0xff)
+        proto.channel.sent(msg, t)
+
+        # Nothing is published until connected.
+        proto.signal_poll.emit(t)
+        assert link.pubs == []
+
+        link.connected = True
+        proto.signal_poll.emit(t)
+        proto.signal_poll.emit(t + 5)
+        assert len(link.pubs) == 1
+        topic, payload = link.pubs[0]
+        assert topic == "insteon/metrics"
+        data = json.loads(payload)
+        assert data["sent"] == 1
+        assert data["airtime_sent"] > 0
+        assert data["utilization"] > 0
+
+        proto.signal_poll.emit(t + 10)
+        assert len(link.pubs) == 2
+
+        # Latency histograms are published once commands are traced.
+        trace = proto.latency.start("insteon/command/sw", t)
+        trace.mark("publish", t + 0.5)
+        trace.finish()
+        proto.signal_poll.emit(t + 20)
+        assert len(link.pubs) == 4
+        topic, payload = link.pubs[3]
+        assert topic == "insteon/latency"
+        assert json.loads(payload)["stages"]["total"]["num"] == 1
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+class MockDevice:
+    def __init__(self, label="dev"):
+        self.label = label
+        self.addr = IM.Address(0x0a0000 + len(label))
+        self.cmd_map = {}
+
+    def type(self):
+        return "MockDevice"
+
+
+class MockLink:
+    def __init__(self):
+        self.signal_connected = IM.Signal()
+        self.signal_message = IM.Signal()
+        self.connected = False
+        self.subs = []
+        self.pubs = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.pubs.append((topic, payload))
+
+    def load_config(self, config):
+        pass
+
+    def subscribe(self, topic, qos=0, callback=None):
+        self.subs.append(topic)
+
+    def unsubscribe(self, topic):
+        self.subs.remove(topic)
+
+
+class MockProto:
+    def __init__(self):
+        self.signal_received = IM.Signal()
+        self.signal_poll = IM.Signal()
+        self.channel = IM.Channel()
+        self.latency = IM.latency.Recorder()
+        self.batch_priority = None
+        self.sent = []
+
+    def send(self, msg, msg_handler, high_priority=False):
+        self.sent.append((msg, msg_handler))
+
+    def add_handler(self, *args):
+        pass
+
+    @contextlib.contextmanager
+    def batch(self, high_priority=False):
+        self.batch_priority = high_priority
+        yield
+        self.batch_priority = None
+
+
+class MockMessage:
+    def __init__(self, topic, payload=b""):
+        self.topic = topic
+        self.payload = payload
@@ -0,0 +1,159 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/mqtt/TopicRouter.py
+#
+#===========================================================================
+import functools
+import insteon_mqtt as IM
+
+
+class Test_TopicRouter:
+    def test_route(self):
+        router = IM.mqtt.TopicRouter()
+        calls = []
+
+        def cb1(client, data, message):
+            calls.append(("cb1", message.topic))
+
+        def cb2(client, data, message):
+            calls.append(("cb2", message.topic))
+
+        def cb3(client, data, message):
+            calls.append(("cb3", message.topic))
+
+        router.subscribe("insteon/aa.bb.cc/set", 1, cb1)
+        router.subscribe("insteon/command/+", 1, cb2)
+        router.subscribe("other/#", 1, cb3)
+        assert len(router) == 3
+
+        assert router.route(None, MockMessage("insteon/aa.bb.cc/set"))
+        assert router.route(None, MockMessage("insteon/command/modem"))
+        assert router.route(None, MockMessage("other/a/b/c"))
+        assert router.route(None, MockMessage("other"))
+        assert not router.route(None, MockMessage("insteon/aa.bb.cc/state"))
+        assert not router.route(None, MockMessage("insteon/command"))
+
+        assert calls == [("cb1", "insteon/aa.bb.cc/set"),
+                         ("cb2", "insteon/command/modem"),
+                         ("cb3", "other/a/b/c"),
+                         ("cb3", "other")]
+
+    #-----------------------------------------------------------------------
+    def test_specific(self):
+        router = IM.mqtt.TopicRouter()
+        router.subscribe("insteon/command/+", 1, "wild")
+        router.subscribe("insteon/command/bulk", 1, "exact")
+        router.subscribe("insteon/#", 1, "all")
+
+        assert router.find("insteon/command/bulk") == "exact"
+        assert router.find("insteon/command/modem") == "wild"
+        assert router.find("insteon/a/b") == "all"
+        assert router.find("$SYS/a") is None
+
+    #-----------------------------------------------------------------------
+    def test_unsubscribe(self):
+        router = IM.mqtt.TopicRouter()
+        router.subscribe("insteon/a/set", 1, "a")
+        router.subscribe("insteon/a/set/more", 1, "b")
+
+        router.unsubscribe("insteon/a/set")
+        assert router.find("insteon/a/set") is None
+        assert router.find("insteon/a/set/more") == "b"
+
+        router.unsubscribe("insteon/a/set/more")
+        assert router.find("insteon/a/set/more") is None
+        assert router._root.children == {}
+
+        # Unknown topics are ignored.
+        router.unsubscribe("insteon/b/set")
+
+    #-----------------------------------------------------------------------
+    def test_filters(self):
+        router = IM.mqtt.TopicRouter()
+        assert router.filters() == []
+
+        # The callback is the device that registered the topic.
+        router.subscribe("insteon/command/+", 1, "cmd")
+        for addr in ["aa.bb.cc", "aa.bb.dd", "lamp"]:
+            router.subscribe("insteon/%s/set" % addr, 1, addr)
+            router.subscribe("insteon/%s/scene" % addr, 1, addr)
+
+        router.subscribe("insteon/modem/scene", 1, "modem")
+        router.subscribe("single/topic", 1, "single")
+
+        assert router.filters() == ["insteon/+/scene", "insteon/+/set",
+                                    "insteon/command/+", "single/topic"]
+
+        # Every registered topic must be covered by a filter.
+        sub = IM.mqtt.TopicRouter()
+        for topic in router.filters():
+            sub.subscribe(topic, 1, topic)
+
+        for topic in router._callbacks:
+            if "+" not in topic:
+                assert sub.find(topic) is not None
+
+        # A single device isn't collapsed to insteon/ADDR/+ which would
+        # also match the state topic we publish.
+        router = IM.mqtt.TopicRouter()
+        dev = MockDevice()
+        for cmd in ["set", "level", "scene"]:
+            router.subscribe("insteon/aa.bb.cc/%s" % cmd, 1,
+                             functools.partial(dev.handle, cmd=cmd))
+
+        assert router.filters() == ["insteon/aa.bb.cc/level",
+                                    "insteon/aa.bb.cc/scene",
+                                    "insteon/aa.bb.cc/set"]
+
+        # Groups that overlap an output are never used.
+        router = IM.mqtt.TopicRouter()
+        router.subscribe("insteon/aa.bb.cc/set", 1, "a")
+        router.subscribe("insteon/aa.bb.dd/set", 1, "b")
+        assert router.filters() == ["insteon/+/set"]
+        assert router.filters(["insteon/+/+"]) == ["insteon/aa.bb.cc/set",
+                                                   "insteon/aa.bb.dd/set"]
+
+    #-----------------------------------------------------------------------
+    def test_overlap(self):
+        router = IM.mqtt.TopicRouter()
+        router.subscribe("insteon/command/+", 1, "cmd")
+        router.subscribe("insteon/command/bulk", 1, "bulk")
+        router.subscribe("other/#", 1, "other")
+        router.subscribe("other/a/b", 1, "b")
+
+        # Topics covered by a wildcard aren't subscribed to twice.
+        assert router.filters() == ["insteon/command/+", "other/#"]
+
+        # But the most specific callback is still used.
+        assert router.find("insteon/command/bulk") == "bulk"
+        assert router.find("insteon/command/aa.bb.cc") == "cmd"
+
+        covers = IM.mqtt.TopicRouter.covers
+        assert covers("a/+", "a/b")
+        assert covers("a/+", "a/+")
+        assert covers("a/#", "a/b/+")
+        assert not covers("a/+", "a/b/c")
+        assert not covers("a/b", "a/+")
+        assert not covers("a/+/c", "a/#")
+
+        overlaps = IM.mqtt.TopicRouter.overlaps
+        assert overlaps("a/+/1", "a/b/+")
+        assert overlaps("a/#", "a")
+        assert overlaps("a/b", "a/b")
+        assert not overlaps("a/+/1", "a/b/2")
+        assert not overlaps("a/+", "a/b/c")
+        assert not overlaps("a", "a/b")
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+class MockMessage:
+    def __init__(self, topic, payload=b""):
+        self.topic = topic
+        self.payload = payload
+
+
+class MockDevice:
+    def handle(self, client, data, message, cmd):
+        pass
@@ -0,0 +1,88 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/network/Replay.py
+#
+#===========================================================================
+import time
+import insteon_mqtt as IM
+import insteon_mqtt.message as Msg
+
+
+class Test_Replay:
+    def test_capture(self, tmpdir):
+        path = str(tmpdir.join("capture.bin"))
+        link = MockLink()
+        capture = IM.network.Capture(path)
+        capture.tap(link)
+
+        link.signal_wrote.emit(link, b"\x02\x62")
+        link.signal_read.emit(link, b"\x02\x50")
+        link.signal_closing.emit(link)
+
+        records = IM.Trace.read(path)
+        assert [r[1:] for r in records] == [(IM.Trace.WRITE, b"\x02\x62"),
+                                            (IM.Trace.READ, b"\x02\x50")]
+        assert abs(records[0][0] - time.time()) < 60
+
+    #-----------------------------------------------------------------------
+    def test_replay(self, tmpdir):
+        # Capture 10 broadcasts sent 0.1 sec apart.
+        path = str(tmpdir.join("capture.bin"))
+        capture = IM.network.Capture(path)
+        for i in range(10):
+            msg = Msg.InpStandard(IM.Address(0x0a0000 + i),
+                                  IM.Address(0, 0, 1),
+                                  Msg.Flags(Msg.Flags.Type.ALL_LINK_BROADCAST,
+                                            False, 3, 3), 0x11, 0xff)
+            capture.record(IM.Trace.WRITE, b"\x02\x62", 1000 + 0.1 * i)
+            capture.record(IM.Trace.READ, msg.to_bytes(), 1000 + 0.1 * i)
+        capture.close()
+
+        for speed, min_dt in [(0, 0), (9, 0.1)]:
+            loop = IM.network.Manager()
+            link = IM.network.Replay()
+            link.load_config({"replay" : {"file" : path, "speed" : speed}})
+            proto = IM.Protocol(link)
+            loop.add(link, connected=False)
+
+            msgs = []
+            proto.signal_received.connect(msgs.append)
+
+            start = time.time()
+            while not link.finished and time.time() - start < 5:
+                loop.select(0.05)
+            dt = time.time() - start
+
+            assert link.finished
+            assert dt >= min_dt
+            assert [m.from_addr.id for m in msgs] == \
+                [0x0a0000 + i for i in range(10)]
+            assert not loop.active()
+
+    #-----------------------------------------------------------------------
+    def test_write(self):
+        link = IM.network.Replay()
+        wrote = []
+
+        def on_wrote(link, data):
+            wrote.append(data)
+
+        link.signal_wrote.connect(on_wrote)
+
+        link.write(b"\x01", 10)
+        link.write(b"\x02")
+        link.write_to_link(5)
+        assert wrote == []
+        link.write_to_link(10)
+        link.write_to_link(10)
+        assert wrote == [b"\x01", b"\x02"]
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+class MockLink:
+    def __init__(self):
+        self.signal_read = IM.Signal()
+        self.signal_wrote = IM.Signal()
+        self.signal_closing = IM.Signal()
@@ -0,0 +1,120 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/sim/Broker.py
+#
+#===========================================================================
+import time
+import insteon_mqtt as IM
+import insteon_mqtt.bench as bench
+
+
+class Test_Broker:
+    def test_messages(self):
+        broker = IM.sim.Broker()
+        broker.load_config({"broker" : "127.0.0.1", "port" : 1883})
+        assert broker.connect()
+        assert broker.connected
+
+        received = []
+
+        def message(link, msg):
+            received.append((msg.topic, msg.payload))
+
+        broker.signal_message.connect(message)
+
+        # Messages are only delivered if they match a subscription.
+        broker.subscribe("insteon/+/set")
+        assert broker.inject("insteon/aa.bb.cc/set", "ON")
+        assert not broker.inject("insteon/aa.bb.cc/level", "ON")
+        assert received == []
+
+        broker.write_to_link(0)
+        assert received == [("insteon/aa.bb.cc/set", b"ON")]
+
+        # Callback subscriptions don't emit the signal.
+        callbacks = []
+
+        def callback(client, data, msg):
+            callbacks.append(msg.topic)
+
+        broker.subscribe("insteon/command/+", 1, callback)
+        broker.inject("insteon/command/aa.bb.cc", b'{"cmd" : "on"}')
+        broker.write_to_link(0)
+        assert callbacks == ["insteon/command/aa.bb.cc"]
+        assert len(received) == 1
+
+        broker.unsubscribe("insteon/+/set")
+        assert not broker.inject("insteon/aa.bb.cc/set", "ON")
+
+        broker.close()
+        assert not broker.connected
+
+    #-----------------------------------------------------------------------
+    def test_publish(self):
+        broker = IM.sim.Broker()
+        broker.connect()
+
+        published = []
+
+        def publish(link, msg):
+            published.append((msg.topic, msg.payload, msg.retain))
+
+        broker.signal_publish.connect(publish)
+        broker.publish("insteon/aa.bb.cc/state", "ON", 1, True)
+        broker.publish("insteon/aa.bb.cc/state", "OFF", 1, True)
+        broker.publish("insteon/aa.bb.cc/event", "1", 1, False)
+        assert published[-1] == ("insteon/aa.bb.cc/event", b"1", False)
+        assert broker.retained == {"insteon/aa.bb.cc/state" : b"OFF"}
+        assert broker.num_published == 3
+
+        # Messages matching the subscriptions are delivered back.
+        received = []
+
+        def message(link, msg):
+            received.append(msg.topic)
+
+        broker.signal_message.connect(message)
+        broker.subscribe("insteon/#")
+        broker.publish("insteon/aa.bb.cc/state", "ON")
+        broker.write_to_link(0)
+        assert received == ["insteon/aa.bb.cc/state"]
+
+    #-----------------------------------------------------------------------
+    def test_bridge(self, tmpdir):
+        # The full bridge runs against the simulated modem and broker.
+        cfg = bench.scale.make_config(4, str(tmpdir), latency=0.01)
+        assert sorted(sum(cfg["insteon"]["devices"].values(), [])) == \
+            ["20.00.00", "20.00.01", "20.00.02", "20.00.03"]
+
+        loop, mqtt_handler, modem = IM.cmd_line.start.setup(cfg)
+        broker = mqtt_handler.link
+        assert isinstance(broker, IM.sim.Broker)
+        assert isinstance(modem.protocol.link, IM.sim.Plm)
+
+        while loop.unconnected:
+            loop.select(0.001)
+        assert broker.subscriptions
+
+        published = []
+
+        def publish(link, msg):
+            published.append((msg.topic, msg.payload))
+
+        broker.signal_publish.connect(publish)
+        broker.inject("insteon/20.00.00/level",
+                      '{ "state" : "ON", "brightness" : 128 }')
+        end = time.time() + 5
+        while not published and time.time() < end:
+            loop.select(0.001)
+
+        assert ("insteon/20.00.00/state",
+                b'{ "state" : "ON", "brightness" : 128 }') in published
+        sim_dim = modem.protocol.link.devices[IM.Address("20.00.00").id]
+        assert sim_dim.level == 128
+
+        loop.close_all()
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
@@ -0,0 +1,132 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/sim/Plm.py
+#
+#===========================================================================
+import insteon_mqtt as IM
+
+
+class Test_Plm:
+    def test_commands(self, tmpdir, monkeypatch):
+        plm, modem = make_modem(tmpdir, monkeypatch)
+        sim_dim = plm.add(IM.sim.Dimmer("0a.00.01"))
+        sim_kp = plm.add(IM.sim.KeypadLinc("0a.00.02"))
+        dim = IM.device.Dimmer(modem.protocol, modem, "0a.00.01")
+        kp = IM.device.KeypadLinc(modem.protocol, modem, "0a.00.02", "kp")
+        modem.add(dim)
+        modem.add(kp)
+
+        dim.on(level=0x80)
+        kp.set_button_led(3, True)
+        run(plm, 2)
+        assert sim_dim.level == 0x80 and dim._level == 0x80
+        assert sim_kp.led_bits == 0x04 and kp._led_bits == 0x04
+
+        # The modem and device databases are downloaded.
+        modem.refresh()
+        dim.refresh(force=True)
+        run(plm, 5)
+        assert len(modem.db) == 4
+        assert len(dim.db) == 2
+        assert dim.db.delta == sim_dim.db_delta
+
+        # Physical button presses are sent to the modem.
+        sim_dim.press(False)
+        run(plm, 2)
+        assert dim._level == 0x00
+
+        # Modem scene updates the responders and they ACK the cleanup.
+        sim_dim.add_link(modem.addr, 30, False, [0x40, 0x00, 0x01])
+        plm.db.append(IM.db.ModemEntry(sim_dim.addr, 30, True))
+        done = []
+        modem.scene(True, 30, on_done=lambda *args: done.append(args))
+        run(plm, 3)
+        assert sim_dim.level == 0x40
+        assert done and done[0][0] is True
+
+    #-----------------------------------------------------------------------
+    def test_faults(self, tmpdir, monkeypatch):
+        plm, modem = make_modem(tmpdir, monkeypatch)
+        plm.load_config({"sim" : {
+            "seed" : 1,
+            "collision_rate" : 0.5,
+            "devices" : {"0a.00.01" : {"drop_rate" : 1}},
+            }})
+        sim_dim = plm.add(IM.sim.Dimmer("0a.00.01"))
+        sim_ok = plm.add(IM.sim.Dimmer("0a.00.02"))
+        sim_bat = plm.add(IM.sim.BatterySensor("0a.00.03"))
+        assert sim_dim.drop_rate == 1 and sim_ok.drop_rate == 0
+
+        dim = IM.device.Dimmer(modem.protocol, modem, "0a.00.01")
+        ok = IM.device.Dimmer(modem.protocol, modem, "0a.00.02")
+        done = []
+
+        def on_done(success, msg, data):
+            done.append(success)
+
+        # Dropped replies time out, collisions are NAK'ed and retried.
+        dim.on(on_done=on_done)
+        ok.on(level=0x30, on_done=on_done)
+        run(plm, 30)
+        assert sorted(done) == [False, True]
+        assert sim_dim.level == 0xff and ok._level == 0x30
+        assert plm.num_dropped > 0 and plm.num_collisions > 0
+
+        # Sleeping devices ignore messages until they send a broadcast.
+        plm.collision_rate = 0
+        bat = IM.device.BatterySensor(modem.protocol, modem, "0a.00.03")
+        modem.add(bat)
+        bat.refresh()
+        run(plm, 1)
+        assert sim_bat.num_received == 0
+
+        sim_bat.heartbeat()
+        bat.refresh()
+        run(plm, 1)
+        assert sim_bat.num_received > 0
+
+    #-----------------------------------------------------------------------
+    def test_config(self):
+        plm = IM.sim.Plm()
+        plm.load_config({
+            "address" : "44.85.11",
+            "sim" : {"latency" : 0.1, "hops" : 2},
+            "devices" : {
+                "dimmer" : ["0a.00.01", {"0a.00.02" : "lamp"}],
+                "keypad_linc_sw" : ["0a.00.03"],
+                "io_linc" : ["0a.00.04"],
+                }})
+
+        types = {IM.Address(k).hex : type(v).__name__
+                 for k, v in plm.devices.items()}
+        assert types == {"0a.00.01" : "Dimmer", "0a.00.02" : "Dimmer",
+                         "0a.00.03" : "KeypadLinc", "0a.00.04" : "Device"}
+        assert plm.devices[IM.Address("0a.00.03").id].is_dimmer is False
+        assert all(d.latency == 0.1 and d.hops == 2
+                   for d in plm.devices.values())
+        assert len(plm.db) == 8
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+def make_modem(tmpdir, monkeypatch):
+    # Run the simulation faster than real time.  The handler time outs use
+    # the active clock so it has to follow the simulation time.
+    monkeypatch.setattr(IM.clock, "_clock", IM.clock.SimClock())
+    plm = IM.sim.Plm(seed=0)
+
+    plm.latency = 0.01
+    protocol = IM.Protocol(plm)
+    modem = IM.Modem(protocol)
+    modem.addr = plm.addr
+    modem.save_path = str(tmpdir)
+    return plm, modem
+
+
+def run(plm, seconds, dt=0.05):
+    t = plm.now
+    for i in range(int(seconds / dt)):
+        t += dt
+        IM.clock.get_clock().move_to(t)
+        plm.step(t)
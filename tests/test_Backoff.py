@@ -0,0 +1,32 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/Backoff.py
+#
+#===========================================================================
+import insteon_mqtt as IM
+
+
+class Test_Backoff:
+    def test_delay(self):
+        obj = IM.Backoff(base=0.5, factor=2.0, max_delay=3.0, jitter=0.5)
+
+        # Jitter moves the delay up to jitter*delay each way.
+        assert obj.delay(1, rand=lambda: 0.5) == 0.5
+        assert obj.delay(1, rand=lambda: 0.0) == 0.25
+        assert obj.delay(2, rand=lambda: 0.5) == 1.0
+        assert obj.delay(3, rand=lambda: 0.5) == 2.0
+        assert obj.delay(4, rand=lambda: 0.5) == 3.0
+        assert obj.delay(4, rand=lambda: 1.0) == 4.5
+
+        for i in range(100):
+            assert 0.25 <= obj.delay(1) <= 0.75
+
+    #-----------------------------------------------------------------------
+    def test_config(self):
+        obj = IM.Backoff()
+        obj.load_config({"base" : 2, "factor" : 3, "max_delay" : 100,
+                         "jitter" : 5})
+        assert obj.jitter == 1.0
+        assert obj.delay(3, rand=lambda: 0.5) == 18.0
+
+    #-----------------------------------------------------------------------
@@ -0,0 +1,131 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/Channel.py
+#
+#===========================================================================
+import pytest
+import insteon_mqtt as IM
+import insteon_mqtt.message as Msg
+
+
+class Test_Channel:
+    def test_received(self):
+        obj = IM.Channel()
+        addr = IM.Address('0a.12.34')
+        t = 1000.0
+
+        # Remaining hops of standard and extended messages.
+        obj.received(inp(Msg.Flags.Type.DIRECT_ACK, 2), t)
+        assert obj.next_write_time() == pytest.approx(t + 2 * obj.STD_HOP_TIME)
+
+        flags = Msg.Flags(Msg.Flags.Type.DIRECT, True, 3, 3)
+        ext = Msg.InpExtended(addr, addr, flags, 0x2e, 0x00, bytes(14))
+        obj.received(ext, t)
+        assert obj.next_write_time() == pytest.approx(t + 3 * obj.EXT_HOP_TIME)
+
+        # Broadcasts add the device cleanups to each responder using the
+        # hops the broadcast took.
+        obj.responders = lambda addr, group: 4 if group == 1 else 0
+        obj.received(inp(Msg.Flags.Type.ALL_LINK_BROADCAST, 2), t + 1)
+        end = t + 1 + 2 * obj.STD_HOP_TIME + obj.cleanup_time(4, 1)
+        assert obj.next_write_time() == pytest.approx(end)
+        assert obj.cleanup_time(4, 1) == pytest.approx(16 * obj.STD_HOP_TIME)
+        assert obj.num_received == 3
+
+        # The next message ends the cleanup estimate.
+        obj.received(inp(Msg.Flags.Type.ALL_LINK_CLEANUP, 3), t + 1.5)
+        assert obj.next_write_time() == \
+            pytest.approx(t + 1.5 + 3 * obj.STD_HOP_TIME)
+
+        # Large scenes are capped.
+        obj.responders = lambda addr, group: 30
+        obj.received(inp(Msg.Flags.Type.ALL_LINK_BROADCAST, 0), t + 2)
+        assert obj.next_write_time() == pytest.approx(t + 2 +
+                                                      obj.MAX_CLEANUP_TIME)
+
+    #-----------------------------------------------------------------------
+    def test_scene(self):
+        obj = IM.Channel()
+        groups = []
+
+        def responders(addr, group):
+            groups.append((addr, group))
+            return 3
+
+        obj.responders = responders
+        t = 1000.0
+
+        # Modem scenes are busy until the modem reports it's done.
+        obj.sent(Msg.OutModemScene(20, 0x11, 0x00), t)
+        assert groups == [(None, 20)]
+        end = obj.next_write_time()
+        assert end == pytest.approx(t + 28 * obj.STD_HOP_TIME)
+
+        obj.received(Msg.InpAllLinkStatus(True), t + 0.5)
+        assert obj.next_write_time() == 0
+
+    #-----------------------------------------------------------------------
+    def test_stats(self):
+        obj = IM.Channel()
+        assert obj.stats()["retry_rate"] == 0
+
+        addr = IM.Address('0a.12.34')
+        for i in range(4):
+            obj.sent(Msg.OutStandard.direct(addr, 0x11, 0xff))
+
+        nak = Msg.OutStandard.direct(addr, 0x11, 0xff)
+        nak.is_ack = False
+        obj.received(nak)
+        obj.timeout()
+        obj.timeout()
+
+        stats = obj.stats()
+        assert stats["sent"] == 4
+        assert stats["nak"] == 1
+        assert stats["collision_rate"] == 0.25
+        assert stats["retry_rate"] == 0.5
+
+    #-----------------------------------------------------------------------
+    def test_airtime(self):
+        obj = IM.Channel()
+        obj.load_config({"window" : 10, "background_utilization" : 0.1})
+        addr = IM.Address('0a.12.34')
+        t = 1000.0
+
+        # Messages are costed with all their hops.
+        obj.sent(Msg.OutStandard.direct(addr, 0x11, 0xff), t)
+        assert obj.airtime_sent == pytest.approx(4 * obj.STD_HOP_TIME)
+        obj.received(inp(Msg.Flags.Type.DIRECT_ACK, 2), t)
+        assert obj.airtime_received == pytest.approx(4 * obj.STD_HOP_TIME)
+
+        # Modem only messages don't use the channel.
+        obj.sent(Msg.OutAllLinkGetFirst(), t)
+        assert obj.airtime_sent == pytest.approx(4 * obj.STD_HOP_TIME)
+
+        assert obj.utilization(t) == pytest.approx(0.8 * obj.STD_HOP_TIME)
+        assert obj.background_ok(t)
+
+        obj.received(inp(Msg.Flags.Type.DIRECT_ACK, 2), t + 5)
+        assert not obj.background_ok(t + 5)
+
+        # Old messages leave the window.
+        assert obj.utilization(t + 12) == pytest.approx(0.4 * obj.STD_HOP_TIME)
+        assert obj.background_ok(t + 12)
+        assert obj.utilization(t + 20) == 0
+        assert obj.stats(t + 20)["airtime_sent"] == 0.348
+
+        # The window stays bounded even if the utilization isn't checked.
+        for i in range(100):
+            obj.received(inp(Msg.Flags.Type.DIRECT_ACK, 2), t + 30 + i)
+        assert len(obj._airtime) == 11
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+def inp(type, hops_left):
+    addr = IM.Address('0a.12.34')
+    flags = Msg.Flags(type, False, hops_left, 3)
+    to_addr = IM.Address('00.00.01') if type == \
+        Msg.Flags.Type.ALL_LINK_BROADCAST else addr
+    return Msg.InpStandard(addr, to_addr, flags, 0x11, 0x00)
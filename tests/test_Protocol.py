@@ -3,6 +3,7 @@
 # Tests for: insteont_mqtt/handler/Protocol.py
 #
 #===========================================================================
+import time
 import insteon_mqtt as IM
 import insteon_mqtt.message as Msg
 
@@ -54,6 +55,133 @@ class Test_Protocol:
         assert proto._read_history[0] == msg_keep
 
     #-----------------------------------------------------------------------
+    def test_duplicate_airtime(self):
+        link = MockSerial()
+        proto = IM.Protocol(link)
+
+        # Each copy of a repeated message is only charged once.
+        addr = IM.Address('0a.12.33')
+        for hops_left in [3, 2]:
+            flags = Msg.Flags(Msg.Flags.Type.ALL_LINK_BROADCAST, False,
+                              hops_left, 3)
+            msg = Msg.InpStandard(addr, IM.Address('00.00.01'), flags, 0x11,
+                                  0x00)
+            link.signal_read.emit(link, msg.to_bytes())
+
+        assert proto.channel.num_received == 1
+        assert proto.channel.airtime_received == \
+            4 * proto.channel.STD_HOP_TIME
+
+    #-----------------------------------------------------------------------
+    def test_batch(self):
+        link = MockSerial()
+        proto = IM.Protocol(link)
+
+        msgs = [Msg.OutAllLinkGetFirst() for i in range(5)]
+        proto.send(msgs[0], "h0")
+        proto.send(msgs[1], "h1")
+
+        # Only the first message is passed to the link until it's written.
+        assert len(link.writes) == 1
+
+        with proto.batch(high_priority=True):
+            proto.send(msgs[2], "h2")
+            with proto.batch():
+                proto.send(msgs[3], "h3")
+
+            assert len(proto._write_queue) == 2
+
+        # The batch is inserted in order after the message being written.
+        handlers = [h for m, h in proto._write_queue]
+        assert handlers == ["h0", "h2", "h3", "h1"]
+
+        with proto.batch():
+            proto.send(msgs[4], "h4")
+
+        handlers = [h for m, h in proto._write_queue]
+        assert handlers == ["h0", "h2", "h3", "h1", "h4"]
+        assert len(link.writes) == 1
+
+    #-----------------------------------------------------------------------
+    def test_retry(self):
+        link = MockSerial()
+        proto = IM.Protocol(link)
+        proto.load_config({"retry_backoff" : {
+            "default" : {"base" : 1.0, "factor" : 2.0, "max_delay" : 3.0,
+                         "jitter" : 0.0},
+            "OutAllLinkGetFirst" : {"base" : 0.0}}})
+
+        addr = IM.Address('0a.12.33')
+        msg = Msg.OutStandard.direct(addr, 0x11, 0xff)
+        assert proto.retry_delay(msg, 1) == 1.0
+        assert proto.retry_delay(msg, 2) == 2.0
+        assert proto.retry_delay(msg, 5) == 3.0
+
+        # Extended messages use the OutStandard policy unless they're set.
+        ext = Msg.OutExtended.direct(addr, 0x2e, 0x00, bytes(14))
+        assert proto.retry_delay(ext, 1) >= 0.5
+
+        # A handler that times out frees the modem and the retry is put at
+        # the front of the queue when the delay has passed.
+        handler = IM.handler.StandardCmd(msg, None, num_retry=3)
+        proto.send(msg, handler)
+        link.signal_wrote.emit(link, None)
+        assert proto._write_handler is handler
+
+        other = Msg.OutAllLinkGetFirst()
+        other_handler = IM.handler.Base()
+        proto.send(other, other_handler)
+
+        t = time.time()
+        proto._poll(t + 6)
+        assert proto._write_handler is None
+        assert proto._write_queue == [(other, other_handler)]
+
+        link.signal_wrote.emit(link, None)
+        assert proto._write_handler is other_handler
+        proto._poll(t + 0.5)
+        assert proto._write_queue == []
+
+        proto._poll(t + 2)
+        assert proto._write_queue == [(msg, handler)]
+
+        # Zero delays are queued right away.
+        assert proto.retry_delay(other, 1) == 0.0
+
+    #-----------------------------------------------------------------------
+    def test_background(self):
+        link = MockSerial()
+        proto = IM.Protocol(link)
+        proto.load_config({"channel" : {"background_utilization" : 0.001}})
+
+        addr = IM.Address('0a.12.33')
+        msg = Msg.OutStandard.direct(addr, 0x11, 0xff)
+        handler = IM.handler.StandardCmd(msg, None)
+        proto.send(msg, handler)
+
+        # Background messages wait for the write queue to be empty.
+        bg_msg = Msg.OutStandard.direct(addr, 0x19, 0x00)
+        bg_handler = IM.handler.StandardCmd(bg_msg, None)
+        with proto.background():
+            proto.send(bg_msg, bg_handler)
+
+        assert bg_handler.background
+        assert proto._background_queue == [(bg_msg, bg_handler)]
+        link.signal_wrote.emit(link, None)
+
+        # The channel is too busy after the first message.
+        t = time.time()
+        proto._write_finished()
+        assert proto._write_queue == []
+        proto._poll(t)
+        assert proto._write_queue == []
+
+        # Once the window has passed, the message is sent.
+        proto._poll(t + proto.channel.window + 1)
+        assert proto._write_queue == [(bg_msg, bg_handler)]
+        assert proto._background_queue == []
+
+    #-----------------------------------------------------------------------
 
 #===========================================================================
 
@@ -63,9 +191,13 @@ class MockSerial:
         self.signal_read = IM.Signal()
         self.signal_wrote = IM.Signal()
         self.config = None
+        self.writes = []
 
     def poll(self):
         pass
 
     def load_config(self, config):
         self.config = config
+
+    def write(self, data, after_time=None):
+        self.writes.append(data)
@@ -0,0 +1,135 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/SceneTracker.py
+#
+#===========================================================================
+import insteon_mqtt as IM
+
+
+class Test_SceneTracker:
+    def test_suggest(self):
+        modem = MockModem()
+        obj = IM.SceneTracker(modem)
+        obj.load_config({"min_count" : 2, "min_devices" : 2})
+
+        addrs = [IM.Address(0x100000 + i) for i in range(3)]
+        targets = {a : 128 for a in addrs}
+
+        # Too few devices are ignored.
+        obj.record(True, {addrs[0] : 128})
+        assert obj.sets == {}
+
+        obj.record(True, targets)
+        assert obj.suggestions() == []
+
+        # Off sets ignore the level.
+        obj.record(False, {a : 10 for a in addrs[:2]})
+        obj.record(False, {a : 20 for a in addrs[:2]})
+        obj.record(True, targets)
+        assert len(obj.suggestions()) == 2
+
+        # Not enabled so nothing is created until asked.
+        assert modem.calls == []
+
+        # The links are created one at a time.
+        obj.create_scenes()
+        i = 0
+        while i < len(modem.calls):
+            modem.calls[i][-1](True, "done", None)
+            i += 1
+
+        calls = [c[:-1] for c in modem.calls]
+        assert calls == [
+            (20, addrs[0], 1, [0xff, 0x00, 0x01]),
+            (20, addrs[1], 1, [0xff, 0x00, 0x01]),
+            (21, addrs[0], 1, [128, 0x00, 0x01]),
+            (21, addrs[1], 1, [128, 0x00, 0x01]),
+            (21, addrs[2], 1, [128, 0x00, 0x01]),
+            ]
+
+        assert obj.suggestions() == []
+        assert sorted(obj.groups) == [20, 21]
+
+    #-----------------------------------------------------------------------
+    def test_auto(self):
+        modem = MockModem()
+        obj = IM.SceneTracker(modem)
+        obj.load_config({"enable" : True, "min_count" : 2,
+                         "min_devices" : 2, "max_groups" : 1})
+
+        addrs = [IM.Address(0x100000 + i) for i in range(4)]
+
+        obj.record(False, {a : None for a in addrs[:2]})
+        obj.record(False, {a : None for a in addrs[:2]})
+        assert len(modem.calls) == 1
+
+        # Pending - not created again.
+        obj.record(False, {a : None for a in addrs[:2]})
+        assert len(modem.calls) == 1
+
+        # Max groups limit.
+        obj.record(False, {a : None for a in addrs[2:]})
+        obj.record(False, {a : None for a in addrs[2:]})
+        assert len(modem.calls) == 1
+
+        # Failure frees the group.
+        modem.calls[0][-1](False, "failed", None)
+        assert obj.groups == []
+
+    #-----------------------------------------------------------------------
+    def test_save(self, tmpdir):
+        modem = MockModem()
+        config = {"enable" : True, "min_count" : 2, "min_devices" : 2,
+                  "max_groups" : 1}
+        obj = IM.SceneTracker(modem)
+        obj.load_config(config, str(tmpdir))
+
+        addrs = [IM.Address(0x100000 + i) for i in range(4)]
+        obj.record(True, {addrs[0] : 10, addrs[1] : 20})
+        obj.record(True, {addrs[0] : 10, addrs[1] : 20})
+        for call in modem.calls:
+            call[-1](True, "done", None)
+        obj.record(False, {a : None for a in addrs[2:]})
+
+        # The sets and the created groups are loaded after a restart so
+        # the group limit still applies.
+        modem = MockModem()
+        obj2 = IM.SceneTracker(modem)
+        obj2.load_config(config, str(tmpdir))
+        assert obj2.groups == obj.groups == [20]
+        assert obj2.sets == obj.sets
+
+        obj2.record(False, {a : None for a in addrs[2:]})
+        assert modem.calls == []
+
+    #-----------------------------------------------------------------------
+    def test_report(self):
+        modem = MockModem()
+        obj = IM.SceneTracker(modem)
+        obj.load_config({"min_count" : 1, "min_devices" : 2})
+
+        addrs = [IM.Address(0x100000 + i) for i in range(4)]
+        obj.record(True, {a : 255 for a in addrs}, group=30)
+        obj.record(True, {a : 255 for a in addrs}, group=30)
+        obj.record(False, {a : None for a in addrs[:3]})
+
+        lines = obj.report()
+        assert len(lines) == 5
+        assert lines[-2] == "PLM messages saved by scenes: 6"
+        assert lines[-1].endswith(": 2")
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+class MockModem:
+    def __init__(self):
+        self.protocol = None
+        self.db = IM.db.Modem()
+        self.calls = []
+
+    def db_add_ctrl_of(self, local_group, remote_addr, remote_group,
+                       two_way=True, refresh=True, on_done=None,
+                       local_data=None, remote_data=None):
+        self.calls.append((local_group, remote_addr, remote_group,
+                           remote_data, on_done))
@@ -173,3 +173,60 @@ def test_disconnect():
 
 
 #===========================================================================
+
+
+#===========================================================================
+
+
+def test_strong():
+    sig = IM.Signal(strong=True)
+    data = []
+
+    # Lambdas stay connected w/ strong references.
+    sig.connect(lambda **kwargs: data.append(1))
+    sig.connect(lambda **kwargs: data.append(2))
+    sig.emit(a=1)
+    assert data == [1, 2]
+
+    sig.clear()
+    sig.emit(a=1)
+    assert data == [1, 2]
+
+#===========================================================================
+
+
+def test_order():
+    clear()
+    sig = IM.Signal()
+    data = []
+    obj = Slot()
+
+    def slot1(**kwargs):
+        data.append(1)
+
+    def slot2(**kwargs):
+        data.append(2)
+        sig.disconnect(slot1)
+        sig.connect(slot3)
+
+    def slot3(**kwargs):
+        data.append(3)
+
+    sig.connect(slot1)
+    sig.connect(obj.method_slot)
+    sig.connect(slot2)
+    sig.connect(slot1)
+    sig.connect(obj.method_slot)
+    assert sig.slots == [slot1, obj.method_slot, slot2]
+
+    # Slots are called in order and changes during emit happen next time.
+    sig.emit(a=1)
+    assert data == [1, 2]
+    assert len(Slot.method_data) == 1
+
+    sig.emit(a=1)
+    assert data == [1, 2, 2, 3]
+
+    # Deleted objects are removed.
+    del obj
+    assert sig.slots == [slot2, slot3]
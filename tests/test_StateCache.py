@@ -0,0 +1,168 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/StateCache.py
+#
+#===========================================================================
+import contextlib
+import time
+import insteon_mqtt as IM
+
+
+class Test_StateCache:
+    def test_record(self, tmpdir):
+        modem = MockModem()
+        obj = IM.StateCache(modem)
+        obj.load_config({"enable" : True, "save_interval" : 10},
+                        str(tmpdir))
+        assert modem.protocol.signal_poll.slots
+
+        dev = MockDevice(0x100001)
+        obj.watch(dev)
+        dev.signal_active.emit(dev, 3, 128)
+        dev.signal_active.emit(dev, 4, 0)
+        dev.signal_fan_changed.emit(dev, IM.device.FanLinc.Speed.MED)
+
+        state = obj.entries[dev.addr.hex]["state"]
+        assert state["signal_active/3"] == [3, 128]
+        assert state["signal_active/4"] == [4, 0]
+        assert state["signal_fan_changed"] == [{"enum" : "Speed",
+                                                "value" : 191}]
+        assert obj.age(dev) < 5
+
+        # Saves are delayed until the save interval has passed.
+        t = time.time()
+        obj.poll(t)
+        assert tmpdir.join("state_cache.json").exists()
+
+        dev.signal_active.emit(dev, 3, 0)
+        obj.poll(t + 5)
+        obj2 = IM.StateCache(MockModem())
+        obj2.load_config({"enable" : True}, str(tmpdir))
+        assert obj2.entries[dev.addr.hex]["state"]["signal_active/3"] == \
+            [3, 128]
+
+        obj.poll(t + 11)
+        obj2.load()
+        assert obj2.entries[dev.addr.hex]["state"]["signal_active/3"] == \
+            [3, 0]
+
+    #-----------------------------------------------------------------------
+    def test_replay(self, tmpdir):
+        modem = MockModem()
+        obj = IM.StateCache(modem)
+        obj.load_config({"enable" : True, "ttl" : 100}, str(tmpdir))
+
+        fresh = MockDevice(0x100001)
+        stale = MockDevice(0x100002)
+        new = MockDevice(0x100003)
+        for dev in (fresh, stale, new):
+            modem.devices[dev.addr.id] = dev
+            obj.watch(dev)
+
+        t = time.time()
+        obj.entries = {
+            fresh.addr.hex : {"time" : t - 10, "state" : {
+                "signal_fan_changed" : [{"enum" : "Speed", "value" : 255}]}},
+            stale.addr.hex : {"time" : t - 200, "state" : {
+                "signal_active/1" : [1, 255]}},
+            }
+
+        emitted = []
+        restored = []
+        slots = [lambda *args: emitted.append(args),
+                 lambda dev, age: restored.append((dev, round(age)))]
+        fresh.signal_fan_changed.connect(slots[0])
+        stale.signal_active.connect(slots[0])
+        obj.signal_restored.connect(slots[1])
+
+        obj.replay(t)
+        assert (fresh, IM.device.FanLinc.Speed.HIGH) in emitted
+        assert (stale, 1, 255) in emitted
+        assert sorted(restored, key=lambda i: i[1]) == [(fresh, 10),
+                                                        (stale, 200)]
+
+        # Replaying doesn't update the cache times.
+        assert round(obj.age(stale, t)) == 200
+
+        # Only the stale and missing devices are refreshed, one at a time.
+        assert fresh.refreshed == 0
+        assert stale.refreshed == 1
+        assert new.refreshed == 0
+        stale.on_done(False, "timeout", None)
+        assert new.refreshed == 1
+        new.on_done(True, "done", None)
+
+        # Replay only happens once.
+        restored.clear()
+        obj.replay(t)
+        assert restored == []
+
+        # The TTL check runs again from the poll.
+        obj.poll(t + 101)
+        assert fresh.refreshed == 1
+
+    #-----------------------------------------------------------------------
+    def test_refresh_many(self, tmpdir):
+        modem = MockModem()
+        obj = IM.StateCache(modem)
+        obj.load_config({"enable" : True}, str(tmpdir))
+
+        # Refreshes that finish right away don't recurse once per device.
+        devices = [MockDevice(0x100000 + i, sync=True) for i in range(3000)]
+        for dev in devices:
+            modem.devices[dev.addr.id] = dev
+
+        obj.verify()
+        assert all(dev.refreshed == 1 for dev in devices)
+
+    #-----------------------------------------------------------------------
+    def test_disabled(self, tmpdir):
+        modem = MockModem()
+        obj = IM.StateCache(modem)
+        obj.load_config({}, str(tmpdir))
+        assert not modem.protocol.signal_poll.slots
+
+        dev = MockDevice(0x100001)
+        obj.watch(dev)
+        dev.signal_active.emit(dev, True)
+        assert obj.entries == {}
+
+        obj.replay()
+        assert dev.refreshed == 0
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+class MockProto:
+    def __init__(self):
+        self.signal_poll = IM.Signal()
+
+    @contextlib.contextmanager
+    def background(self):
+        yield
+
+
+class MockModem:
+    def __init__(self):
+        self.protocol = MockProto()
+        self.devices = {}
+
+
+class MockDevice:
+    Speed = IM.device.FanLinc.Speed
+
+    def __init__(self, addr, sync=False):
+        self.addr = IM.Address(addr)
+        self.sync = sync
+        self.label = self.addr.hex
+        self.signal_active = IM.Signal()
+        self.signal_fan_changed = IM.Signal()
+        self.refreshed = 0
+        self.on_done = None
+
+    def refresh(self, force=False, on_done=None):
+        self.refreshed += 1
+        self.on_done = on_done
+        if self.sync:
+            on_done(False, "unreachable", None)
@@ -0,0 +1,109 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/Trace.py
+#
+#===========================================================================
+import insteon_mqtt as IM
+import insteon_mqtt.message as Msg
+
+
+class Test_Trace:
+    def test_ring(self):
+        obj = IM.Trace(size=3)
+        for i in range(5):
+            obj.record(obj.READ, bytes([i]))
+
+        # Only the newest records are kept, oldest first.
+        assert [r[2] for r in obj.records()] == [b"\x02", b"\x03", b"\x04"]
+
+        obj.load_config({"size" : 2})
+        assert [r[2] for r in obj.records()] == [b"\x03", b"\x04"]
+        obj.record(obj.READ, b"\x05")
+        assert [r[2] for r in obj.records()] == [b"\x04", b"\x05"]
+
+        obj.load_config({"enable" : False})
+        obj.record(obj.READ, b"\x06")
+        assert [r[2] for r in obj.records()] == [b"\x04", b"\x05"]
+
+    #-----------------------------------------------------------------------
+    def test_clock(self, tmpdir):
+        obj = IM.Trace()
+        with IM.clock.use_clock(IM.clock.SimClock(1000.0)):
+            obj.record(obj.READ, b"\x01")
+
+        # Records use the bridge clock so they line up with the logs.
+        path = str(tmpdir.join("trace.bin"))
+        obj.dump(path)
+        assert IM.Trace.read(path) == [(1000.0, obj.READ, b"\x01")]
+
+    #-----------------------------------------------------------------------
+    def test_protocol(self, tmpdir):
+        link = MockSerial()
+        proto = IM.Protocol(link)
+
+        addr = IM.Address('0a.12.34')
+        msg = Msg.OutStandard.direct(addr, 0x11, 0xff)
+        handler = IM.handler.StandardCmd(msg, None)
+        proto.send(msg, handler)
+        link.signal_wrote.emit(link, None)
+
+        # Modem echo with an ACK and a garbled message.
+        link.signal_read.emit(link, msg.to_bytes() + b"\x06")
+        proto.trace.record(proto.trace.READ, b"\x02\xff\x01")
+
+        kinds = [r[1] for r in proto.trace.records()]
+        assert kinds == [IM.Trace.WRITE, IM.Trace.HANDLER, IM.Trace.READ,
+                         IM.Trace.READ]
+
+        path = str(tmpdir.join("trace.bin"))
+        proto.trace.dump(path)
+        records = IM.Trace.read(path)
+        assert [r[2] for r in records[-2:]] == [msg.to_bytes() + b"\x06",
+                                                b"\x02\xff\x01"]
+
+        lines = IM.Trace.decode(path)
+        assert len(lines) == 4
+        assert "WRITE" in lines[0] and "0a.12.34" in lines[0]
+        assert "HANDLER StandardCmd started" in lines[1]
+        assert "READ" in lines[2] and "ack: True" in lines[2]
+        assert lines[3].endswith("02 ff 01")
+
+    #-----------------------------------------------------------------------
+    def test_modem_dump(self, tmpdir):
+        modem = IM.Modem(IM.Protocol(MockSerial()))
+        modem.save_path = str(tmpdir)
+        calls = []
+
+        def on_done(success, msg, data):
+            calls.append((success, data))
+
+        modem.trace_dump("trace.bin", on_done=on_done)
+        assert calls[-1] == (True, str(tmpdir.join("trace.bin")))
+        assert tmpdir.join("trace.bin").check()
+
+        # Only a file name in the storage directory is allowed.
+        outside = tmpdir.join("..", "outside.bin")
+        for name in ["../outside.bin", str(outside), "sub/trace.bin", "..",
+                     ""]:
+            modem.trace_dump(name, on_done=on_done)
+            assert calls[-1] == (False, None)
+        assert not outside.check()
+
+        modem.trace_dump(on_done=on_done)
+        assert calls[-1][0] is True
+        assert calls[-1][1].startswith(str(tmpdir))
+
+    #-----------------------------------------------------------------------
+
+
+#===========================================================================
+class MockSerial:
+    def __init__(self):
+        self.signal_read = IM.Signal()
+        self.signal_wrote = IM.Signal()
+
+    def load_config(self, config):
+        pass
+
+    def write(self, data, after_time=None):
+        pass
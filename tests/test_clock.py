@@ -0,0 +1,96 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/clock.py
+#
+#===========================================================================
+import time
+import insteon_mqtt as IM
+
+
+class Test_clock:
+    def test_sim_clock(self):
+        obj = IM.clock.SimClock(1000.0)
+        assert obj.time() == 1000.0
+        assert obj.poll_time_out(5) == 0
+
+        # No deadlines - move by the time out.
+        assert obj.advance(5) == 1005.0
+
+        # Jump to the next deadline.
+        obj.deadline(1007.5)
+        obj.deadline(1020.0)
+        assert obj.advance(60) == 1007.5
+
+        # Deadlines that are due keep the clock still for one pass.
+        assert obj.advance(60) == 1007.5
+        assert obj.advance(60) == 1020.0
+
+        # Moving drops the deadlines before the time and never goes back.
+        obj.deadline(1030.0)
+        obj.deadline(1100.0)
+        obj.move_to(1050.0)
+        assert obj._deadlines == [1100.0]
+        obj.move_to(900.0)
+        assert obj.time() == 1050.0
+
+    #-----------------------------------------------------------------------
+    def test_use_clock(self):
+        sys_clock = IM.clock.get_clock()
+        assert abs(IM.clock.now() - time.time()) < 1
+
+        sim = IM.clock.SimClock(10.0)
+        with IM.clock.use_clock(sim):
+            assert IM.clock.get_clock() is sim
+            assert IM.clock.now() == 10.0
+            IM.clock.deadline(12.0)
+            assert sim._deadlines == [12.0]
+
+        assert IM.clock.get_clock() is sys_clock
+
+        prev = IM.clock.set_clock(sim)
+        assert prev is sys_clock
+        assert IM.clock.set_clock(None) is sim
+        assert type(IM.clock.get_clock()) is IM.clock.Clock
+
+        IM.clock.set_clock(prev)
+
+    #-----------------------------------------------------------------------
+    def test_network(self, tmpdir):
+        # Hours of simulated traffic run in a fraction of the real time.
+        sim = IM.clock.SimClock(1000.0)
+        with IM.clock.use_clock(sim):
+            plm = IM.sim.Plm(seed=0)
+            sim_dim = plm.add(IM.sim.Dimmer("0a.00.01"))
+
+            loop = IM.network.Manager()
+            protocol = IM.Protocol(plm)
+            modem = IM.Modem(protocol)
+            modem.addr = plm.addr
+            modem.save_path = str(tmpdir)
+            dim = IM.device.Dimmer(protocol, modem, "0a.00.01")
+            modem.add(dim)
+            loop.add(plm, connected=False)
+
+            done = []
+            count = 120
+
+            def cmd():
+                done.append(IM.clock.now())
+                dim.on(level=len(done) % 2 * 0xff)
+                if len(done) < count:
+                    protocol.call_later(60, cmd)
+
+            start = time.time()
+            protocol.call_later(60, cmd)
+            end = sim.time() + (count + 1) * 60
+            while sim.time() < end:
+                loop.select(1.0)
+                assert time.time() - start < 30
+
+            assert len(done) == count
+            assert sim_dim.level == 0x00 and dim._level == 0x00
+            assert done[1] - done[0] == 60.0
+
+            loop.close_all()
+
+    #-----------------------------------------------------------------------
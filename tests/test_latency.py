@@ -0,0 +1,121 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/latency.py
+#
+#===========================================================================
+import json
+import insteon_mqtt as IM
+import insteon_mqtt.bench as bench
+import insteon_mqtt.message as Msg
+
+
+class Test_latency:
+    def test_context(self):
+        obj = IM.latency.Recorder()
+        trace = obj.start("insteon/command/dim", 1000.0)
+
+        done = []
+        with IM.latency.context(trace):
+            assert IM.latency.current() is trace
+            IM.latency.mark("queued")
+            on_done1 = trace.wrap(lambda *args: done.append(args))
+            on_done2 = trace.wrap(lambda *args: done.append(args))
+
+        assert IM.latency.current() is None
+        assert trace.pending == 2
+
+        # Discard only removes a matching last stage.
+        trace.mark("plm_ack", 1000.1)
+        trace.discard("device_ack")
+        trace.mark("device_ack", 1000.2)
+        trace.discard("device_ack")
+        assert [i[0] for i in trace.stages] == ["received", "queued",
+                                                "plm_ack"]
+
+        # The trace finishes when every handler is done.
+        on_done1(True, "ok", None)
+        assert not trace.finished and obj.num_traces == 0
+        on_done2(True, "ok", None)
+        on_done2(True, "ok", None)
+        assert trace.finished and obj.num_traces == 1
+        assert len(done) == 3
+
+        # Later marks are ignored.
+        trace.mark("publish")
+        assert trace.stages[-1][0] == "done"
+
+        # Traces that never used a handler aren't recorded.
+        trace = obj.start("insteon/command/dim")
+        trace.end()
+        trace.finish()
+        assert obj.num_traces == 1
+
+        obj.load_config({"enable" : False})
+        assert obj.start("insteon/command/dim") is None
+
+    #-----------------------------------------------------------------------
+    def test_recorder(self, tmpdir):
+        path = str(tmpdir.join("latency.json"))
+        obj = IM.latency.Recorder()
+        obj.load_config({"sample_rate" : 0.5, "samples" : 2, "file" : path})
+        assert obj.samples.maxlen == 2
+
+        for i in range(5):
+            trace = obj.start("cmd", 1000.0)
+            trace.mark("write", 1000.003)
+            trace.mark("done", 1000.5 + i)
+            trace.finish()
+
+        stats = obj.stats()
+        assert stats["traces"] == 5
+        assert stats["buckets_ms"] == IM.latency.BUCKETS_MS
+        write = stats["stages"]["write"]
+        assert write["num"] == 5 and write["mean_ms"] == 3.0
+        assert write["counts"][2] == 5
+        total = stats["stages"]["total"]
+        assert total["max_ms"] == 4500.0
+        assert sum(total["counts"]) == 5
+
+        # Every other trace is sampled.
+        assert len(obj.samples) == 2
+        with open(path) as f:
+            lines = [json.loads(i) for i in f]
+        assert len(lines) == 2
+        assert lines[0]["stages"][-1] == ["done", 1500.0]
+        assert lines[1]["total_ms"] == 3500.0
+
+        addr = IM.Address("0a.00.01")
+        flags = Msg.Flags(Msg.Flags.Type.DIRECT_ACK, False)
+        ack = Msg.InpStandard(addr, addr, flags, 0x11, 0xff)
+        assert IM.latency.msg_stage(ack) == "device_ack"
+        out = Msg.OutStandard.direct(addr, 0x11, 0xff)
+        out.is_ack = True
+        assert IM.latency.msg_stage(out) == "plm_ack"
+
+    #-----------------------------------------------------------------------
+    def test_bridge(self, tmpdir):
+        # Trace a command through the bridge with a simulated clock.
+        with IM.clock.use_clock(IM.clock.SimClock(1000.0)):
+            cfg = bench.scale.make_config(4, str(tmpdir), latency=0.01)
+            cfg["insteon"]["latency"] = {"sample_rate" : 1}
+            loop, mqtt_handler, modem = IM.cmd_line.start.setup(cfg)
+            while loop.unconnected:
+                loop.select(0.01)
+
+            payload = json.dumps({"state" : "ON", "brightness" : 100})
+            mqtt_handler.link.inject("insteon/20.00.00/level", payload)
+            for i in range(100):
+                loop.select(1.0)
+
+            loop.close_all()
+
+        recorder = modem.protocol.latency
+        assert recorder.num_traces == 1
+        trace = recorder.samples[0]
+        assert trace["name"] == "insteon/20.00.00/level"
+        assert [i[0] for i in trace["stages"]] == [
+            "received", "queued", "write", "sent", "plm_ack", "device_ack",
+            "publish", "done"]
+        assert trace["total_ms"] > 0
+
+    #-----------------------------------------------------------------------
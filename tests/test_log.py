@@ -0,0 +1,72 @@
+#===========================================================================
+#
+# Tests for: insteont_mqtt/log.py
+#
+#===========================================================================
+import logging
+import insteon_mqtt as IM
+
+
+class Test_log:
+    def test_lazy(self, caplog):
+        LOG = IM.log.get_logger()
+        LOG.setLevel(logging.INFO)
+        calls = []
+
+        def func(a, b):
+            calls.append((a, b))
+            return [a, b]
+
+        # Not called unless the message is output.
+        LOG.debug("value %s", IM.log.Lazy(func, 1, 2))
+        assert calls == []
+
+        with caplog.at_level(logging.INFO, logger="insteon_mqtt"):
+            LOG.info("value %s", IM.log.Lazy(func, 1, 2))
+
+        # Each handler formats the record.
+        assert calls and set(calls) == {(1, 2)}
+        assert "value [1, 2]" in caplog.text
+
+    #-----------------------------------------------------------------------
+    def test_drop(self):
+        records = IM.log.queue.Queue(2)
+        handler = IM.log.DropQueueHandler(records)
+
+        for i in range(3):
+            handler.emit(logging.makeLogRecord({"msg" : "msg %d" % i}))
+
+        # The oldest record is dropped when the queue is full.
+        assert handler.num_dropped == 1
+        assert records.get_nowait().msg == "msg 1"
+        assert records.get_nowait().msg == "msg 2"
+
+    #-----------------------------------------------------------------------
+    def test_async(self, tmpdir):
+        LOG = IM.log.get_logger()
+        save = list(LOG.handlers)
+        path = str(tmpdir.join("insteon.log"))
+        ui = []
+        try:
+            IM.log.initialize(logging.INFO, False, path,
+                              {"logging" : {"queue_size" : 10}})
+            with LOG.ui_context(ui.append):
+                LOG.ui("ui message")
+                LOG.info("info message")
+
+            # UI records go to the callback right away.
+            assert [r.getMessage() for r in ui] == ["ui message"]
+
+            IM.log.shutdown()
+            with open(path) as f:
+                lines = f.readlines()
+
+            assert "ui message" in lines[0]
+            assert "info message" in lines[1]
+        finally:
+            IM.log.shutdown()
+            for handler in list(LOG.handlers):
+                if handler not in save:
+                    LOG.removeHandler(handler)
+
+    #-----------------------------------------------------------------------